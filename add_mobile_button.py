@@ -1,14 +1,11 @@
-import os
+"""
+週曆每日底部新增「預約此日」按鈕 (手機端專用) 與其事件監聽
+"""
+from tools.patching import Edit, Patch, run
 
-app_js_path = r"h:\schedule\app.js"
-
-try:
-    with open(app_js_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # 1. Insert HTML generation
-    target_html_insert = "dayEl.appendChild(bookingsEl);"
-    new_html_code = """dayEl.appendChild(bookingsEl);
+# 1. Insert HTML generation
+TARGET_HTML_INSERT = "dayEl.appendChild(bookingsEl);"
+NEW_HTML_CODE = """dayEl.appendChild(bookingsEl);
 
         // 新增底部預約按鈕（手機端專用）
         const footerEl = document.createElement('div');
@@ -23,50 +20,29 @@ try:
             </button>
         `;
         dayEl.appendChild(footerEl);"""
-    
-    if target_html_insert in content and "btn-book-mobile" not in content:
-        content = content.replace(target_html_insert, new_html_code)
-        print("Inserted HTML generation code")
-    else:
-        print("HTML generation code already exists or target not found")
-
-    # 2. Insert Event Listener
-    # We look for the closing of the previous forEach loop
-    target_event_insert = """    document.querySelectorAll('.btn-book').forEach(btn => {
-        btn.addEventListener('click', (e) => {
-            e.stopPropagation();
-            openBookingModal(btn.dataset.date);
-        });
-    });"""
-    
-    new_event_code = """    document.querySelectorAll('.btn-book').forEach(btn => {
-        btn.addEventListener('click', (e) => {
-            e.stopPropagation();
-            openBookingModal(btn.dataset.date);
-        });
-    });
 
+# 2. Insert Event Listener
+# 插在 renderCalendar() 結尾 (.btn-book 監聽之後), 以函式名稱定位
+NEW_EVENT_CODE = """
     // 手機端底部預約按鈕
     document.querySelectorAll('.btn-book-mobile').forEach(btn => {
         btn.addEventListener('click', (e) => {
             e.stopPropagation();
             openBookingModal(btn.dataset.date);
         });
-    });"""
-
-    if target_event_insert in content and "btn-book-mobile" in new_event_code:
-        # Check if we already inserted event listener (simple check)
-        if "document.querySelectorAll('.btn-book-mobile')" not in content:
-            content = content.replace(target_event_insert, new_event_code)
-            print("Inserted event listener code")
-        else:
-             print("Event listener code likely already exists")
-    else:
-        print("Target for event listener not found")
-
-    with open(app_js_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    print("Successfully updated app.js")
-
-except Exception as e:
-    print(f"Error updating app.js: {e}")
+    });
+"""
+
+PATCHES = [
+    Patch('add_mobile_button/day-footer', 'app.js',
+          (Edit(TARGET_HTML_INSERT, NEW_HTML_CODE),),
+          unless='btn-book-mobile',
+          label='Inserted HTML generation code'),
+    Patch('add_mobile_button/event-listener', 'app.js',
+          (Edit(None, NEW_EVENT_CODE, symbol='renderCalendar', where='end'),),
+          unless="document.querySelectorAll('.btn-book-mobile')",
+          label='Inserted event listener code'),
+]
+
+if __name__ == '__main__':
+    run(PATCHES)
@@ -10,6 +10,8 @@ firebase.initializeApp(firebaseConfig);
 const db = firebase.firestore();
 const auth = firebase.auth();
 const bookingsCollection = db.collection('bookings');
+// 重複 / 批次預約系列: 一份文件 = 一串日期 (tools/series.py)
+const seriesCollection = db.collection('bookingSeries');
 // v2.41.0 (M.1): 場地公告 collection
 const announcementsCollection = db.collection('roomAnnouncements');
 
@@ -501,6 +503,150 @@ function renderSkeleton() {
     }
 }
 
+// ===== 靜態週分片 (tools/shards.py) + 變更日誌 bookingChanges (functions journalBookingChanges) =====
+// 冷開啟時週檢視先用 SW 快取的分片畫第一屏, 再只查分片 watermark 之後的變更補上
+const SHARD_MAX_AGE = 13 * 24 * 60 * 60 * 1000; // 須短於日誌保留 14 天, watermark 之後的變更才會都還在
+
+/**
+ * 分片網址; 場地名稱以 UTF-16 FNV-1a 雜湊 (與 tools/shards.py room_hash 相同)
+ */
+function shardUrl(room, queryStart, queryEnd) {
+    let h = 0x811c9dc5;
+    for (let i = 0; i < room.length; i++) {
+        h ^= room.charCodeAt(i);
+        h = Math.imul(h, 0x01000193) >>> 0;
+    }
+    return `shards/${h.toString(16).padStart(8, '0')}-${queryStart.replace(/\//g, '')}-${queryEnd.replace(/\//g, '')}.json`;
+}
+
+/**
+ * 分片中的預約 → 與 Firestore 查詢結果相同的格式 (createdAt 由 epoch 毫秒轉回 Timestamp)
+ */
+function reviveShardBooking(b) {
+    const booking = { ...b, room: b.room || '禮堂' };
+    if (typeof b.createdAt === 'number') booking.createdAt = firebase.firestore.Timestamp.fromMillis(b.createdAt);
+    return booking;
+}
+
+/**
+ * 依序套用變更日誌: 新增/修改 → 以 id 覆寫 (僅限本場地本週); 刪除/移出 → 僅在副本仍位於舊位置時移除
+ * @param {Array} list 分片內容
+ * @param {Array} changes bookingChanges 文件 ({bookingId, room, date, deleted, booking}), changedAt 遞增
+ */
+function applyBookingChanges(list, changes, room, queryStart, queryEnd) {
+    const byId = new Map(list.map(b => [b.id, b]));
+    changes.forEach(c => {
+        if (c.seriesId) return; // 系列的日期異動 (trackSeriesChanges): 系列不在分片內, 一律即時展開
+        if (c.deleted) {
+            const current = byId.get(c.bookingId);
+            if (current && current.date === c.date && current.room === c.room) byId.delete(c.bookingId);
+            return;
+        }
+        const b = c.booking;
+        if ((b.room || '禮堂') === room && b.date >= queryStart && b.date <= queryEnd) {
+            byId.set(c.bookingId, { ...b, id: c.bookingId, room: b.room || '禮堂' });
+        }
+    });
+    return Array.from(byId.values());
+}
+
+/**
+ * 取得本週分片; 不存在、key 不符或太舊則回傳 null
+ */
+async function loadBookingShard(room, queryStart, queryEnd) {
+    try {
+        const res = await fetch(shardUrl(room, queryStart, queryEnd));
+        if (!res.ok) return null;
+        const shard = await res.json();
+        if (shard.key !== `${room}:${queryStart}:${queryEnd}` || Date.now() - shard.watermark > SHARD_MAX_AGE) return null;
+        return shard;
+    } catch (e) {
+        return null;
+    }
+}
+
+/**
+ * 分片 + watermark 之後的變更 = 目前的預約
+ */
+async function catchUpShard(shard, room, queryStart, queryEnd) {
+    const snapshot = await statsTrackedGet(
+        db.collection('bookingChanges')
+            .where('room', '==', room)
+            .where('changedAt', '>', firebase.firestore.Timestamp.fromMillis(shard.watermark))
+            .orderBy('changedAt')
+    );
+    const changes = snapshot.docs.map(doc => doc.data());
+    return applyBookingChanges(shard.bookings.map(reviveShardBooking), changes, room, queryStart, queryEnd);
+}
+
+/**
+ * 日期查詢鍵 (dayOrdinal / weekKey / monthKey) 是否已回填完成: tools/datekeys.py 整批回填成功後才寫入
+ * migrations/dateKeys (complete = true)。app.js 隨每次 push 部署, 不保證回填已跑過 → 沒有標記 (或規則尚未
+ * 部署而讀取被拒) 時一律照舊以 date 字串範圍查詢, 否則沒有查詢鍵的舊預約會從週曆 / 月曆 / 歷史記錄消失
+ */
+let dateKeysReadyPromise = null;
+function dateKeysReady() {
+    if (!dateKeysReadyPromise) {
+        dateKeysReadyPromise = db.collection('migrations').doc('dateKeys').get()
+            .then(snap => snap.exists && snap.data().complete === true)
+            .catch(() => false);
+    }
+    return dateKeysReadyPromise;
+}
+
+/**
+ * 回填完成時以查詢鍵查詢, 否則 (或查詢鍵的查詢失敗, 例如索引還在建立) 改用 date 字串範圍的舊查詢
+ * @param {() => object} keyed 使用 dayOrdinal / weekKey / monthKey 的查詢
+ * @param {() => object} byDate 同一範圍以 date 字串查詢
+ * @param {(query: object) => Promise<object>} [get] 執行查詢 (預設 query.get(); 週曆 / 月曆傳 statsTrackedGet)
+ */
+async function getBookingsByDateKeys(keyed, byDate, get = query => query.get()) {
+    if (await dateKeysReady()) {
+        try {
+            return await get(keyed());
+        } catch (e) {
+            console.warn('[dateKeys] 查詢鍵查詢失敗, 改用 date 範圍', e);
+        }
+    }
+    return get(byDate());
+}
+
+/**
+ * 單一場地在 [queryStart, queryEnd] 的預約 (查詢鍵未回填時以 date 範圍查詢, 見 getBookingsByDateKeys)
+ */
+function getRoomBookings(room, queryStart, queryEnd) {
+    return getBookingsByDateKeys(
+        () => roomBookingsQuery(room, queryStart, queryEnd),
+        () => bookingsCollection
+            .where('room', '==', room)
+            .where('date', '>=', queryStart)
+            .where('date', '<=', queryEnd),
+        statsTrackedGet,
+    );
+}
+
+/**
+ * 單一場地在 [queryStart, queryEnd] 的預約查詢 (dayOrdinal / weekKey / monthKey 由 tools/datekeys.py 回填)
+ * 剛好一週 (週一~週日) → weekKey 等值; 剛好一個月 → monthKey 等值; 其他區間 → dayOrdinal 整數範圍
+ * 週曆、月曆與背景預載對同一週 / 同一月發出的是同一個等值查詢, SDK 的本機持久化快取可以直接沿用
+ */
+function roomBookingsQuery(room, queryStart, queryEnd) {
+    const query = bookingsCollection.where('room', '==', room);
+    const start = bookingDateKeys(queryStart);
+    const end = bookingDateKeys(queryEnd);
+    if (start.weekKey === queryStart && end.dayOrdinal - start.dayOrdinal === 6) {
+        return query.where('weekKey', '==', start.weekKey);
+    }
+    const [year, month] = start.monthKey.split('/').map(Number);
+    if (queryStart === `${start.monthKey}/01` && end.monthKey === start.monthKey
+        && end.dayOrdinal - start.dayOrdinal + 1 === new Date(year, month, 0).getDate()) {
+        return query.where('monthKey', '==', start.monthKey);
+    }
+    return query
+        .where('dayOrdinal', '>=', start.dayOrdinal)
+        .where('dayOrdinal', '<=', end.dayOrdinal);
+}
+
 /**
  * 從 Firestore 載入預約資料
  */
@@ -540,18 +686,43 @@ async function loadBookingsFromFirebase(forceRefresh = false) {
         return;
     }
 
-    // 2. 快取未命中，顯示 Skeleton 並發起 Firestore 查詢
+    // 2. 週檢視: 靜態分片先畫第一屏, 再以變更日誌補上分片之後的異動 (只讀有變動的文件)
+    if (displayMode !== 'range') {
+        const shard = await loadBookingShard(room, queryStart, queryEnd);
+        if (shard) {
+            isLoading = true;
+            try {
+                bookings = shard.bookings.map(reviveShardBooking);
+                await loadRoomSettings(room);
+                renderCalendar();
+
+                const [caughtUp, seriesBookings] = await Promise.all([
+                    catchUpShard(shard, room, queryStart, queryEnd),
+                    loadSeriesBookings({ room, queryStart, queryEnd }), // 系列不在分片內, 一律即時展開
+                ]);
+                bookings = caughtUp.concat(seriesBookings);
+                bookingsCache[cacheKey] = { bookings: bookings, timestamp: Date.now() };
+                renderCalendar();
+                triggerRoomPrefetch(queryStart, queryEnd);
+                return;
+            } catch (error) {
+                console.warn('[Shard] 變更日誌補差失敗, 改用完整查詢:', error);
+            } finally {
+                isLoading = false;
+            }
+        }
+    }
+
+    // 3. 快取未命中，顯示 Skeleton 並發起 Firestore 查詢
     isLoading = true;
     renderSkeleton();
 
     try {
         // v2.42.0: 透過 statsTrackedGet 收集快取命中率
-        const snapshot = await statsTrackedGet(
-            bookingsCollection
-                .where('room', '==', room)
-                .where('date', '>=', queryStart)
-                .where('date', '<=', queryEnd)
-        );
+        const [snapshot, seriesBookings] = await Promise.all([
+            getRoomBookings(room, queryStart, queryEnd),
+            loadSeriesBookings({ room, queryStart, queryEnd }),
+        ]);
 
         bookings = [];
         snapshot.forEach(doc => {
@@ -559,6 +730,7 @@ async function loadBookingsFromFirebase(forceRefresh = false) {
             const bookingRoom = data.room || '禮堂'; // 正規化場地
             bookings.push({ ...data, id: doc.id, room: bookingRoom });
         });
+        bookings.push(...seriesBookings);
 
         // 寫入記憶體快取
         bookingsCache[cacheKey] = {
@@ -612,12 +784,10 @@ function triggerRoomPrefetch(queryStart, queryEnd) {
 
             try {
                 // 發起 Firestore 查詢，透過 SDK IndexedDB 或是 Server
-                const snapshot = await statsTrackedGet(
-                    bookingsCollection
-                        .where('room', '==', roomName)
-                        .where('date', '>=', queryStart)
-                        .where('date', '<=', queryEnd)
-                );
+                const [snapshot, seriesBookings] = await Promise.all([
+                    getRoomBookings(roomName, queryStart, queryEnd),
+                    loadSeriesBookings({ room: roomName, queryStart, queryEnd }),
+                ]);
 
                 const roomBookings = [];
                 snapshot.forEach(doc => {
@@ -625,6 +795,7 @@ function triggerRoomPrefetch(queryStart, queryEnd) {
                     const bookingRoom = data.room || '禮堂';
                     roomBookings.push({ ...data, id: doc.id, room: bookingRoom });
                 });
+                roomBookings.push(...seriesBookings);
 
                 bookingsCache[cacheKey] = {
                     bookings: roomBookings,
@@ -689,12 +860,10 @@ async function loadMonthBookings(forceRefresh = false) {
 
     try {
         // v2.42.0: 透過 statsTrackedGet 收集快取命中率
-        const snapshot = await statsTrackedGet(
-            bookingsCollection
-                .where('room', '==', room)
-                .where('date', '>=', queryStart)
-                .where('date', '<=', queryEnd)
-        );
+        const [snapshot, seriesBookings] = await Promise.all([
+            getRoomBookings(room, queryStart, queryEnd),
+            loadSeriesBookings({ room, queryStart, queryEnd }),
+        ]);
 
         monthBookings = [];
         snapshot.forEach(doc => {
@@ -702,6 +871,7 @@ async function loadMonthBookings(forceRefresh = false) {
             const bookingRoom = data.room || '禮堂'; // 正規化場地
             monthBookings.push({ ...data, id: doc.id, room: bookingRoom });
         });
+        monthBookings.push(...seriesBookings);
 
         // 寫入記憶體快取
         monthBookingsCache[cacheKey] = {
@@ -730,6 +900,7 @@ async function addBookingToFirebase(bookingData) {
     try {
         const docRef = await bookingsCollection.add({
             ...bookingData,
+            ...bookingDateKeys(bookingData.date),
             createdAt: firebase.firestore.FieldValue.serverTimestamp()
         });
         return docRef.id;
@@ -815,6 +986,239 @@ function getBookingForPeriod(date, periodId) {
     return getAllLoadedBookings().find(b => b.date === dateStr && b.periods.includes(periodId) && b.room === room);
 }
 
+// ===== 衝突索引: (場地, 日期序數) → 節次 bitmask (對應 tools/conflicts.py) =====
+// bit i = PERIODS[i]; 批次/重複預約的衝突檢查只需每個日期一次 Map 查詢 + 一次 AND
+
+const PERIOD_BITS = Object.fromEntries(PERIODS.map((p, i) => [p.id, 1 << i]));
+
+/**
+ * 'YYYY/MM/DD' (或 YYYY-MM-DD) → 自 1970/01/01 起的天數
+ */
+function dateOrdinal(dateStr) {
+    const [y, m, d] = dateStr.split(/[/-]/).map(Number);
+    return Date.UTC(y, m - 1, d) / 86400000;
+}
+
+/**
+ * dateOrdinal 的反向: 天數 → 'YYYY/MM/DD'
+ */
+function ordinalDate(ordinal) {
+    const day = new Date(ordinal * 86400000);
+    return formatDate(new Date(day.getUTCFullYear(), day.getUTCMonth(), day.getUTCDate()));
+}
+
+/**
+ * 預約日期 → 等值查詢鍵 (與 tools/datekeys.py date_keys 相同)
+ * dayOrdinal = 日期序數, weekKey = 所在週週一 'YYYY/MM/DD', monthKey = 'YYYY/MM'
+ */
+function bookingDateKeys(dateStr) {
+    const dayOrdinal = dateOrdinal(dateStr);
+    // 1970/01/01 是星期四: (序數 + 3) % 7 = 距週一的天數
+    return {
+        dayOrdinal,
+        weekKey: ordinalDate(dayOrdinal - ((dayOrdinal + 3) % 7 + 7) % 7),
+        monthKey: dateStr.replace(/-/g, '/').slice(0, 7),
+    };
+}
+
+/**
+ * 節次 id 陣列 → bitmask (未知節次忽略)
+ */
+function periodMask(periodIds) {
+    return (periodIds || []).reduce((mask, id) => mask | (PERIOD_BITS[id] || 0), 0);
+}
+
+/**
+ * 由預約清單建立衝突索引; 已取消 (periods 為空) 的預約不佔位
+ * @returns {Map<string, number>} key 為 `${room}|${dateOrdinal}`
+ */
+function buildConflictIndex(bookingList) {
+    const index = new Map();
+    bookingList.forEach(b => {
+        const mask = periodMask(b.periods);
+        if (!mask) return;
+        const key = `${b.room}|${dateOrdinal(b.date)}`;
+        index.set(key, (index.get(key) || 0) | mask);
+    });
+    return index;
+}
+
+/**
+ * 找出 dates 中與 periodIds 衝突的日期
+ * @returns {{date: string, periods: string[]}[]} 依 dates 順序, periods 為重疊的節次 id
+ */
+function findConflicts(index, room, dates, periodIds) {
+    const wanted = periodMask(periodIds);
+    const conflicts = [];
+    dates.forEach(date => {
+        const overlap = (index.get(`${room}|${dateOrdinal(date)}`) || 0) & wanted;
+        if (overlap) conflicts.push({ date, periods: PERIODS.filter(p => overlap & PERIOD_BITS[p.id]).map(p => p.id) });
+    });
+    return conflicts;
+}
+
+// ===== 重複 / 批次預約系列 (bookingSeries, 格式見 tools/series.py) =====
+// 多個日期的預約存成一份系列文件: 場地 + 節次 + 日期 bitmap (dayBits), 讀取時展開成虛擬預約
+// 20 個日期的重複預約 = 1 次寫入、1 次後端觸發, 不再是 20 份文件各觸發一輪
+
+const SERIES_MAX_DAYS = 366; // 單一系列最長跨度 (同 tools/series.py MAX_SPAN_DAYS); 超過則照舊逐日建立
+
+/**
+ * dayOrdinal 陣列 → dayBits hex (bit i = startOrdinal + i 當天, 位於位元組 i >> 3 的第 i & 7 位)
+ */
+function seriesDayBits(ordinals, startOrdinal) {
+    const bytes = new Uint8Array(((Math.max(...ordinals) - startOrdinal) >> 3) + 1);
+    ordinals.forEach(ordinal => {
+        const i = ordinal - startOrdinal;
+        bytes[i >> 3] |= 1 << (i & 7);
+    });
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * 系列 → 有效日期的 dayOrdinal (遞增)
+ */
+function seriesOrdinals(series) {
+    const hex = series.dayBits || '';
+    const ordinals = [];
+    for (let i = 0; i < hex.length; i += 2) {
+        const byte = parseInt(hex.slice(i, i + 2), 16);
+        for (let j = 0; j < 8; j++) {
+            if (byte >> j & 1) ordinals.push(series.startOrdinal + i * 4 + j);
+        }
+    }
+    return ordinals;
+}
+
+/**
+ * 系列文件 → [fromOrdinal, toOrdinal] 內的虛擬預約 (欄位同 bookings 文件, id = '<系列 id>@<dayOrdinal>')
+ */
+function expandSeries(id, series, fromOrdinal = -Infinity, toOrdinal = Infinity) {
+    const { startOrdinal, endOrdinal, dayBits, periodMask, foldedFrom, rejectedDayBits, ...fields } = series;
+    return seriesOrdinals(series)
+        .filter(ordinal => ordinal >= fromOrdinal && ordinal <= toOrdinal)
+        .map(ordinal => {
+            const date = ordinalDate(ordinal);
+            return {
+                ...fields,
+                date,
+                ...bookingDateKeys(date),
+                room: series.room || '禮堂',
+                batchId: series.batchId || id,
+                id: `${id}@${ordinal}`,
+                seriesId: id,
+            };
+        });
+}
+
+/**
+ * 預約 id 分成一般文件 id 與 {系列 id: [dayOrdinal]} (虛擬預約)
+ */
+function splitSeriesBookingIds(bookingIds) {
+    const plain = [];
+    const series = {};
+    bookingIds.forEach(id => {
+        const m = /^(.+)@(-?\d+)$/.exec(id);
+        if (!m) {
+            plain.push(id);
+        } else {
+            (series[m[1]] = series[m[1]] || []).push(Number(m[2]));
+        }
+    });
+    return { plain, series };
+}
+
+// bookingSeries 的 rules / 索引隨 firebase deploy --only firestore 上線, 不在 push 的自動部署內:
+// 尚未部署時讀取被拒 (permission-denied) 或缺索引 (failed-precondition), 視為沒有任何系列
+const SERIES_NOT_DEPLOYED = new Set(['permission-denied', 'failed-precondition']);
+
+/**
+ * bookingSeries 是否可用: 以 room + endOrdinal 的查詢 (需要複合索引) 試讀一次, 結果快取到重新載入頁面
+ * 不可用時多日期預約照舊逐日寫入 bookings, 避免批次預約因系列寫入被拒而整批失敗
+ */
+let seriesReadyPromise = null;
+function seriesReady() {
+    if (!seriesReadyPromise) {
+        seriesReadyPromise = seriesCollection.where('room', '==', '').where('endOrdinal', '>=', 0).limit(1).get()
+            .then(() => true)
+            .catch(() => false);
+    }
+    return seriesReadyPromise;
+}
+
+/**
+ * 查詢系列並展開成 [queryStart, queryEnd] 內的虛擬預約 (皆可省略)
+ * 系列數量遠少於預約, 只以 endOrdinal >= 起日 一個範圍條件查詢, 起點晚於迄日的在前端略過
+ * rules / 索引尚未部署 (SERIES_NOT_DEPLOYED) 時回傳空陣列; 其他錯誤照常拋出, 衝突檢查不會漏看既有系列
+ * @param {{room?: string, deviceId?: string, queryStart?: string, queryEnd?: string}} filter
+ */
+async function loadSeriesBookings({ room, deviceId, queryStart, queryEnd } = {}) {
+    let query = seriesCollection;
+    if (room) query = query.where('room', '==', room);
+    if (deviceId) query = query.where('deviceId', '==', deviceId);
+    const fromOrdinal = queryStart ? dateOrdinal(queryStart) : -Infinity;
+    const toOrdinal = queryEnd ? dateOrdinal(queryEnd) : Infinity;
+    if (queryStart) query = query.where('endOrdinal', '>=', fromOrdinal);
+    let snapshot;
+    try {
+        snapshot = await statsTrackedGet(query);
+    } catch (error) {
+        if (!SERIES_NOT_DEPLOYED.has(error.code)) throw error;
+        console.warn('bookingSeries 尚未部署, 略過系列:', error.code);
+        return [];
+    }
+    return snapshot.docs.flatMap(doc => expandSeries(doc.id, doc.data(), fromOrdinal, toOrdinal));
+}
+
+/**
+ * 查詢結果併入系列的虛擬預約; 回傳與 QuerySnapshot 相同用法的物件 (docs / size / empty / forEach)
+ * order = 'desc' 時整體依 date 由新到舊重排 (原查詢有 orderBy date desc 的情境)
+ */
+function withSeriesBookings(snapshot, seriesBookings, order = null) {
+    const docs = snapshot.docs.concat(seriesBookings.map(({ id, ...data }) => ({ id, data: () => data })));
+    if (order === 'desc' && seriesBookings.length > 0) {
+        const dates = new Map(docs.map(doc => [doc, doc.data().date || '']));
+        docs.sort((a, b) => dates.get(b).localeCompare(dates.get(a)));
+    }
+    return {
+        docs,
+        size: docs.length,
+        empty: docs.length === 0,
+        metadata: snapshot.metadata,
+        forEach: callback => docs.forEach(callback),
+    };
+}
+
+/**
+ * 取消系列中的日期: 清掉這些日期的 bit; 管理員取消到一天不剩時刪除整個系列
+ * (一般使用者與 bookings 相同只能 update, 系列留下空的 dayBits)
+ * detach 有值 (單日只取消部分節次) 時, 同一交易內把該日以剩下的節次拆成一般預約
+ */
+async function removeSeriesDates(seriesId, ordinals, detach = null) {
+    const ref = seriesCollection.doc(seriesId);
+    const removed = new Set(ordinals);
+    await db.runTransaction(async (tx) => {
+        const snap = await tx.get(ref);
+        if (!snap.exists) return;
+        const series = snap.data();
+        const rest = seriesOrdinals(series).filter(ordinal => !removed.has(ordinal));
+        if (rest.length === 0 && currentUser) {
+            tx.delete(ref);
+        } else {
+            tx.update(ref, { dayBits: rest.length ? seriesDayBits(rest, series.startOrdinal) : '' });
+        }
+        if (detach) {
+            // detachedFrom: functions trackSeriesChanges 據此把這一天記為節次變更, 不推取消 / 建立通知
+            tx.set(bookingsCollection.doc(), {
+                ...detach,
+                ...bookingDateKeys(detach.date),
+                detachedFrom: seriesId,
+                createdAt: firebase.firestore.FieldValue.serverTimestamp(),
+            });
+        }
+    });
+}
+
 // ===== UI 渲染 =====
 
 /**
@@ -1230,9 +1634,12 @@ function renderPeriodCheckboxes(date) {
     const container = document.getElementById('periodCheckboxes');
     container.innerHTML = '';
 
+    // 整日只掃一次已載入預約, 各節次以 bit 判斷; 只有被佔用的節次才查預約者
+    const bookedMask = buildConflictIndex(getAllLoadedBookings()).get(`${getSelectedRoom()}|${dateOrdinal(date)}`) || 0;
+
     PERIODS.forEach(period => {
-        const isBooked = isPeriodBooked(parseDate(date), period.id);
-        const booker = getBookerForPeriod(parseDate(date), period.id);
+        const isBooked = (bookedMask & PERIOD_BITS[period.id]) !== 0;
+        const booker = isBooked ? getBookerForPeriod(parseDate(date), period.id) : null;
 
         // 檢查固定不開放
         const dateObj = parseDate(date);
@@ -1506,46 +1913,76 @@ async function submitBooking() {
     submitBtn.innerHTML = '<span>處理中...</span>';
 
     try {
-        for (const dateStr of datesToBook) {
+        // 檢查該場地的衝突: 'in' 查詢每次最多 30 個日期, 20 週的重複預約只需 1 次往返
+        const ordinals = datesToBook.map(dateOrdinal);
+        const startOrdinal = Math.min(...ordinals);
+        const endOrdinal = Math.max(...ordinals);
+        const wanted = new Set(datesToBook);
+        // 系列: 同場地、涵蓋這段期間的系列展開後只留要預約的日期
+        const existing = (await loadSeriesBookings({
+            room, queryStart: ordinalDate(startOrdinal), queryEnd: ordinalDate(endOrdinal),
+        })).filter(b => wanted.has(b.date));
+        for (let i = 0; i < datesToBook.length; i += 30) {
             const snapshot = await bookingsCollection
-                .where('date', '==', dateStr)
-                .where('room', '==', room) // 檢查該場地的衝突
+                .where('room', '==', room)
+                .where('date', 'in', datesToBook.slice(i, i + 30))
                 .get();
+            snapshot.docs.forEach(doc => existing.push(doc.data()));
+        }
 
-            for (const doc of snapshot.docs) {
-                const booking = doc.data();
-                for (const periodId of selectedPeriods) {
-                    if (booking.periods.includes(periodId)) {
-                        const period = PERIODS.find(p => p.id === periodId);
-                        showToast(`${dateStr} ${period.name} 已被 ${booking.booker} 預約`, 'error');
-                        throw new Error('衝突');
-                    }
-                }
-            }
+        const [conflict] = findConflicts(buildConflictIndex(existing), room, datesToBook, selectedPeriods);
+        if (conflict) {
+            const periodId = conflict.periods[0];
+            const booking = existing.find(b => b.date === conflict.date && (b.periods || []).includes(periodId));
+            const period = PERIODS.find(p => p.id === periodId);
+            showToast(`${conflict.date} ${period.name} 已被 ${booking.booker} 預約`, 'error');
+            throw new Error('衝突');
         }
 
-        const batch = db.batch();
-        const createdRefs = []; // v2.40.0: 追蹤新建立 ID 供「撤銷」使用
-        // v2.49.2: 多筆批次/重複預約 → 加上 batchId,後端 LINE 通知會彙整成一則
-        const batchId = (datesToBook.length > 1)
-            ? `b_${Date.now()}_${Math.random().toString(36).slice(2, 10)}`
-            : null;
-        for (const dateStr of datesToBook) {
-            const docRef = bookingsCollection.doc();
-            createdRefs.push(docRef);
-            const docData = {
-                date: dateStr,
-                room: room, // 儲存場地資訊
+        const createdIds = []; // v2.40.0: 追蹤新建立 ID 供「撤銷」使用
+        let seriesId = null;
+        if (datesToBook.length > 1 && endOrdinal - startOrdinal < SERIES_MAX_DAYS && await seriesReady()) {
+            // 多個日期 → 一份系列文件 (日期 bitmap + 節次 mask), 一次寫入、後端只觸發一次彙整通知
+            const seriesRef = seriesCollection.doc();
+            seriesId = seriesRef.id;
+            await seriesRef.set({
+                room: room,
                 periods: selectedPeriods,
+                periodMask: periodMask(selectedPeriods),
                 booker: booker,
                 reason: reason,
                 deviceId: getDeviceId(),
+                startOrdinal,
+                endOrdinal,
+                dayBits: seriesDayBits(ordinals, startOrdinal),
                 createdAt: firebase.firestore.FieldValue.serverTimestamp()
-            };
-            if (batchId) docData.batchId = batchId;
-            batch.set(docRef, docData);
+            });
+            ordinals.forEach(ordinal => createdIds.push(`${seriesId}@${ordinal}`));
+        } else {
+            const batch = db.batch();
+            // v2.49.2: 多筆批次/重複預約 → 加上 batchId,後端 LINE 通知會彙整成一則
+            // (超過 SERIES_MAX_DAYS 的長期重複預約, 或 bookingSeries 尚未部署時才會走到這裡)
+            const batchId = (datesToBook.length > 1)
+                ? `b_${Date.now()}_${Math.random().toString(36).slice(2, 10)}`
+                : null;
+            for (const dateStr of datesToBook) {
+                const docRef = bookingsCollection.doc();
+                createdIds.push(docRef.id);
+                const docData = {
+                    date: dateStr,
+                    ...bookingDateKeys(dateStr), // dayOrdinal / weekKey / monthKey (週曆、月曆的等值查詢鍵)
+                    room: room, // 儲存場地資訊
+                    periods: selectedPeriods,
+                    booker: booker,
+                    reason: reason,
+                    deviceId: getDeviceId(),
+                    createdAt: firebase.firestore.FieldValue.serverTimestamp()
+                };
+                if (batchId) docData.batchId = batchId;
+                batch.set(docRef, docData);
+            }
+            await batch.commit();
         }
-        await batch.commit();
         recordBooking(); // 記錄本次預約用於 Rate Limiting
 
         // v2.40.0: V.2 累積該場地使用次數供「常用置頂」排序
@@ -1556,8 +1993,9 @@ async function submitBooking() {
             booker, room, periods: selectedPeriods, reason,
             dates: datesToBook,
             count: datesToBook.length,
-            createdIds: createdRefs.map(r => r.id),
-        }, createdRefs.map(r => r.id).join(','));
+            createdIds,
+            seriesId,
+        }, seriesId || createdIds.join(','));
 
         // 預約成功後，若是批次模式則重置狀態
         if (isBatchMode) {
@@ -1581,7 +2019,7 @@ async function submitBooking() {
             action: {
                 label: '↩ 撤銷',
                 countdown: 30,
-                onClick: () => undoRecentBookings(createdRefs.map(r => r.id))
+                onClick: () => undoRecentBookings(createdIds)
             }
         });
 
@@ -1699,7 +2137,14 @@ async function executeDeleteBooking() {
             newPeriods = [];
         }
 
-        if (currentUser) {
+        if (pendingDeleteBooking.seriesId) {
+            // 系列中的一天: 清掉該日的 bit; 只取消部分節次時把這一天拆成一般預約
+            const { seriesId, dayOrdinal: ordinal, date, room, booker: seriesBooker, deviceId } = pendingDeleteBooking;
+            await removeSeriesDates(seriesId, [ordinal], newPeriods.length === 0 ? null : {
+                date, room, periods: newPeriods, booker: seriesBooker, reason: reason || '',
+                ...(deviceId ? { deviceId } : {}),
+            });
+        } else if (currentUser) {
             // 管理員模式：直接刪除或更新
             if (newPeriods.length === 0) {
                 await deleteBookingFromFirebase(bookingId);
@@ -1761,9 +2206,15 @@ async function executeDeleteBooking() {
 async function undoRecentBookings(bookingIds) {
     if (!bookingIds || bookingIds.length === 0) return;
     try {
-        const batch = db.batch();
-        bookingIds.forEach(id => batch.delete(bookingsCollection.doc(id)));
-        await batch.commit();
+        const { plain, series } = splitSeriesBookingIds(bookingIds);
+        if (plain.length > 0) {
+            const batch = db.batch();
+            plain.forEach(id => batch.delete(bookingsCollection.doc(id)));
+            await batch.commit();
+        }
+        for (const [seriesId, ordinals] of Object.entries(series)) {
+            await removeSeriesDates(seriesId, ordinals);
+        }
         await loadBookingsFromFirebase(true);
         showToast(`已撤銷 ${bookingIds.length} 筆預約`, 'info');
 
@@ -2104,8 +2555,11 @@ async function loadDashboardData() {
         const todayStr = formatDate(new Date());
 
         // 1. 取得今日所有預約
-        const snapshot = await bookingsCollection.where('date', '==', todayStr).get();
-        const todayBookings = [];
+        const [snapshot, seriesBookings] = await Promise.all([
+            bookingsCollection.where('date', '==', todayStr).get(),
+            loadSeriesBookings({ queryStart: todayStr, queryEnd: todayStr }),
+        ]);
+        const todayBookings = [...seriesBookings];
         snapshot.forEach(doc => {
             todayBookings.push(doc.data());
         });
@@ -2170,7 +2624,7 @@ async function loadDataHealth() {
         if (_dataHealthCache && (Date.now() - _dataHealthCacheTime) < 5 * 60 * 1000) {
             stats = _dataHealthCache;
         } else {
-            const snap = await bookingsCollection.get();
+            const snap = withSeriesBookings(...await Promise.all([bookingsCollection.get(), loadSeriesBookings()]));
             let total = 0, semCount = 0, yearCount = 0, oldest = null;
             snap.forEach(doc => {
                 total++;
@@ -2381,10 +2835,13 @@ async function runAnalyticsWithRange() {
 
     try {
         // 一次拉取區間內全部預約（含已清空的取消紀錄）
-        const snapshot = await bookingsCollection
-            .where('date', '>=', fsStart)
-            .where('date', '<=', fsEnd)
-            .get();
+        const snapshot = withSeriesBookings(...await Promise.all([
+            bookingsCollection
+                .where('date', '>=', fsStart)
+                .where('date', '<=', fsEnd)
+                .get(),
+            loadSeriesBookings({ queryStart: fsStart, queryEnd: fsEnd }),
+        ]));
 
         const allDocs = [];
         snapshot.forEach(doc => allDocs.push({ id: doc.id, ...doc.data() }));
@@ -2805,12 +3262,15 @@ async function executeExport(archive = false) {
 
         // 1. 獲取資料：有區間時走 (date range) 索引查詢，避免全庫掃描
         let query = bookingsCollection.orderBy('date', 'desc');
+        const seriesRange = {};
         if (range.start && range.end) {
             query = query
                 .where('date', '>=', range.start)
                 .where('date', '<=', range.end);
+            Object.assign(seriesRange, { queryStart: range.start, queryEnd: range.end });
         }
-        const snapshot = await query.get();
+        const [result, seriesBookings] = await Promise.all([query.get(), loadSeriesBookings(seriesRange)]);
+        const snapshot = withSeriesBookings(result, seriesBookings, 'desc');
 
         if (snapshot.empty) {
             showToast(`【${range.label}】沒有任何預約資料`, 'warning');
@@ -3055,7 +3515,10 @@ async function loadStatsData(rangeKey = 'current') {
         if (statsEndDateStr) {
             statsQuery = statsQuery.where('date', '<=', statsEndDateStr);
         }
-        const snapshot = await statsQuery.get();
+        const snapshot = withSeriesBookings(...await Promise.all([
+            statsQuery.get(),
+            loadSeriesBookings({ room, queryStart: statsStartDateStr, queryEnd: statsEndDateStr || undefined }),
+        ]));
 
         if (snapshot.empty) {
             showToast('該場地在此區間沒有預約資料', 'warning');
@@ -3305,7 +3768,10 @@ async function executeAdvancedSearch() {
             .where('date', '>=', startDateStr)
             .where('date', '<=', endDateStr);
 
-        const snapshot = await query.get();
+        const snapshot = withSeriesBookings(...await Promise.all([
+            query.get(),
+            loadSeriesBookings({ queryStart: startDateStr, queryEnd: endDateStr }),
+        ]));
         let results = [];
 
         snapshot.forEach(doc => {
@@ -3913,7 +4379,10 @@ async function loadMyBookings() {
 
     try {
         const deviceId = getDeviceId();
-        const snap = await bookingsCollection.where('deviceId', '==', deviceId).get();
+        const snap = withSeriesBookings(...await Promise.all([
+            bookingsCollection.where('deviceId', '==', deviceId).get(),
+            loadSeriesBookings({ deviceId }),
+        ]));
 
         if (!window.historyBookings) window.historyBookings = {};
 
@@ -3997,7 +4466,7 @@ async function loadMyBookings() {
  * 載入歷史記錄資料
  */
 async function loadHistoryData(rangeOverride = null) {
-    let startDate, endDate, rangeLabel;
+    let startDate, endDate, rangeLabel, monthKey = null;
 
     if (rangeOverride && rangeOverride.start && rangeOverride.end) {
         // v2.51.0 (L.3): 學期感知快速區間
@@ -4011,19 +4480,30 @@ async function loadHistoryData(rangeOverride = null) {
             return;
         }
         const [year, month] = monthInput.split('-');
-        startDate = `${year}/${month}/01`;
-        endDate = `${year}/${month}/31`;
-        rangeLabel = `${year}/${month}`;
+        monthKey = `${year}/${month}`;
+        rangeLabel = monthKey;
     }
 
     showToast(`正在載入【${rangeLabel}】歷史記錄...`, 'info');
 
     try {
-        const snapshot = await bookingsCollection
-            .where('date', '>=', startDate)
-            .where('date', '<=', endDate)
-            .orderBy('date', 'desc')
-            .get();
+        // 單月: monthKey 等值查詢 (不再以 YYYY/MM/31 充當月底); 學期區間: dayOrdinal 整數範圍
+        // 查詢鍵未回填時照舊以 date 字串範圍查詢 ('YYYY/MM/31' 作為字串上界仍涵蓋整個月)
+        const keyed = () => (monthKey
+            ? bookingsCollection.where('monthKey', '==', monthKey).orderBy('date', 'desc')
+            : bookingsCollection
+                .where('dayOrdinal', '>=', dateOrdinal(startDate))
+                .where('dayOrdinal', '<=', dateOrdinal(endDate))
+                .orderBy('dayOrdinal', 'desc'));
+        const byDate = () => bookingsCollection
+            .where('date', '>=', monthKey ? `${monthKey}/01` : startDate)
+            .where('date', '<=', monthKey ? `${monthKey}/31` : endDate)
+            .orderBy('date', 'desc');
+        const [result, seriesBookings] = await Promise.all([
+            getBookingsByDateKeys(keyed, byDate),
+            loadSeriesBookings(monthKey ? { queryStart: `${monthKey}/01` } : { queryStart: startDate, queryEnd: endDate }),
+        ]);
+        const snapshot = withSeriesBookings(result, seriesBookings.filter(b => !monthKey || b.monthKey === monthKey), 'desc');
 
         const historyList = document.getElementById('historyList');
 
@@ -4424,6 +4904,54 @@ document.addEventListener('DOMContentLoaded', () => {
 
 // ===== AI 智慧預約建議核心邏輯 =====
 
+// 學期空堂索引 (tools/freeslots.py 產生, 隨網站部署): 每場地每日一個 uint16 空堂 bitmask
+// 查得到就不必為了建議對 Firestore 下範圍查詢; 最終送出時仍即時檢查衝突
+const FREE_SLOTS_URL = 'free-slots.json';
+const FREE_SLOTS_TTL = 5 * 60 * 1000;
+let freeSlotsPromise = null;
+let freeSlotsLoadedAt = 0;
+
+/**
+ * free-slots.json → { version, base (日期序數), days, rooms: {room: {free: Uint16Array, busy: Uint8Array}} }
+ * 節次順序與目前 PERIODS 不同 (app.js 已更新但索引還沒重建) 時回傳 null
+ */
+function decodeFreeSlots(data) {
+    if (!data || data.periods.join() !== PERIODS.map(p => p.id).join()) return null;
+    const bytes = b64 => Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+    const rooms = {};
+    Object.entries(data.rooms).forEach(([room, r]) => {
+        const raw = bytes(r.free);
+        const free = new Uint16Array(raw.length / 2);
+        for (let i = 0; i < free.length; i++) free[i] = raw[2 * i] | (raw[2 * i + 1] << 8);
+        rooms[room] = { free, busy: bytes(r.busy) };
+    });
+    return { version: data.version, base: dateOrdinal(data.start), days: data.days, rooms };
+}
+
+/**
+ * 載入空堂索引 (cache: no-cache → 未變更時只是一次 304); 不存在或格式不符回傳 null
+ */
+function loadFreeSlots() {
+    if (!freeSlotsPromise || Date.now() - freeSlotsLoadedAt > FREE_SLOTS_TTL) {
+        freeSlotsLoadedAt = Date.now();
+        freeSlotsPromise = fetch(FREE_SLOTS_URL, { cache: 'no-cache' })
+            .then(r => (r.ok ? r.json() : null))
+            .then(decodeFreeSlots)
+            .catch(() => null);
+    }
+    return freeSlotsPromise;
+}
+
+/**
+ * 索引是否涵蓋 [startStr, endStr] 與所有場地
+ */
+function freeSlotsCover(index, startStr, endStr) {
+    return !!index
+        && dateOrdinal(startStr) >= index.base
+        && dateOrdinal(endStr) < index.base + index.days
+        && ROOMS.every(r => index.rooms[r]);
+}
+
 /**
  * 尋找智慧替代方案
  * @param {string} dateStr 目標日期 (YYYY/MM/DD)
@@ -4443,56 +4971,77 @@ async function findSmartAlternatives(dateStr, periodId, roomName) {
     endDate.setDate(targetDate.getDate() + 7);
     const endDateStr = formatDate(endDate);
 
-    // 一次性查詢範圍內所有資料 (包含所有場地)
-    // 這樣可以同時滿足 Strategy A (同場地不同日), B (同日不同場地), C (同日同場地不同時段)
-    // v2.55.0: 同時抓「全部場地的固定不開放設定」(~4 個 doc, 成本極低)
-    //          → 徹底修掉舊版「推薦了其實固定不開放的時段」的缺陷
-    const [snapshot, settingsSnap] = await Promise.all([
-        bookingsCollection
-            .where('date', '>=', startDateStr)
-            .where('date', '<=', endDateStr)
-            .get(),
-        db.collection('roomSettings').get().catch(() => null),
-    ]);
-
-    const rangeBookings = [];
-    snapshot.forEach(doc => {
-        rangeBookings.push(doc.data());
-    });
-
-    // 各場地固定不開放設定表 {room: Set(slotId)}
-    const settingsMap = {};
-    if (settingsSnap) {
-        settingsSnap.forEach(doc => {
-            settingsMap[doc.id] = new Set(doc.data().unavailableSlots || []);
-        });
-    }
-    const DAY_IDS = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'];
-
-    // 輔助：指定「場地」在指定日期+節次是否固定不開放 (v2.55.0 正確版, 取代舊 stub)
-    function isSlotBlockedFor(room, dateObj, pid) {
-        const set = settingsMap[room];
-        if (!set) return false; // 該場地無設定 = 全開放
-        return set.has(`${DAY_IDS[dateObj.getDay()]}_${pid}`);
-    }
-
     // 輔助：週末不推薦 (學校情境, 老師平日上課)
     function isWeekend(d) {
         return d.getDay() === 0 || d.getDay() === 6;
     }
 
-    // 輔助：檢查是否被預約 (基於本次查詢結果)
-    function isBookedInRange(checkDateStr, checkPeriodId, checkRoom) {
-        return rangeBookings.some(b =>
-            b.date === checkDateStr &&
-            (b.room || '禮堂') === checkRoom &&
-            b.periods.includes(checkPeriodId)
-        );
-    }
+    // isSlotFree(場地, 日期物件, 節次) = 未被預約且非固定不開放; roomBusyCount = 當天已借節次數
+    let isSlotFree, roomBusyCount;
+    const freeSlots = await loadFreeSlots();
+
+    if (freeSlotsCover(freeSlots, startDateStr, endDateStr) && freeSlots.rooms[roomName]) {
+        // 空堂索引: O(1) 查表; 疊上本機已載入的預約 (可能比索引新)
+        const local = buildConflictIndex(getAllLoadedBookings());
+        isSlotFree = (room, dateObj, pid) => {
+            const ord = dateOrdinal(formatDate(dateObj));
+            const free = freeSlots.rooms[room].free[ord - freeSlots.base] & ~(local.get(`${room}|${ord}`) || 0);
+            return (free & PERIOD_BITS[pid]) !== 0;
+        };
+        roomBusyCount = (room, dStr) => freeSlots.rooms[room].busy[dateOrdinal(dStr) - freeSlots.base];
+    } else {
+        // 沒有索引 (或超出學期範圍): 一次性查詢範圍內所有資料 (包含所有場地)
+        // 這樣可以同時滿足 Strategy A (同場地不同日), B (同日不同場地), C (同日同場地不同時段)
+        // v2.55.0: 同時抓「全部場地的固定不開放設定」(~4 個 doc, 成本極低)
+        //          → 徹底修掉舊版「推薦了其實固定不開放的時段」的缺陷
+        const [snapshot, settingsSnap, seriesBookings] = await Promise.all([
+            getBookingsByDateKeys(
+                () => bookingsCollection
+                    .where('dayOrdinal', '>=', dateOrdinal(startDateStr))
+                    .where('dayOrdinal', '<=', dateOrdinal(endDateStr)),
+                () => bookingsCollection
+                    .where('date', '>=', startDateStr)
+                    .where('date', '<=', endDateStr),
+            ),
+            db.collection('roomSettings').get().catch(() => null),
+            loadSeriesBookings({ queryStart: startDateStr, queryEnd: endDateStr }),
+        ]);
+
+        const rangeBookings = [...seriesBookings];
+        snapshot.forEach(doc => {
+            rangeBookings.push(doc.data());
+        });
+
+        // 各場地固定不開放設定表 {room: Set(slotId)}
+        const settingsMap = {};
+        if (settingsSnap) {
+            settingsSnap.forEach(doc => {
+                settingsMap[doc.id] = new Set(doc.data().unavailableSlots || []);
+            });
+        }
+        const DAY_IDS = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'];
+
+        // 輔助：指定「場地」在指定日期+節次是否固定不開放 (v2.55.0 正確版, 取代舊 stub)
+        function isSlotBlockedFor(room, dateObj, pid) {
+            const set = settingsMap[room];
+            if (!set) return false; // 該場地無設定 = 全開放
+            return set.has(`${DAY_IDS[dateObj.getDay()]}_${pid}`);
+        }
 
-    // 輔助：某場地當天已被借用的總節次數 (用於「越空的場地越優先」)
-    function roomBusyCount(room, dStr) {
-        return rangeBookings
+        // 輔助：檢查是否被預約 (基於本次查詢結果)
+        function isBookedInRange(checkDateStr, checkPeriodId, checkRoom) {
+            return rangeBookings.some(b =>
+                b.date === checkDateStr &&
+                (b.room || '禮堂') === checkRoom &&
+                b.periods.includes(checkPeriodId)
+            );
+        }
+
+        isSlotFree = (room, dateObj, pid) =>
+            !isBookedInRange(formatDate(dateObj), pid, room) && !isSlotBlockedFor(room, dateObj, pid);
+
+        // 輔助：某場地當天已被借用的總節次數 (用於「越空的場地越優先」)
+        roomBusyCount = (room, dStr) => rangeBookings
             .filter(b => b.date === dStr && (b.room || '禮堂') === room)
             .reduce((n, b) => n + (b.periods ? b.periods.length : 0), 0);
     }
@@ -4509,7 +5058,7 @@ async function findSmartAlternatives(dateStr, periodId, roomName) {
             if (d < todayMidnight) continue;     // 不推過去
             if (isWeekend(d)) continue;          // v2.55.0: 不推週六日
             // v2.55.0: 改用「目標場地自己的」不開放設定 (舊版誤用主畫面場地的全域設定)
-            if (!isBookedInRange(ds, periodId, roomName) && !isSlotBlockedFor(roomName, d, periodId)) {
+            if (isSlotFree(roomName, d, periodId)) {
                 suggestions.push({
                     type: 'date',
                     date: ds,
@@ -4537,11 +5086,9 @@ async function findSmartAlternatives(dateStr, periodId, roomName) {
     const recommendedRooms = similarRooms[roomName] || ROOMS.filter(r => r !== roomName);
 
     recommendedRooms.forEach(otherRoom => {
-        // 檢查該場地是否被預約
-        if (isBookedInRange(dateStr, periodId, otherRoom)) return;
-        // v2.55.0 🔴 修正核心缺陷: 檢查「該場地自己的」固定不開放時段
-        // (舊版直接忽略 → 會推薦老師一個點了才發現不能約的時段)
-        if (isSlotBlockedFor(otherRoom, targetDate, periodId)) return;
+        // 檢查該場地是否被預約, 以及「該場地自己的」固定不開放時段
+        // (v2.55.0 🔴 修正核心缺陷: 舊版直接忽略 → 會推薦老師一個點了才發現不能約的時段)
+        if (!isSlotFree(otherRoom, targetDate, periodId)) return;
 
         const isSimilar = (similarRooms[roomName] || []).includes(otherRoom);
         // v2.55.0: 越空的場地越優先 — 當天已借節次越多扣越多分 (每節 -2, 上限 -10)
@@ -4567,7 +5114,7 @@ async function findSmartAlternatives(dateStr, periodId, roomName) {
             if (newIndex >= 0 && newIndex < PERIODS.length) {
                 const newPeriod = PERIODS[newIndex];
                 // v2.55.0: 改用目標場地自己的設定
-                if (!isBookedInRange(dateStr, newPeriod.id, roomName) && !isSlotBlockedFor(roomName, targetDate, newPeriod.id)) {
+                if (isSlotFree(roomName, targetDate, newPeriod.id)) {
                     suggestions.push({
                         type: 'period',
                         date: dateStr,
@@ -5995,8 +6542,19 @@ async function executeBatchCancel() {
         // Firestore batch write 上限 500 筆，分批處理
         const CHUNK = 400;
         let successCount = 0;
-        for (let i = 0; i < ids.length; i += CHUNK) {
-            const chunk = ids.slice(i, i + CHUNK);
+        // 系列中的日期: 每個系列一次交易清掉選取日期的 bit
+        const { plain, series } = splitSeriesBookingIds(ids);
+        for (const [seriesId, ordinals] of Object.entries(series)) {
+            const owned = ordinals.filter(ordinal => {
+                const booking = window.historyBookings?.[`${seriesId}@${ordinal}`];
+                return booking && (isAdmin || booking.deviceId === localDeviceId);
+            });
+            if (owned.length === 0) continue;
+            await removeSeriesDates(seriesId, owned);
+            successCount += owned.length;
+        }
+        for (let i = 0; i < plain.length; i += CHUNK) {
+            const chunk = plain.slice(i, i + CHUNK);
             const batch = db.batch();
             for (const id of chunk) {
                 const booking = window.historyBookings?.[id];
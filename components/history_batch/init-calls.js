@@ -0,0 +1,4 @@
+
+    initSearchEventListeners();
+    initHistoryEventListeners();
+    initBatchBooking();
\ No newline at end of file
@@ -831,6 +831,13 @@ async function sendBatchCreateNotifications(batchId, accessToken) {
     }
 
     const bookings = snap.docs.map(d => ({ id: d.id, ...d.data() }));
+    await pushBatchCreateNotifications(bookings, accessToken, batchId);
+}
+
+/**
+ * 同一批 (batchId 或 bookingSeries 系列) 的預約 → 一則彙整通知給預約者與房間觀察者
+ */
+async function pushBatchCreateNotifications(bookings, accessToken, batchId) {
     bookings.sort((a, b) => (a.date || '').localeCompare(b.date || ''));
     const first = bookings[0];
 
@@ -1034,6 +1041,45 @@ async function notifyRoomWatchers(booking, eventType, accessToken, bookerLineUse
     }
 }
 
+const CANCEL_NOTICES = {
+    cancelled: { log: '預約取消', title: '❌ 預約已取消' },
+    force_deleted: { log: '預約強刪', title: '⚠️ 預約已被管理員取消' },
+};
+
+/**
+ * 取消 / 強刪通知 (notifyOnBookingUpdate、notifyOnBookingDelete、trackSeriesChanges 共用)
+ * @param {Object} booking - 取消前的預約資料 (含 id)
+ * @param {'cancelled'|'force_deleted'} eventType
+ * @param {string} deviceId - 預約者裝置
+ */
+async function notifyBookingCancelled(booking, eventType, deviceId = booking.deviceId) {
+    const notice = CANCEL_NOTICES[eventType];
+    const accessToken = LINE_ACCESS_TOKEN.value();
+    const lineUserId = await getBoundLineUserId(deviceId);
+    // v2.53.0 (P1-5): 通知偏好 (取消/異動)
+    const prefs = await getNotifPrefs(deviceId);
+
+    // 1. 推給預約者本人 (若已綁定 且 未關閉「取消/異動」)
+    if (lineUserId && prefs.onCancel) {
+        const flex = createBookingFlexMessage(booking, eventType);
+        await pushFlexToUser(lineUserId, flex, accessToken, `${notice.log} ${booking.room} ${booking.date}`);
+    } else if (!lineUserId) {
+        logger.info(`[${notice.log}] ${booking.id} booker 未綁定 LINE`);
+    }
+
+    // 2. v2.49.0: 推給「房間觀察者」(訂閱該教室的人)
+    await notifyRoomWatchers(booking, eventType, accessToken, lineUserId);
+
+    // 3. v2.53.0 (P1-1): Web Push 給預約者裝置 (取消最有價值 — 人不在畫面前也會知道)
+    if (prefs.onCancel) {
+        await sendWebPushToDevice(deviceId, {
+            title: notice.title,
+            body: `${booking.room}｜${booking.date}｜${formatPeriods(booking.periods)}`,
+            url: 'https://cagoooo.github.io/schedule/',
+        }, VAPID_PRIVATE_KEY.value());
+    }
+}
+
 // ==========================================================================
 // Function #4: notifyOnBookingCreate
 // 監聽 bookings collection onCreate → 推「✅ 預約成功」
@@ -1052,6 +1098,9 @@ exports.notifyOnBookingCreate = onDocumentCreated(
         const bookingId = event.params.bookingId;
         const accessToken = LINE_ACCESS_TOKEN.value();
 
+        // 系列中單日改節次時拆出的預約 (app.js removeSeriesDates): 原本就訂到了, 不是新預約
+        if (booking.detachedFrom) return;
+
         // v2.49.2: 批次/重複預約 → 走彙整通知路徑
         if (booking.batchId) {
             const isLeader = await tryAcquireBatchLock(booking.batchId);
@@ -1125,42 +1174,11 @@ exports.notifyOnBookingUpdate = onDocumentUpdated(
 
         if (!wasActive || !isCancelled) return; // 不是「從有效變取消」,跳過
 
-        const bookingId = event.params.bookingId;
-        const accessToken = LINE_ACCESS_TOKEN.value();
-        const bookerDeviceId = before.deviceId || after.deviceId;
-        const lineUserId = await getBoundLineUserId(bookerDeviceId);
-        // v2.53.0 (P1-5): 通知偏好 (取消/異動)
-        const prefs = await getNotifPrefs(bookerDeviceId);
-
-        // 1. 推給預約者本人 (若已綁定 且 未關閉「取消/異動」)
-        if (lineUserId && prefs.onCancel) {
-            const flex = createBookingFlexMessage({ ...before, id: bookingId }, 'cancelled');
-            await pushFlexToUser(
-                lineUserId,
-                flex,
-                accessToken,
-                `預約取消 ${before.room} ${before.date}`
-            );
-        } else if (!lineUserId) {
-            logger.info(`[notifyOnBookingUpdate] ${bookingId} 取消但未綁定 booker`);
-        }
-
-        // 2. v2.49.0: 推給「房間觀察者」(訂閱該教室的人)
-        await notifyRoomWatchers(
-            { ...before, id: bookingId },
+        await notifyBookingCancelled(
+            { ...before, id: event.params.bookingId },
             'cancelled',
-            accessToken,
-            lineUserId,
+            before.deviceId || after.deviceId,
         );
-
-        // 3. v2.53.0 (P1-1): Web Push 給預約者裝置 (取消最有價值 — 人不在畫面前也會知道)
-        if (prefs.onCancel) {
-            await sendWebPushToDevice(bookerDeviceId, {
-                title: '❌ 預約已取消',
-                body: `${before.room}｜${before.date}｜${formatPeriods(before.periods)}`,
-                url: 'https://cagoooo.github.io/schedule/',
-            }, VAPID_PRIVATE_KEY.value());
-        }
     }
 );
 
@@ -1184,47 +1202,19 @@ exports.notifyOnBookingDelete = onDocumentDeleted(
         if (!booking.periods || booking.periods.length === 0) return;
 
         const bookingId = event.params.bookingId;
-        const accessToken = LINE_ACCESS_TOKEN.value();
-        const lineUserId = await getBoundLineUserId(booking.deviceId);
-        // v2.53.0 (P1-5): 通知偏好 (取消/異動)
-        const prefs = await getNotifPrefs(booking.deviceId);
-
-        // 1. 推給預約者本人 (若已綁定 且 未關閉「取消/異動」)
-        if (lineUserId && prefs.onCancel) {
-            const flex = createBookingFlexMessage({ ...booking, id: bookingId }, 'force_deleted');
-            await pushFlexToUser(
-                lineUserId,
-                flex,
-                accessToken,
-                `預約強刪 ${booking.room} ${booking.date}`
-            );
-        } else if (!lineUserId) {
-            logger.info(`[notifyOnBookingDelete] ${bookingId} 強刪但 booker 未綁定`);
-        }
-
-        // 2. v2.49.0: 推給「房間觀察者」(訂閱該教室的人)
-        await notifyRoomWatchers(
-            { ...booking, id: bookingId },
-            'force_deleted',
-            accessToken,
-            lineUserId,
-        );
-
-        // 3. v2.53.0 (P1-1): Web Push 給預約者裝置
-        if (prefs.onCancel) {
-            await sendWebPushToDevice(booking.deviceId, {
-                title: '⚠️ 預約已被管理員取消',
-                body: `${booking.room}｜${booking.date}｜${formatPeriods(booking.periods)}`,
-                url: 'https://cagoooo.github.io/schedule/',
-            }, VAPID_PRIVATE_KEY.value());
+        // tools/series.py fold 把原預約折進系列: 不是取消, 不推
+        if (await isFoldedIntoSeries(bookingId, booking)) {
+            logger.info(`[notifyOnBookingDelete] ${bookingId} 已折疊進系列, 跳過`);
+            return;
         }
+        await notifyBookingCancelled({ ...booking, id: bookingId }, 'force_deleted');
     }
 );
 
 // ==========================================================================
 // Function #6.5 (v2.54.0 / P1-3): trackBookingChanges — 預約編輯歷史 Edit Trail
 // 後端自動記錄每筆 bookings 文件的欄位級變更 (前端繞不過、不可偽造)
-// created / updated (含 before→after diff) / deleted 皆寫入 editTrail
+// created / updated (含 before→after diff) / deleted 皆寫入 editTrail; 系列 (bookingSeries) 的日期由 trackSeriesChanges 記
 // ==========================================================================
 
 exports.trackBookingChanges = onDocumentWritten(
@@ -1238,8 +1228,12 @@ exports.trackBookingChanges = onDocumentWritten(
         const changes = {};
 
         if (!before && after) {
+            // 系列拆出的單日 (trackSeriesChanges 記為節次變更) 與 tools/series.py unfold 展開的預約: 都不是新預約
+            if (after.detachedFrom || await isUnfoldedBooking(after)) return;
             changeType = 'created';
         } else if (before && !after) {
+            // tools/series.py fold 折進系列的原預約: 日期與節次都沒變, 不是刪除
+            if (await isFoldedIntoSeries(bookingId, before)) return;
             changeType = 'deleted';
         } else if (before && after) {
             changeType = 'updated';
@@ -1279,6 +1273,342 @@ exports.trackBookingChanges = onDocumentWritten(
     }
 );
 
+// ==========================================================================
+// Function #6.6: journalBookingChanges — 預約變更日誌 (給靜態週分片補差)
+// tools/shards.py 匯出 shards/*.json 後, 前端只查 changedAt > 分片 watermark 的日誌
+// 與 editTrail 不同: 任何寫入都記 (含 createdAt 等系統欄位), 公開可讀, 14 天後由 TTL 清除
+// ==========================================================================
+
+const CHANGE_JOURNAL_TTL_DAYS = 14;
+
+exports.journalBookingChanges = onDocumentWritten(
+    { document: 'bookings/{bookingId}', region: 'asia-east1' },
+    async (event) => {
+        const before = event.data?.before?.exists ? event.data.before.data() : null;
+        const after = event.data?.after?.exists ? event.data.after.data() : null;
+        const bookingId = event.params.bookingId;
+        const changedAt = admin.firestore.FieldValue.serverTimestamp();
+        const expireAt = admin.firestore.Timestamp.fromMillis(Date.now() + CHANGE_JOURNAL_TTL_DAYS * 86400000);
+
+        const entries = [];
+        if (after) {
+            entries.push({ bookingId, room: after.room || '禮堂', date: after.date || '', deleted: false, booking: after, changedAt, expireAt });
+        }
+        // 刪除, 或改了場地/日期 → 舊位置記一筆移除 (前端只在副本仍位於舊位置時才移除)
+        if (before && (!after || (before.room || '禮堂') !== (after.room || '禮堂') || before.date !== after.date)) {
+            entries.push({ bookingId, room: before.room || '禮堂', date: before.date || '', deleted: true, booking: null, changedAt, expireAt });
+        }
+
+        try {
+            const batch = db.batch();
+            entries.forEach(entry => batch.set(db.collection('bookingChanges').doc(), entry));
+            await batch.commit();
+        } catch (e) {
+            logger.error('[bookingChanges] 寫入失敗', e);
+        }
+    }
+);
+
+// ==========================================================================
+// Function #6.7: syncBookingDateKeys — 預約日期查詢鍵 (dayOrdinal / weekKey / monthKey)
+// 前端週曆/月曆改用 weekKey / monthKey 等值查詢; 新版前端寫入時已帶上,
+// 這裡補正舊版前端 (SW 快取未更新) 建立的預約與改了 date 的更新。計算方式同 tools/datekeys.py
+// ==========================================================================
+
+const pad2 = n => String(n).padStart(2, '0');
+
+/** 自 1970/01/01 起的天數 → 'YYYY/MM/DD' */
+function ordinalDate(ordinal) {
+    const day = new Date(ordinal * 86400000);
+    return `${day.getUTCFullYear()}/${pad2(day.getUTCMonth() + 1)}/${pad2(day.getUTCDate())}`;
+}
+
+function bookingDateKeys(dateStr) {
+    const [y, m, d] = String(dateStr).split(/[/-]/).map(Number);
+    const dayOrdinal = Date.UTC(y, m - 1, d) / 86400000;
+    return {
+        dayOrdinal,
+        weekKey: ordinalDate(dayOrdinal - ((dayOrdinal + 3) % 7 + 7) % 7),
+        monthKey: `${y}/${pad2(m)}`,
+    };
+}
+
+exports.syncBookingDateKeys = onDocumentWritten(
+    { document: 'bookings/{bookingId}', region: 'asia-east1' },
+    async (event) => {
+        const after = event.data?.after?.exists ? event.data.after.data() : null;
+        if (!after || !/^\d{4}\/\d{2}\/\d{2}$/.test(after.date || '')) return;
+
+        const keys = bookingDateKeys(after.date);
+        // 已一致 → 不寫 (本函式自己的更新也會觸發一次, 到這裡結束)
+        if (Object.keys(keys).every(k => after[k] === keys[k])) return;
+        try {
+            await event.data.after.ref.update(keys);
+        } catch (e) {
+            logger.error('[dateKeys] 補正失敗', event.params.bookingId, e);
+        }
+    }
+);
+
+// ==========================================================================
+// Function #6.8: notifyOnSeriesCreate — 重複 / 批次預約系列 (bookingSeries)
+// 前端把多個日期的預約存成一份系列文件 (日期 bitmap dayBits + 節次, 格式見 tools/series.py):
+// 一個系列只觸發這一次, 直接送彙整通知, 不必像 batchId 那樣每份文件搶 notificationLocks
+// ==========================================================================
+
+/** dayOrdinal 陣列 → dayBits hex (同 app.js seriesDayBits); 空陣列 = '' */
+function seriesDayBits(ordinals, startOrdinal) {
+    if (ordinals.length === 0) return '';
+    const bytes = new Uint8Array(((Math.max(...ordinals) - startOrdinal) >> 3) + 1);
+    ordinals.forEach(ordinal => {
+        const i = ordinal - startOrdinal;
+        bytes[i >> 3] |= 1 << (i & 7);
+    });
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+/** 系列 → 有效日期的 dayOrdinal (bit i = startOrdinal + i, 位於位元組 i >> 3 的第 i & 7 位) */
+function seriesOrdinals(series) {
+    const hex = series.dayBits || '';
+    const ordinals = [];
+    for (let i = 0; i < hex.length; i += 2) {
+        const byte = parseInt(hex.slice(i, i + 2), 16);
+        for (let j = 0; j < 8; j++) {
+            if (byte >> j & 1) ordinals.push(series.startOrdinal + i * 4 + j);
+        }
+    }
+    return ordinals;
+}
+
+/**
+ * 系列 → [fromDate, toDate] ('YYYY/MM/DD', 省略 = 不限) 內的虛擬預約, 欄位同 bookings 文件
+ */
+function expandSeries(seriesId, series, fromDate = null, toDate = null) {
+    const from = fromDate ? bookingDateKeys(fromDate).dayOrdinal : -Infinity;
+    const to = toDate ? bookingDateKeys(toDate).dayOrdinal : Infinity;
+    return seriesOrdinals(series)
+        .filter(ordinal => ordinal >= from && ordinal <= to)
+        .map(ordinal => seriesOccurrence(seriesId, series, ordinal));
+}
+
+/** 系列中某一天的虛擬預約 */
+function seriesOccurrence(seriesId, series, ordinal) {
+    const { startOrdinal, endOrdinal, dayBits, periodMask, foldedFrom, rejectedDayBits, ...fields } = series;
+    return {
+        ...fields,
+        id: `${seriesId}@${ordinal}`,
+        seriesId,
+        date: ordinalDate(ordinal),
+        room: series.room || '禮堂',
+    };
+}
+
+/**
+ * [fromDate, toDate] 內全部系列展開後的虛擬預約 (排程提醒、學期報表與 bookings 一起計算)
+ */
+async function loadSeriesBookings(fromDate, toDate) {
+    const snap = await db.collection('bookingSeries')
+        .where('endOrdinal', '>=', bookingDateKeys(fromDate).dayOrdinal)
+        .get();
+    return snap.docs.flatMap(doc => expandSeries(doc.id, doc.data(), fromDate, toDate));
+}
+
+/**
+ * tools/series.py fold 在同一個 commit 建立系列並刪除原預約。刪除 trigger 的 before 是 commit 前的內容,
+ * 同一 commit 內寫上的標記看不到, 所以改查「有系列的 foldedFrom 記著這份文件」(系列在同一 commit 建立, 必定已存在)
+ */
+async function isFoldedIntoSeries(bookingId, booking) {
+    if (!booking.batchId || !/^\d{4}\/\d{2}\/\d{2}$/.test(booking.date || '')) return false;
+    try {
+        const ordinal = String(bookingDateKeys(booking.date).dayOrdinal);
+        const snap = await db.collection('bookingSeries')
+            .where(new admin.firestore.FieldPath('foldedFrom', ordinal), '==', bookingId)
+            .limit(1)
+            .get();
+        return !snap.empty;
+    } catch (e) {
+        logger.warn('[series] 查詢 foldedFrom 失敗', bookingId, e.message);
+        return false;
+    }
+}
+
+exports.notifyOnSeriesCreate = onDocumentCreated(
+    {
+        document: 'bookingSeries/{seriesId}',
+        secrets: [LINE_ACCESS_TOKEN],
+        region: 'asia-east1',
+    },
+    async (event) => {
+        const series = event.data?.data();
+        if (!series) return;
+        // tools/series.py fold 折疊的既有預約: 建立當時已通知過
+        if (series.foldedFrom) return;
+
+        const seriesId = event.params.seriesId;
+        const bookings = expandSeries(seriesId, series);
+        if (bookings.length === 0) return;
+        try {
+            await pushBatchCreateNotifications(bookings, LINE_ACCESS_TOKEN.value(), seriesId);
+        } catch (err) {
+            logger.error('[notifyOnSeriesCreate] 系列通知失敗', err);
+        }
+    }
+);
+
+/**
+ * tools/series.py unfold 在同一個 commit 建立展開後的預約並刪除系列; 第一天的預約已存在 = 展開, 不是取消
+ */
+async function isUnfoldedSeries(seriesId, series) {
+    const [ordinal] = seriesOrdinals(series);
+    if (ordinal === undefined) return false;
+    const bookingId = (series.foldedFrom || {})[String(ordinal)] || `${seriesId}_${ordinal}`;
+    try {
+        return (await db.collection('bookings').doc(bookingId).get()).exists;
+    } catch (e) {
+        logger.warn('[series] 查詢展開的預約失敗', seriesId, e.message);
+        return false;
+    }
+}
+
+/**
+ * tools/series.py unfold 展開出的預約: 同一 commit 寫入 notificationLocks/{batchId} (kind = series_unfold)
+ */
+async function isUnfoldedBooking(booking) {
+    if (!booking.batchId) return false;
+    try {
+        const lock = await db.collection('notificationLocks').doc(booking.batchId).get();
+        return lock.exists && lock.data().kind === 'series_unfold';
+    } catch (e) {
+        return false;
+    }
+}
+
+// ==========================================================================
+// Function #6.9: trackSeriesChanges — 系列日期的取消通知、editTrail 與 bookingChanges
+// 取消系列中的日期只是清掉 dayBits 的 bit, bookings 的 trigger 都看不到: 這裡比對前後的 dayBits,
+// 每個加入 / 移除的日期各記一筆 editTrail 與 bookingChanges (bookingId = '<系列 id>@<dayOrdinal>'),
+// 移除的日期推與 bookings 相同的取消通知 (建立時的彙整通知仍由 notifyOnSeriesCreate 送)
+//
+// 系列建立後日期只會減少 (app.js 只清 bit; fold / unfold 是整份建立 / 刪除)。rules 無法逐位元比對 dayBits,
+// 一般使用者的 update 只擋得住「只改 dayBits 且不變長」, 多出來的日期在這裡清回去,
+// 並記下 rejectedDayBits = {dayBits: 被拒的值, at}: 這次清回的寫入再觸發時以它認出, 不當成取消
+// ==========================================================================
+
+const SERIES_WRITE_BATCH = 400;
+
+/** 把更新時多出來的日期清回去 (交易內以目前內容為準, 不蓋掉之後的取消) */
+async function rejectAddedSeriesDays(ref, added, attempted) {
+    const rejected = new Set(added);
+    await db.runTransaction(async (tx) => {
+        const snap = await tx.get(ref);
+        if (!snap.exists) return;
+        const series = snap.data();
+        const kept = seriesOrdinals(series).filter(ordinal => !rejected.has(ordinal));
+        tx.update(ref, {
+            dayBits: seriesDayBits(kept, series.startOrdinal),
+            rejectedDayBits: { dayBits: attempted, at: Date.now() },
+        });
+    });
+}
+
+exports.trackSeriesChanges = onDocumentWritten(
+    {
+        document: 'bookingSeries/{seriesId}',
+        secrets: [LINE_ACCESS_TOKEN, VAPID_PRIVATE_KEY],
+        region: 'asia-east1',
+    },
+    async (event) => {
+        const before = event.data?.before?.exists ? event.data.before.data() : null;
+        const after = event.data?.after?.exists ? event.data.after.data() : null;
+        const seriesId = event.params.seriesId;
+        // 本 trigger 自己清回多餘日期的寫入: 那些日期從未生效, 不記錄也不通知
+        if (before && after && before.rejectedDayBits?.at !== after.rejectedDayBits?.at) return;
+
+        const now = new Set(after ? seriesOrdinals(after) : []);
+        const was = new Set(before ? seriesOrdinals(before) : []);
+        let added = [...now].filter(ordinal => !was.has(ordinal));
+        const removed = [...was].filter(ordinal => !now.has(ordinal));
+        if (added.length === 0 && removed.length === 0) return;
+
+        if (before && after && added.length > 0) {
+            logger.warn('[trackSeriesChanges] 更新加入了新日期, 清回原狀', seriesId, added);
+            try {
+                await rejectAddedSeriesDays(event.data.after.ref, added, after.dayBits);
+            } catch (e) {
+                logger.error('[trackSeriesChanges] 清除新加入的日期失敗', seriesId, e);
+            }
+            added = [];
+        }
+
+        // tools/series.py fold / unfold 只換了儲存方式, 日期沒有增減
+        if (!before && after.foldedFrom) return;
+        if (!after && await isUnfoldedSeries(seriesId, before)) return;
+
+        // 單日只取消部分節次: app.js 同一交易內拆出 detachedFrom = 系列 id 的一般預約 → 記為節次變更, 不推取消
+        const detached = new Map();
+        if (removed.length > 0) {
+            try {
+                const snap = await db.collection('bookings').where('detachedFrom', '==', seriesId).get();
+                snap.docs.forEach(doc => detached.set(doc.data().dayOrdinal, doc.data().periods || []));
+            } catch (e) {
+                logger.warn('[trackSeriesChanges] 查詢拆出的預約失敗', seriesId, e.message);
+            }
+        }
+
+        const trail = [];
+        const journal = [];
+        const cancelled = [];
+        const trailEntry = (booking, changeType, changes) => ({
+            bookingId: booking.id,
+            changeType,
+            changes,
+            room: booking.room,
+            date: booking.date,
+            booker: booking.booker || '',
+            deviceId: booking.deviceId || null,
+        });
+        for (const ordinal of added) {
+            const { id, ...booking } = seriesOccurrence(seriesId, after, ordinal);
+            trail.push(trailEntry({ ...booking, id }, 'created', {}));
+            journal.push({ bookingId: id, seriesId, room: booking.room, date: booking.date, deleted: false, booking });
+        }
+        for (const ordinal of removed) {
+            const booking = seriesOccurrence(seriesId, before, ordinal);
+            const periods = detached.get(ordinal);
+            if (periods) {
+                trail.push(trailEntry(booking, 'updated', { periods: { before: before.periods, after: periods } }));
+            } else if (after) {
+                // 清掉 bit = 取消, 與 bookings 的 periods 改為 [] 記法相同
+                trail.push(trailEntry(booking, 'updated', { periods: { before: before.periods, after: [] } }));
+                cancelled.push(booking);
+            } else {
+                trail.push(trailEntry(booking, 'deleted', {}));      // 管理員刪除整個系列
+                cancelled.push(booking);
+            }
+            journal.push({ bookingId: booking.id, seriesId, room: booking.room, date: booking.date, deleted: true, booking: null });
+        }
+
+        const changedAt = admin.firestore.FieldValue.serverTimestamp();
+        const expireAt = admin.firestore.Timestamp.fromMillis(Date.now() + CHANGE_JOURNAL_TTL_DAYS * 86400000);
+        const writes = [
+            ...trail.map(entry => [db.collection('editTrail').doc(), { ...entry, changedAt }]),
+            ...journal.map(entry => [db.collection('bookingChanges').doc(), { ...entry, changedAt, expireAt }]),
+        ];
+        try {
+            for (let i = 0; i < writes.length; i += SERIES_WRITE_BATCH) {
+                const batch = db.batch();
+                writes.slice(i, i + SERIES_WRITE_BATCH).forEach(([ref, data]) => batch.set(ref, data));
+                await batch.commit();
+            }
+        } catch (e) {
+            logger.error('[trackSeriesChanges] editTrail / bookingChanges 寫入失敗', e);
+        }
+
+        const eventType = after ? 'cancelled' : 'force_deleted';
+        await Promise.all(cancelled.map(booking => notifyBookingCancelled(booking, eventType)));
+    }
+);
+
 // ==========================================================================
 // Phase 3 (v2.46.0): 排程提醒 + 管理員告警
 // ==========================================================================
@@ -1438,13 +1768,17 @@ exports.scheduledReminder = onSchedule(
         const tomorrow = new Date(tw.getTime() + 86400 * 1000);
         const tomorrowStr = `${tomorrow.getUTCFullYear()}/${String(tomorrow.getUTCMonth() + 1).padStart(2, '0')}/${String(tomorrow.getUTCDate()).padStart(2, '0')}`;
 
-        const snapshot = await db.collection('bookings')
-            .where('date', 'in', [todayStr, tomorrowStr])
-            .get();
+        const [snapshot, seriesBookings] = await Promise.all([
+            db.collection('bookings')
+                .where('date', 'in', [todayStr, tomorrowStr])
+                .get(),
+            loadSeriesBookings(todayStr, tomorrowStr),
+        ]);
+        const entries = snapshot.docs.map(doc => ({ id: doc.id, booking: doc.data() }))
+            .concat(seriesBookings.map(booking => ({ id: booking.id, booking })));
 
         let scanned = 0, sent = 0, skipped = 0;
-        for (const doc of snapshot.docs) {
-            const booking = doc.data();
+        for (const { id: bookingId, booking } of entries) {
             if (!booking.periods || booking.periods.length === 0) continue; // 已取消
             scanned += 1;
 
@@ -1458,7 +1792,7 @@ exports.scheduledReminder = onSchedule(
             // 在 27~33 分鐘窗口內 (避免精準度問題,涵蓋 5 分鐘 cron 變動)
             if (minsUntil < 27 || minsUntil > 33) continue;
 
-            const reminderKey = `${doc.id}_30min`;
+            const reminderKey = `${bookingId}_30min`;
             const sentDoc = await db.collection('sentReminders').doc(reminderKey).get();
             if (sentDoc.exists) {
                 skipped += 1;
@@ -1478,7 +1812,7 @@ exports.scheduledReminder = onSchedule(
 
             // 記錄已推
             await db.collection('sentReminders').doc(reminderKey).set({
-                bookingId: doc.id,
+                bookingId,
                 type: '30min',
                 sentAt: admin.firestore.FieldValue.serverTimestamp(),
                 expiresAt: admin.firestore.Timestamp.fromMillis(Date.now() + 7 * 86400 * 1000),
@@ -2225,8 +2559,8 @@ async function aggregateSemesterStats(startDate, endDate) {
         leadTimeDistribution: { '當天': 0, '1-3 天': 0, '4-7 天': 0, '8-30 天': 0, '> 30 天': 0 },
     };
 
-    snap.forEach(doc => {
-        const b = doc.data();
+    const bookings = snap.docs.map(doc => doc.data()).concat(await loadSeriesBookings(startDate, endDate));
+    bookings.forEach(b => {
         const isActive = b.periods && b.periods.length > 0;
         stats.totalBookings += 1;
         if (isActive) stats.totalActive += 1;
@@ -13,15 +13,22 @@ const ASSETS_TO_CACHE = [
     'https://fonts.googleapis.com/css2?family=Noto+Sans+TC:wght@400;500;700&family=Plus+Jakarta+Sans:wght@500;600;700&display=swap',
 ];
 
+// 部署時由 tools/fingerprint.py 改寫成 app.<hash>.js 這類內容指紋檔名: 同名即同內容, 可永久沿用
+const FINGERPRINTED_ASSET = /\.[0-9a-f]{10}\.(?:js|css)$/;
+
 // ===== Install: 預快取核心資源 =====
 // v2.41.1: 改為「等候模式」, 由前端通知使用者後再 skipWaiting
+// 指紋資源若已在舊快取中 (任何版本) 就直接複製, 只下載內容真的有變的檔案
 self.addEventListener('install', event => {
     event.waitUntil(
         caches.open(CACHE_NAME).then(cache => {
             console.log(`[SW ${APP_VERSION}] Caching app shell`);
-            return cache.addAll(ASSETS_TO_CACHE).catch(err => {
-                console.warn('[SW] Some assets failed to cache:', err);
-            });
+            return Promise.all(ASSETS_TO_CACHE.map(url => {
+                const cached = FINGERPRINTED_ASSET.test(url) ? caches.match(url) : Promise.resolve(undefined);
+                return cached
+                    .then(response => response ? cache.put(url, response) : cache.add(url))
+                    .catch(err => console.warn('[SW] Asset failed to cache:', url, err));
+            }));
         })
     );
     // ⚠ 不主動 skipWaiting, 改由前端 banner 點擊「立即更新」後觸發
@@ -85,6 +92,11 @@ self.addEventListener('fetch', event => {
         return; // 不攔截，瀏覽器直連
     }
 
+    // 空堂索引由 app 以 cache: 'no-cache' 自行重新驗證; 走 SWR 會拿到上一版
+    if (isSameOrigin && url.pathname.endsWith('/free-slots.json')) {
+        return;
+    }
+
     // HTML 導航：Network First (確保總是最新)
     if (event.request.mode === 'navigate') {
         event.respondWith(
@@ -0,0 +1,5 @@
+"""讓 tests/py 可以直接 import tools 與根目錄的 codemod 腳本"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
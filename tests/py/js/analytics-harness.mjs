@@ -0,0 +1,93 @@
+/**
+ * tools/analytics.py 對照用: 在 node 中執行 app.js 的 build* 分析函式, 把渲染結果轉成 JSON
+ *
+ * stdin: { docs: [...], start: 'YYYY-MM-DD', end: 'YYYY-MM-DD' } (createdAt 為 ISO 字串)
+ * stdout: 與 analyze() 相同結構的 JSON
+ *
+ * 不依賴 jsdom: 只提供 build* 用到的最小 DOM (getElementById / createElement / appendChild / innerHTML)
+ */
+import { readFileSync } from 'node:fs';
+import { fileURLToPath } from 'node:url';
+import path from 'node:path';
+
+const __dirname = path.dirname(fileURLToPath(import.meta.url));
+const appSource = readFileSync(path.resolve(__dirname, '../../../app.js'), 'utf8');
+
+function makeStub() {
+    const fn = function () { return proxy; };
+    const proxy = new Proxy(fn, {
+        get(_t, prop) {
+            if (prop === 'then' || prop === 'catch' || prop === 'finally') return () => proxy;
+            if (prop === Symbol.toPrimitive) return () => '';
+            return proxy;
+        },
+        apply() { return proxy; },
+    });
+    return proxy;
+}
+
+class FakeElement {
+    constructor() {
+        this.children = [];
+        this.style = {};
+        this.className = '';
+        this.title = '';
+        this.textContent = '';
+        this._html = '';
+    }
+    appendChild(child) { this.children.push(child); return child; }
+    set innerHTML(html) { this._html = html; this.children = []; }
+    get innerHTML() { return this._html; }
+}
+
+const elements = {};
+const fakeDocument = {
+    getElementById: id => (elements[id] ??= new FakeElement()),
+    createElement: () => new FakeElement(),
+    addEventListener() {},
+    querySelector: () => null,
+    querySelectorAll: () => [],
+};
+
+const input = JSON.parse(readFileSync(0, 'utf8'));
+const docs = input.docs.map(d => ({
+    ...d,
+    createdAt: d.createdAt ? { toDate: () => new Date(d.createdAt) } : null,
+}));
+
+const factory = new Function(
+    'firebase', 'firebaseConfig', 'Sentry', 'document', 'window', 'localStorage', 'navigator',
+    `${appSource}\n;return { buildHeatmap, buildVenueRanking, buildUserFrequency, buildCancellationAnalysis, buildLeadTimeDistribution };`
+);
+const app = factory(makeStub(), {}, undefined, fakeDocument, makeStub(), makeStub(), makeStub());
+
+const valid = docs.filter(b => b.periods && b.periods.length > 0);
+app.buildHeatmap(valid, input.start, input.end);
+app.buildVenueRanking(valid);
+app.buildUserFrequency(valid);
+app.buildCancellationAnalysis(docs);
+app.buildLeadTimeDistribution(valid);
+
+const labels = elements.heatmapMonthLabels.children.map(s => s.textContent);
+const weeks = elements.heatmapGrid.children.map((col, i) => ({
+    label: labels[i],
+    cells: col.children.map(cell => {
+        const [date, count] = cell.title.replace(' 節次', '').split('：');
+        return [date, Number(count), Number(cell.className.split('level-')[1]), cell.style.opacity !== '0.3'];
+    }),
+}));
+
+const bars = id => [...elements[id].innerHTML.matchAll(
+    /analytics-bar-label" title="([^"]*)">[\s\S]*?analytics-bar-value"[^>]*>([^<]*)<\/span>/g
+)].map(m => [m[1], m[2]]);
+
+console.log(JSON.stringify({
+    heatmap: { weeks },
+    venueRanking: bars('venueRankingChart').map(([room, v]) => [room, parseInt(v, 10)]),
+    userFrequency: bars('userFrequencyChart').map(([name, v]) => [name, parseInt(v, 10)]),
+    cancellation: bars('cancellationChart').map(([room, v]) => {
+        const [, rate, cancelled, total] = v.match(/([\d.]+)% \((\d+)\/(\d+)\)/);
+        return [room, Number(total) - Number(cancelled), Number(cancelled), rate];
+    }),
+    leadTime: [...elements.leadTimeChart.innerHTML.matchAll(/title="[^：]*：(\d+) 筆"/g)].map(m => Number(m[1])),
+}));
@@ -0,0 +1,205 @@
+/**
+ * functions/index.js 的 Firestore trigger 對照用: 以記憶體中的假 Firestore 執行一連串 commit,
+ * 每個 commit 全部寫入後, 依序觸發文件路徑相符的 onDocumentCreated / Updated / Deleted / Written
+ * (trigger 看到的 before 是 commit 前的內容, 與正式環境相同; trigger 自己的寫入不再串接觸發)
+ *
+ * stdin: { data: {集合: {文件 id: 資料}}, commits: [[{op: 'create'|'set'|'update'|'delete', collection, id, data}]] }
+ * stdout: { pushes: [{to, altText}], webPush: [{deviceId, title, body}], data: 最終內容 }
+ *
+ * LINE / web-push / firebase-functions 皆為假模組, 不需要 npm install
+ */
+const { readFileSync } = require('node:fs');
+const path = require('node:path');
+
+const source = readFileSync(path.resolve(__dirname, '../../../functions/index.js'), 'utf8');
+const input = JSON.parse(readFileSync(0, 'utf8'));
+const store = input.data || {};
+const pushes = [];
+const webPush = [];
+const triggers = [];
+let autoId = 0;
+
+const SERVER_TIMESTAMP = 'SERVER_TIMESTAMP';
+const clone = value => (value === undefined ? undefined : JSON.parse(JSON.stringify(value)));
+
+class FieldPath {
+    constructor(...segments) { this.segments = segments; }
+}
+
+function fieldValue(data, field) {
+    const segments = field instanceof FieldPath ? field.segments : String(field).split('.');
+    return segments.reduce((value, key) => (value == null ? undefined : value[key]), data);
+}
+
+function matches(data, [field, op, expected]) {
+    const value = fieldValue(data, field);
+    switch (op) {
+        case '==': return value === expected;
+        case '>=': return value >= expected;
+        case '<=': return value <= expected;
+        case '>': return value > expected;
+        case '<': return value < expected;
+        case 'in': return expected.includes(value);
+        case 'array-contains': return Array.isArray(value) && value.includes(expected);
+        default: throw new Error(`不支援的運算子 ${op}`);
+    }
+}
+
+function snapshot(ref, data) {
+    return { id: ref.id, ref, exists: data !== undefined, data: () => clone(data) };
+}
+
+class DocRef {
+    constructor(collection, id) { this.collection = collection; this.id = id; }
+    current() { return (store[this.collection] || {})[this.id]; }
+    write(data) { (store[this.collection] ??= {})[this.id] = clone(data); }
+    async get() { return snapshot(this, this.current()); }
+    async set(data) { this.write(data); }
+    async create(data) {
+        if (this.current() !== undefined) throw new Error(`ALREADY_EXISTS ${this.collection}/${this.id}`);
+        this.write(data);
+    }
+    async update(data) { this.write({ ...this.current(), ...data }); }
+    async delete() { delete (store[this.collection] || {})[this.id]; }
+}
+
+class Query {
+    constructor(collection, filters = [], max = null) {
+        this.collection = collection;
+        this.filters = filters;
+        this.max = max;
+    }
+    where(field, op, value) { return new Query(this.collection, [...this.filters, [field, op, value]], this.max); }
+    orderBy() { return this; }
+    limit(n) { return new Query(this.collection, this.filters, n); }
+    async get() {
+        const docs = Object.entries(store[this.collection] || {})
+            .filter(([, data]) => this.filters.every(f => matches(data, f)))
+            .slice(0, this.max ?? undefined)
+            .map(([id, data]) => snapshot(new DocRef(this.collection, id), data));
+        return { docs, size: docs.length, empty: docs.length === 0, forEach: cb => docs.forEach(cb) };
+    }
+}
+
+class CollectionRef extends Query {
+    doc(id) { return new DocRef(this.collection, id || `auto${++autoId}`); }
+    async add(data) { const ref = this.doc(); ref.write(data); return ref; }
+}
+
+const db = {
+    collection: name => new CollectionRef(name),
+    batch() {
+        const ops = [];
+        return {
+            set: (ref, data) => ops.push(() => ref.set(data)),
+            create: (ref, data) => ops.push(() => ref.create(data)),
+            update: (ref, data) => ops.push(() => ref.update(data)),
+            delete: ref => ops.push(() => ref.delete()),
+            commit: async () => { for (const op of ops) await op(); },
+        };
+    },
+    async runTransaction(fn) {
+        return fn({
+            get: ref => ref.get(),
+            set: (ref, data) => ref.write(data),
+            create: (ref, data) => {
+                if (ref.current() !== undefined) throw new Error(`ALREADY_EXISTS ${ref.collection}/${ref.id}`);
+                ref.write(data);
+            },
+            update: (ref, data) => ref.write({ ...ref.current(), ...data }),
+            delete: ref => { delete (store[ref.collection] || {})[ref.id]; },
+        });
+    },
+};
+
+const firestore = () => db;
+firestore.FieldValue = { serverTimestamp: () => SERVER_TIMESTAMP };
+firestore.Timestamp = { fromMillis: millis => ({ millis }) };
+firestore.FieldPath = FieldPath;
+
+function register(kind) {
+    return (options, handler) => {
+        const [collection, param] = options.document.split('/');
+        triggers.push({ kind, collection, param: param.slice(1, -1), handler });
+        return handler;
+    };
+}
+
+const passthrough = (...args) => args[args.length - 1];
+const logger = { info() {}, warn() {}, error() {}, debug() {}, log() {} };
+const modules = {
+    'firebase-functions/v2/https': { onRequest: passthrough },
+    'firebase-functions/v2/firestore': {
+        onDocumentCreated: register('created'),
+        onDocumentUpdated: register('updated'),
+        onDocumentDeleted: register('deleted'),
+        onDocumentWritten: register('written'),
+    },
+    'firebase-functions/v2/scheduler': { onSchedule: passthrough },
+    'firebase-functions/v2': { setGlobalOptions() {} },
+    'firebase-functions/params': { defineSecret: name => ({ value: () => `secret-${name}` }) },
+    'firebase-functions/logger': logger,
+    'firebase-admin': { initializeApp() {}, firestore, storage: () => ({ bucket: () => ({}) }) },
+    '@line/bot-sdk': {
+        messagingApi: {
+            MessagingApiClient: class {
+                async pushMessage({ to, messages }) { pushes.push({ to, altText: messages[0].altText }); }
+            },
+        },
+    },
+    'web-push': {
+        setVapidDetails() {},
+        async sendNotification(subscription, payload) {
+            const { title, body } = JSON.parse(payload);
+            webPush.push({ deviceId: subscription.deviceId, title, body });
+        },
+    },
+    '@google/generative-ai': { GoogleGenerativeAI: class {} },
+    crypto: require('node:crypto'),
+};
+
+const module_ = { exports: {} };
+new Function('require', 'module', 'exports', 'setTimeout', source)(
+    name => {
+        if (!(name in modules)) throw new Error(`harness 沒有提供模組 ${name}`);
+        return modules[name];
+    },
+    module_, module_.exports, fn => fn(),
+);
+
+function eventFor(kind, write, before, after) {
+    const ref = new DocRef(write.collection, write.id);
+    const change = { before: snapshot(ref, before), after: snapshot(ref, after) };
+    const data = kind === 'created' ? change.after : kind === 'deleted' ? change.before : change;
+    return { data, params: {} };
+}
+
+async function run() {
+    for (const commit of input.commits || []) {
+        const fired = [];
+        for (const write of commit) {
+            const ref = new DocRef(write.collection, write.id);
+            const before = ref.current();
+            if (write.op === 'delete') await ref.delete();
+            else if (write.op === 'update') await ref.update(write.data);
+            else ref.write(write.data);
+            fired.push([write, clone(before)]);
+        }
+        for (const [write, before] of fired) {
+            const after = new DocRef(write.collection, write.id).current();
+            const kind = before === undefined ? 'created' : after === undefined ? 'deleted' : 'updated';
+            for (const trigger of triggers) {
+                if (trigger.collection !== write.collection || ![kind, 'written'].includes(trigger.kind)) continue;
+                const event = eventFor(trigger.kind === 'written' ? 'written' : kind, write, before, clone(after));
+                event.params[trigger.param] = write.id;
+                await trigger.handler(event);
+            }
+        }
+    }
+    process.stdout.write(JSON.stringify({ pushes, webPush, data: store }));
+}
+
+run().catch(err => {
+    console.error(err);
+    process.exit(1);
+});
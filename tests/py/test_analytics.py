@@ -0,0 +1,99 @@
+"""
+離線分析測試 — 與 app.js 的 build* 函式 (在 node 中執行) 輸出逐項比對; CSV 與 JSON 讀取結果一致、
+Firestore 匯出的預約系列展開成各日期
+"""
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tools import ROOT
+from tools.analytics import CSV_HEADERS, TIMEZONE, analyze, app_constants, read_csv, read_json
+from tools.conflicts import date_ordinal
+from tools.firestore import encode_value
+from tools.series import day_bits
+
+HARNESS = ROOT / 'tests' / 'py' / 'js' / 'analytics-harness.mjs'
+
+
+def _docs(n=600, seed=7):
+    rng = random.Random(seed)
+    rooms, periods = app_constants()
+    period_ids = list(periods.values())
+    bookers = ['王老師', '李老師', '陳老師', '12', '3', '林主任', '張組長'] + [f'教師{i}' for i in range(15)]
+    docs = []
+    for i in range(n):
+        day = datetime(2024, 8, 1, tzinfo=TIMEZONE) + timedelta(days=rng.randrange(0, 180))
+        created = day - timedelta(days=rng.choice([0, 0, 1, 2, 5, 9, 20]), hours=rng.randrange(0, 30))
+        docs.append({
+            'id': f'doc{i}',
+            'date': day.strftime('%Y/%m/%d'),
+            'room': rng.choice(rooms + ['舊場地']),
+            'periods': [] if rng.random() < 0.15 else rng.sample(period_ids, rng.randint(1, 4)),
+            'booker': rng.choice(bookers),
+            'createdAt': None if rng.random() < 0.05 else created.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        })
+    return docs
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_matches_app_js_build_functions(tmp_path):
+    docs = _docs()
+    path = tmp_path / 'archive.json'
+    path.write_text(json.dumps({'bookings': docs}, ensure_ascii=False), encoding='utf-8')
+    report = analyze(read_json(path), '2024-08-01', '2025-01-31')
+
+    proc = subprocess.run(['node', str(HARNESS)], input=json.dumps(
+        {'docs': docs, 'start': '2024-08-01', 'end': '2025-01-31'}, ensure_ascii=False),
+        capture_output=True, text=True, check=True, env={**os.environ, 'TZ': 'Asia/Taipei'})
+    js = json.loads(proc.stdout)
+
+    assert report['heatmap']['weeks'] == js['heatmap']['weeks']
+    assert report['venueRanking'] == js['venueRanking']
+    assert report['userFrequency'] == js['userFrequency']
+    assert [[room, v, c, f'{rate * 100:.1f}'] for room, v, c, rate in report['cancellation']] == js['cancellation']
+    assert report['leadTime']['counts'] == js['leadTime']
+
+
+def test_csv_export_and_archive_json_agree(tmp_path):
+    docs = _docs(200, seed=3)
+    _, periods = app_constants()
+    names = {pid: name for name, pid in periods.items()}
+    with open(tmp_path / 'export.csv', 'w', encoding='utf-8', newline='') as f:
+        f.write('\ufeff')
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(CSV_HEADERS)
+        for d in docs:
+            created = '未知時間'
+            if d['createdAt']:
+                local = datetime.fromisoformat(d['createdAt'].replace('Z', '+00:00')).astimezone(TIMEZONE)
+                created = f'{local.year}/{local.month}/{local.day} {local:%H:%M:%S}'
+            writer.writerow([d['id'], d['date'], d['room'], ' & '.join(names[p] for p in d['periods']),
+                             d['booker'], '無', created, 'Unknown', '有效'])
+    (tmp_path / 'archive.json').write_text(json.dumps({'bookings': docs}, ensure_ascii=False), encoding='utf-8')
+
+    from_csv = analyze(read_csv(tmp_path / 'export.csv'))
+    from_json = analyze(read_json(tmp_path / 'archive.json'))
+    assert from_csv == from_json
+    assert from_csv['kpi']['cancelCount'] == sum(1 for d in docs if not d['periods'])
+
+
+def test_firestore_export_expands_series(tmp_path):
+    days = [date_ordinal(d) for d in ('2025/03/03', '2025/03/10', '2025/03/24')]
+    series = {'room': '禮堂', 'periods': ['period1', 'period2'], 'booker': '王老師', 'startOrdinal': days[0],
+              'endOrdinal': days[-1], 'dayBits': day_bits(days, days[0]), 'createdAt': '2025-03-01T00:00:00Z'}
+    booking = {'date': '2025/03/05', 'room': '禮堂', 'periods': [], 'booker': '李老師'}
+    export = {'documents': [
+        {'name': f'projects/x/databases/(default)/documents/{collection}/{doc_id}',
+         'fields': {k: encode_value(v) for k, v in data.items()}}
+        for collection, doc_id, data in (('bookings', 'b1', booking), ('bookingSeries', 'ser_a', series))]}
+    (tmp_path / 'export.json').write_text(json.dumps(export, ensure_ascii=False), encoding='utf-8')
+    cols = read_json(tmp_path / 'export.json')
+    assert cols.ids == ['b1'] + [f'ser_a@{d}' for d in days]
+    report = analyze(cols)
+    assert report['kpi'] == {'totalBookings': 3, 'totalPeriods': 6, 'uniqBookers': 1, 'cancelCount': 1}
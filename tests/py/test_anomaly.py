@@ -0,0 +1,138 @@
+"""
+異常偵測測試 — 滑動視窗計數與逐筆重算一致、跨門檻即告警且一個視窗一次、晚到異動、閒置值清除;
+匯出檔重播與門檻調整、輪詢回看去重; emulator editTrail
+"""
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tools import anomaly
+from tools.anomaly import RULES, Detector, Rule, _Window, change_kind, follow, main, parse_overrides
+from tools.firestore import Firestore
+
+T0 = datetime(2025, 3, 5, 1, 0, tzinfo=timezone.utc)
+DELETE = Rule('device_delete', 'deviceId', frozenset({'deleted', 'cancelled'}), 5, 600, '大量刪除')
+
+
+def _entry(seconds, kind='deleted', device='dev_1', **fields):
+    return {'id': uuid.uuid4().hex, 'bookingId': f'bk{seconds}', 'changeType': kind, 'changes': {},
+            'room': '禮堂', 'booker': '王老師', 'deviceId': device,
+            'changedAt': (T0 + timedelta(seconds=seconds)).isoformat().replace('+00:00', 'Z'), **fields}
+
+
+def test_window_matches_recount():
+    rng = random.Random(7)
+    window, size = _Window(10), 10
+    seen = []
+    bucket = head = 1000
+    for _ in range(3000):
+        bucket += rng.choice((0, 0, 1, 1, 2, 15)) if rng.random() < 0.9 else -rng.randrange(12)   # 偶爾晚到
+        head = max(head, bucket)
+        total = window.add(bucket)
+        if bucket > head - size:
+            seen.append(bucket)
+        assert total == sum(1 for b in seen if b > head - size)
+
+
+def test_alert_on_crossing_once_per_window():
+    detector = Detector([DELETE])
+    fired = [(s, detector.feed(_entry(s))) for s in range(0, 50, 10)]             # 第 5 筆跨過門檻
+    assert [bool(a) for _, a in fired] == [False] * 4 + [True]
+    alert = fired[-1][1][0]
+    assert (alert['key'], alert['count'], alert['bookingId']) == ('dev_1', 5, 'bk40')
+    assert alert['at'] == '2025-03-05T09:00:40+08:00'
+    assert not any(detector.feed(_entry(s)) for s in range(50, 600, 50))          # 同一視窗內不再告警
+    assert detector.feed(_entry(640)) and detector.alerts['device_delete'] == 2   # 下一個視窗仍超標
+    assert not detector.feed(_entry(300, device='dev_2'))                         # 各值分開計數
+
+
+def test_change_kinds_and_rule_dimensions():
+    cancel = _entry(0, 'updated', changes={'periods': {'before': ['period1'], 'after': []}})
+    edit = _entry(0, 'updated', changes={'reason': {'before': 'a', 'after': 'b'}})
+    assert change_kind(cancel) == 'cancelled' and change_kind(edit) == 'updated'
+    assert change_kind(_entry(0, 'created')) == 'created'
+
+    detector = Detector([DELETE, Rule('room', 'room', frozenset({'updated'}), 2, 60, '場地')])
+    for s in range(4):
+        assert not detector.feed({**cancel, 'changedAt': _entry(s)['changedAt']})
+    assert detector.feed(_entry(5, 'updated', changes={'periods': {'before': ['lunch'], 'after': []}}))
+    assert [a['rule'] for a in detector.feed(edit) + detector.feed(edit)] == ['room']
+    assert not Detector([DELETE]).feed(_entry(0, device=None))                    # 沒有 deviceId 不計
+    assert Detector([DELETE]).feed({'changeType': 'deleted', 'deviceId': 'x'}) == []
+
+
+def test_late_events_and_pruning(monkeypatch):
+    detector = Detector([DELETE])
+    for s in (100, 90, 95, 80):                                                    # 視窗內順序顛倒
+        detector.feed(_entry(s))
+    assert detector.feed(_entry(-900)) == [] and detector.feed(_entry(60))        # 早於視窗的不計
+
+    monkeypatch.setattr(anomaly, 'PRUNE_EVERY', 100)
+    detector = Detector(RULES)
+    for i in range(5000):
+        detector.feed(_entry(i * 30, 'created', device=f'dev_{i}', booker=f'師{i}', room=f'室{i % 3}'))
+    assert detector.tracked() < 3 * 200 + 3                                      # 只留最近一個視窗內的值
+
+
+def test_replay_export_with_overrides(tmp_path, capsys):
+    entries = [_entry(s, device='dev_9') for s in range(0, 300, 20)] + [_entry(400, 'created')]
+    path = tmp_path / 'editTrail.jsonl'
+    path.write_text(''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries), encoding='utf-8')
+
+    assert main([str(path)]) == 0
+    out = capsys.readouterr().out
+    assert '✗' not in out and '處理 16 筆異動' in out
+    assert main([str(path), '--set', 'device_mass_cancel=10/300']) == 0
+    out = capsys.readouterr().out
+    assert out.count('✗') == 1 and 'deviceId=dev_9: 5 分鐘內 10 筆 (門檻 10)' in out
+    assert main([str(path), '--set', 'device_mass_cancel=10/300', '--json']) == 0
+    alerts = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(a['rule'], a['bookingId']) for a in alerts] == [('device_mass_cancel', 'bk180')]
+
+    with pytest.raises(ValueError):
+        parse_overrides(['nope=3'])
+    assert parse_overrides(['room_churn=9'])[-1].window == 600
+
+
+class FakeFirestore:
+    """每次查詢回傳 changedAt >= 起點的文件; pages 依序模擬每次輪詢時已可見的文件"""
+
+    def __init__(self, pages):
+        self.pages = iter(pages)
+        self.queries = []
+
+    def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+        (field, op, since), = filters
+        self.queries.append(since)
+        visible = next(self.pages)
+        yield from (e for e in visible if anomaly._epoch(e['changedAt']) >= since.timestamp())
+
+
+def test_follow_dedupes_lookback(monkeypatch):
+    monkeypatch.setattr(anomaly.time, 'sleep', lambda s: None)
+    a, b, c, late = _entry(10), _entry(20), _entry(40), _entry(35)
+    client = FakeFirestore([[a, b], [a, b, c], [a, b, late, c]])
+    got = list(follow(client, T0, lookback=10, polls=3))
+    assert [e['bookingId'] for e in got] == ['bk10', 'bk20', 'bk40', 'bk35']
+    assert [q - T0 for q in client.queries] == [timedelta(0), timedelta(seconds=10), timedelta(seconds=30)]
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_detects_recent_trail(capsys):
+    project = f'demo-{uuid.uuid4().hex[:8]}'
+    client = Firestore(project)
+    now = datetime.now(timezone.utc)
+    try:
+        client.commit([client.create_write('editTrail', f'tr{i:02d}', {
+            'bookingId': f'bk{i}', 'changeType': 'deleted', 'changes': {}, 'room': '禮堂', 'date': '2025/03/05',
+            'booker': '王老師', 'deviceId': 'dev_bot', 'changedAt': now - timedelta(seconds=60 - i)})
+            for i in range(25)])
+        assert main(['--project', project, '--since', '5']) == 0
+        out = capsys.readouterr().out
+        assert 'device_mass_cancel' in out and 'deviceId=dev_bot' in out and '處理 25 筆異動' in out
+    finally:
+        client.close()
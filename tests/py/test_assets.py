@@ -0,0 +1,88 @@
+"""
+圖示與預先壓縮測試 — favicon.png (JPEG) 縮小解碼、PNG 往返、面積平均縮圖; manifest / index.html / sw.js 改寫、重跑不變、
+--precompress 才輸出 .gz 且內容一致
+"""
+import gzip
+import json
+import shutil
+
+from tools import ROOT
+from tools.assets import (ICONS, Image, build, decode_png, encode_png, flatten_background, read_image, resize)
+
+HTML = '''<link rel="icon" type="image/png" href="favicon.png">\r
+<link rel="manifest" href="manifest.json">\r
+<link rel="apple-touch-icon" href="favicon.png">\r
+<script src="app.js"></script>\r
+<div class="pwa-icon"><img src="favicon.png" alt="App Icon"></div>\r
+'''
+SW = '''const CACHE_NAME = 'booking-system-v1';
+const ASSETS_TO_CACHE = [
+    './',
+    './index.html',
+    './app.js',
+    './favicon.png',
+    './manifest.json',
+    'https://fonts.googleapis.com/css2?family=X',
+];
+self.registration.showNotification('t', { icon: './favicon.png', badge: './favicon.png' });
+'''
+
+
+def test_decodes_repo_favicon_at_half_scale():
+    image = read_image(ROOT / 'favicon.png', 512)
+    assert (image.width, image.height) == (512, 512)
+    assert min(image.pixel(5, 5)) >= 230                                # 棋盤格背景
+    r, g, b = image.pixel(200, 300)                                     # 日曆外框的藍綠色
+    assert b > g > r and r < 80
+    assert flatten_background(image).pixel(5, 5) == (255, 255, 255)
+
+
+def test_png_round_trip_and_area_resize():
+    pixels = bytearray()
+    for y in range(4):
+        for x in range(6):
+            pixels += bytes((x * 40, y * 60, 255 if (x + y) % 2 else 0))
+    image = Image(6, 4, pixels)
+    assert decode_png(encode_png(image)) == image
+    small = resize(image, 2)                                            # 先置中裁成 4×4 再 2×2 平均
+    assert small.pixel(0, 0) == (60, 30, 128) and small.pixel(1, 1) == (140, 150, 128)
+
+
+def _tree(tmp_path):
+    shutil.copy(ROOT / 'favicon.png', tmp_path / 'favicon.png')
+    (tmp_path / 'index.html').write_bytes(HTML.encode('utf-8'))
+    (tmp_path / 'sw.js').write_text(SW)
+    (tmp_path / 'app.js').write_text('function init() { return 1; }\n' * 200)
+    (tmp_path / 'manifest.json').write_bytes(json.dumps({'name': '預約', 'icons': [{'src': 'favicon.png'}]},
+                                                        ensure_ascii=False, indent=4).replace('\n', '\r\n').encode())
+
+
+def test_build_rewrites_references_and_is_idempotent(tmp_path):
+    _tree(tmp_path)
+    summary, _ = build(tmp_path)
+    assert set(summary['icons']) == {name for name, _ in ICONS}
+    assert decode_png((tmp_path / 'icon-192.png').read_bytes()).width == 192
+    assert summary['install_after'] * 5 < summary['install_before']
+
+    manifest = (tmp_path / 'manifest.json').read_bytes()
+    assert b'\r\n' in manifest and not manifest.endswith(b'\n')          # 換行符與檔尾保持原樣
+    assert [i['src'] for i in json.loads(manifest)['icons']] == ['icon-192.png', 'icon-512.png']
+    html = (tmp_path / 'index.html').read_text()
+    assert '<link rel="icon" type="image/png" sizes="32x32" href="favicon-32.png">' in html
+    assert '<link rel="apple-touch-icon" sizes="180x180" href="apple-touch-icon.png">' in html
+    assert '<img src="icon-192.png" alt="App Icon">' in html and 'favicon.png' not in html
+    sw = (tmp_path / 'sw.js').read_text()
+    assert "'./favicon-32.png',\n    './icon-192.png',\n    './manifest.json'" in sw
+    assert "icon: './icon-192.png', badge: './icon-192.png'" in sw and 'favicon.png' not in sw
+    assert 'booking-system-v1-' in sw                                   # 清單變了 → CACHE_NAME 換新
+    assert not list(tmp_path.glob('*.gz')) and summary['compressed'] == {}      # 預設不產生壓縮檔
+
+    outputs = {p.name: p.read_bytes() for p in tmp_path.iterdir()}
+    _, results = build(tmp_path)
+    assert results == []
+    assert {p.name: p.read_bytes() for p in tmp_path.iterdir()} == outputs
+
+    summary, _ = build(tmp_path, precompress=True)
+    for name in ('index.html', 'sw.js', 'manifest.json', 'app.js'):
+        assert gzip.decompress((tmp_path / f'{name}.gz').read_bytes()) == (tmp_path / name).read_bytes()
+    assert set(summary['compressed']) >= {'index.html', 'sw.js', 'manifest.json', 'app.js'}
@@ -0,0 +1,110 @@
+"""
+稽核日誌封存測試 — 匯出檔串流解析、月分區與 rollup 一致、依 id 合併重建位元組相同、查詢篩選同 loadAuditLogs; emulator 游標分頁與清理
+"""
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from tools.auditarchive import AuditArchive, audit_cutoff, build, iter_export, iter_firestore, prune
+from tools.firestore import Firestore
+
+BEFORE = datetime(2025, 8, 1, tzinfo=timezone(timedelta(hours=8)))
+
+LOGS = [
+    {'id': 'a', 'action': 'CREATE_BOOKING', 'timestamp': '2024-03-01T01:00:00Z', 'userEmail': 'wang@school.tw',
+     'details': {'booker': '王老師', 'room': '禮堂'}},
+    {'id': 'b', 'action': 'FORCE_DELETE_BOOKING', 'timestamp': '2024-03-31T17:30:00Z', 'userEmail': 'admin@school.tw',
+     'details': {'booker': '李老師'}},                                   # 台北時間 4/1
+    {'id': 'c', 'action': 'CREATE_BOOKING', 'timestamp': {'_seconds': 1709881200, '_nanoseconds': 0},
+     'performedBy': 'Guest', 'deviceId': 'dev_123'},                    # 2024-03-08 15:00 +08
+    {'id': 'd', 'action': 'EXPORT_CSV', 'timestamp': '2025-09-01T00:00:00Z', 'details': {'count': 3}},
+    {'id': 'e', 'action': 'ADMIN_LOGIN', 'timestamp': None},
+]
+
+
+def _rest(doc):
+    fields = {'action': {'stringValue': doc['action']}, 'timestamp': {'timestampValue': doc['timestamp']}}
+    return {'name': f"projects/p/databases/(default)/documents/audit_logs/{doc['id']}", 'fields': fields}
+
+
+def test_export_readers_stream_both_formats(tmp_path):
+    as_object = tmp_path / 'export.json'
+    as_object.write_text(json.dumps({'exportedAt': 'x', 'documents': [_rest(LOGS[0]), LOGS[1]]}), encoding='utf-8')
+    lines = tmp_path / 'export.jsonl'
+    lines.write_text('\n'.join(json.dumps(d, ensure_ascii=False) for d in LOGS) + '\n', encoding='utf-8')
+    assert [d['id'] for d in iter_export(as_object, chunk_size=7)] == ['a', 'b']      # 元素跨越讀取區塊
+    assert next(iter_export(as_object))['timestamp'] == '2024-03-01T01:00:00Z'
+    assert [d['id'] for d in iter_export(lines)] == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_partitions_rollup_and_queries(tmp_path):
+    out = tmp_path / 'archive'
+    summary = build(LOGS, out, before=BEFORE)
+    assert summary == {'months': {'2024-03': 2, '2024-04': 1}, 'archived': 3, 'skipped': 2}
+    with AuditArchive(out) as archive:
+        assert archive.months() == ['2024-03', '2024-04']
+        assert archive.rollup['months']['2024-03'] == {'total': 2, 'actions': {'CREATE_BOOKING': 2},
+                                                       'days': {'01': {'CREATE_BOOKING': 1}, '08': {'CREATE_BOOKING': 1}}}
+        assert [r['id'] for r in archive.query('2024-03-01', '2024-04-30')] == ['b', 'c', 'a']
+        assert archive.month(2024, 4)[0]['timestamp'] == '2024-04-01T01:30:00+08:00'
+        assert [r['id'] for r in archive.month(2024, 3, action='CREATE_BOOKING', user='王')] == ['a']
+        assert [r['id'] for r in archive.month(2024, 3, user='DEV_1')] == ['c']
+        assert archive.counts('2024-03-02', '2024-04-30') == {'CREATE_BOOKING': 1, 'FORCE_DELETE_BOOKING': 1}
+    assert not list(out.glob('.*'))                                     # 暫存檔都已清除
+
+
+def test_rebuild_merges_by_id_and_is_byte_identical(tmp_path):
+    out = tmp_path / 'archive'
+    build(LOGS, out, before=BEFORE)
+    first = (out / 'audit-2024-03.jsonl.gz').read_bytes()
+    build(LOGS, out, before=BEFORE)
+    assert (out / 'audit-2024-03.jsonl.gz').read_bytes() == first
+
+    build([dict(LOGS[0], details={'booker': '王老師', 'room': '森林小屋'}), dict(LOGS[0], id='f')] * 2,
+          out, before=BEFORE)
+    with AuditArchive(out) as archive:
+        march = archive.month(2024, 3)
+        assert sorted(r['id'] for r in march) == ['a', 'c', 'f']
+        assert next(r for r in march if r['id'] == 'a')['details']['room'] == '森林小屋'
+        assert archive.rollup['months']['2024-03']['total'] == 3
+
+
+def test_cutoff_keeps_one_full_school_year():
+    assert audit_cutoff(date(2026, 10, 18)) == datetime(2025, 8, 1, tzinfo=timezone(timedelta(hours=8)))
+    assert audit_cutoff(date(2026, 7, 31)).date() == date(2024, 8, 1)
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_stream_build_and_prune(tmp_path):
+    client = Firestore(f'demo-{uuid.uuid4().hex[:8]}')
+    start = datetime(2024, 2, 20, tzinfo=timezone.utc)
+    try:
+        writes = [client.create_write('audit_logs', f'log{i:04d}', {'action': 'CREATE_BOOKING' if i % 3 else 'EXPORT_CSV'})
+                  for i in range(700)]
+        for i, w in enumerate(writes):
+            # 每 5 筆同一時間戳, 驗證游標以 __name__ 分辨同時間的文件
+            w['update']['fields']['timestamp'] = {'timestampValue': (start + timedelta(hours=i // 5 * 6))
+                                                  .isoformat().replace('+00:00', 'Z')}
+        client.commit(writes[:500])
+        client.commit(writes[500:])
+
+        streamed = [d['id'] for d in iter_firestore(client, BEFORE, page_size=64)]
+        assert streamed == sorted(streamed) and len(set(streamed)) == 700
+
+        out = tmp_path / 'archive'
+        cutoff = datetime(2024, 4, 1, tzinfo=timezone(timedelta(hours=8)))
+        archived = build(iter_firestore(client, cutoff, page_size=64), out, before=cutoff)['archived']
+        dry = prune(client, out, cutoff)
+        assert dry == {'scanned': archived, 'archived': archived, 'unarchived': 0, 'commits': 0}
+
+        (out / 'audit-2024-03.jsonl.gz').unlink()                      # 未封存的月份不會被刪
+        done = prune(client, out, cutoff, batch_size=100, confirm=True)
+        assert done['archived'] + done['unarchived'] == archived and done['unarchived'] > 0
+        left = client.run_query('audit_logs', [('timestamp', '<', cutoff)])
+        assert len(left) == done['unarchived']
+        assert client.run_query('audit_logs', [('action', '==', 'PRUNE_AUDIT_LOGS')])[0]['details']['deleted'] == done['archived']
+    finally:
+        client.close()
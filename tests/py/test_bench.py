@@ -0,0 +1,40 @@
+"""
+效能基準測試 — 合成樹放大後, 以名稱定位的 edit 仍須落在原檔宣告; 退步判斷需超過容忍度與雜訊門檻
+"""
+from tools.bench import compare, scale_css, scale_html, scale_js
+from tools.jsindex import JsIndex
+
+JS = '''function switchView(mode) {
+    render(`${mode}`);
+}
+const VIEWS = ['week', 'month'];
+'''
+
+
+def test_scaled_js_keeps_symbol_anchors_on_original():
+    scaled = scale_js(JS, 3)
+    idx = JsIndex.build(scaled)
+    assert scaled.count('render(') == 3                     # 錨點密度隨大小放大
+    assert not idx.duplicates()
+    assert idx.find('switchView').start == len(scaled) - len(JS)
+    assert idx.find('VIEWS__b2') is not None
+
+
+def test_scaled_html_and_css():
+    html = '<html><body class="x">\n<main></main>\n</body></html>'
+    assert scale_html(html, 3).count('<main>') == 3
+    assert scale_html(html, 3).count('</body>') == 1
+    assert scale_css('\ufeff.a {}\n', 2) == '.a {}\n\n\ufeff.a {}\n'
+
+
+def test_compare_reports_only_real_regressions():
+    def result(update_js, update_files):
+        return {'results': {'10x': {'entries': {
+            'add_history_batch.update_js': {'cold': update_js},
+            'update_files': {'cold': update_files},
+        }}}}
+
+    baseline = result(0.100, 0.002)
+    assert compare(result(0.110, 0.004), baseline) == []    # 10% 與 2 ms 都在容忍範圍內
+    assert compare(result(0.200, 0.004), baseline) == [
+        ('10x', 'add_history_batch.update_js', 'cold', 0.100, 0.200)]
@@ -0,0 +1,144 @@
+"""
+預約串流匯出測試 — CSV 格式同 executeExport 且 analytics 可讀回、系列日期依序併入、中斷後續傳與一次跑完位元組相同、
+記憶體不隨筆數成長; emulator 游標分頁
+"""
+import json
+import os
+import tracemalloc
+import uuid
+
+import pytest
+
+from tools.analytics import read_csv
+from tools.bulkexport import export, state_path
+from tools.conflicts import date_ordinal
+from tools.firestore import Firestore
+from tools.series import day_bits
+
+PERIODS = {'period1': '第一節', 'period2': '第二節', 'lunch': '午休'}
+DOCS = [
+    {'id': 'b1', 'date': '2025/03/05', 'room': '禮堂', 'periods': ['period1', 'period2'], 'booker': '王老師',
+     'reason': '社團, 成果發表', 'createdAt': '2025-03-04T16:03:22.123456789Z', 'deviceId': 'dev_1'},
+    {'id': 'b2', 'date': '2025/03/05', 'room': '未知場地', 'periods': ['lunch', 'x9'], 'booker': '',
+     'reason': '說 "你好"\n第二行'},
+    {'id': 'a9', 'date': '2025/03/07', 'room': '電腦教室', 'periods': ['period2'], 'booker': '李老師',
+     'createdAt': '2025-03-01T01:00:00Z'},
+]
+
+
+class PagedFirestore:
+    """依 date desc + id desc 排序、以 start_after 游標分頁的替身; fail_after 筆後模擬連線中斷"""
+
+    def __init__(self, docs, fail_after=None, series=()):
+        self.docs = sorted(docs, key=lambda d: (d['date'], d['id']), reverse=True)
+        self.series = list(series)
+        self.fail_after = fail_after
+        self.yielded = 0
+
+    def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+        if collection == 'bookingSeries':
+            yield from (dict(s) for s in self.series if all(s['endOrdinal'] >= v for _, _, v in filters))
+            return
+        docs = [d for d in self.docs if all(d['date'] >= v if op == '>=' else d['date'] <= v for _, op, v in filters)]
+        if start_after is not None:
+            docs = [d for d in docs if (d['date'], d['id']) < tuple(start_after)]
+        for doc in docs:
+            if self.fail_after is not None and self.yielded >= self.fail_after:
+                raise ConnectionResetError('模擬中斷')
+            self.yielded += 1
+            yield dict(doc)
+
+
+def test_csv_matches_execute_export(tmp_path):
+    out = tmp_path / 'export.csv'
+    assert export(PagedFirestore(DOCS), out, period_names=PERIODS) == {'rows': 3, 'resumed': 0}
+    assert out.read_bytes().decode('utf-8') == (
+        '\ufeff預約編號,預約日期,場地名稱,預約節次,預約者姓名,預約理由/用途,建立時間,操作裝置ID,狀態\n'
+        'a9,2025/03/07,電腦教室,第二節,李老師,無,2025/3/1 09:00:00,Unknown,有效\n'
+        'b2,2025/03/05,禮堂,午休 & x9,未知,"說 ""你好""\n第二行",未知時間,Unknown,有效\n'
+        'b1,2025/03/05,禮堂,第一節 & 第二節,王老師,"社團, 成果發表",2025/3/5 00:03:22,dev_1,有效')
+    assert not state_path(out).exists()
+    cols = read_csv(out)                                                # tools/analytics 可直接讀
+    assert cols.ids == ['a9', 'b2', 'b1'] and all(cols.valid())
+    assert cols.created[0] == 1740790800.0
+
+
+def test_series_dates_are_merged(tmp_path):
+    days = [date_ordinal(d) for d in ('2025/03/03', '2025/03/05', '2025/03/10')]
+    series = {'id': 'ser_a', 'room': '禮堂', 'periods': ['lunch'], 'booker': '陳主任', 'reason': '社團',
+              'createdAt': '2025-02-20T00:00:00Z', 'startOrdinal': days[0], 'endOrdinal': days[-1],
+              'dayBits': day_bits(days, days[0])}
+    out = tmp_path / 'series.csv'
+    assert export(PagedFirestore(DOCS, series=[series]), out, '2025-03-04', '2025-03-31',
+                  period_names=PERIODS)['rows'] == 5
+    cols = read_csv(out)
+    assert cols.ids == [f'ser_a@{days[2]}', 'a9', f'ser_a@{days[1]}', 'b2', 'b1']       # date desc, 同日依 id desc
+
+    full, part = tmp_path / 'full.ndjson', tmp_path / 'part.ndjson'
+    export(PagedFirestore(DOCS, series=[series]), full, period_names=PERIODS)
+    with pytest.raises(ConnectionResetError):
+        export(PagedFirestore(DOCS, fail_after=1, series=[series]), part, page_size=2, period_names=PERIODS)
+    assert json.loads(state_path(part).read_text())['cursor'] == ['2025/03/07', 'a9']
+    summary = export(PagedFirestore(DOCS, series=[series]), part, page_size=2, resume=True, period_names=PERIODS)
+    assert summary == {'rows': 6, 'resumed': 2} and part.read_bytes() == full.read_bytes()
+
+
+def test_resume_after_interruption_is_byte_identical(tmp_path):
+    docs = [{'id': f'd{i:04d}', 'date': f'2025/{i % 12 + 1:02d}/{i % 28 + 1:02d}', 'periods': ['period1'],
+             'booker': f'老師{i}'} for i in range(500)]
+    for name in ('full.csv', 'full.ndjson'):
+        full, part = tmp_path / name, tmp_path / f'part-{name}'
+        export(PagedFirestore(docs), full, '2025-02-01', '2025-11-30', page_size=64, period_names=PERIODS)
+
+        with pytest.raises(ConnectionResetError):
+            export(PagedFirestore(docs, fail_after=150), part, '2025-02-01', '2025-11-30', page_size=64,
+                   period_names=PERIODS)
+        assert json.loads(state_path(part).read_text())['rows'] == 128
+        with pytest.raises(ValueError):                                 # 區間不同不可續傳
+            export(PagedFirestore(docs), part, '2025-01-01', '2025-11-30', page_size=64, resume=True,
+                   period_names=PERIODS)
+        client = PagedFirestore(docs)
+        summary = export(client, part, '2025-02-01', '2025-11-30', page_size=64, resume=True, period_names=PERIODS)
+        assert summary['resumed'] == 128 and client.yielded == summary['rows'] - 128
+        assert part.read_bytes() == full.read_bytes()
+        assert not state_path(part).exists()
+
+
+def test_memory_is_flat(tmp_path):
+    class Synthetic:
+        def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+            if collection == 'bookingSeries':
+                return
+            for i in range(self.count):
+                yield {'id': f'id{i:06d}', 'date': '2025/03/05', 'periods': ['period1'], 'booker': '王老師' * 5,
+                       'reason': '段考' * 20, 'createdAt': '2025-03-04T16:03:22Z'}
+
+    def peak(count):
+        client = Synthetic()
+        client.count = count
+        tracemalloc.start()
+        export(client, tmp_path / f'{count}.csv', page_size=500, period_names=PERIODS)
+        _, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return top
+    small, large = peak(2000), peak(40000)
+    assert (tmp_path / '40000.csv').stat().st_size > 20 * (tmp_path / '2000.csv').stat().st_size * 0.9
+    assert large < small * 1.5
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_cursor_pagination(tmp_path):
+    client = Firestore(f'demo-{uuid.uuid4().hex[:8]}')
+    try:
+        writes = [client.create_write('bookings', f'bk{i:04d}', {'date': f'2025/03/{i % 20 + 1:02d}', 'room': '禮堂',
+                                                                 'periods': ['period1'], 'booker': '王老師'})
+                  for i in range(600)]
+        client.commit(writes[:500])
+        client.commit(writes[500:])
+        out = tmp_path / 'march.ndjson'
+        assert export(client, out, '2025-03-03', '2025-03-12', page_size=64, period_names=PERIODS)['rows'] == 300
+        rows = [json.loads(line) for line in out.read_text(encoding='utf-8').splitlines()]
+        keys = [(r['date'], r['id']) for r in rows]
+        assert keys == sorted(keys, reverse=True) and len(set(keys)) == 300
+    finally:
+        client.close()
@@ -0,0 +1,173 @@
+"""
+批次匯入測試 — 規則展開與檢查、既有預約系列展開後參與衝突檢查、每條規則寫成一份系列 (跨度達上限才逐日)、
+重跑略過已寫入的系列 (離線); 設定 FIRESTORE_EMULATOR_HOST 時對 emulator 實際寫入、重跑冪等、衝突時不寫
+"""
+import os
+import uuid
+
+import pytest
+
+from tools.analytics import app_constants
+from tools.bulkimport import RULE_HEADERS, RuleError, check, documents, import_rules, load_state, plan, read_rules
+from tools.conflicts import date_ordinal
+from tools.firestore import Firestore, decode_value, encode_value
+from tools.series import day_bits, expand, fold_plan, series_ordinals
+
+HEADER = ','.join(RULE_HEADERS)
+
+
+def _rules(tmp_path, *rows):
+    path = tmp_path / 'rules.csv'
+    path.write_text('\ufeff' + '\n'.join([HEADER, *rows]) + '\n', encoding='utf-8')
+    return read_rules(path)
+
+
+def _labels():
+    _, periods = app_constants()
+    return list(periods.values()), {pid: name for name, pid in periods.items()}
+
+
+def test_expand_weekly_rules(tmp_path):
+    rules = _rules(tmp_path,
+                   '禮堂,三,第五節、第六節,2025-09-01,2025-09-30,王老師,社團,1',
+                   '禮堂,週五,period1;lunch,2025/09/01,2025/09/30,李老師,,2')
+    assert rules[0].weekday == 2 and rules[0].periods == ('period5', 'period6')
+    assert rules[1].periods == ('period1', 'lunch')
+    docs = plan(rules)
+    assert [d['date'] for d in docs] == ['2025/09/03', '2025/09/10', '2025/09/17', '2025/09/24',
+                                         '2025/09/05', '2025/09/19']
+    assert len({d['id'] for d in docs}) == 6 and plan(rules) == docs          # id 由內容決定
+    assert len({d['batchId'] for d in docs}) == 2 and len({d['seriesId'] for d in docs}) == 2
+    assert docs[0]['id'] == f"{docs[0]['seriesId']}@{docs[0]['dayOrdinal']}"
+    assert (docs[0]['weekKey'], docs[0]['monthKey'], docs[4]['weekKey']) == ('2025/09/01', '2025/09', '2025/09/01')
+
+
+def test_one_series_per_rule(tmp_path):
+    period_ids, _ = _labels()
+    rules = _rules(tmp_path,
+                   '禮堂,三,第五節、第六節,2025-09-01,2026-01-31,王老師,社團,1',
+                   '禮堂,一,第一節,2025-09-01,2026-09-07,李老師,升旗,1',           # 跨 372 天: 逐日
+                   '禮堂,二,第一節,2025-09-01,2025-09-05,陳主任,,1')              # 只有一天: 逐日
+    docs = plan(rules)
+    writes = documents(docs, period_ids)
+    assert [(c, n) for c, _, _, n in writes] == [('bookings', 1)] * (54 + 1) + [('bookingSeries', 22)]
+    # 逐日文件: firestore.rules 上限 12 個欄位 (另加寫入時的 createdAt)
+    assert {k for k in writes[0][2]} | {'createdAt'} == {
+        'date', 'room', 'periods', 'booker', 'reason', 'deviceId', 'batchId', 'createdAt',
+        'dayOrdinal', 'weekKey', 'monthKey'}
+    # 系列與 series fold 折疊同一批逐日文件的結果相同 (id、dayBits、periodMask)
+    _, sid, data, _ = writes[-1]
+    folded = [{**d, 'id': f'old_{i}'} for i, d in enumerate(docs) if d.get('seriesId') == sid]
+    [(fold_sid, fold_data, _)] = fold_plan(folded, period_ids)[0]
+    assert sid == fold_sid and data == {k: v for k, v in fold_data.items() if k != 'foldedFrom'}
+    assert expand({**data, 'id': sid}) == [{k: v for k, v in d.items() if k != 'line'}
+                                           for d in docs if d.get('seriesId') == sid]
+
+
+def test_invalid_rows_are_all_reported(tmp_path):
+    with pytest.raises(RuleError) as e:
+        _rules(tmp_path,
+               '不存在的場地,一,第一節,2025-09-01,2025-09-30,王老師,,',
+               '禮堂,八,第一節,2025-09-01,2025-09-30,王老師,,',
+               '禮堂,一,第九節,2025-09-01,2025-09-30,王老師,,')
+    assert [line.split(':')[0] for line in str(e.value).splitlines()] == ['第 2 列', '第 3 列', '第 4 列']
+
+
+def test_check_reports_every_kind_of_conflict(tmp_path):
+    rules = _rules(tmp_path,
+                   '禮堂,一,第一節,2025-09-01,2025-09-29,王老師,社團,1',
+                   '禮堂,一,第一節、第二節,2025-09-22,2025-09-22,李老師,考試,1')
+    docs = plan(rules)
+    state = {'禮堂': (
+        [{'id': 'x', 'room': '禮堂', 'date': '2025/09/08', 'periods': ['period1'], 'booker': '陳主任'},
+         {'id': docs[0]['id'], 'room': '禮堂', 'date': '2025/09/01', 'periods': ['period1'], 'booker': '王老師'}],
+        ['mon_period2'],
+        [{'room': '禮堂', 'lockBookings': True, 'startDate': '2025/09/15', 'endDate': '2025/09/15', 'message': '校慶'}],
+    )}
+    pending, skipped, problems = check(docs, state, *_labels())
+    assert skipped == 1                                                      # 前次已寫入
+    assert problems == ['第 2 列 2025/09/08 禮堂 第一節 已被 陳主任 預約',
+                        '第 2 列 2025/09/15 禮堂 已被公告鎖定: 校慶',
+                        '第 3 列 2025/09/22 禮堂 第二節 為固定禁排時段']
+    assert [d['date'] for d in pending] == ['2025/09/22', '2025/09/29']
+
+    state['禮堂'] = ([], [], [])
+    _, _, problems = check(docs, state, *_labels())
+    assert problems == ['第 3 列 2025/09/22 禮堂 第一節 與第 2 列重疊']
+
+
+class SeriesClient:
+    """只回應 load_state 的查詢: 一般預約為空, bookingSeries 依 room / endOrdinal 篩選"""
+
+    def __init__(self, series):
+        self.series = series
+
+    def run_query(self, collection, filters):
+        if collection != 'bookingSeries':
+            return []
+        (_, _, room), (_, _, lo) = filters
+        return [s for s in self.series if s['room'] == room and s['endOrdinal'] >= lo]
+
+    def get(self, collection, doc_id):
+        return None
+
+
+def test_existing_series_conflicts(tmp_path, monkeypatch):
+    monkeypatch.setattr('tools.bulkimport.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    rules = _rules(tmp_path, '禮堂,一,第一節,2025-09-01,2025-09-29,王老師,社團,1')
+    docs = plan(rules)
+    days = [date_ordinal(d) for d in ('2025/08/25', '2025/09/08', '2025/10/06')]
+    series = {'id': 'ser_a', 'room': '禮堂', 'periods': ['period1'], 'booker': '陳主任', 'startOrdinal': days[0],
+              'endOrdinal': days[-1], 'dayBits': day_bits(days, days[0])}
+    other = {**series, 'id': 'ser_b', 'room': '視聽教室'}
+    state = load_state(SeriesClient([series, other]), docs)
+    assert [b['id'] for b in state['禮堂'][0]] == [f'ser_a@{days[1]}']    # 只展開匯入範圍內的日期
+    pending, _, problems = check(docs, state, *_labels())
+    assert problems == ['第 2 列 2025/09/08 禮堂 第一節 已被 陳主任 預約']
+    assert '2025/09/08' not in [d['date'] for d in pending]
+
+
+def test_rerun_skips_written_series(tmp_path, monkeypatch):
+    monkeypatch.setattr('tools.bulkimport.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    period_ids, labels = _labels()
+    rules = _rules(tmp_path, '禮堂,一,第一節,2025-09-01,2025-09-29,王老師,社團,1')
+    docs = plan(rules)
+    [(_, sid, data, _)] = documents(docs, period_ids)
+    # 前次寫入後取消了 09/08: 展開少一天, 重跑也不補回
+    ordinals = [o for o in series_ordinals(data) if o != date_ordinal('2025/09/08')]
+    written = {**data, 'id': sid, 'dayBits': day_bits(ordinals, data['startOrdinal'])}
+    state = load_state(SeriesClient([written]), docs)
+    pending, skipped, problems = check(docs, state, period_ids, labels)
+    assert (pending, skipped, problems) == ([], 5, [])
+
+
+def test_value_round_trip():
+    data = {'s': '禮堂', 'n': 3, 'f': 1.5, 'b': False, 'none': None, 'list': ['a', 1], 'map': {'k': [True]}}
+    assert {k: decode_value(encode_value(v)) for k, v in data.items()} == data
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_import(tmp_path):
+    project = f'demo-{uuid.uuid4().hex[:8]}'
+    rooms, _ = app_constants()
+    rows = [f'{room},{day},第{n}節,2025-09-01,2026-01-16,教師{i},社團,1'
+            for i, (room, day, n) in enumerate((r, d, n) for r in rooms[:6] for d in '一二三四五' for n in '一二三四')]
+    rules = _rules(tmp_path, *rows)
+    client = Firestore(project)
+    try:
+        summary = import_rules(client, rules, batch_size=100, connections=4)
+        assert not summary['conflicts'] and not summary['errors']
+        assert summary['written'] == summary['planned'] > 500 and summary['series'] == len(rules)
+        stored = client.run_query('bookingSeries', [('room', '==', rooms[0])])
+        assert len(stored) == len(rules) // 6 and not client.run_query('bookings', [('room', '==', rooms[0])])
+        assert sum(len(series_ordinals(s)) for s in stored) == summary['planned'] // 6
+        assert all(s['createdAt'] and s['deviceId'] == 'bulk_import' for s in stored)
+
+        again = import_rules(client, rules)
+        assert again['skipped'] == summary['planned'] and again['written'] == 0
+
+        clash = _rules(tmp_path, f'{rooms[0]},一,第一節,2025-09-01,2025-09-08,另一位老師,,')
+        blocked = import_rules(client, clash)
+        assert blocked['conflicts'] and blocked['written'] == 0
+    finally:
+        client.close()
@@ -0,0 +1,141 @@
+"""
+app.js 拆分測試 — 啟動路徑與同步使用的函式留在關鍵區塊、事件處理器才延遲、跨 chunk 共用移到 shared、node 實際載入 stub
+"""
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from tools import ROOT
+from tools.codesplit import CRITICAL_ROOTS, analyze, split, write
+from tools.fingerprint import fingerprint
+from tools.jsindex import JsIndex
+from tools.patching import read_text
+
+SOURCE = '''/**
+ * 測試用 app.js
+ */
+const state = { opened: 0 };
+
+function formatDate(d) { return `${d}`; }
+function renderCalendar() { return formatDate('x'); }
+function loadBookingsFromFirebase() { renderCalendar(); }
+async function submitBooking() { await loadBookingsFromFirebase(); }
+
+// ===== 統計功能 =====
+
+/**
+ * 開啟統計
+ */
+function openStatsModal() { state.opened += 1; return statsTitle(); }
+function statsTitle() { return `統計 ${state.opened}`; }
+
+// ===== 進階搜尋功能 =====
+
+function openSearchModal(id) { return statsTitle() + rowHtml(id); }
+function onSearchKey(e) { e.preventDefault(); }
+
+// ===== 其他 =====
+
+function summarize(list) { return list.length; }
+function rowHtml(id) { return `<button onclick="openSearchModal(${id})">`; }
+
+function initEventListeners() {
+    document.getElementById('btnStats').addEventListener('click', openStatsModal);
+    document.getElementById('btnSearch').addEventListener('click', () => openSearchModal(1));
+    document.addEventListener('keydown', onSearchKey);
+    state.count = summarize([1, 2]);
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    initEventListeners();
+    loadBookingsFromFirebase();
+});
+'''
+
+NODE_HARNESS = '''
+const vm = require('vm');
+const files = %s;
+const listeners = {};
+globalThis.window = globalThis;
+globalThis.addEventListener = () => {};
+globalThis.document = {
+    head: { appendChild(s) { setTimeout(() => { vm.runInThisContext(files[s.src]); s.onload(); }); } },
+    createElement: () => ({}),
+    getElementById: (id) => ({ addEventListener: (type, fn) => { listeners[id] = fn; } }),
+    addEventListener: (type, fn) => { listeners[type] = fn; },
+};
+vm.runInThisContext(files['app.js']);
+listeners.DOMContentLoaded();
+(async () => {
+    const first = listeners.btnStats();                 // stub: 載入 stats + shared 後轉呼叫
+    const out = { first: await first, search: await listeners.btnSearch() };
+    out.second = openStatsModal();                      // chunk 已覆蓋 stub → 同步回傳
+    out.count = state.count;
+    process.stdout.write(JSON.stringify(out));
+})();
+'''
+
+
+def _placement(analysis):
+    return {s.name: chunk for chunk, syms in analysis.chunks.items() for s in syms}
+
+
+def test_classifies_startup_sync_and_handler_references():
+    analysis = analyze(SOURCE)
+    critical = {n for n in analysis.critical if n in analysis.functions}
+    assert critical == {'formatDate', 'renderCalendar', 'loadBookingsFromFirebase', 'submitBooking',
+                        'initEventListeners', 'summarize', 'onSearchKey'}
+    # statsTitle 被 stats 與 search 同步使用 → shared; rowHtml 只被 search 使用但宣告在其他區段 → shared
+    assert _placement(analysis) == {'openStatsModal': 'stats', 'openSearchModal': 'search',
+                                    'statsTitle': 'shared', 'rowHtml': 'shared'}
+    assert analysis.deps == {'stats': ['shared'], 'search': ['shared'], 'shared': []}
+    assert analysis.explain('summarize')[:2] == ['summarize', 'initEventListeners']
+
+
+def test_split_keeps_every_declaration_once():
+    critical, files, analysis = split(SOURCE)
+    assert critical.startswith('/**\n * 測試用 app.js\n */\n// ===== 延遲載入區塊')
+    assert "function openStatsModal() { return callLazy('stats', 'openStatsModal', this, arguments); }" in critical
+    assert '開啟統計' not in critical
+    chunk_source = '\n'.join(data.decode('utf-8') for data in files.values())
+    assert chunk_source.count('function statsTitle()') == 1 and '開啟統計' in chunk_source
+    assert sorted(n.split('.')[1] for n in files) == ['search', 'shared', 'stats']
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行拆分後的 app.js')
+def test_stubs_load_chunks_in_node():
+    critical, files, _ = split(SOURCE)
+    files = {name: data.decode('utf-8') for name, data in files.items()}
+    files['app.js'] = critical
+    proc = subprocess.run(['node', '-e', NODE_HARNESS % json.dumps(files, ensure_ascii=False)],
+                          capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == {'first': '統計 1', 'search': '統計 1<button onclick="openSearchModal(1)">',
+                                       'second': '統計 2', 'count': 2}
+
+
+def test_app_js_split_and_precache(tmp_path):
+    for name in ('app.js', 'index.html', 'sw.js'):
+        shutil.copy2(ROOT / name, tmp_path / name)
+    source, _ = read_text(ROOT / 'app.js')
+    critical, files, analysis, results = write(tmp_path)
+    assert [r.status for r in results] == ['applied']
+    for name in CRITICAL_ROOTS + ('formatDate', 'getMonday', 'showToast'):
+        assert name in analysis.critical
+    placement = _placement(analysis)
+    assert {'buildHeatmap', 'openStatsModal', 'exportToCSV', 'toggleBatchDate'} <= set(placement)
+    assert len(critical) < len(source) / 2
+    # 原始每個函式宣告恰好出現一次 (關鍵區塊或 chunk), 其餘是 stub
+    idx = JsIndex.build(critical)
+    assert all(idx.find(name) for name in placement)
+    chunks = '\n'.join(data.decode('utf-8') for data in files.values())
+    assert all(f'function {name}(' in chunks for name in placement)
+    assert (tmp_path / 'app.js').read_bytes().count(b'\r\n') > 1000          # 保留 CRLF
+
+    fingerprint(tmp_path)
+    sw = (tmp_path / 'sw.js').read_text(encoding='utf-8')
+    assert all(f"'./{name}'" in sw for name in files)
+    if shutil.which('node'):
+        for name in [*files, 'app.js']:
+            subprocess.run(['node', '--check', str(tmp_path / name)], check=True)
@@ -0,0 +1,78 @@
+"""
+冷封存測試 — 月分區往返不失真、重複建立冪等、Firestore 匯出的預約系列展開封存、查詢結果與 loadHistoryData 的 Firestore 查詢一致
+"""
+import json
+from datetime import date
+
+from tools.coldarchive import ColdArchive, build, retention_cutoff
+from tools.conflicts import date_ordinal
+from tools.firestore import encode_value
+from tools.series import day_bits
+
+DOCS = [
+    {'id': 'a', 'date': '2022/03/01', 'room': '禮堂', 'periods': ['period1', 'period2'], 'booker': '王老師',
+     'reason': '朝會', 'createdAt': '2022-02-20T01:00:00Z'},
+    {'id': 'b', 'date': '2022/03/15', 'room': '森林小屋', 'periods': ['lunch'], 'booker': '李老師',
+     'reason': '社團', 'createdAt': None},
+    {'id': 'c', 'date': '2022/03/31', 'room': '禮堂', 'periods': [], 'booker': '王老師',
+     'reason': '已取消', 'createdAt': None},
+    {'id': 'd', 'date': '2022/04/02', 'room': '禮堂', 'periods': ['period8'], 'booker': '陳主任',
+     'reason': '', 'createdAt': '2022-04-01T08:30:00+08:00'},
+    {'id': 'e', 'date': '2024/09/01', 'room': '禮堂', 'periods': ['period1'], 'booker': '王老師',
+     'reason': '未過期', 'createdAt': None},
+]
+
+
+def _source(tmp_path, docs):
+    path = tmp_path / 'archive.json'
+    path.write_text(json.dumps({'bookings': docs}, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+def test_month_query_round_trips_and_skips_unexpired(tmp_path):
+    out = tmp_path / 'cold'
+    assert build([_source(tmp_path, DOCS)], out, before=date(2023, 8, 1)) == {'2022-03': 3, '2022-04': 1}
+    with ColdArchive(out) as archive:
+        march = archive.month(2022, 3)
+        assert [b['id'] for b in march] == ['b', 'a']                  # 日期遞減, 已取消不列出
+        assert march[1]['periods'] == ['period1', 'period2']
+        assert march[1]['createdAt'] == '2022-02-20T09:00:00+08:00'
+        assert march[0]['createdAt'] is None
+        assert [b['id'] for b in archive.month(2022, 3, room='森林小屋')] == ['b']
+        assert [b['id'] for b in archive.query('2022-03-10', '2022-04-30')] == ['d', 'b']
+        assert archive.month(2021, 1) == []
+
+
+def test_rebuild_merges_by_id_and_is_idempotent(tmp_path):
+    out = tmp_path / 'cold'
+    build([_source(tmp_path, DOCS)], out, before=date(2023, 8, 1))
+    first = (out / 'bookings-2022-03.bkca').read_bytes()
+    build([_source(tmp_path, DOCS)], out, before=date(2023, 8, 1))
+    assert (out / 'bookings-2022-03.bkca').read_bytes() == first
+
+    changed = [dict(DOCS[1], reason='社團改期'), dict(DOCS[0], id='f', date='2022/03/20')]
+    build([_source(tmp_path, changed)], out, before=date(2023, 8, 1))
+    with ColdArchive(out) as archive:
+        march = archive.month(2022, 3)
+    assert [(b['id'], b['reason']) for b in march] == [('f', '朝會'), ('b', '社團改期'), ('a', '朝會')]
+
+
+def test_series_in_firestore_export_are_archived(tmp_path):
+    days = [date_ordinal(d) for d in ('2022/03/28', '2022/04/04', '2022/09/05')]
+    series = {'room': '禮堂', 'periods': ['period3'], 'booker': '林主任', 'reason': '週會', 'startOrdinal': days[0],
+              'endOrdinal': days[-1], 'dayBits': day_bits(days, days[0])}
+    source = tmp_path / 'export.json'
+    source.write_text(json.dumps({'documents': [
+        {'name': 'projects/x/databases/(default)/documents/bookingSeries/ser_a',
+         'fields': {k: encode_value(v) for k, v in series.items()}}]}, ensure_ascii=False), encoding='utf-8')
+    out = tmp_path / 'cold'
+    assert build([source], out, before=date(2022, 8, 1)) == {'2022-03': 1, '2022-04': 1}   # 未過期的那天不封存
+    with ColdArchive(out) as archive:
+        hits = archive.query('2022/03/01', '2022/04/30')
+    assert [(b['id'], b['date'], b['periods']) for b in hits] == [
+        (f'ser_a@{days[1]}', '2022/04/04', ['period3']), (f'ser_a@{days[0]}', '2022/03/28', ['period3'])]
+
+
+def test_retention_cutoff_keeps_three_full_school_years():
+    assert retention_cutoff(date(2026, 10, 18)) == date(2023, 8, 1)
+    assert retention_cutoff(date(2026, 7, 31)) == date(2022, 8, 1)
@@ -0,0 +1,139 @@
+"""
+元件編譯器測試 — 只重建 hash 有變的片段、原地更新不重複插入、移除片段還原錨點、缺錨點整組不寫、檔案監看
+"""
+import sys
+import threading
+import time
+
+import pytest
+
+from tools.components import Compiler, Inotify, Poller, load_component
+from tools.cssprune import collect_usage
+
+MANIFEST = '''id = "demo"
+
+[[fragment]]
+id = "button"
+file = "button.html"
+target = "index.html"
+after = "<main>"
+
+[[fragment]]
+id = "title"
+file = "title.html"
+target = "index.html"
+replace = "<h1>舊標題</h1>"
+
+[[fragment]]
+id = "styles"
+file = "styles.css"
+target = "styles.css"
+
+[[fragment]]
+id = "init"
+file = "init.js"
+target = "app.js"
+symbol = "init"
+where = "end"
+'''
+
+FILES = {
+    'button.html': '\n<button id="demo"></button>',
+    'title.html': '<h1>新標題</h1>',
+    'styles.css': '.demo {\n    color: red;\n}\n\n@media (max-width: 768px) {\n    .demo {\n        color: blue;\n    }\n}\n',
+    'init.js': '    initDemo();\n',
+}
+
+
+def _tree(tmp_path):
+    (tmp_path / 'index.html').write_text('<body>\n<main>\n<h1>舊標題</h1>\n</main>\n</body>\n', encoding='utf-8')
+    (tmp_path / 'styles.css').write_text('body {\n    margin: 0;\n}\n', encoding='utf-8')
+    (tmp_path / 'app.js').write_bytes(b'function init() {\r\n    start();\r\n}\r\n')
+    base = tmp_path / 'components' / 'demo'
+    base.mkdir(parents=True)
+    (base / 'component.toml').write_text(MANIFEST, encoding='utf-8')
+    for name, text in FILES.items():
+        (base / name).write_text(text, encoding='utf-8')
+    return base
+
+
+def _read(tmp_path, name):
+    return (tmp_path / name).read_bytes().decode('utf-8')
+
+
+def test_first_build_then_noop(tmp_path):
+    _tree(tmp_path)
+    results = Compiler(tmp_path).build()
+    assert {r.status for r in results} == {'applied'}
+    assert _read(tmp_path, 'index.html') == '<body>\n<main>\n<button id="demo"></button>\n<h1>新標題</h1>\n</main>\n</body>\n'
+    assert _read(tmp_path, 'app.js') == 'function init() {\r\n    start();\r\n    initDemo();\r\n}\r\n'
+    assert '.demo {' in _read(tmp_path, 'styles.css')
+    # 狀態檔在新的 Compiler 也有效: 沒變就不產生 patch、不碰任何 target
+    assert Compiler(tmp_path).build() == []
+
+
+def test_only_changed_fragments_rebuild_in_place(tmp_path):
+    base = _tree(tmp_path)
+    Compiler(tmp_path).build()
+    html = (tmp_path / 'index.html').stat().st_mtime_ns
+    (base / 'init.js').write_text('    initDemo({ fast: true });\n', encoding='utf-8')
+    (base / 'styles.css').write_text(FILES['styles.css'].replace('red', 'green'), encoding='utf-8')
+
+    results = Compiler(tmp_path).build()
+    assert sorted(r.patch.id for r in results) == ['demo/init', 'demo/styles']
+    styles = next(r.patch for r in results if r.patch.id == 'demo/styles')
+    assert [(e.rule, e.context) for e in styles.edits] == [('.demo', ())]    # 只動有變的那條規則
+    assert _read(tmp_path, 'app.js') == 'function init() {\r\n    start();\r\n    initDemo({ fast: true });\r\n}\r\n'
+    css = _read(tmp_path, 'styles.css')
+    assert 'color: green' in css and 'color: red' not in css and css.count('.demo {') == 2
+    assert (tmp_path / 'index.html').stat().st_mtime_ns == html
+
+
+def test_removed_fragments_are_undone(tmp_path):
+    base = _tree(tmp_path)
+    Compiler(tmp_path).build()
+    manifest = MANIFEST.split('[[fragment]]')
+    (base / 'component.toml').write_text('[[fragment]]'.join(manifest[:2] + manifest[3:]), encoding='utf-8')
+    (base / 'styles.css').write_text('.demo {\n    color: red;\n}\n', encoding='utf-8')
+
+    results = Compiler(tmp_path).build()
+    assert {r.status for r in results} == {'applied'}
+    assert _read(tmp_path, 'index.html') == '<body>\n<main>\n<button id="demo"></button>\n<h1>舊標題</h1>\n</main>\n</body>\n'
+    css = _read(tmp_path, 'styles.css')
+    assert 'color: red' in css and 'color: blue' not in css
+    assert Compiler(tmp_path).build() == []
+
+
+def test_missing_anchor_writes_nothing(tmp_path):
+    base = _tree(tmp_path)
+    (base / 'component.toml').write_text(MANIFEST.replace('after = "<main>"', 'after = "<nav>"'), encoding='utf-8')
+    before = {name: _read(tmp_path, name) for name in ('index.html', 'styles.css', 'app.js')}
+    results = Compiler(tmp_path).build()
+    assert {r.status for r in results} == {'missing', 'aborted'}
+    assert {name: _read(tmp_path, name) for name in before} == before
+    assert not (tmp_path / '.component-state.json').exists()
+
+
+def test_history_batch_component():
+    component = load_component('history_batch')
+    assert [f.key for f in component.fragments] == [
+        'add_history_batch/history-button', 'add_history_batch/history-modal', 'add_history_batch/batch-option',
+        'add_history_batch/styles', 'add_history_batch/functions', 'add_history_batch/init-calls']
+    tokens, _ = collect_usage()
+    assert {'history-modal-overlay', 'batch-calendar-day', 'selected-date-tag'} <= tokens
+
+
+@pytest.mark.parametrize('watcher', [
+    Poller,
+    pytest.param(Inotify, marks=pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify 僅 Linux')),
+])
+def test_watchers_see_saves(tmp_path, watcher):
+    w = watcher([tmp_path])
+    try:
+        assert not w.wait(0.3)
+        threading.Timer(0.1, lambda: (tmp_path / 'a.css').write_text('.a {}')).start()
+        started = time.monotonic()
+        assert w.wait(3)
+        assert time.monotonic() - started < 2
+    finally:
+        w.close()
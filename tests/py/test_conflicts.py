@@ -0,0 +1,81 @@
+"""
+衝突索引測試 — 與逐筆 periods.includes() 掃描結果相同; app.js 的 buildConflictIndex / findConflicts 輸出一致
+"""
+import json
+import shutil
+import subprocess
+from datetime import date
+
+import pytest
+
+from tools import ROOT
+from tools.analytics import app_constants
+from tools.conflicts import ConflictIndex, date_ordinal, main, weekly_dates
+from tools.jsindex import JsIndex
+
+from test_analytics import _docs
+
+JS_SYMBOLS = ('PERIODS', 'PERIOD_BITS', 'dateOrdinal', 'periodMask', 'buildConflictIndex', 'findConflicts')
+
+
+def _scan(docs, room, days, periods):
+    """app.js 原本的做法: 每個日期掃一遍該場地的預約"""
+    out = []
+    for day in days:
+        hit = {p for d in docs if d['room'] == room and d['date'] == day for p in d['periods'] if p in periods}
+        if hit:
+            out.append((day, [p for p in app_constants()[1].values() if p in hit]))
+    return out
+
+
+def test_matches_linear_scan():
+    docs = _docs(800, seed=11)
+    rooms, periods = app_constants()
+    index = ConflictIndex.from_docs(docs)
+    days = [d['date'] for d in docs[:100]] + weekly_dates(date(2024, 8, 5), 26)
+    for room in rooms:
+        for wanted in (['period1'], ['period2', 'lunch', 'period5'], list(periods.values())):
+            assert index.conflicts(room, days, wanted) == _scan(docs, room, days, wanted)
+
+
+def test_cancelled_and_unknown_periods_do_not_block():
+    index = ConflictIndex.from_docs([
+        {'room': '禮堂', 'date': '2025/09/01', 'periods': []},
+        {'room': '禮堂', 'date': '2025/09/08', 'periods': ['period1', 'period9']},
+    ])
+    assert index.booked('禮堂', '2025/09/01') == 0
+    assert index.conflicts('禮堂', weekly_dates(date(2025, 9, 1), 3), ['period1', 'period2']) == [('2025/09/08', ['period1'])]
+    assert index.conflicts('禮堂', ['2025-09-08'], ['period2']) == []
+    assert date_ordinal('1970/01/02') == 1 and date_ordinal(date(2025, 9, 1)) == date_ordinal('2025-09-01')
+
+
+def test_cli_exit_code(tmp_path, capsys):
+    path = tmp_path / 'archive.json'
+    path.write_text(json.dumps({'bookings': [
+        {'id': 'a', 'room': '禮堂', 'date': '2025/09/15', 'periods': ['period3'], 'booker': '王老師'},
+    ]}, ensure_ascii=False), encoding='utf-8')
+    args = [str(path), '--room', '禮堂', '--start', '2025-09-01', '--weeks', '4', '--periods']
+    assert main(args + ['period3']) == 1
+    assert '✗ 2025/09/15' in capsys.readouterr().out
+    assert main(args + ['period4']) == 0
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_matches_app_js():
+    docs = _docs(400, seed=5)
+    rooms, periods = app_constants()
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    source = '\n'.join(idx.text(idx.find(name)) for name in JS_SYMBOLS)
+    days = weekly_dates(date(2024, 8, 2), 26)
+    cases = [(room, wanted) for room in rooms for wanted in (['period1', 'period2'], ['lunch'])]
+    script = source + f"""
+const docs = {json.dumps(docs, ensure_ascii=False)};
+const index = buildConflictIndex(docs);
+const out = {json.dumps(cases, ensure_ascii=False)}.map(([room, wanted]) =>
+    findConflicts(index, room, {json.dumps(days)}, wanted).map(c => [c.date, c.periods]));
+process.stdout.write(JSON.stringify(out));
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True)
+    index = ConflictIndex.from_docs(docs, list(periods.values()))
+    expected = [[list(c) for c in index.conflicts(room, days, wanted)] for room, wanted in cases]
+    assert json.loads(proc.stdout) == expected
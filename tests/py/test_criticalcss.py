@@ -0,0 +1,120 @@
+"""
+關鍵 CSS 測試 — 初始 DOM 的 selector 比對 (組合子、屬性、互動狀態、彈窗內容不展開)、renderSkeleton 骨架屏、
+@media / print / @keyframes 取捨; index.html 改寫保留 CRLF、重跑不變、指紋步驟仍找得到樣式表; repo 首屏預算
+"""
+import gzip
+
+from tools import ROOT
+from tools.criticalcss import (BUDGET, Document, add_skeleton, build, critical_css, parse_html, split_top,
+                               stylesheet_links)
+from tools.fingerprint import referenced_assets
+
+HTML = """<html><head><title>x</title></head><body>
+<header class="header"><h1 class="header-title"><span class="title-main">預約</span></h1></header>
+<main class="main-content">
+  <section class="control-panel"><div class="control-row">
+    <div class="control-group"><label>日期</label><input type="date" class="date-input" id="startDate"></div>
+    <div class="control-group"><select class="room-select" data-kind="room big"></select></div>
+  </div><p class="date-hint"></p></section>
+  <div class="calendar-grid" id="calendarGrid"></div>
+  <div class="month-calendar hidden"><div class="month-grid" id="monthCalendarGrid"></div></div>
+</main>
+<div class="modal-overlay" id="modalOverlay"><div class="modal"><div class="modal-body"></div></div></div>
+</body></html>"""
+
+SKELETON = """function renderSkeleton() {
+    if (viewMode === 'week') {
+        const grid = document.getElementById('calendarGrid');
+        const dayEl = document.createElement('div');
+        dayEl.className = 'calendar-day skeleton-day';
+        dayEl.innerHTML = `<div class="day-header"><div class="skeleton skeleton-text short"></div></div>`;
+        grid.appendChild(dayEl);
+    } else {
+        const grid = document.getElementById('monthCalendarGrid');
+        const cell = document.createElement('div');
+        cell.className = 'month-day skeleton-cell';
+        grid.appendChild(cell);
+    }
+}"""
+
+
+def _document():
+    return Document(add_skeleton(parse_html(HTML), SKELETON))
+
+
+def test_selector_matching():
+    doc = _document()
+    hits = ['.control-panel', 'main .control-row > .control-group', 'label + input', '.control-group ~ .control-group',
+            'input[type="date"]', '[data-kind~=big]', 'select[data-kind^="room"]', ':root', 'body *',
+            '.date-input::placeholder', '.control-group:not(.x)', '.control-group:nth-child(2n+1)', '#startDate',
+            '.modal-overlay', '.month-calendar', '.header .title-main', 'h1.header-title']
+    misses = ['.control-group:hover', '.date-input:focus', '.control-panel > label', 'input + label',
+              '.modal-body', '.modal-overlay .modal', '.month-grid', '[data-kind="room"]', 'span.header-title',
+              '.header > .title-main', '.unknown']
+    assert [s for s in hits if not doc.matches(s)] == []
+    assert [s for s in misses if doc.matches(s)] == []
+    assert split_top('.a, :is(.b, .c) .d,[x=","]') == ['.a', ':is(.b, .c) .d', '[x=","]']
+
+
+def test_skeleton_from_render_function():
+    doc = _document()
+    assert doc.matches('.calendar-grid > .calendar-day.skeleton-day .skeleton-text.short')
+    assert not doc.matches('.skeleton-cell')                      # 月曆在 .hidden 裡, 不補骨架
+    real = Document.from_files()
+    for selector in ('.control-panel', '.control-row', '.calendar-grid', '.skeleton-day .skeleton-card'):
+        assert real.matches(selector), selector
+    assert not real.matches('.modal-body')
+
+
+def test_rule_selection():
+    css = """
+/* 基本 */
+.control-panel, .modal-body { padding: 1rem; animation: fadeIn 1s; }
+.control-group:hover { background: white; }
+@keyframes fadeIn { from { opacity: 0; } to { opacity: 1; } }
+@keyframes unused { from { opacity: 0; } }
+@font-face { font-family: X; src: url(x.woff2); }
+@import url("other.css");
+@media (max-width: 600px) { .control-row { gap: 0; } .modal { top: 0; } }
+@media print { .control-panel { display: none; } }
+"""
+    out, stats = critical_css(css, _document())
+    assert out == ('.control-panel{padding:1rem;animation:fadeIn 1s}@keyframes fadeIn{from{opacity:0}to{opacity:1}}'
+                   '@font-face{font-family:X;src:url(x.woff2)}@media (max-width: 600px){.control-row{gap:0}}')
+    assert (stats['rules'], stats['inlined']) == (9, 2)
+
+
+def _tree(tmp_path, css='.control-panel { color: red; }\n.modal-body { color: blue; }\n'):
+    html = HTML.replace('<title>x</title>', '<title>x</title>\n    <link rel="stylesheet" href="https://x.test/font.css">'
+                        '\n    <link rel="stylesheet" href="styles.css">')
+    (tmp_path / 'index.html').write_bytes(html.replace('\n', '\r\n').encode('utf-8'))
+    (tmp_path / 'styles.css').write_text(css, encoding='utf-8')
+    return tmp_path
+
+
+def test_rewrite_index_html(tmp_path):
+    root = _tree(tmp_path)
+    css, stats, results = build(root)
+    assert css == '.control-panel{color:red}' and [r.status for r in results] == ['applied']
+    data = (root / 'index.html').read_bytes()
+    assert data.count(b'\n') == data.count(b'\r\n')
+    html = data.decode('utf-8')
+    assert ('    <style id="critical-css">.control-panel{color:red}</style>\r\n'
+            '    <link rel="stylesheet" href="styles.css" media="print" onload="this.media=\'all\'">\r\n'
+            '    <noscript><link rel="stylesheet" href="styles.css"></noscript>') in html
+    assert '<link rel="stylesheet" href="https://x.test/font.css">' in html
+    assert [href for _, href in stylesheet_links(html)] == ['styles.css']         # 外部與 <noscript> 內的不算
+    assert referenced_assets(html) == ['styles.css']               # fingerprint 仍會改寫 / 預快取
+
+    assert [r.status for r in build(root)[2]] == ['skipped'] and (root / 'index.html').read_bytes() == data
+    (root / 'styles.css').write_text('.control-row { gap: 0 }\n', encoding='utf-8')
+    build(root)
+    html = (root / 'index.html').read_text(encoding='utf-8')
+    assert html.count('<style id="critical-css">.control-row{gap:0}</style>') == 1 and html.count('<noscript>') == 1
+
+
+def test_repo_critical_css_within_budget():
+    css, stats, _ = build(ROOT, dry_run=True)
+    assert css and all(s['inlined'] < s['rules'] / 2 for s in stats.values())
+    assert len(gzip.compress(css.encode('utf-8'))) < BUDGET
+    assert '.control-panel{' in css and '.skeleton-card' in css
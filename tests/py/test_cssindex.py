@@ -0,0 +1,51 @@
+"""
+CSS 規則索引測試 — @media 內的規則要能獨立定位, upsert 重跑不得讓檔案變大
+"""
+from tools.cssindex import CssIndex, dedupe
+from tools.patching import Patch, css_upserts, patch_text
+
+CSS = '''/* 控制面板 */
+.control-row { gap: 1rem; }
+
+@media (max-width: 768px) {
+    .control-row { gap: 0.5rem; }
+}
+
+.a,
+.b { color: red; }
+.a, .b { color: red; }
+'''
+
+
+def test_rules_are_keyed_by_selector_and_context():
+    idx = CssIndex.build(CSS)
+    top = idx.find('.control-row')
+    mobile = idx.find('.control-row', ('@media (max-width: 768px)',))
+    assert idx.body(top).strip() == 'gap: 1rem;'
+    assert idx.body(mobile).strip() == 'gap: 0.5rem;'
+    assert idx.text(top, with_doc=True).startswith('/* 控制面板 */')
+    assert len(idx.find_all('.a, .b')) == 2
+
+
+def test_upsert_is_idempotent_and_respects_media_context():
+    patch = Patch('p', 'styles.css', css_upserts('''
+.control-row { gap: 2rem; }
+@media (max-width: 768px) {
+    .control-row { gap: 1rem; }
+    .new-rule { color: blue; }
+}
+'''))
+    once, _ = patch_text(CSS, [patch])
+    twice, _ = patch_text(once, [patch])
+    assert once == twice
+    idx = CssIndex.build(once)
+    assert idx.body(idx.find('.control-row')).strip() == 'gap: 2rem;'
+    assert idx.find('.new-rule', ('@media (max-width: 768px)',)) is not None
+    assert len(idx.blocks) == 1
+
+
+def test_dedupe_drops_only_earlier_identical_copy():
+    out, removed = dedupe(CSS)
+    assert removed == 1
+    assert out.count('color: red') == 1
+    assert out.rstrip().endswith('.a, .b { color: red; }')
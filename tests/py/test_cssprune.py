@@ -0,0 +1,70 @@
+"""
+未使用 selector 清除測試 — 動態組字的 class 與 :not() 內的 class 都不能誤刪; 從來源檔收集 token 與動態前綴、
+--rewrite 改寫 index.html / sw.js 且重跑不變
+"""
+from tools.cssprune import collect_usage, minify, prune, rewrite_references, unreferenced_stylesheets
+
+CSS = '''.used { color: red; }
+.unused { color: blue; }
+.heat-3 { opacity: 1; }
+.used:not(.gone) { margin: 0; }
+.used, .gone { padding: 0 !important; }
+@media (max-width: 600px) {
+    .unused { display: none; }
+}
+@keyframes spin { from { transform: rotate(0); } }
+'''
+
+
+def test_prune_keeps_dynamic_prefixes_and_drops_dead_rules():
+    css, result = prune(CSS, tokens={'used'}, prefixes=('heat-',))
+    assert '.unused' not in css and '@media' not in css
+    assert '.heat-3{opacity:1}' in css
+    assert '.used:not(.gone){margin:0}' in css
+    assert '.used{padding:0!important}' in css           # 只剩可能命中的 selector
+    assert '@keyframes' not in css                          # 沒有任何規則引用 spin
+    assert result['stats']['rules_dropped'] == 3
+
+
+def test_minify_preserves_strings_and_descendant_spaces():
+    assert minify(".a .b", declarations=False) == '.a .b'
+    assert minify("content: ' ;  ' ;") == "content:' ;  '"
+
+
+APP = """function renderHeat(level, state) {
+    cell.className = `heat-${level}`;
+    badge.classList.add('status-' + state);
+    el.className = 'plain-class';
+}
+"""
+
+
+def test_collect_usage_finds_runtime_classes(tmp_path):
+    (tmp_path / 'index.html').write_text('<div id="grid" class="calendar-grid"></div>\n')
+    (tmp_path / 'app.js').write_text(APP)
+    (tmp_path / 'components').mkdir()
+    (tmp_path / 'components' / 'modal.html').write_text('<div class="modal-card"></div>\n')
+    tokens, prefixes = collect_usage(root=tmp_path)
+    assert prefixes == ('heat-', 'status-')                 # 'plain-class' 是完整字串, 不是前綴
+    assert {'calendar-grid', 'grid', 'plain-class', 'modal-card'} <= tokens
+
+    css, result = prune('.heat-2 { a: b; }\n.status-ok, .status-done { c: d; }\n#grid .plain-class { e: f; }\n'
+                        '.modal-card { g: h; }\n.plain-other { i: j; }\n.stale-3 { k: l; }\n', tokens, prefixes)
+    assert css == '.heat-2{a:b}.status-ok,.status-done{c:d}#grid .plain-class{e:f}.modal-card{g:h}\n'
+    assert [d['selector'] for d in result['dropped']] == ['.plain-other', '.stale-3']
+
+
+def test_rewrite_points_index_and_sw_at_min_css(tmp_path):
+    (tmp_path / 'index.html').write_bytes(b'<head>\r\n<link rel="stylesheet" href="styles.css">\r\n</head>\r\n')
+    (tmp_path / 'sw.js').write_text("const ASSETS = ['./', './styles.css', './app.js'];\n")
+    (tmp_path / 'styles.css').write_text('.a { color: red; }\n')
+    (tmp_path / 'styles.v1.css').write_text('.a { color: blue; }\n')
+
+    assert [r.status for r in rewrite_references('styles.css', tmp_path)] == ['applied', 'applied']
+    html, sw = (tmp_path / 'index.html').read_bytes(), (tmp_path / 'sw.js').read_bytes()
+    assert html == b'<head>\r\n<link rel="stylesheet" href="styles.min.css">\r\n</head>\r\n'
+    assert sw == b"const ASSETS = ['./', './styles.min.css', './app.js'];\n"
+    assert unreferenced_stylesheets(tmp_path) == ['styles.css', 'styles.v1.css']
+
+    assert [r.status for r in rewrite_references('styles.css', tmp_path)] == ['skipped', 'skipped']
+    assert (tmp_path / 'index.html').read_bytes() == html and (tmp_path / 'sw.js').read_bytes() == sw
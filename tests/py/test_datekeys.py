@@ -0,0 +1,152 @@
+"""
+日期查詢鍵測試 — 跨年 / 週日 / 閏日的 weekKey、與 app.js bookingDateKeys 一致; 回填只寫不一致的文件、重跑 0 筆、
+全部成功才寫入完成標記 (--status 據此回報)、app.js 標記不存在或查詢失敗時改用 date 範圍; emulator 回填
+"""
+import json
+import os
+import shutil
+import subprocess
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from tools import ROOT
+from tools.datekeys import MARKER, backfill_complete, date_keys, main, migrate, parse_day, pending
+from tools.firestore import Firestore, FirestoreError
+from tools.jsindex import JsIndex
+
+JS_SYMBOLS = ('formatDate', 'dateOrdinal', 'ordinalDate', 'bookingDateKeys')
+
+
+def test_week_and_month_keys():
+    assert date_keys(date(2025, 3, 5)) == {'dayOrdinal': 20152, 'weekKey': '2025/03/03', 'monthKey': '2025/03'}
+    assert date_keys(date(2025, 3, 9))['weekKey'] == '2025/03/03'                 # 週日屬於前一個週一
+    assert date_keys(date(2025, 1, 1))['weekKey'] == '2024/12/30'                 # 跨年
+    assert date_keys(date(2024, 3, 1))['weekKey'] == '2024/02/26'                 # 閏年
+    assert date_keys(date(1970, 1, 1))['dayOrdinal'] == 0
+    assert parse_day('2025-3-5') == date(2025, 3, 5) and parse_day('2025/02/30') is None and parse_day(None) is None
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_matches_app_js():
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    source = '\n'.join(idx.text(idx.find(name)) for name in JS_SYMBOLS)
+    days = [date(2023, 12, 20) + timedelta(days=i) for i in range(0, 900, 3)]
+    script = source + f"""
+process.stdout.write(JSON.stringify({json.dumps([d.strftime('%Y/%m/%d') for d in days])}.map(bookingDateKeys)));
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True,
+                          env={**os.environ, 'TZ': 'America/Los_Angeles'})
+    assert json.loads(proc.stdout) == [date_keys(d) for d in days]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_app_js_falls_back_to_date_until_backfilled():
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    source = '\n'.join(idx.text(idx.find(name)) for name in ('dateKeysReady', 'getBookingsByDateKeys'))
+    script = """
+let marker;
+const db = { collection: () => ({ doc: () => ({ get: async () => {
+    if (marker === 'denied') throw new Error('permission-denied');
+    return { exists: marker !== undefined, data: () => marker };
+} }) }) };
+console.warn = () => {};
+let dateKeysReadyPromise = null;
+""" + source + """
+const get = q => (q === 'broken' ? Promise.reject(new Error('index')) : q);
+const run = keyed => getBookingsByDateKeys(() => keyed, () => 'date', get);
+(async () => {
+    const out = [];
+    for (const state of [undefined, 'denied', { complete: false }, { complete: true }]) {
+        marker = state;
+        dateKeysReadyPromise = null;
+        out.push(await run('keyed'), await run('broken'));
+    }
+    process.stdout.write(JSON.stringify(out));
+})();
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == ['date', 'date'] * 3 + ['keyed', 'date']
+
+
+class FakeFirestore:
+    def __init__(self, docs, fail=False):
+        self.docs = {d['id']: dict(d) for d in docs}
+        self.other = {}
+        self.commits = []
+        self.fail = fail
+
+    def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+        yield from (dict(d) for d in list(self.docs.values()))
+
+    def get(self, collection, doc_id):
+        return self.other.get((collection, doc_id))
+
+    def update_write(self, collection, doc_id, data):
+        return collection, doc_id, data
+
+    def set_write(self, collection, doc_id, data):
+        return collection, doc_id, data
+
+    def commit(self, writes):
+        if self.fail and writes[0][0] == 'bookings':
+            raise FirestoreError(503, '模擬寫入失敗')
+        self.commits.append(len(writes))
+        for collection, doc_id, data in writes:
+            if collection == 'bookings':
+                self.docs[doc_id].update(data)
+            else:
+                self.other[(collection, doc_id)] = dict(data)
+
+
+def test_migrate_only_touches_stale_docs(monkeypatch):
+    docs = [{'id': f'b{i}', 'date': f'2025/03/{i % 28 + 1:02d}'} for i in range(25)]
+    docs[0].update(date_keys(date(2025, 3, 1)))                                     # 已一致
+    docs[1].update(date_keys(date(2025, 3, 1)))                                     # date 改過 → 過期
+    docs[2].update({**date_keys(date(2025, 3, 3)), 'dayOrdinal': 20150.0})          # 型別不對 (規則要 int)
+    docs.append({'id': 'bad', 'date': '2025/13/01'})
+    client = FakeFirestore(docs)
+    monkeypatch.setattr('tools.datekeys.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+
+    assert migrate(client, batch_size=4, connections=2, dry_run=True)['updated'] == 24 and client.commits == []
+    assert not backfill_complete(client)                                          # dry run 不寫標記
+    summary = migrate(client, batch_size=4, connections=2)
+    assert (summary['scanned'], summary['current'], summary['invalid'], summary['updated']) == (26, 1, 1, 24)
+    assert client.commits == [4, 4, 4, 4, 4, 4, 1]                                # 最後一個 commit 是完成標記
+    assert backfill_complete(client) and client.other[MARKER]['invalid'] == 1
+    assert all(pending(d) == {} for d in client.docs.values() if d['id'] != 'bad')
+    assert migrate(client)['updated'] == 0
+
+
+def test_marker_only_after_clean_backfill(monkeypatch):
+    monkeypatch.setattr('tools.datekeys.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    client = FakeFirestore([{'id': 'b1', 'date': '2025/03/05'}], fail=True)
+    summary = migrate(client)
+    assert summary['errors'] and not summary['marked'] and not backfill_complete(client)
+    client.fail = False
+    assert migrate(client)['marked'] and backfill_complete(client)
+
+    monkeypatch.setattr('tools.datekeys.Firestore', lambda project, token=None: client)
+    client.close = lambda: None
+    assert main(['--project', 'demo', '--status']) == 0
+    client.other.clear()
+    assert main(['--project', 'demo', '--status']) == 1
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_backfill(capsys):
+    project = f'demo-{uuid.uuid4().hex[:8]}'
+    client = Firestore(project)
+    try:
+        client.commit([client.create_write('bookings', f'bk{i:03d}', {'date': f'2025/03/{i % 20 + 1:02d}', 'room': '禮堂',
+                                                                      'periods': ['period1'], 'booker': '王老師'})
+                       for i in range(120)])
+        assert main(['--project', project, '--batch-size', '50']) == 0
+        week = client.run_query('bookings', [('room', '==', '禮堂'), ('weekKey', '==', '2025/03/03')])
+        assert len(week) == 42 and all(d['booker'] == '王老師' for d in week)
+        assert main(['--project', project]) == 0
+        assert '已回填 0 筆' in capsys.readouterr().out
+        assert main(['--project', project, '--status']) == 0
+    finally:
+        client.close()
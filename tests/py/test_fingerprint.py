@@ -0,0 +1,65 @@
+"""
+內容指紋資產測試 — 只有內容變動的檔案換網址; 未引用的舊樣式表不再預快取
+"""
+from tools.fingerprint import content_hash, fingerprint
+
+HTML = '''<link rel="stylesheet" href="styles.css">
+<link rel="manifest" href="manifest.json">
+<script src="https://cdn.example.com/x.js"></script>
+<script src="app.js"></script>
+'''
+SW = '''const CACHE_NAME = 'booking-system-v1';
+const ASSETS_TO_CACHE = [
+    './',
+    './index.html',
+    './old.css',
+    './styles.css',
+    './app.js',
+    './manifest.json',
+    'https://fonts.googleapis.com/css2?family=X',
+];
+self.addEventListener('install', () => {});
+'''
+
+
+def _tree(tmp_path, app='init();\n'):
+    (tmp_path / 'index.html').write_text(HTML)
+    (tmp_path / 'sw.js').write_text(SW)
+    (tmp_path / 'styles.css').write_text('.a { color: red; }\n')
+    (tmp_path / 'app.js').write_text(app)
+    (tmp_path / 'manifest.json').write_text('{}\n')
+
+
+def test_rewrites_tags_and_precache_list(tmp_path):
+    _tree(tmp_path)
+    manifest, _ = fingerprint(tmp_path)
+    app = f"app.{content_hash(b'init();' + chr(10).encode())}.js"
+    assert manifest['app.js'] == app
+    assert (tmp_path / app).read_text() == 'init();\n'
+
+    html = (tmp_path / 'index.html').read_text()
+    assert f'src="{app}"' in html and 'href="manifest.json"' in html
+    sw = (tmp_path / 'sw.js').read_text()
+    assert './old.css' not in sw                              # index.html 沒有引用
+    assert f"'./{app}'" in sw and "'./manifest.json'" in sw
+    assert sw.index(f"'./{app}'") < sw.index('fonts.googleapis')
+    assert "const CACHE_NAME = 'booking-system-v1-" in sw
+    assert sw.endswith("self.addEventListener('install', () => {});\n")
+
+
+def test_rerun_is_stable_and_only_changed_assets_get_new_urls(tmp_path):
+    _tree(tmp_path)
+    first, _ = fingerprint(tmp_path)
+    sw = (tmp_path / 'sw.js').read_text()
+    html = (tmp_path / 'index.html').read_text()
+
+    again, _ = fingerprint(tmp_path)
+    assert again == first
+    assert (tmp_path / 'sw.js').read_text() == sw
+    assert (tmp_path / 'index.html').read_text() == html
+
+    (tmp_path / 'app.js').write_text('init(2);\n')
+    changed, _ = fingerprint(tmp_path)
+    assert changed['styles.css'] == first['styles.css']
+    assert changed['app.js'] != first['app.js']
+    assert (tmp_path / 'sw.js').read_text() != sw           # CACHE_NAME 隨清單改變
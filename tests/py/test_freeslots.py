@@ -0,0 +1,87 @@
+"""
+空堂索引測試 — 每格 bit 與逐筆比對一致、version 只隨內容改變、app.js decodeFreeSlots 解出相同結果
+"""
+import json
+import random
+import shutil
+import subprocess
+from datetime import date, timedelta
+
+import pytest
+
+from tools import ROOT
+from tools.analytics import app_constants
+from tools.freeslots import DAY_IDS, compile_slots, decode_room, semester_range
+from tools.jsindex import JsIndex
+
+from test_analytics import _docs
+
+START, END = date(2024, 8, 1), date(2025, 1, 31)
+JS_SYMBOLS = ('ROOMS', 'PERIODS', 'dateOrdinal', 'decodeFreeSlots', 'freeSlotsCover')
+
+
+def _settings(seed=1):
+    rng = random.Random(seed)
+    rooms, periods = app_constants()
+    return {room: rng.sample([f'{d}_{p}' for d in DAY_IDS for p in periods.values()], 12) for room in rooms[:4]}
+
+
+def test_bits_match_bookings_and_settings():
+    rooms, periods = app_constants()
+    period_ids = list(periods.values())
+    docs = _docs(800, seed=13)
+    settings = _settings()
+    artifact = compile_slots(docs, settings, START, END, rooms, period_ids)
+    assert artifact['days'] == 184 and artifact['periods'] == period_ids
+    for room in rooms:
+        free, busy = decode_room(artifact, room)
+        assert len(free) == len(busy) == 184
+        for i in range(184):
+            day = START + timedelta(days=i)
+            day_str = day.strftime('%Y/%m/%d')
+            todays = [d for d in docs if d['date'] == day_str and d['room'] == room]
+            assert busy[i] == sum(len(d['periods']) for d in todays)
+            for bit, pid in enumerate(period_ids):
+                taken = any(pid in d['periods'] for d in todays)
+                blocked = f'{DAY_IDS[day.weekday()]}_{pid}' in settings.get(room, ())
+                assert bool(free[i] >> bit & 1) == (not taken and not blocked)
+
+
+def test_version_tracks_content_only():
+    rooms, periods = app_constants()
+    docs = _docs(200, seed=2)
+    args = (START, END, rooms, list(periods.values()))
+    a = compile_slots(docs, _settings(), *args)
+    assert compile_slots(list(reversed(docs)), _settings(), *args) == a
+    moved = [dict(docs[0], periods=['period8'])] + docs[1:]
+    assert compile_slots(moved, _settings(), *args)['version'] != a['version']
+    assert compile_slots(docs, _settings(seed=9), *args)['version'] != a['version']
+
+
+def test_semester_range_matches_app():
+    assert semester_range(date(2025, 9, 1)) == (date(2025, 8, 1), date(2026, 1, 31))
+    assert semester_range(date(2026, 1, 15)) == (date(2025, 8, 1), date(2026, 1, 31))
+    assert semester_range(date(2026, 3, 1)) == (date(2026, 2, 1), date(2026, 7, 31))
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_app_js_decodes_same_bits():
+    rooms, periods = app_constants()
+    artifact = compile_slots(_docs(300, seed=4), _settings(), START, END, rooms, list(periods.values()))
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    script = '\n'.join(idx.text(idx.find(name)) for name in JS_SYMBOLS) + f"""
+const index = decodeFreeSlots({json.dumps(artifact, ensure_ascii=False)});
+const out = {{
+    cover: [freeSlotsCover(index, '2024/08/01', '2025/01/31'), freeSlotsCover(index, '2024/07/31', '2024/08/10')],
+    base: index.base,
+    rooms: Object.fromEntries(Object.entries(index.rooms).map(([r, v]) => [r, [Array.from(v.free), Array.from(v.busy)]])),
+}};
+process.stdout.write(JSON.stringify(out));
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True)
+    js = json.loads(proc.stdout)
+    assert js['cover'] == [True, False]
+    assert js['base'] == (START - date(1970, 1, 1)).days
+    for room in rooms:
+        free, busy = decode_room(artifact, room)
+        assert js['rooms'][room] == [list(free), list(busy)]
@@ -0,0 +1,79 @@
+"""
+熱路徑分析測試 — 迴圈內 innerHTML += / 查找、事件 callback 不算迴圈、字面值與字串搜尋略過、render 函式重綁事件、補丁腳本內嵌 JS 行號、repo 在預算內
+"""
+from tools.hotpath import compare, counts, embedded_js, load_budget, scan, scan_source
+
+SOURCE = '''function loadHistory(snapshot) {
+    list.innerHTML = '';
+    snapshot.forEach(doc => {
+        const names = doc.periods.map(id => PERIODS.find(p => p.id === id).name);
+        list.innerHTML += `<div>${names}</div>`;
+        btn.addEventListener('click', () => { list.innerHTML += selected.includes(doc.id); });
+    });
+}
+
+function renderGrid(days) {
+    let html = '';
+    for (let d = 1; d <= days; d++)
+        html += picked.indexOf(d) > -1 ? 'x' : '';
+    do { n = queue.findIndex(q => q === n); } while (n > 0);
+    for (const day of days) {
+        if (['sat', 'sun'].includes(day)) continue;
+        if (day.label.includes(',') || name.toLowerCase().includes(day.label)) continue;
+    }
+    grid.innerHTML = html;
+    grid.querySelectorAll('.cell').forEach(el => el.addEventListener('click', onCell));
+    const rows = grid.querySelectorAll('.row');
+    for (const row of rows) { row.onclick = onRow; }
+    grid.querySelectorAll('.tip').forEach(el => el.classList.add('ready'));
+}
+
+function initEventListeners() {
+    document.querySelectorAll('.tab').forEach(el => el.addEventListener('click', onTab));
+}
+'''
+
+
+def _found(findings):
+    return [(f.rule, f.line, f.function) for f in findings]
+
+
+def test_loops_and_rules():
+    assert _found(scan_source(SOURCE, 'demo.js')) == [
+        ('lookup-in-loop', 4, 'loadHistory'),                   # PERIODS.find 在 map / forEach 內
+        ('innerhtml-concat-in-loop', 5, 'loadHistory'),         # click callback 內的兩項不算
+        ('lookup-in-loop', 13, 'renderGrid'),                   # 無大括號的 for 本體
+        ('lookup-in-loop', 14, 'renderGrid'),                   # do { } while
+        ('listener-rebind-in-render', 20, 'renderGrid'),
+        ('listener-rebind-in-render', 21, 'renderGrid'),        # 變數 + for...of 的寫法
+    ]
+    loop = scan_source(SOURCE, 'demo.js')[1].loop
+    assert loop == 'snapshot.forEach'
+
+
+def test_embedded_js_line_numbers(tmp_path):
+    script = tmp_path / 'patch_demo.py'
+    script.write_text('"""補丁"""\nCSS = """.a { color: red; }"""\n\nJS = """\nrows.forEach(r => {\n'
+                      '    table.innerHTML += r;\n});\n"""\n', encoding='utf-8')
+    [(name, text, offset)] = embedded_js(script)
+    assert name == 'JS'
+    [finding] = scan_source(text, script.name, offset, name)
+    assert (finding.line, finding.function, finding.rule) == (6, 'JS', 'innerhtml-concat-in-loop')
+
+
+def test_budget_compare():
+    current = {'app.js::a': {'lookup-in-loop': 2}, 'app.js::b': {'innerhtml-concat-in-loop': 1}}
+    budget = {'app.js::a': {'lookup-in-loop': 3}}
+    over, under = compare(current, budget)
+    assert over == [('app.js::b', 'innerhtml-concat-in-loop', 1, 0)]
+    assert under == [('app.js::a', 'lookup-in-loop', 2, 3)]
+
+
+def test_repo_within_budget():
+    findings = scan()
+    over, _ = compare(counts(findings), load_budget())
+    assert over == []
+    # 歷史記錄元件的 innerHTML += 與日曆格 includes 都有抓到 (目前以預算容許, 不是漏報)
+    keys = {(f.path, f.function, f.rule) for f in findings}
+    assert ('components/history_batch/functions.js', 'loadHistoryData', 'innerhtml-concat-in-loop') in keys
+    assert ('components/history_batch/functions.js', 'renderBatchCalendar', 'lookup-in-loop') in keys
@@ -0,0 +1,48 @@
+"""
+app.js 頂層符號索引測試 — 字串 / template / regex 內的大括號不得影響層級判斷
+"""
+from tools import ROOT
+from tools.jsindex import JsIndex
+from tools.patching import Edit, Patch, patch_text
+
+SOURCE = '''/**
+ * 文件
+ */
+function a() {
+    const s = "}";
+    const t = `${'{'} ${ `${x}` } }`;
+    const r = /[}{]\\//g;
+    return s / 2;
+}
+
+async function b() { /* } */ }
+const C = { x: 1 };
+document.addEventListener('click', () => {});
+function a() {}
+'''
+
+
+def test_declarations_and_spans():
+    idx = JsIndex.build(SOURCE)
+    assert [(s.name, s.kind) for s in idx.symbols] == [
+        ('a', 'function'), ('b', 'async function'), ('C', 'const'), (None, 'statement'), ('a', 'function'),
+    ]
+    first = idx.symbols[0]
+    assert idx.text(first).endswith('return s / 2;\n}')
+    assert idx.text(first, with_doc=True).startswith('/**')
+    assert idx.at(SOURCE.index('return')) == first
+    assert idx.find('a') == idx.symbols[-1]      # 後宣告者生效
+    assert list(idx.duplicates()) == ['a']
+
+
+def test_app_js_reports_shadowed_get_semester_range():
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    assert 'getSemesterRange' in idx.duplicates()
+    assert idx.find('switchView').kind == 'function'
+
+
+def test_symbol_anchored_edit_survives_whitespace_changes():
+    text = 'function keep() {}\nfunction switchView(mode)   {\n  old();\n}\n'
+    out, results = patch_text(text, [Patch('p', 'app.js', (Edit(None, 'function switchView() {}', symbol='switchView'),))])
+    assert results[0].status == 'applied'
+    assert out == 'function keep() {}\nfunction switchView() {}\n'
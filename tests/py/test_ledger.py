@@ -0,0 +1,39 @@
+"""
+補丁帳本測試 — 重跑未變動的樹不得開啟 target; 部分套用必須被精確指出
+"""
+import builtins
+
+from tools.ledger import Ledger, partial_modules
+from tools.patching import Edit, Patch, apply_patches
+
+PATCHES = [
+    Patch('demo/append', 'styles.css', (Edit(None, '.x {}\n'),)),           # 無冪等保護
+    Patch('demo/js', 'app.js', (Edit('init();', 'init();\ninitMore();'),)),
+]
+
+
+def test_rerun_on_unchanged_tree_never_opens_targets(tmp_path, monkeypatch):
+    (tmp_path / 'styles.css').write_text('.a {}\n')
+    (tmp_path / 'app.js').write_text('init();\n')
+    apply_patches(PATCHES, root=tmp_path, ledger=Ledger(tmp_path))
+
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(builtins, 'open', lambda f, *a, **k: opened.append(str(f)) or real_open(f, *a, **k))
+    results = apply_patches(PATCHES, root=tmp_path, ledger=Ledger(tmp_path))
+
+    assert [r.status for r in results] == ['skipped', 'skipped']
+    assert not any(f.endswith(('styles.css', 'app.js')) for f in opened)
+    assert (tmp_path / 'styles.css').read_text() == '.a {}\n.x {}\n'  # append 沒有重複
+
+
+def test_status_detects_reverted_and_partial(tmp_path):
+    (tmp_path / 'styles.css').write_text('.a {}\n')
+    (tmp_path / 'app.js').write_text('init();\n')
+    apply_patches(PATCHES, root=tmp_path, ledger=Ledger(tmp_path))
+    (tmp_path / 'app.js').write_text('init();\n')  # 手動還原 app.js
+
+    ledger = Ledger(tmp_path)
+    statuses = {p.id: ledger.status(p) for p in PATCHES}
+    assert statuses == {'demo/append': 'applied', 'demo/js': 'reverted'}
+    assert partial_modules(statuses) == ['demo']
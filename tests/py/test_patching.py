@@ -0,0 +1,71 @@
+"""
+補丁引擎測試 — 單次掃描的結果必須與舊腳本逐一 str.replace 相同; 原子寫入保留檔案權限
+"""
+import os
+import stat
+
+import pytest
+
+from tools.patching import Edit, Patch, PatchError, apply_patches, collect, patch_text, read_text, write_atomic
+
+
+def test_same_result_as_sequential_replace():
+    text = 'a(); b(); a();'
+    out, results = patch_text(text, [
+        Patch('p1', 't', (Edit('a();', 'A();'),)),
+        Patch('p2', 't', (Edit('b();', 'B();'),)),
+    ])
+    assert out == text.replace('a();', 'A();').replace('b();', 'B();')
+    assert [r.status for r in results] == ['applied', 'applied']
+
+
+def test_unless_guard_skips_patch():
+    out, results = patch_text('x btn-book-mobile', [Patch('p', 't', (Edit('x', 'y'),), unless='btn-book-mobile')])
+    assert out == 'x btn-book-mobile'
+    assert results[0].status == 'skipped'
+
+
+def test_missing_anchor_leaves_whole_patch_unapplied():
+    out, results = patch_text('foo', [Patch('p', 't', (Edit('foo', 'bar'), Edit('nope', '')))])
+    assert out == 'foo'
+    assert results[0].status == 'missing'
+
+
+def test_until_extends_span_like_update_styles():
+    css = '.a {}\n.control-row { x }\n.room-select:focus { y }\n.z {}'
+    out, _ = patch_text(css, [Patch('p', 't', (Edit('.control-row {', 'NEW', until=('.room-select:focus {', '}'), count=1),))])
+    assert out == '.a {}\nNEW\n.z {}'
+
+
+def test_overlapping_edits_raise():
+    with pytest.raises(PatchError):
+        patch_text('abcdef', [Patch('p1', 't', (Edit('abcd', ''),)), Patch('p2', 't', (Edit('cdef', ''),))])
+
+
+def test_apply_preserves_crlf_and_is_idempotent(tmp_path):
+    (tmp_path / 'app.js').write_bytes(b'dayEl.appendChild(bookingsEl);\r\nend\r\n')
+    patches = collect(['add_mobile_button'])
+    apply_patches(patches, root=tmp_path)
+    first = (tmp_path / 'app.js').read_bytes()
+    assert b'btn-book-mobile' in first
+    assert b'\n' not in first.replace(b'\r\n', b'')
+    apply_patches(patches, root=tmp_path)
+    assert (tmp_path / 'app.js').read_bytes() == first
+    assert read_text(tmp_path / 'app.js')[1] == '\r\n'
+
+
+def test_write_keeps_file_mode(tmp_path):
+    target = tmp_path / 'styles.css'
+    target.write_text('.a {}\n')
+    os.chmod(target, 0o644)
+    write_atomic(target, b'.b {}\n')
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o644          # 不是 mkstemp 的 0600
+    os.chmod(target, 0o755)
+    write_atomic(target, b'.c {}\n')
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o755
+    umask = os.umask(0o022)
+    try:
+        write_atomic(tmp_path / 'new.css', b'.d {}\n')
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(tmp_path / 'new.css').st_mode) == 0o644
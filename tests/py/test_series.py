@@ -0,0 +1,324 @@
+"""
+預約系列測試 — dayBits 編解碼與展開和 app.js 一致、app.js 在 rules / 索引未部署時視為沒有系列; 依 batchId 折疊 (欄位不同分開、已取消保留)、折疊再展開還原原文件;
+折疊 / 展開不觸發通知與 editTrail、系列日期的取消通知 / 拆出單日 / editTrail、更新時多出的日期清回
+(functions trigger 對照); emulator 往返
+"""
+import json
+import os
+import shutil
+import subprocess
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from tools import ROOT
+from tools.anomaly import change_kind
+from tools.conflicts import date_ordinal, weekly_dates
+from tools.datekeys import date_keys, parse_day
+from tools.firestore import Firestore
+from tools.jsindex import JsIndex
+from tools.series import (BOOKINGS, COLLECTION, LOCKS, day_bits, expand, fold, fold_plan, series_ordinals,
+                          unfold)
+
+PERIOD_IDS = ['morning', 'period1', 'period2', 'period3', 'lunch']
+JS_SYMBOLS = ('formatDate', 'dateOrdinal', 'ordinalDate', 'bookingDateKeys', 'seriesDayBits', 'seriesOrdinals',
+              'expandSeries')
+CREATED = datetime(2025, 8, 20, 1, 2, 3, tzinfo=timezone.utc)
+HARNESS = ROOT / 'tests' / 'py' / 'js' / 'functions-harness.cjs'
+
+
+def _booking(doc_id, day, batch_id='b_1', **fields):
+    return {'id': doc_id, 'date': day, 'room': '禮堂', 'periods': ['period1', 'period2'], 'booker': '王老師',
+            'reason': '社團', 'deviceId': 'dev_1', 'batchId': batch_id, 'createdAt': '2025-08-20T01:02:03.000Z',
+            **date_keys(parse_day(day)), **fields}
+
+
+def test_day_bits_round_trip():
+    ordinals = [20000, 20003, 20008, 20015, 20016]
+    bits = day_bits(ordinals, 20000)
+    assert bits == '098101'                                              # bit i 在位元組 i >> 3 的第 i & 7 位
+    assert series_ordinals({'startOrdinal': 20000, 'dayBits': bits}) == ordinals
+    series = {'id': 'ser_x', 'startOrdinal': 20000, 'endOrdinal': 20016, 'dayBits': bits, 'room': '禮堂',
+              'periods': ['lunch'], 'booker': '李老師', 'reason': ''}
+    docs = expand(series, '2024/10/05', '2024/10/19')
+    assert [d['date'] for d in docs] == ['2024/10/07', '2024/10/12', '2024/10/19']
+    assert docs[0]['id'] == 'ser_x@20003' and docs[0]['seriesId'] == 'ser_x' and docs[0]['batchId'] == 'ser_x'
+    assert docs[2]['weekKey'] == '2024/10/14' and docs[2]['monthKey'] == '2024/10'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_matches_app_js():
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    source = '\n'.join(idx.text(idx.find(name)) for name in JS_SYMBOLS)
+    days = weekly_dates(datetime(2024, 12, 18).date(), 40) + ['2025/02/28', '2025/03/01']
+    ordinals = sorted({date_ordinal(d) for d in days})
+    series = {'id': 'ser_js', 'startOrdinal': ordinals[0], 'endOrdinal': ordinals[-1], 'room': '電腦教室',
+              'periods': ['period3'], 'booker': '王老師', 'reason': '段考', 'deviceId': 'dev_9'}
+    script = source + f"""
+const ordinals = {json.dumps(ordinals)};
+const bits = seriesDayBits(ordinals, ordinals[0]);
+const series = {{ ...{json.dumps(series, ensure_ascii=False)}, dayBits: bits }};
+delete series.id;
+process.stdout.write(JSON.stringify([bits, seriesOrdinals(series),
+    expandSeries('ser_js', series, dateOrdinal('2025/01/01'), dateOrdinal('2025/03/31'))]));
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True,
+                          env={**os.environ, 'TZ': 'Asia/Taipei'})
+    bits, js_ordinals, js_docs = json.loads(proc.stdout)
+    assert bits == day_bits(ordinals, ordinals[0]) and js_ordinals == ordinals
+    assert js_docs == expand({**series, 'dayBits': bits}, '2025/01/01', '2025/03/31')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_app_js_treats_undeployed_series_as_empty():
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    names = ('SERIES_NOT_DEPLOYED', 'seriesReady', 'loadSeriesBookings')
+    source = '\n'.join(idx.text(idx.find(name)) for name in names)
+    script = """
+let failure = null;
+const query = { where: () => query, limit: () => query, get: async () => {
+    if (failure) throw Object.assign(new Error(failure), { code: failure });
+    return { docs: [{ id: 'ser_1', data: () => ({}) }] };
+} };
+const seriesCollection = query;
+const statsTrackedGet = q => q.get();
+const dateOrdinal = () => 0;
+const expandSeries = id => [{ id: `${id}@0` }];
+console.warn = () => {};
+let seriesReadyPromise = null;
+""" + source + """
+(async () => {
+    const out = [];
+    for (const code of [null, 'permission-denied', 'failed-precondition', 'unavailable']) {
+        failure = code;
+        seriesReadyPromise = null;
+        const loaded = await loadSeriesBookings({ room: 'r', queryStart: '2025/01/01' }).catch(e => e.code);
+        out.push([await seriesReady(), loaded]);
+    }
+    process.stdout.write(JSON.stringify(out));
+})();
+"""
+    proc = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == [[True, [{'id': 'ser_1@0'}]], [False, []], [False, []], [False, 'unavailable']]
+
+
+def test_fold_plan_groups_by_batch_and_fields():
+    docs = [_booking(f'a{i}', day) for i, day in enumerate(weekly_dates(datetime(2025, 9, 3).date(), 5))]
+    docs.append(_booking('a9', '2025/10/08', reason='改過理由'))               # 同 batch 但欄位不同 → 單獨一筆, 不折
+    docs.append(_booking('c0', '2025/09/10', periods=[]))                        # 已取消 → 保留
+    docs += [_booking('d0', '2025/09/01', 'b_2'), _booking('d1', '2025/09/01', 'b_2')]   # 同一天重複
+    docs += [_booking('e0', '2025/01/06', 'b_3'), _booking('e1', '2026/01/07', 'b_3')]   # 跨度超過上限
+    docs.append(_booking('s0', '2025/09/01', batch_id=None))
+    plan, skipped = fold_plan(docs, PERIOD_IDS)
+    assert len(plan) == 1 and len(skipped) == 2
+    sid, data, ids = plan[0]
+    assert ids == ['a0', 'a1', 'a2', 'a3', 'a4'] and sid.startswith('ser_') and fold_plan(docs, PERIOD_IDS)[0] == plan
+    assert data['periodMask'] == 0b110 and data['createdAt'] == CREATED and data['batchId'] == 'b_1'
+    assert [d['date'] for d in expand({**data, 'id': sid})] == [d['date'] for d in docs[:5]]
+    assert data['foldedFrom'] == {str(date_ordinal(d['date'])): d['id'] for d in docs[:5]}
+
+
+class FakeFirestore:
+    """以 dict 存放集合; write 為 (動作, 集合, id, 資料), 任一前置條件不符整個 commit 不生效"""
+
+    def __init__(self, bookings):
+        self.data = {BOOKINGS: {d['id']: {k: v for k, v in d.items() if k != 'id'} for d in bookings},
+                     COLLECTION: {}, LOCKS: {}}
+        self.commits = []
+
+    def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+        yield from ({**v, 'id': k} for k, v in list(self.data[collection].items()))
+
+    def list_documents(self, collection):
+        return list(self.stream_query(collection))
+
+    def get(self, collection, doc_id):
+        doc = self.data[collection].get(doc_id)
+        return {**doc, 'id': doc_id} if doc else None
+
+    def create_write(self, collection, doc_id, data, server_time=()):
+        return 'create', collection, doc_id, data
+
+    def set_write(self, collection, doc_id, data):
+        return 'set', collection, doc_id, data
+
+    def delete_write(self, collection, doc_id, must_exist=False):
+        return ('delete!' if must_exist else 'delete'), collection, doc_id, None
+
+    def commit(self, writes):
+        for op, collection, doc_id, _ in writes:
+            exists = doc_id in self.data[collection]
+            if (op == 'create' and exists) or (op == 'delete!' and not exists):
+                raise OSError(f'{op} {collection}/{doc_id} 前置條件不符')
+        self.commits.append(writes)
+        for op, collection, doc_id, data in writes:
+            if op.startswith('delete'):
+                del self.data[collection][doc_id]
+            else:
+                self.data[collection][doc_id] = json.loads(json.dumps(data, default=str))
+
+
+def test_fold_then_unfold_restores_bookings(monkeypatch):
+    monkeypatch.setattr('tools.series.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    docs = [_booking(f'a{i}', day) for i, day in enumerate(weekly_dates(datetime(2025, 9, 3).date(), 20))]
+    docs += [_booking('c0', '2025/09/10', periods=[]), _booking('s0', '2025/09/11', batch_id=None)]
+    client = FakeFirestore(docs)
+    before = json.loads(json.dumps(client.data[BOOKINGS]))
+
+    assert fold(client, PERIOD_IDS, dry_run=True)['bookings'] == 20 and not client.data[COLLECTION]
+    summary = fold(client, PERIOD_IDS)
+    assert (summary['series'], summary['bookings'], summary['errors']) == (1, 20, [])
+    assert set(client.data[BOOKINGS]) == {'c0', 's0'} and len(client.data[COLLECTION]) == 1
+    assert fold(client, PERIOD_IDS)['series'] == 0                              # 重跑不會重複折疊
+
+    summary = unfold(client)
+    assert (summary['series'], summary['bookings'], summary['errors']) == (1, 20, [])
+    assert not client.data[COLLECTION] and set(client.data[LOCKS]) == {'b_1'}    # 展開不再觸發批次通知
+    restored = client.data[BOOKINGS]
+    assert set(restored) == set(before)
+    for doc_id in (f'a{i}' for i in range(20)):
+        doc = before[doc_id]
+        assert {**restored[doc_id], 'createdAt': doc['createdAt']} == doc
+        assert restored[doc_id]['createdAt'].startswith('2025-08-20 01:02:03')
+
+
+def _run_triggers(data, commits):
+    """在 node 中依序執行 commits, 觸發 functions/index.js 的 Firestore trigger; commits 為 FakeFirestore 的 writes"""
+    ops = [[{'op': 'delete' if op.startswith('delete') else op, 'collection': collection, 'id': doc_id, 'data': body}
+            for op, collection, doc_id, body in writes] for writes in commits]
+    proc = subprocess.run(['node', str(HARNESS)], capture_output=True, text=True, check=True,
+                          input=json.dumps({'data': data, 'commits': ops}, ensure_ascii=False, default=str))
+    return json.loads(proc.stdout)
+
+
+def _watched(bookings):
+    """預約者已綁定 LINE 並訂閱 web push, 另有一位觀察「禮堂」的使用者"""
+    return {BOOKINGS: json.loads(json.dumps(bookings, default=str)),
+            'lineBindings': {'dev_1': {'lineUserId': 'U_booker'}},
+            'roomWatchers': {'U_watch': {'lineUserId': 'U_watch', 'rooms': ['禮堂']}},
+            'webPushSubscriptions': {'dev_1': {'subscription': {'endpoint': 'https://push.test/1',
+                                                                'deviceId': 'dev_1'}}}}
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 functions/index.js')
+def test_fold_sends_no_notifications(monkeypatch):
+    monkeypatch.setattr('tools.series.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    docs = [_booking(f'a{i}', day) for i, day in enumerate(weekly_dates(datetime(2025, 9, 3).date(), 6))]
+    client = FakeFirestore(docs)
+    data = _watched(client.data[BOOKINGS])
+    assert fold(client, PERIOD_IDS)['series'] == 1
+
+    out = _run_triggers(data, client.commits)
+    assert out['pushes'] == [] and out['webPush'] == []
+    assert 'editTrail' not in out['data']                                      # 異常偵測不會看到大量刪除
+    assert not out['data'][BOOKINGS] and len(out['data'][COLLECTION]) == 1
+
+    # 對照: 管理員真的刪除其中一筆 → 預約者、觀察者與 web push 都會收到, editTrail 記 deleted
+    out = _run_triggers(data, [[('delete', BOOKINGS, 'a0', None)]])
+    assert [p['to'] for p in out['pushes']] == ['U_booker', 'U_watch']
+    assert [w['title'] for w in out['webPush']] == ['⚠️ 預約已被管理員取消']
+    assert [e['changeType'] for e in out['data']['editTrail'].values()] == ['deleted']
+
+
+def _series_doc(days, periods=('period1', 'period2')):
+    ordinals = [date_ordinal(d) for d in days]
+    return {'room': '禮堂', 'periods': list(periods), 'periodMask': 0b110, 'booker': '王老師', 'reason': '社團',
+            'deviceId': 'dev_1', 'createdAt': '2025-08-20T01:02:03.000Z', 'startOrdinal': ordinals[0],
+            'endOrdinal': ordinals[-1], 'dayBits': day_bits(ordinals, ordinals[0])}
+
+
+def _trail(out):
+    return sorted(out['data'].get('editTrail', {}).values(), key=lambda e: e['date'])
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 functions/index.js')
+def test_series_changes_notify_and_trail():
+    days = weekly_dates(datetime(2025, 9, 3).date(), 5)
+    ordinals = [date_ordinal(d) for d in days]
+    series = _series_doc(days)
+    out = _run_triggers(_watched({}), [[('create', COLLECTION, 'ser_t', series)]])
+    assert [(e['changeType'], e['bookingId']) for e in _trail(out)] == [('created', f'ser_t@{o}') for o in ordinals]
+    assert {(c['seriesId'], c['deleted']) for c in out['data']['bookingChanges'].values()} == {('ser_t', False)}
+    assert [p['to'] for p in out['pushes']] == ['U_booker', 'U_watch']            # 建立仍是一則彙整通知
+    base = {**out['data'], 'editTrail': {}, 'bookingChanges': {}}
+
+    # 清掉兩天的 bit = 取消: 每天各推一次, editTrail 在異常偵測中算 cancelled
+    cancelled = {**series, 'dayBits': day_bits(ordinals[2:], ordinals[0])}
+    out = _run_triggers(base, [[('set', COLLECTION, 'ser_t', cancelled)]])
+    assert [(e['date'], change_kind(e)) for e in _trail(out)] == [(d, 'cancelled') for d in days[:2]]
+    assert sorted(p['to'] for p in out['pushes']) == ['U_booker', 'U_booker', 'U_watch', 'U_watch']
+    assert [w['title'] for w in out['webPush']] == ['❌ 預約已取消'] * 2
+    assert [(c['deleted'], c['booking']) for c in out['data']['bookingChanges'].values()] == [(True, None)] * 2
+    base = {**out['data'], 'editTrail': {}, 'bookingChanges': {}}
+
+    # 單日只取消一節 → 同一交易拆出一般預約: 記為節次變更, 不推取消也不推建立
+    detached = {'date': days[2], 'room': '禮堂', 'periods': ['period2'], 'booker': '王老師', 'reason': '社團',
+                'deviceId': 'dev_1', 'detachedFrom': 'ser_t', **date_keys(parse_day(days[2]))}
+    remaining = {**series, 'dayBits': day_bits(ordinals[3:], ordinals[0])}
+    out = _run_triggers(base, [[('set', COLLECTION, 'ser_t', remaining), ('create', BOOKINGS, 'bk_d', detached)]])
+    assert out['pushes'] == [] and out['webPush'] == []
+    assert [(e['changeType'], e['changes']) for e in _trail(out)] == [
+        ('updated', {'periods': {'before': ['period1', 'period2'], 'after': ['period2']}})]
+    base = {**out['data'], 'editTrail': {}, 'bookingChanges': {}}
+
+    # 管理員刪除整個系列 = 強刪
+    out = _run_triggers(base, [[('delete', COLLECTION, 'ser_t', None)]])
+    assert [(e['date'], e['changeType']) for e in _trail(out)] == [(d, 'deleted') for d in days[3:]]
+    assert [w['title'] for w in out['webPush']] == ['⚠️ 預約已被管理員取消'] * 2
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 functions/index.js')
+def test_added_series_days_are_rejected():
+    days = weekly_dates(datetime(2025, 9, 3).date(), 5)
+    ordinals = [date_ordinal(d) for d in days]
+    series = _series_doc(days[:1] + days[2:])
+    base = {**_watched({}), COLLECTION: {'ser_t': series}}
+
+    # rules 只檢查長度: 同一次 update 取消第一天又補上沒預約的第二天 → 第二天清回去, 只記第一天的取消
+    tampered = {**series, 'dayBits': day_bits(ordinals[1:], ordinals[0])}
+    out = _run_triggers(base, [[('set', COLLECTION, 'ser_t', tampered)]])
+    stored = out['data'][COLLECTION]['ser_t']
+    assert stored['dayBits'] == day_bits(ordinals[2:], ordinals[0])
+    assert stored['rejectedDayBits']['dayBits'] == tampered['dayBits']
+    assert [(e['date'], change_kind(e)) for e in _trail(out)] == [(days[0], 'cancelled')]
+    assert [w['title'] for w in out['webPush']] == ['❌ 預約已取消']
+
+    # 清回的那次寫入再觸發時: 第二天從未生效, 不記錄也不通知
+    base = {**out['data'], COLLECTION: {'ser_t': tampered}, 'editTrail': {}, 'bookingChanges': {}}
+    out = _run_triggers(base, [[('set', COLLECTION, 'ser_t', stored)]])
+    assert out['pushes'] == [] and out['webPush'] == [] and not out['data']['editTrail']
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 functions/index.js')
+def test_unfold_sends_no_notifications(monkeypatch):
+    monkeypatch.setattr('tools.series.parallel', lambda c, jobs, n: [job(c) for job in jobs])
+    series = _series_doc(weekly_dates(datetime(2025, 9, 3).date(), 4))
+    client = FakeFirestore([])
+    client.data[COLLECTION]['ser_t'] = series
+    data = {**_watched({}), COLLECTION: {'ser_t': series}}
+    assert unfold(client)['bookings'] == 4
+
+    out = _run_triggers(data, client.commits)
+    assert out['pushes'] == [] and out['webPush'] == [] and 'editTrail' not in out['data']
+    assert len(out['data'][BOOKINGS]) == 4 and not out['data'][COLLECTION]
+
+
+@pytest.mark.skipif('FIRESTORE_EMULATOR_HOST' not in os.environ, reason='需要 Firestore emulator')
+def test_emulator_fold_round_trip():
+    client = Firestore(f'demo-{uuid.uuid4().hex[:8]}')
+    try:
+        days = weekly_dates(datetime(2025, 9, 1).date(), 12)
+        client.commit([client.create_write(BOOKINGS, f'bk{i:02d}', {k: v for k, v in _booking('', day).items()
+                                                                    if k not in ('id', 'createdAt')},
+                                           server_time=('createdAt',)) for i, day in enumerate(days)])
+        assert fold(client, PERIOD_IDS)['series'] == 1
+        series = client.list_documents(COLLECTION)
+        assert len(series) == 1 and [d['date'] for d in expand(series[0])] == days
+        assert client.run_query(BOOKINGS) == []
+        assert unfold(client, [series[0]['id']])['bookings'] == 12
+        docs = sorted(client.run_query(BOOKINGS), key=lambda d: d['id'])
+        assert [d['id'] for d in docs] == [f'bk{i:02d}' for i in range(12)] and docs[3]['weekKey'] == '2025/09/22'
+        assert client.get(LOCKS, 'b_1') is not None and client.list_documents(COLLECTION) == []
+    finally:
+        client.close()
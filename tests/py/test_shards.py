@@ -0,0 +1,83 @@
+"""
+週分片測試 — 分組與 key 和 bookingsCache 一致、舊分片清除、app.js shardUrl / applyBookingChanges 對照
+"""
+import json
+import shutil
+import subprocess
+from datetime import date
+
+import pytest
+
+from tools import ROOT
+from tools.analytics import app_constants
+from tools.jsindex import JsIndex
+from tools.shards import build_shards, shard_name, week_starts, write_shards
+
+from test_analytics import _docs
+
+JS_SYMBOLS = ('shardUrl', 'applyBookingChanges')
+
+
+def _node(script):
+    idx = JsIndex.from_file(ROOT / 'app.js')
+    source = '\n'.join(idx.text(idx.find(name)) for name in JS_SYMBOLS)
+    proc = subprocess.run(['node', '-e', source + '\n' + script], capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def test_shards_group_by_room_and_week():
+    rooms, _ = app_constants()
+    weeks = week_starts(date(2024, 9, 4), behind=1, ahead=2)
+    assert [w.isoformat() for w in weeks] == ['2024-08-26', '2024-09-02', '2024-09-09', '2024-09-16']
+    docs = _docs(600, seed=8)
+    shards = build_shards(docs, rooms, weeks, watermark=123)
+    assert len(shards) == len(rooms) * 4
+    shard = shards[shard_name(rooms[0], '2024/09/02', '2024/09/08')]
+    assert shard['key'] == f'{rooms[0]}:2024/09/02:2024/09/08' and shard['watermark'] == 123
+    expected = sorted(d['id'] for d in docs if d['room'] == rooms[0] and '2024/09/02' <= d['date'] <= '2024/09/08')
+    assert sorted(b['id'] for b in shard['bookings']) == expected
+    assert all(isinstance(b.get('createdAt', 0), int) for s in shards.values() for b in s['bookings'])
+    assert sum(len(s['bookings']) for s in shards.values()) == sum(
+        1 for d in docs if d['room'] in rooms and '2024/08/26' <= d['date'] <= '2024/09/22')
+
+
+def test_write_removes_stale_shards(tmp_path):
+    rooms, _ = app_constants()
+    write_shards(build_shards([], rooms[:2], week_starts(date(2024, 9, 4), 0, 1), 1), tmp_path)
+    write_shards(build_shards([], rooms[:2], week_starts(date(2024, 9, 11), 0, 1), 1), tmp_path)
+    names = sorted(p.name.split('-', 1)[1] for p in (tmp_path / 'shards').iterdir())
+    assert names == ['20240909-20240915.json'] * 2 + ['20240916-20240922.json'] * 2
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 執行 app.js')
+def test_app_js_shard_url_and_changes():
+    rooms, _ = app_constants()
+    urls = _node(f"process.stdout.write(JSON.stringify({json.dumps(rooms, ensure_ascii=False)}"
+                 f".map(r => shardUrl(r, '2024/09/02', '2024/09/08'))));")
+    assert urls == [shard_name(r, '2024/09/02', '2024/09/08') for r in rooms]
+
+    shard = [
+        {'id': 'a', 'room': '禮堂', 'date': '2024/09/02', 'periods': ['period1']},
+        {'id': 'b', 'room': '禮堂', 'date': '2024/09/03', 'periods': ['period2']},
+        {'id': 'c', 'room': '禮堂', 'date': '2024/09/04', 'periods': ['period3']},
+    ]
+    changes = [
+        # a 改到同週另一天: 新位置先到, 舊位置的移除不應刪掉新副本
+        {'bookingId': 'a', 'room': '禮堂', 'date': '2024/09/05', 'deleted': False,
+         'booking': {'room': '禮堂', 'date': '2024/09/05', 'periods': ['period1']}},
+        {'bookingId': 'a', 'room': '禮堂', 'date': '2024/09/02', 'deleted': True, 'booking': None},
+        # b 移到下週: 只有舊位置的移除與本週有關
+        {'bookingId': 'b', 'room': '禮堂', 'date': '2024/09/10', 'deleted': False,
+         'booking': {'room': '禮堂', 'date': '2024/09/10', 'periods': ['period2']}},
+        {'bookingId': 'b', 'room': '禮堂', 'date': '2024/09/03', 'deleted': True, 'booking': None},
+        # c 被取消 (periods 清空); d 新增
+        {'bookingId': 'c', 'room': '禮堂', 'date': '2024/09/04', 'deleted': False,
+         'booking': {'room': '禮堂', 'date': '2024/09/04', 'periods': []}},
+        {'bookingId': 'd', 'room': '禮堂', 'date': '2024/09/06', 'deleted': False,
+         'booking': {'room': '禮堂', 'date': '2024/09/06', 'periods': ['lunch']}},
+    ]
+    result = _node(f"""process.stdout.write(JSON.stringify(applyBookingChanges(
+        {json.dumps(shard, ensure_ascii=False)}, {json.dumps(changes, ensure_ascii=False)},
+        '禮堂', '2024/09/02', '2024/09/08')));""")
+    assert {b['id']: (b['date'], b['periods']) for b in result} == {
+        'a': ('2024/09/05', ['period1']), 'c': ('2024/09/04', []), 'd': ('2024/09/06', ['lunch'])}
@@ -0,0 +1,86 @@
+"""
+交易式多檔補丁測試 — 任一 target 缺錨點時整組都不寫; 提交中途失敗必須還原; 替換後權限不變;
+多支腳本同一次讀寫, 只放棄缺錨點的腳本
+"""
+import os
+import stat
+
+import pytest
+
+from tools.ledger import Ledger
+from tools.transaction import TransactionError, apply_transaction
+from tools.patching import Edit, Patch, script_of
+
+PATCHES = [
+    Patch('demo/html', 'index.html', (Edit('<main>', '<main>\n<button id="history"></button>'),)),
+    Patch('demo/css', 'styles.css', (Edit(None, '#history {}\n'),)),
+    Patch('demo/js', 'app.js', (Edit('init();', 'init();\ninitHistory();'),)),
+]
+
+
+def _tree(tmp_path, js='init();\n'):
+    (tmp_path / 'index.html').write_text('<main>\n</main>\n')
+    (tmp_path / 'styles.css').write_text('.a {}\n')
+    (tmp_path / 'app.js').write_text(js)
+    return {p.name: p.read_bytes() for p in tmp_path.iterdir()}
+
+
+def test_missing_anchor_leaves_whole_tree_untouched(tmp_path):
+    before = _tree(tmp_path, js='start();\n')
+    results = apply_transaction(PATCHES, root=tmp_path, ledger=Ledger(tmp_path), workers=2)
+    assert {r.patch.id: r.status for r in results} == {
+        'demo/html': 'aborted', 'demo/css': 'aborted', 'demo/js': 'missing'}
+    assert {p.name: p.read_bytes() for p in tmp_path.iterdir()} == before   # 連帳本都沒寫
+
+
+def test_parallel_apply_commits_every_target(tmp_path):
+    _tree(tmp_path)
+    for p in tmp_path.iterdir():
+        os.chmod(p, 0o644)
+    results = apply_transaction(PATCHES, root=tmp_path, ledger=Ledger(tmp_path), workers=3)
+    assert [r.status for r in results] == ['applied'] * 3
+    assert 'initHistory();' in (tmp_path / 'app.js').read_text()
+    assert {stat.S_IMODE(p.stat().st_mode) for p in tmp_path.iterdir() if p.suffix != '.json'} == {0o644}
+    again = apply_transaction(PATCHES, root=tmp_path, ledger=Ledger(tmp_path))
+    assert [r.status for r in again] == ['skipped'] * 3
+
+
+def test_failed_rename_rolls_back_replaced_targets(tmp_path, monkeypatch):
+    before = _tree(tmp_path)
+    real_replace = os.replace
+    calls = []
+
+    def flaky_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 2:
+            raise OSError('disk full')
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', flaky_replace)
+    with pytest.raises(TransactionError):
+        apply_transaction(PATCHES, root=tmp_path, workers=1)
+    monkeypatch.setattr(os, 'replace', real_replace)
+    assert {p.name: p.read_bytes() for p in tmp_path.iterdir()} == before   # 無暫存檔殘留
+
+
+def test_units_share_one_pass(tmp_path, monkeypatch):
+    _tree(tmp_path)
+    patches = PATCHES + [Patch('other/js', 'app.js', (Edit('start();', 'start();\\nboot();'),)),
+                         Patch('other/css', 'styles.css', (Edit('.a {}', '.a { color: red; }'),))]
+    reads = []
+    real_open = open
+
+    def counting_open(path, mode='r', *args, **kwargs):
+        if 'b' in mode and 'r' in mode:
+            reads.append(os.path.basename(path))
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    results = apply_transaction(patches, root=tmp_path, ledger=Ledger(tmp_path), workers=1, unit=script_of)
+    monkeypatch.undo()
+    assert sorted(r for r in reads if r != '.patch-ledger.json') == ['app.js', 'index.html', 'styles.css']
+    assert {r.patch.id: r.status for r in results} == {
+        'demo/html': 'applied', 'demo/css': 'applied', 'demo/js': 'applied',
+        'other/js': 'missing', 'other/css': 'aborted'}
+    assert (tmp_path / 'styles.css').read_text() == '.a {}\n#history {}\n'       # 只放棄缺錨點的腳本
+    assert 'initHistory();' in (tmp_path / 'app.js').read_text()
@@ -0,0 +1,10 @@
+"""
+禮堂&專科教室&IPAD平板車預約系統 — Python 建置 / 維運工具
+
+根目錄的 codemod 腳本 (update_files.py、add_mobile_button.py、update_styles.py、
+add_history_batch.py) 只負責「宣告」要改什麼, 實際讀檔、比對、寫檔都交給本套件。
+"""
+from pathlib import Path
+
+# repo 根目錄 (所有 target 路徑都相對於此, 不再寫死 h:\schedule\)
+ROOT = Path(__file__).resolve().parent.parent
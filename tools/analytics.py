@@ -0,0 +1,337 @@
+"""
+離線進階分析 (offline analytics engine)
+
+管理後台的 buildHeatmap / buildVenueRanking / buildUserFrequency /
+buildCancellationAnalysis / buildLeadTimeDistribution 在瀏覽器中逐筆處理整學期的預約,
+整學年的資料就會讓分頁卡住。本模組讀取 executeExport 產生的 CSV、封存 JSON
+或 Firestore JSON 匯出, 在 Python 端算出與上述函式相同的結果, 輸出後台可直接載入的 JSON。
+Firestore 匯出中的 bookingSeries 系列文件以 tools/series.expand 展開成各日期的預約, 與 withSeriesBookings 相同。
+
+資料先轉成欄式 (columnar) 結構: 每個欄位一個 list / array, 各統計以 zip + Counter
+一次走完整欄, 不逐筆建立物件; repo 不依賴 NumPy, 只用標準函式庫。
+
+語意與 app.js 一致之處:
+  - periods 為空 = 已取消; 節次數為 periods 長度
+  - room 空白 → '禮堂'; booker 空白 → '未知'
+  - 排序為穩定排序, 同分時保留 JS 物件鍵的列舉順序 (整數鍵在前)
+  - 提前天數以台灣時間 (UTC+8) 的預約日 00:00 減去建立時間
+
+用法:
+    python -m tools.analytics 預約匯出.csv -o analytics.json
+    python -m tools.analytics archive-113-1.json archive-113-2.json --start 2024-08-01 --end 2025-07-31
+    python -m tools.analytics schoolA.csv schoolB.csv --per-source      # 各校分開輸出
+"""
+import argparse
+import csv
+import json
+import math
+import re
+import sys
+from array import array
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from tools import ROOT
+from tools.firestore import decode_value
+from tools.jsindex import JsIndex
+
+TIMEZONE = timezone(timedelta(hours=8))
+DEFAULT_ROOM = '禮堂'
+UNKNOWN_BOOKER = '未知'
+MONTH_NAMES = [f'{m}月' for m in range(1, 13)]
+LEAD_TIME_LABELS = ['當天', '1–3天', '4–7天', '8–14天', '15天+']
+CSV_HEADERS = ['預約編號', '預約日期', '場地名稱', '預約節次', '預約者姓名', '預約理由/用途', '建立時間', '操作裝置ID', '狀態']
+
+_ARRAY_INDEX = re.compile(r'^(?:0|[1-9]\d*)$')
+_LOCALE_TIME = re.compile(r'^(\d{4})/(\d{1,2})/(\d{1,2}) (\d{1,2}):(\d{2}):(\d{2})$')
+
+
+def app_constants(root=ROOT):
+    """從 app.js 讀出 ROOMS 與 PERIODS (名稱 → id), 避免兩邊各維護一份"""
+    idx = JsIndex.from_file(root / 'app.js')
+    rooms = re.findall(r'"([^"]*)"', idx.text(idx.find('ROOMS')))
+    periods = dict((name, pid) for pid, name in
+                   re.findall(r"id:\s*'([^']*)',\s*name:\s*'([^']*)'", idx.text(idx.find('PERIODS'))))
+    return rooms, periods
+
+
+class Columns:
+    """欄式預約資料; created 以 epoch 秒儲存, 未知為 NaN"""
+
+    def __init__(self):
+        self.ids = []
+        self.date = []              # 'YYYY/MM/DD' (原字串)
+        self.room = []
+        self.booker = []
+        self.periods = array('H')   # 節次數; 0 = 已取消
+        self.created = array('d')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, doc_id, day, room, booker, periods, created):
+        self.ids.append(doc_id)
+        self.date.append(day or '')
+        self.room.append(room or DEFAULT_ROOM)
+        self.booker.append(booker or UNKNOWN_BOOKER)
+        self.periods.append(periods)
+        self.created.append(created.timestamp() if created else math.nan)
+
+    def extend(self, other):
+        self.ids += other.ids
+        self.date += other.date
+        self.room += other.room
+        self.booker += other.booker
+        self.periods += other.periods
+        self.created += other.created
+
+    def valid(self):
+        """periods 非空者的遮罩"""
+        return [n > 0 for n in self.periods]
+
+
+# ===== 讀取 =====
+
+def parse_created(value):
+    """ISO 字串 / zh-TW toLocaleString ('2025/3/5 14:03:22') / Firestore timestamp dict → aware datetime"""
+    if not value or value == '未知時間':
+        return None
+    if isinstance(value, dict):
+        seconds = value.get('_seconds', value.get('seconds'))
+        if seconds is None:
+            return None
+        return datetime.fromtimestamp(seconds + value.get('_nanoseconds', value.get('nanoseconds', 0)) / 1e9,
+                                      timezone.utc)
+    value = str(value).strip()
+    m = _LOCALE_TIME.match(value)
+    if m:
+        return datetime(*map(int, m.groups()), tzinfo=TIMEZONE)
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=TIMEZONE)
+
+
+def iter_csv(path):
+    """逐筆讀出 executeExport 的 CSV (含 Excel BOM); periods 為節次名稱"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header != CSV_HEADERS:
+            raise ValueError(f'{path}: 不是 executeExport 的 CSV 格式')
+        for row in reader:
+            if not row:
+                continue
+            doc_id, day, room, periods, booker, reason, created, device, _status = row
+            yield {'id': doc_id, 'date': day, 'room': room, 'periods': periods.split(' & ') if periods else [],
+                   'booker': booker, 'reason': reason, 'createdAt': created, 'deviceId': device}
+
+
+def iter_json(path):
+    """逐筆讀出封存 JSON ({bookings: [...]})、文件陣列, 或 Firestore REST 匯出 ({documents: [...]});
+    bookingSeries 文件 (帶 dayBits) 展開成各日期的虛擬預約"""
+    from tools.series import expand        # tools.series 匯入本模組, 延後到用時才載入
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('bookings', data.get('documents', []))
+    for doc in data:
+        if 'fields' in doc:
+            doc_id = doc.get('name', '').rsplit('/', 1)[-1]
+            doc = {k: decode_value(v) for k, v in doc['fields'].items()}
+            doc.setdefault('id', doc_id)
+        if 'dayBits' in doc:
+            yield from expand(doc)
+        else:
+            yield doc
+
+
+def iter_docs(path):
+    return iter_csv(path) if str(path).lower().endswith('.csv') else iter_json(path)
+
+
+def _columns(docs):
+    cols = Columns()
+    for doc in docs:
+        cols.append(doc.get('id', ''), doc.get('date'), doc.get('room'), doc.get('booker'),
+                    len(doc.get('periods') or ()), parse_created(doc.get('createdAt')))
+    return cols
+
+
+def read_csv(path):
+    return _columns(iter_csv(path))
+
+
+def read_json(path):
+    return _columns(iter_json(path))
+
+
+def load(path):
+    return _columns(iter_docs(path))
+
+
+# ===== 統計 (對應 app.js 的 build* 函式) =====
+
+def js_key_order(keys):
+    """JS 物件鍵的列舉順序: 陣列索引形式的整數鍵由小到大在前, 其餘依插入順序"""
+    keys = list(keys)
+    ints = sorted((k for k in keys if _ARRAY_INDEX.match(k) and int(k) < 2 ** 32 - 1), key=int)
+    return ints + [k for k in keys if k not in set(ints)]
+
+
+def _weighted(keys, weights):
+    counts = Counter()
+    for key, n in zip(keys, weights):
+        counts[key] += n
+    return counts
+
+
+def heatmap(cols, start_iso, end_iso):
+    """buildHeatmap: 每週一欄 (週一起算), 含月份標籤與 0–4 色階"""
+    mask = cols.valid()
+    day_count = _weighted((d for d, ok in zip(cols.date, mask) if ok), (n for n in cols.periods if n))
+    max_val = max(max(day_count.values(), default=1), 1)
+
+    def level(count):
+        if not count:
+            return 0
+        if count <= max_val * 0.25:
+            return 1
+        if count <= max_val * 0.50:
+            return 2
+        if count <= max_val * 0.75:
+            return 3
+        return 4
+
+    start = date.fromisoformat(start_iso)
+    end = date.fromisoformat(end_iso)
+    cursor = start - timedelta(days=start.weekday())
+    weeks = []
+    prev_month = None
+    while cursor <= end:
+        if cursor.weekday() == 0:
+            label = MONTH_NAMES[cursor.month - 1] if cursor.month != prev_month else ''
+            prev_month = cursor.month
+            weeks.append({'label': label, 'cells': []})
+        key = cursor.strftime('%Y/%m/%d')
+        count = day_count.get(key, 0)
+        inside = start <= cursor <= end
+        weeks[-1]['cells'].append([key, count, level(count) if inside else 0, inside])
+        cursor += timedelta(days=1)
+    return {'start': start_iso, 'end': end_iso, 'max': max_val, 'weeks': weeks}
+
+
+def venue_ranking(cols, rooms):
+    """buildVenueRanking: 只計 ROOMS 內的場地, 依節次數遞減"""
+    counts = _weighted((r for r, n in zip(cols.room, cols.periods) if n), (n for n in cols.periods if n))
+    ranked = [[room, counts.get(room, 0)] for room in rooms if counts.get(room, 0) > 0]
+    return sorted(ranked, key=lambda item: -item[1])
+
+
+def user_frequency(cols, limit=10):
+    """buildUserFrequency: 節次數最多的前 10 名預約者"""
+    counts = _weighted((b for b, n in zip(cols.booker, cols.periods) if n), (n for n in cols.periods if n))
+    ranked = [[name, counts[name]] for name in js_key_order(counts)]
+    return sorted(ranked, key=lambda item: -item[1])[:limit]
+
+
+def cancellation(cols, rooms):
+    """buildCancellationAnalysis: 各場地 [場地, 成立, 取消, 取消率], 依取消率遞減"""
+    valid = Counter(r for r, n in zip(cols.room, cols.periods) if n)
+    cancelled = Counter(r for r, n in zip(cols.room, cols.periods) if not n)
+    order = js_key_order(list(rooms) + [r for r in dict.fromkeys(cols.room) if r not in set(rooms)])
+    rows = [[room, valid[room], cancelled[room], cancelled[room] / (valid[room] + cancelled[room])]
+            for room in order if valid[room] + cancelled[room] > 0]
+    return sorted(rows, key=lambda row: -row[3])
+
+
+def lead_time(cols):
+    """buildLeadTimeDistribution: 當天 / 1–3 / 4–7 / 8–14 / 15 天以上"""
+    buckets = [0] * 5
+    day_start = {}
+    for day, n, created in zip(cols.date, cols.periods, cols.created):
+        if not n or not day or math.isnan(created):
+            continue
+        if day not in day_start:
+            y, m, d = (int(p) for p in day.replace('-', '/').split('/'))
+            day_start[day] = datetime(y, m, d, tzinfo=TIMEZONE).timestamp()
+        days = max(0, math.floor((day_start[day] - created) * 1000 / 86400000))
+        buckets[0 if days == 0 else 1 if days <= 3 else 2 if days <= 7 else 3 if days <= 14 else 4] += 1
+    return {'labels': LEAD_TIME_LABELS, 'counts': buckets}
+
+
+def kpi(cols):
+    mask = cols.valid()
+    return {
+        'totalBookings': sum(mask),
+        'totalPeriods': sum(cols.periods),
+        'uniqBookers': len({b for b, ok in zip(cols.booker, mask) if ok}),
+        'cancelCount': len(cols) - sum(mask),
+    }
+
+
+def in_range(cols, start_iso, end_iso):
+    """與 runAnalyticsWithRange 相同: date 字串介於 YYYY/MM/DD 區間 (含端點)"""
+    lo, hi = start_iso.replace('-', '/'), end_iso.replace('-', '/')
+    keep = [i for i, day in enumerate(cols.date) if lo <= day <= hi]
+    if len(keep) == len(cols):
+        return cols
+    out = Columns()
+    out.ids = [cols.ids[i] for i in keep]
+    out.date = [cols.date[i] for i in keep]
+    out.room = [cols.room[i] for i in keep]
+    out.booker = [cols.booker[i] for i in keep]
+    out.periods = array('H', (cols.periods[i] for i in keep))
+    out.created = array('d', (cols.created[i] for i in keep))
+    return out
+
+
+def analyze(cols, start_iso=None, end_iso=None, rooms=None):
+    """回傳整份分析報告 (後台 JSON 格式)"""
+    if rooms is None:
+        rooms, _ = app_constants()
+    dates = [d for d in cols.date if d]
+    start_iso = start_iso or (min(dates).replace('/', '-') if dates else date.today().isoformat())
+    end_iso = end_iso or (max(dates).replace('/', '-') if dates else start_iso)
+    cols = in_range(cols, start_iso, end_iso)
+    return {
+        'range': {'start': start_iso, 'end': end_iso},
+        'kpi': kpi(cols),
+        'heatmap': heatmap(cols, start_iso, end_iso),
+        'venueRanking': venue_ranking(cols, rooms),
+        'userFrequency': user_frequency(cols),
+        'cancellation': cancellation(cols, rooms),
+        'leadTime': lead_time(cols),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='離線計算進階分析儀表板資料')
+    parser.add_argument('inputs', nargs='+', help='executeExport CSV / 封存 JSON / Firestore JSON 匯出')
+    parser.add_argument('--start', help='YYYY-MM-DD (預設為資料中最早日期)')
+    parser.add_argument('--end', help='YYYY-MM-DD (預設為資料中最晚日期)')
+    parser.add_argument('--per-source', action='store_true', help='每個輸入檔 (例如各校) 分開輸出')
+    parser.add_argument('-o', '--output', help='輸出 JSON 路徑 (預設 stdout)')
+    args = parser.parse_args(argv)
+
+    rooms, _ = app_constants()
+    sources = {Path(p).stem: load(p) for p in args.inputs}
+    if args.per_source:
+        report = {name: analyze(cols, args.start, args.end, rooms) for name, cols in sources.items()}
+    else:
+        combined = Columns()
+        for cols in sources.values():
+            combined.extend(cols)
+        report = analyze(combined, args.start, args.end, rooms)
+    payload = json.dumps(report, ensure_ascii=False, separators=(',', ':'))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+        print(f"✓ {sum(len(c) for c in sources.values())} 筆預約 → {args.output}", file=sys.stderr)
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+預約異動串流異常偵測 (editTrail → 滑動視窗計數)
+
+functions/index.js 的 anomalyDetection 每 30 分鐘重查一次 audit_logs 最近 1 小時的資料:
+讀取量隨歷史成長, 而且異常最久要等一個排程週期才看得到, 也只看全站總量,
+分不出是哪一台裝置 / 哪位預約者在大量建立或取消。
+
+本模組把 trackBookingChanges 寫入的 editTrail 當成串流逐筆餵進偵測器:
+
+  - 每筆異動先分類為 created / updated / cancelled (periods 改成空陣列) / deleted
+  - 每條規則 (RULES) 對一個維度 (deviceId / booker / room) 的每個值維護一個滑動視窗計數:
+    視窗切成 BUCKETS 格的環狀陣列 + 累計值, 每筆異動只動固定格數 (O(1)), 記憶體與歷史長度無關;
+    時間往前推時只清掉被越過的格, 視窗內晚到 (順序顛倒) 的異動仍記入原本那一格
+  - 累計值一跨過門檻立即產生告警, 同一 (規則, 值) 一個視窗內只告警一次
+  - 超過視窗沒有新異動的值每 PRUNE_EVERY 筆清除一次, 活躍值才佔記憶體
+
+視窗解析度為 window / BUCKETS (預設 10 分鐘視窗 = 10 秒一格), 計數可能多算最舊的一格。
+
+來源:
+  Firestore — 以 changedAt 遞增讀取 --since 分鐘內的 editTrail; --follow 之後持續輪詢,
+              每次回看 LOOKBACK 秒 (伺服器時間戳與可見順序不一定一致) 並依文件 id 去重
+  匯出檔   — .jsonl / .ndjson 每行一筆, .json 為陣列或 {documents: [...]} (同 tools.auditarchive),
+              逐筆讀取不整檔載入, 調整門檻時可重播同一份日誌比較告警數
+
+用法:
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.anomaly --project demo-test
+    python -m tools.anomaly --project <專案> --token "$(gcloud auth print-access-token)" --follow
+    python -m tools.anomaly editTrail.jsonl --set device_mass_cancel=15/300    # 重播匯出檔並調整門檻
+    python -m tools.anomaly editTrail.jsonl --json > alerts.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+
+from tools.analytics import TIMEZONE, parse_created
+from tools.auditarchive import iter_export
+from tools.firestore import Firestore
+
+COLLECTION = 'editTrail'
+BUCKETS = 60
+PRUNE_EVERY = 4096
+LOOKBACK = 30               # 秒
+POLL_INTERVAL = 5           # 秒
+SINCE_MINUTES = 60
+
+Rule = namedtuple('Rule', 'name dimension kinds threshold window label')
+
+RULES = (
+    Rule('device_mass_create', 'deviceId', frozenset({'created'}), 30, 600, '同一裝置大量建立'),
+    Rule('device_mass_cancel', 'deviceId', frozenset({'cancelled', 'deleted'}), 20, 600, '同一裝置大量取消 / 刪除'),
+    Rule('booker_mass_create', 'booker', frozenset({'created'}), 40, 3600, '同一預約者大量建立'),
+    Rule('booker_mass_cancel', 'booker', frozenset({'cancelled', 'deleted'}), 30, 3600, '同一預約者大量取消 / 刪除'),
+    Rule('room_churn', 'room', frozenset({'created', 'updated', 'cancelled', 'deleted'}), 60, 600, '單一場地異動暴增'),
+)
+
+
+def change_kind(entry):
+    """editTrail 文件 → 'created' / 'updated' / 'cancelled' / 'deleted'"""
+    kind = entry.get('changeType') or 'updated'
+    if kind == 'updated':
+        periods = (entry.get('changes') or {}).get('periods')
+        if isinstance(periods, dict) and periods.get('before') and not periods.get('after'):
+            return 'cancelled'
+    return kind
+
+
+def _epoch(value):
+    created = parse_created(value) if value is not None and not isinstance(value, datetime) else value
+    return created.timestamp() if created else None
+
+
+class _Window:
+    """一個 (規則, 值) 的環狀計數: counts[bucket % size], head = 最新一格的編號"""
+    __slots__ = ('counts', 'head', 'total', 'alerted')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.head = None
+        self.total = 0
+        self.alerted = None
+
+    def add(self, bucket):
+        """記一筆, 回傳視窗內的總數; 早於視窗的異動不計"""
+        size = len(self.counts)
+        if self.head is None:
+            self.head = bucket
+        elif bucket > self.head:
+            for b in range(max(self.head + 1, bucket - size + 1), bucket + 1):
+                self.total -= self.counts[b % size]
+                self.counts[b % size] = 0
+            self.head = bucket
+        elif bucket <= self.head - size:
+            return self.total
+        self.counts[bucket % size] += 1
+        self.total += 1
+        return self.total
+
+
+def window_text(seconds):
+    if seconds % 3600 == 0:
+        return f'{seconds // 3600} 小時'
+    return f'{seconds // 60} 分鐘' if seconds % 60 == 0 else f'{seconds} 秒'
+
+
+class Detector:
+    """逐筆 feed() editTrail 文件, 回傳這一筆觸發的告警 [dict]"""
+
+    def __init__(self, rules=RULES, buckets=BUCKETS):
+        self.rules = list(rules)
+        self.buckets = buckets
+        self.windows = [{} for _ in self.rules]
+        self.events = 0
+        self.skipped = 0
+        self.newest = None
+        self.alerts = Counter()         # 規則名稱 → 告警數
+
+    def feed(self, entry):
+        ts = _epoch(entry.get('changedAt'))
+        if ts is None:
+            self.skipped += 1
+            return []
+        self.events += 1
+        if self.newest is None or ts > self.newest:
+            self.newest = ts
+        kind = change_kind(entry)
+        alerts = []
+        for rule, windows in zip(self.rules, self.windows):
+            key = entry.get(rule.dimension)
+            if kind not in rule.kinds or not key:
+                continue
+            bucket = int(ts * self.buckets // rule.window)
+            window = windows.get(key)
+            if window is None:
+                window = windows[key] = _Window(self.buckets)
+            count = window.add(bucket)
+            if count >= rule.threshold and (window.alerted is None or bucket - window.alerted >= self.buckets):
+                window.alerted = bucket
+                self.alerts[rule.name] += 1
+                alerts.append({
+                    'rule': rule.name, 'label': rule.label, 'dimension': rule.dimension, 'key': key,
+                    'count': count, 'threshold': rule.threshold, 'window': rule.window,
+                    'at': datetime.fromtimestamp(ts, TIMEZONE).isoformat(), 'bookingId': entry.get('bookingId'),
+                })
+        if self.events % PRUNE_EVERY == 0:
+            self.prune()
+        return alerts
+
+    def prune(self):
+        """清除超過一個視窗沒有新異動的值"""
+        if self.newest is None:
+            return
+        for rule, windows in zip(self.rules, self.windows):
+            horizon = int(self.newest * self.buckets // rule.window) - self.buckets
+            for key in [k for k, w in windows.items() if w.head <= horizon]:
+                del windows[key]
+
+    def tracked(self):
+        """目前追蹤中的 (規則, 值) 數"""
+        return sum(len(w) for w in self.windows)
+
+
+def follow(client, since, poll_interval=POLL_INTERVAL, lookback=LOOKBACK, polls=None):
+    """依 changedAt 遞增 yield since (datetime) 之後的 editTrail; polls=None 持續輪詢, 否則輪詢 polls 次"""
+    seen = {}                       # 文件 id → changedAt; 只保留回看範圍內的, 記憶體不隨時間成長
+    start = newest = since.timestamp()
+    n = 0
+    while polls is None or n < polls:
+        if n:
+            time.sleep(poll_interval)
+        n += 1
+        after = datetime.fromtimestamp(max(start, newest - lookback), timezone.utc)
+        for entry in client.stream_query(COLLECTION, [('changedAt', '>=', after)], [('changedAt', 'asc')]):
+            ts = _epoch(entry.get('changedAt'))
+            if entry['id'] in seen or ts is None:
+                continue
+            seen[entry['id']] = ts
+            newest = max(newest, ts)
+            yield entry
+        seen = {k: ts for k, ts in seen.items() if ts >= newest - lookback}
+
+
+def format_alert(alert):
+    at = alert['at'][:19].replace('T', ' ')
+    return (f"✗ {at} {alert['label']} ({alert['rule']}) {alert['dimension']}={alert['key']}: "
+            f"{window_text(alert['window'])}內 {alert['count']} 筆 (門檻 {alert['threshold']})")
+
+
+def run(entries, detector, emit):
+    """把 entries 逐筆餵進 detector, 每則告警呼叫 emit"""
+    for entry in entries:
+        for alert in detector.feed(entry):
+            emit(alert)
+
+
+def parse_overrides(values, rules=RULES):
+    """['規則=門檻/視窗秒數', ...] → 調整後的規則"""
+    by_name = {r.name: r for r in rules}
+    for value in values or ():
+        name, _, spec = value.partition('=')
+        threshold, _, window = spec.partition('/')
+        if name not in by_name or not threshold.isdigit() or (window and not window.isdigit()):
+            raise ValueError(f'無法解析 {value!r} (格式: 規則=門檻[/視窗秒數], 規則: {", ".join(by_name)})')
+        by_name[name] = by_name[name]._replace(threshold=int(threshold), window=int(window or by_name[name].window))
+    return [by_name[r.name] for r in rules]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='editTrail 串流異常偵測 (滑動視窗)')
+    parser.add_argument('export', nargs='?', help='重播匯出檔 (.jsonl / .json); 省略則讀 Firestore')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+    parser.add_argument('--token', help='OAuth access token (正式環境 editTrail 需登入才能讀; emulator 不需要)')
+    parser.add_argument('--since', type=float, default=SINCE_MINUTES, help='從幾分鐘前開始讀 (暖機視窗)')
+    parser.add_argument('--follow', action='store_true', help='持續輪詢新的異動')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='輪詢間隔秒數')
+    parser.add_argument('--set', action='append', dest='overrides', metavar='規則=門檻[/秒]', help='調整規則 (可重複)')
+    parser.add_argument('--json', action='store_true', help='告警以 JSON Lines 輸出')
+    args = parser.parse_args(argv)
+    try:
+        rules = parse_overrides(args.overrides)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.export and not args.project:
+        parser.error('需要匯出檔或 --project (或 GCLOUD_PROJECT)')
+
+    def emit(alert):
+        print(json.dumps(alert, ensure_ascii=False) if args.json else format_alert(alert), flush=True)
+
+    detector = Detector(rules)
+    client = None
+    if args.export:
+        entries = iter_export(args.export)
+    else:
+        client = Firestore(args.project, token=args.token)
+        since = datetime.fromtimestamp(time.time() - args.since * 60, timezone.utc)
+        entries = follow(client, since, args.interval, polls=None if args.follow else 1)
+    t0 = time.perf_counter()
+    try:
+        run(entries, detector, emit)
+    except KeyboardInterrupt:
+        pass                        # --follow 以 Ctrl-C 結束, 照樣印出統計
+    finally:
+        if client:
+            client.close()
+    if args.json:
+        return 0
+    print(f'· 處理 {detector.events} 筆異動 ({time.perf_counter() - t0:.2f} s), 追蹤 {detector.tracked()} 個值'
+          + (f', {detector.skipped} 筆沒有 changedAt' if detector.skipped else ''))
+    for rule in rules:
+        print(f'  {rule.name:<20} 門檻 {rule.threshold:>3} / {window_text(rule.window):<6} 告警 {detector.alerts[rule.name]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,603 @@
+"""
+圖示縮圖與預先壓縮 (icon resizing + precompressed assets)
+
+favicon.png 其實是 446 KB、1024×1024 的 JPEG (副檔名與 manifest 的 image/png 都不對,
+背景還是畫死在圖裡的灰白棋盤格), 卻同時被當成分頁圖示、apple-touch-icon、PWA 192 / 512 圖示,
+並列在 sw.js 的 ASSETS_TO_CACHE → 每位使用者第一次安裝都要先下載這張大圖。
+
+本模組在部署時 (tools.fingerprint 之後):
+  1. 解碼 favicon.png (純 Python baseline JPEG 解碼; 以縮小版 IDCT 直接解出 512 px), 棋盤格背景改成純白,
+     面積平均縮成 favicon-32 / apple-touch-icon (180) / icon-192 / icon-512 四張 PNG
+  2. manifest.json 的 icons 改列 192 / 512 兩張; index.html 的 icon / apple-touch-icon / 安裝提示圖改指向對應尺寸
+  3. sw.js 預快取清單以 favicon-32 + icon-192 取代 favicon.png (CACHE_NAME 雜湊隨之更新), 推播通知改用 icon-192
+  4. (選用, --precompress) index.html、sw.js、manifest.json 與預快取清單中的 JS / CSS 另存 .gz
+     (有安裝 brotli 套件時再加 .br), 供支援預先壓縮檔的主機 (nginx gzip_static / brotli_static) 直接送出
+
+GitHub Pages 會自行壓縮回應, 不會送出同名的 .gz 檔, 所以部署流程不產生壓縮檔;
+首次安裝下載量的節省全部來自圖示 (摘要中安裝前後都以未壓縮的檔案大小計算)。
+
+只用標準函式庫; progressive JPEG 等不支援的格式會直接報錯, 不會產生半套圖示。
+
+用法:
+    python -m tools.assets                  # 部署用: 產生圖示、改寫引用
+    python -m tools.assets --precompress    # 另外輸出 .gz / .br (自架 nginx 等會送預先壓縮檔的主機)
+    python -m tools.assets --dry-run        # 只計算尺寸與首次安裝下載量, 不寫檔
+"""
+import argparse
+import gzip
+import json
+import math
+import re
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from tools import ROOT
+from tools.fingerprint import current_assets, is_local, sw_patches
+from tools.patching import Edit, Patch, apply_patches, encode, read_text, report, with_eol, write_atomic
+
+try:
+    import brotli
+except ImportError:         # 選用: 沒有安裝就只輸出 .gz
+    brotli = None
+
+ICON_SOURCE = 'favicon.png'
+# (輸出檔名, 邊長 px)
+ICONS = (
+    ('favicon-32.png', 32),
+    ('apple-touch-icon.png', 180),
+    ('icon-192.png', 192),
+    ('icon-512.png', 512),
+)
+MANIFEST_ICONS = ('icon-192.png', 'icon-512.png')
+PRECACHE_ICONS = ('favicon-32.png', 'icon-192.png')
+# index.html 中引用 favicon.png 的標籤 → 換成的圖示 (依 rel; <img> 等其他標籤用 DEFAULT_ICON)
+HTML_ICONS = {'icon': 'favicon-32.png', 'shortcut icon': 'favicon-32.png', 'apple-touch-icon': 'apple-touch-icon.png'}
+DEFAULT_ICON = 'icon-192.png'
+# sw.js showNotification 的圖示欄位
+NOTIFICATION_ICONS = {'icon': 'icon-192.png', 'badge': 'icon-192.png'}
+# 棋盤格背景: 各色版都 ≥ BACKGROUND_FLOOR 且色差 ≤ BACKGROUND_SPREAD 的淺灰 / 白 → 純白
+BACKGROUND_FLOOR = 224
+BACKGROUND_SPREAD = 16
+COMPRESSIBLE = ('.html', '.js', '.css', '.json')
+ALWAYS_COMPRESS = ('index.html', 'sw.js', 'manifest.json')
+
+_TAG = re.compile(r'<(?:link|img)\b[^>]*>', re.IGNORECASE)
+_REL = re.compile(r'\brel="([^"]+)"', re.IGNORECASE)
+_SCAN_END = re.compile(rb'\xff[^\x00\xd0-\xd7]')
+_RESTART = re.compile(rb'\xff[\xd0-\xd7]')
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 第 k 個 zigzag 係數在 8×8 區塊 (列優先) 的位置
+ZIGZAG = (0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5, 12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6,
+          7, 14, 21, 28, 35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51, 58, 59, 52, 45, 38, 31,
+          39, 46, 53, 60, 61, 54, 47, 55, 62, 63)
+
+
+@dataclass
+class Image:
+    """8-bit RGB 影像, pixels 為列優先的 bytearray (每像素 3 bytes)"""
+    width: int
+    height: int
+    pixels: bytearray
+
+    def pixel(self, x, y):
+        i = (y * self.width + x) * 3
+        return tuple(self.pixels[i:i + 3])
+
+
+# ===== JPEG 解碼 (baseline, Huffman) =====
+
+def _huffman(counts, symbols):
+    """16-bit 前瞻查表: table[接下來 16 bits] = 碼長 << 8 | 符號"""
+    table = [0] * 65536
+    code = k = 0
+    for length in range(1, 17):
+        span = 1 << (16 - length)
+        for _ in range(counts[length - 1]):
+            entry = length << 8 | symbols[k]
+            table[code * span:(code + 1) * span] = [entry] * span
+            code += 1
+            k += 1
+        code <<= 1
+    return table
+
+
+def _idct_table(n):
+    """n 點縮小版 IDCT: 8×8 係數只取左上 n×n, 直接解出 n×n 像素 (libjpeg 的 scaled decode)"""
+    return [[(math.sqrt(0.5) if u == 0 else 1.0) / 2 * math.cos((2 * k + 1) * u * math.pi / (2 * n))
+             for u in range(n)] for k in range(n)]
+
+
+def _segments(scan):
+    """熵編碼資料依 RST 標記切段, 去掉 0xFF00 填充; 尾端補 0 供 16-bit 前瞻"""
+    return [s.replace(b'\xff\x00', b'\xff') + bytes(4) for s in _RESTART.split(scan)]
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+class _Frame:
+    def __init__(self, segment, scale):
+        self.height, self.width = struct.unpack('>HH', segment[1:5])
+        self.components = {}
+        for i in range(segment[5]):
+            cid, hv, tq = segment[6 + i * 3:9 + i * 3]
+            self.components[cid] = {'h': hv >> 4, 'v': hv & 15, 'tq': tq, 'pred': 0}
+        self.hmax = max(c['h'] for c in self.components.values())
+        self.vmax = max(c['v'] for c in self.components.values())
+        self.mcux = _ceil_div(self.width, 8 * self.hmax)
+        self.mcuy = _ceil_div(self.height, 8 * self.vmax)
+        self.n = 8 // scale
+        for c in self.components.values():
+            c['stride'] = self.mcux * c['h'] * self.n
+            c['plane'] = bytearray(c['stride'] * self.mcuy * c['v'] * self.n)
+            # 非交錯 scan 只涵蓋該色版實際的寬高, 不補到 MCU 邊界
+            c['blocks_x'] = _ceil_div(_ceil_div(self.width * c['h'], self.hmax), 8)
+            c['blocks_y'] = _ceil_div(_ceil_div(self.height * c['v'], self.vmax), 8)
+
+
+def _decode_scan(frame, scan_components, segments, restart, quant, idct):
+    n = frame.n
+    keep = [ZIGZAG[k] // 8 < n and ZIGZAG[k] % 8 < n for k in range(64)]
+    single = len(scan_components) == 1
+    if single:
+        c = scan_components[0][0]
+        total = c['blocks_x'] * c['blocks_y']
+    else:
+        total = frame.mcux * frame.mcuy
+    per_segment = restart or total
+
+    for index, data in enumerate(segments):
+        first = index * per_segment
+        if first >= total:
+            break
+        for c, _, _ in scan_components:
+            c['pred'] = 0
+        acc = nbits = pos = 0
+
+        def bits(count):
+            nonlocal acc, nbits, pos
+            while nbits < 16:
+                acc = (acc & 0xFFFF) << 8 | data[pos]
+                pos += 1
+                nbits += 8
+            nbits -= count
+            return acc >> nbits & ((1 << count) - 1)
+
+        def symbol(table):
+            nonlocal acc, nbits, pos
+            while nbits < 16:
+                acc = (acc & 0xFFFF) << 8 | data[pos]
+                pos += 1
+                nbits += 8
+            entry = table[acc >> (nbits - 16) & 0xFFFF]
+            nbits -= entry >> 8
+            return entry & 0xFF
+
+        def block(c, dc, ac, bx, by):
+            q = quant[c['tq']]
+            coef = [0] * 64
+            s = symbol(dc)
+            if s:
+                v = bits(s)
+                c['pred'] += v - (1 << s) + 1 if v < 1 << (s - 1) else v
+            coef[0] = c['pred'] * q[0]
+            k = 1
+            while k < 64:
+                rs = symbol(ac)
+                s = rs & 15
+                if not s:
+                    if rs != 0xF0:
+                        break
+                    k += 16
+                    continue
+                k += rs >> 4
+                v = bits(s)
+                if k < 64 and keep[k]:
+                    coef[ZIGZAG[k]] = (v - (1 << s) + 1 if v < 1 << (s - 1) else v) * q[k]
+                k += 1
+            # 先對列、再對行做 n 點 IDCT
+            rows = [[sum(coef[r * 8 + u] * t[u] for u in range(n)) for t in idct] for r in range(n)]
+            plane, stride = c['plane'], c['stride']
+            base = by * n * stride + bx * n
+            for j, t in enumerate(idct):
+                out = base + j * stride
+                for i in range(n):
+                    value = round(sum(rows[r][i] * t[r] for r in range(n))) + 128
+                    plane[out + i] = 0 if value < 0 else 255 if value > 255 else value
+
+        for unit in range(first, min(first + per_segment, total)):
+            if single:
+                c, dc, ac = scan_components[0]
+                block(c, dc, ac, unit % c['blocks_x'], unit // c['blocks_x'])
+                continue
+            mx, my = unit % frame.mcux, unit // frame.mcux
+            for c, dc, ac in scan_components:
+                for by in range(c['v']):
+                    for bx in range(c['h']):
+                        block(c, dc, ac, mx * c['h'] + bx, my * c['v'] + by)
+
+
+def decode_jpeg(data, size=None):
+    """baseline JPEG → Image; 給 size 時以 1/2、1/4、1/8 縮小解碼, 但短邊不小於 size"""
+    if data[:2] != b'\xff\xd8':
+        raise ValueError('不是 JPEG 檔')
+    quant, tables, frame, restart = {}, {}, None, 0
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise ValueError(f'JPEG 標記錯誤 (位移 {pos})')
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0xD9:
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        segment = data[pos + 4:pos + 2 + length]
+        pos += 2 + length
+        if marker == 0xDB:
+            i = 0
+            while i < len(segment):
+                wide, tq = segment[i] >> 4, segment[i] & 15
+                if wide:
+                    quant[tq] = struct.unpack('>64H', segment[i + 1:i + 129])
+                    i += 129
+                else:
+                    quant[tq] = tuple(segment[i + 1:i + 65])
+                    i += 65
+        elif marker == 0xC4:
+            i = 0
+            while i < len(segment):
+                counts = segment[i + 1:i + 17]
+                total = sum(counts)
+                tables[segment[i] >> 4, segment[i] & 15] = _huffman(counts, segment[i + 17:i + 17 + total])
+                i += 17 + total
+        elif marker in (0xC0, 0xC1):
+            scale = 1
+            if size:
+                short = min(struct.unpack('>HH', segment[1:5]))
+                scale = max((s for s in (1, 2, 4, 8) if _ceil_div(short, s) >= size), default=1)
+            frame = _Frame(segment, scale)
+        elif 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise ValueError(f'只支援 baseline JPEG (SOF 0x{marker:02X})')
+        elif marker == 0xDD:
+            restart = int.from_bytes(segment[:2], 'big')
+        elif marker == 0xDA:
+            if frame is None:
+                raise ValueError('JPEG 缺少 SOF')
+            scan_components = [(frame.components[segment[1 + i * 2]],
+                                tables[0, segment[2 + i * 2] >> 4], tables[1, segment[2 + i * 2] & 15])
+                               for i in range(segment[0])]
+            end = _SCAN_END.search(data, pos)
+            end = end.start() if end else len(data)
+            _decode_scan(frame, scan_components, _segments(data[pos:end]), restart, quant, _idct_table(frame.n))
+            pos = end
+    if frame is None:
+        raise ValueError('JPEG 缺少 SOF')
+    return _to_rgb(frame)
+
+
+def _to_rgb(frame):
+    scale = 8 // frame.n
+    width, height = _ceil_div(frame.width, scale), _ceil_div(frame.height, scale)
+    planes = []
+    for c in frame.components.values():
+        xs = [x * c['h'] // frame.hmax for x in range(width)]
+        planes.append((c['plane'], c['stride'], xs, c['v']))
+    pixels = bytearray(width * height * 3)
+    out = 0
+    for y in range(height):
+        rows = [(plane, y * v // frame.vmax * stride, xs) for plane, stride, xs, v in planes]
+        if len(rows) == 1:
+            plane, base, xs = rows[0]
+            for x in range(width):
+                pixels[out:out + 3] = bytes((plane[base + xs[x]],)) * 3
+                out += 3
+            continue
+        (py, by, xy), (pb, bb, xb), (pr, br, xr) = rows[:3]
+        for x in range(width):
+            lum, cb, cr = py[by + xy[x]], pb[bb + xb[x]] - 128, pr[br + xr[x]] - 128
+            for value in (lum + 1.402 * cr, lum - 0.344136 * cb - 0.714136 * cr, lum + 1.772 * cb):
+                value = round(value)
+                pixels[out] = 0 if value < 0 else 255 if value > 255 else value
+                out += 1
+    return Image(width, height, pixels)
+
+
+# ===== PNG =====
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    return a if pa <= pb and pa <= pc else b if pb <= pc else c
+
+
+def _filtered(row, prev):
+    """五種 PNG 濾波中取絕對值和最小者 (libpng 的啟發式)"""
+    left = bytes(3) + row[:-3]
+    upleft = bytes(3) + prev[:-3]
+    candidates = (
+        row,
+        bytes((a - b) & 255 for a, b in zip(row, left)),
+        bytes((a - b) & 255 for a, b in zip(row, prev)),
+        bytes((a - (b + c) // 2) & 255 for a, b, c in zip(row, left, prev)),
+        bytes((a - _paeth(b, c, d)) & 255 for a, b, c, d in zip(row, left, prev, upleft)),
+    )
+    best = min(range(5), key=lambda f: sum(v if v < 128 else 256 - v for v in candidates[f]))
+    return bytes((best,)) + candidates[best]
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(image):
+    stride = image.width * 3
+    prev = bytes(stride)
+    raw = bytearray()
+    for y in range(image.height):
+        row = bytes(image.pixels[y * stride:(y + 1) * stride])
+        raw += _filtered(row, prev)
+        prev = row
+    header = struct.pack('>IIBBBBB', image.width, image.height, 8, 2, 0, 0, 0)
+    return (_PNG_SIGNATURE + _chunk(b'IHDR', header) + _chunk(b'IDAT', zlib.compress(bytes(raw), 9))
+            + _chunk(b'IEND', b''))
+
+
+def decode_png(data):
+    """8-bit 非交錯 RGB / RGBA PNG → Image (透明度疊在白底上)"""
+    if not data.startswith(_PNG_SIGNATURE):
+        raise ValueError('不是 PNG 檔')
+    pos, idat = 8, bytearray()
+    while pos < len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b'IHDR':
+            width, height, depth, color, _, _, interlace = struct.unpack('>IIBBBBB', body)
+            if depth != 8 or color not in (2, 6) or interlace:
+                raise ValueError('只支援 8-bit 非交錯 RGB / RGBA PNG')
+        elif kind == b'IDAT':
+            idat += body
+        pos += 12 + length
+    channels = 3 if color == 2 else 4
+    stride = width * channels
+    raw = zlib.decompress(bytes(idat))
+    prev = bytearray(stride)
+    pixels = bytearray()
+    for y in range(height):
+        kind, row = raw[y * (stride + 1)], bytearray(raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        for i in range(stride):
+            left = row[i - channels] if i >= channels else 0
+            upleft = prev[i - channels] if i >= channels else 0
+            predictor = (0, left, prev[i], (left + prev[i]) // 2, _paeth(left, prev[i], upleft))[kind]
+            row[i] = (row[i] + predictor) & 255
+        if channels == 4:
+            for i in range(0, stride, 4):
+                alpha = row[i + 3]
+                pixels += bytes((v * alpha + 255 * (255 - alpha)) // 255 for v in row[i:i + 3])
+        else:
+            pixels += row
+        prev = row
+    return Image(width, height, pixels)
+
+
+def read_image(path, size=None):
+    data = Path(path).read_bytes()
+    if data.startswith(_PNG_SIGNATURE):
+        return decode_png(data)
+    return decode_jpeg(data, size)
+
+
+# ===== 影像處理 =====
+
+def square(image):
+    """置中裁成正方形"""
+    side = min(image.width, image.height)
+    if image.width == image.height:
+        return image
+    x0, y0 = (image.width - side) // 2, (image.height - side) // 2
+    pixels = bytearray()
+    for y in range(y0, y0 + side):
+        start = (y * image.width + x0) * 3
+        pixels += image.pixels[start:start + side * 3]
+    return Image(side, side, pixels)
+
+
+def flatten_background(image, floor=BACKGROUND_FLOOR, spread=BACKGROUND_SPREAD):
+    """接近白色的低彩度像素 (棋盤格與 JPEG 雜訊) 改成純白: 圖示更乾淨, PNG 也壓得更小"""
+    pixels = bytearray(image.pixels)
+    for i in range(0, len(pixels), 3):
+        r, g, b = pixels[i], pixels[i + 1], pixels[i + 2]
+        low = min(r, g, b)
+        if low >= floor and max(r, g, b) - low <= spread:
+            pixels[i:i + 3] = b'\xff\xff\xff'
+    return Image(image.width, image.height, pixels)
+
+
+def _taps(source, target):
+    """面積平均: 每個輸出像素涵蓋的來源像素與權重"""
+    ratio = source / target
+    taps = []
+    for i in range(target):
+        a, b = i * ratio, (i + 1) * ratio
+        taps.append([(j, (min(b, j + 1) - max(a, j)) / ratio) for j in range(int(a), min(math.ceil(b), source))])
+    return taps
+
+
+def resize(image, size):
+    """縮成 size×size (先置中裁成正方形); 只縮小不放大"""
+    image = square(image)
+    if size >= image.width:
+        return image
+    taps = _taps(image.width, size)
+    src, width = image.pixels, image.width
+    rows = []
+    for y in range(image.height):
+        base = y * width * 3
+        row = []
+        for t in taps:
+            for ch in range(3):
+                row.append(sum(src[base + j * 3 + ch] * w for j, w in t))
+        rows.append(row)
+    pixels = bytearray()
+    for t in taps:
+        for x in range(size * 3):
+            pixels.append(min(255, round(sum(rows[j][x] * w for j, w in t))))
+    return Image(size, size, pixels)
+
+
+def build_icons(root=ROOT, icons=ICONS):
+    """回傳 {檔名: PNG bytes}"""
+    largest = max(size for _, size in icons)
+    source = flatten_background(square(read_image(root / ICON_SOURCE, largest)))
+    return {name: encode_png(resize(source, size)) for name, size in icons}
+
+
+# ===== 引用改寫 =====
+
+def manifest_text(text, eol, icons=ICONS):
+    """manifest.json 的 icons 改列 MANIFEST_ICONS (保留原本縮排 4 格、換行符與檔尾)"""
+    data = json.loads(text)
+    data['icons'] = [{'src': name, 'sizes': f'{size}x{size}', 'type': 'image/png'}
+                     for name, size in icons if name in MANIFEST_ICONS]
+    out = with_eol(json.dumps(data, ensure_ascii=False, indent=4), eol)
+    return out + eol if text.endswith('\n') else out
+
+
+def html_patches(html, icons=ICONS):
+    """index.html 中 src / href 為 favicon.png 的 <link> / <img> 改指向對應尺寸的圖示"""
+    sizes = dict(icons)
+    edits = []
+    for m in _TAG.finditer(html):
+        tag = m.group()
+        if f'"{ICON_SOURCE}"' not in tag or any(e.old == tag for e in edits):
+            continue
+        rel = _REL.search(tag)
+        name = HTML_ICONS.get(rel.group(1).lower(), DEFAULT_ICON) if rel else DEFAULT_ICON
+        new = tag.replace(f'"{ICON_SOURCE}"', f'"{name}"')
+        if rel and 'sizes=' not in new:
+            new = new.replace(f'href="{name}"', f'sizes="{sizes[name]}x{sizes[name]}" href="{name}"')
+        edits.append(Edit(tag, new))
+    return [Patch('assets/html-icons', 'index.html', tuple(edits), label='index.html 圖示')] if edits else []
+
+
+def precache_icons(assets):
+    """預快取清單中的 favicon.png 換成 PRECACHE_ICONS"""
+    assets = list(assets)
+    if f'./{ICON_SOURCE}' in assets:
+        i = assets.index(f'./{ICON_SOURCE}')
+        assets[i:i + 1] = [f'./{name}' for name in PRECACHE_ICONS if f'./{name}' not in assets]
+    return assets
+
+
+def sw_icon_patches(sw_source):
+    """預快取清單以 PRECACHE_ICONS 取代 favicon.png (CACHE_NAME 一併更新), 推播通知圖示改用 icon-192"""
+    patches = []
+    assets = current_assets(sw_source)
+    if f'./{ICON_SOURCE}' in assets:
+        patches += sw_patches(sw_source, precache_icons(assets))
+    edits = tuple(Edit(f"{key}: './{ICON_SOURCE}'", f"{key}: './{name}'") for key, name in NOTIFICATION_ICONS.items()
+                  if f"{key}: './{ICON_SOURCE}'" in sw_source)
+    if edits:
+        patches.append(Patch('assets/notification', 'sw.js', edits, label='sw.js 推播通知圖示'))
+    return patches
+
+
+# ===== 預先壓縮 =====
+
+def compressible(root, assets):
+    """index.html、sw.js、manifest.json 與預快取清單中的本地文字資源"""
+    names = list(ALWAYS_COMPRESS)
+    for entry in assets:
+        name = entry[2:] if entry.startswith('./') else entry
+        if is_local(entry) and name.endswith(COMPRESSIBLE) and name not in names and (root / name).exists():
+            names.append(name)
+    return names
+
+
+def compress(data):
+    """回傳 {副檔名: 壓縮後 bytes}; 沒比原檔小的不輸出"""
+    out = {'.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        out['.br'] = brotli.compress(data, quality=11)
+    return {ext: body for ext, body in out.items() if len(body) < len(data)}
+
+
+def install_bytes(root, assets, sizes=None):
+    """預快取清單中本地資源的下載量; sizes 可覆蓋個別檔案 (尚未寫入的新圖示)"""
+    sizes = sizes or {}
+    total = 0
+    for entry in assets:
+        if not is_local(entry):
+            continue
+        name = (entry[2:] if entry.startswith('./') else entry) or 'index.html'
+        if name in sizes:
+            total += sizes[name]
+        elif (root / name).exists():
+            total += (root / name).stat().st_size
+    return total
+
+
+def build(root=ROOT, dry_run=False, precompress=False):
+    """產生圖示、改寫 manifest / index.html / sw.js, precompress 時另外輸出壓縮檔; 回傳 (摘要, patch 結果)"""
+    root = Path(root)
+    html, _ = read_text(root / 'index.html')
+    sw_source, _ = read_text(root / 'sw.js')
+    before = current_assets(sw_source)
+
+    icons = build_icons(root)
+    manifest, eol = read_text(root / 'manifest.json')
+    new_manifest = manifest_text(manifest, eol)
+    if not dry_run:
+        for name, data in icons.items():
+            write_atomic(root / name, data)
+        if new_manifest != manifest:
+            write_atomic(root / 'manifest.json', encode(new_manifest))
+    patches = html_patches(html) + sw_icon_patches(sw_source)
+    results = apply_patches(patches, root=root, dry_run=dry_run)
+
+    after = precache_icons(before)
+    sizes = {name: len(data) for name, data in icons.items()}
+    compressed = {}
+    for name in compressible(root, after) if precompress else ():
+        outputs = compress((root / name).read_bytes())
+        compressed[name] = {ext: len(body) for ext, body in outputs.items()}
+        if not dry_run:
+            for ext, body in outputs.items():
+                write_atomic(root / f'{name}{ext}', body)
+    summary = {
+        'icons': {name: len(data) for name, data in icons.items()},
+        'compressed': compressed,
+        'install_before': install_bytes(root, before),
+        'install_after': install_bytes(root, after, sizes),
+    }
+    return summary, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='產生多尺寸圖示並改寫 manifest / 預快取清單 (可選預先壓縮檔)')
+    parser.add_argument('--dry-run', action='store_true', help='只計算尺寸, 不寫檔')
+    parser.add_argument('--precompress', action='store_true',
+                        help='另存 .gz / .br (GitHub Pages 不會送出, 僅供支援預先壓縮檔的主機)')
+    args = parser.parse_args(argv)
+
+    summary, results = build(dry_run=args.dry_run, precompress=args.precompress)
+    for name, size in summary['icons'].items():
+        print(f"✓ {name}: {size / 1024:.1f} KB")
+    for name, outputs in summary['compressed'].items():
+        sizes = ', '.join(f'{ext} {size / 1024:.1f} KB' for ext, size in outputs.items()) or '壓縮後未變小, 略過'
+        print(f"✓ {name}: {sizes}")
+    if args.precompress and brotli is None:
+        print('· 未安裝 brotli 套件, 只輸出 .gz')
+    report(results)
+    print(f"首次安裝下載量: {summary['install_before'] / 1024:.0f} KB → {summary['install_after'] / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
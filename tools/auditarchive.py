@@ -0,0 +1,494 @@
+"""
+稽核日誌冷封存 (audit_logs → 壓縮月分區 + 各動作統計)
+
+logSystemAction 每個管理動作寫一份 audit_logs 文件, 唯一的複合索引是
+(action, timestamp); 系統日誌彈窗與 anomalyDetection 每次都重讀原始文件,
+讀取量隨歷史線性成長。DATA_RETENTION.md 規定 audit_logs 保留至少 1 學年,
+超過的部分由管理員手動清理。
+
+本模組:
+  1. 以游標分頁 (Firestore.stream_query) 或逐筆解析匯出檔, 串流讀出早於保留
+     期限的日誌; 記憶體只放一頁 / 一筆, 與歷史總量無關
+  2. 依台北時間月份寫入 archive/audit-YYYY-MM.jsonl.gz (gzip JSON Lines,
+     mtime 固定為 0, 同樣內容重建位元組相同), 與既有分區依文件 id 合併
+  3. 同時彙整 archive/audit-rollup.json: 每月 / 每日各 action 的筆數,
+     統計列與異常基準不必解壓分區
+  4. prune: 只刪除「已在本機分區內」且早於保留期限的來源文件, 每 500 筆一個
+     commit; 預設只列出數量, 加 --confirm 才刪除, 刪除後寫一筆 PRUNE_AUDIT_LOGS 日誌
+
+查詢與 loadAuditLogs 相同的篩選 (action 完全相符、使用者關鍵字比對
+userEmail / performedBy / details.booker / deviceId), 結果依時間遞減:
+
+    with AuditArchive() as archive:
+        archive.query('2024-03-01', '2024-03-31', action='FORCE_DELETE_BOOKING')
+        archive.counts('2024-01-01', '2024-06-30')              # 只讀 rollup
+
+日誌含操作者 email、IP 與 User Agent (個資), 與預約冷封存同放 archive/, 不進版控。
+
+用法:
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.auditarchive build --project demo-test
+    python -m tools.auditarchive build --project <專案> --token "$(gcloud auth print-access-token)"
+    python -m tools.auditarchive build audit_logs.jsonl [--before 2025-08-01]   # 由匯出檔建立
+    python -m tools.auditarchive prune --project <專案> --token ... [--confirm]
+    python -m tools.auditarchive query 2024-03 [--action FORCE_DELETE_BOOKING] [--user 王]
+    python -m tools.auditarchive stats
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dtime
+from pathlib import Path
+
+from tools import ROOT
+from tools.analytics import TIMEZONE, parse_created
+from tools.coldarchive import ARCHIVE_DIR, retention_cutoff
+from tools.firestore import MAX_BATCH, Firestore, auto_id, decode_value
+from tools.patching import file_mode, write_atomic
+
+COLLECTION = 'audit_logs'
+RETENTION_YEARS = 1
+PARTITION_GLOB = 'audit-*.jsonl.gz'
+ROLLUP_FILE = 'audit-rollup.json'
+PRUNE_ACTION = 'PRUNE_AUDIT_LOGS'
+CHUNK_SIZE = 1 << 16
+# 匯出檔若為物件, 文件陣列所在的鍵
+_ARRAY_KEY = re.compile(r'"(?:documents|audit_logs|logs)"\s*:\s*\[')
+
+
+def audit_cutoff(today=None):
+    """audit_logs 保留至少 1 個完整學年: 早於回傳時間 (台北 0 時) 者可封存 / 清理"""
+    return datetime.combine(retention_cutoff(today, RETENTION_YEARS), dtime(), TIMEZONE)
+
+
+def _partition_name(month):
+    return f'audit-{month}.jsonl.gz'
+
+
+def normalize(doc):
+    """來源文件 → 分區列: id / action / timestamp (台北時間 ISO 字串) 在前, 其餘欄位原樣保留
+
+    沒有 timestamp 的文件 (serverTimestamp 尚未寫回) 回傳 None。
+    """
+    created = parse_created(doc.get('timestamp'))
+    if created is None:
+        return None
+    row = {'id': doc.get('id', ''), 'action': doc.get('action') or '',
+           'timestamp': created.astimezone(TIMEZONE).isoformat()}
+    row.update((k, v) for k, v in doc.items() if k not in row)
+    return row
+
+
+# ===== 來源 =====
+
+def _decode(doc):
+    if 'fields' in doc:
+        data = {k: decode_value(v) for k, v in doc['fields'].items()}
+        data.setdefault('id', doc.get('name', '').rsplit('/', 1)[-1])
+        return data
+    return doc
+
+
+def _iter_array(f, chunk_size):
+    """逐筆 raw_decode 頂層陣列 (或物件內 documents / audit_logs / logs 陣列) 的元素"""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+        return not eof
+
+    while not eof and not buf.lstrip():
+        fill()
+    head = buf.lstrip()[:1]
+    if head == '{':
+        while not (m := _ARRAY_KEY.search(buf)):
+            if not fill():
+                return
+        pos = m.end()
+    elif head == '[':
+        pos = buf.index('[') + 1
+    else:
+        raise ValueError(f'{getattr(f, "name", "匯出檔")}: 不是 JSON 陣列或文件物件')
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buf):
+            if not fill():
+                raise ValueError('匯出檔在陣列結束前中斷')
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            doc, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if not fill():
+                raise
+            continue
+        yield doc
+        pos = end
+
+
+def iter_export(path, chunk_size=CHUNK_SIZE):
+    """逐筆讀出匯出檔: .jsonl / .ndjson 每行一份; .json 為文件陣列或 {documents: [...]}
+
+    兩種都不整檔載入。元素可為一般 dict 或 Firestore REST 文件 ({name, fields})。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if str(path).lower().endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    yield _decode(json.loads(line))
+        else:
+            for doc in _iter_array(f, chunk_size):
+                yield _decode(doc)
+
+
+def iter_firestore(client, before, page_size=300):
+    """audit_logs 中 timestamp < before 的文件, 依時間遞增以游標分頁讀出"""
+    return client.stream_query(COLLECTION, [('timestamp', '<', before)],
+                               [('timestamp', 'asc')], page_size=page_size)
+
+
+# ===== 寫入 =====
+
+def _open_gzip(path):
+    raw = open(path, 'wb')
+    return raw, gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0)
+
+
+def _lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _add(counts, action, n=1):
+    counts[action] = counts.get(action, 0) + n
+
+
+class _Spool:
+    """每個月份一個暫存 gzip; 來源不必依月份排序, 記憶體不隨筆數成長"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+
+    def write(self, month, row):
+        if month not in self.files:
+            fd, path = tempfile.mkstemp(dir=self.directory, prefix=f'.audit-{month}.', suffix='.spool')
+            os.close(fd)
+            self.files[month] = (path, *_open_gzip(path))
+        self.files[month][2].write((json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+
+    def close(self):
+        for _, raw, gz in self.files.values():
+            if not gz.closed:
+                gz.close()
+                raw.close()
+
+    def cleanup(self):
+        self.close()
+        for path, _, _ in self.files.values():
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def _merge(directory, month, spool_path):
+    """既有分區 (被新資料取代的 id 除外) + 暫存資料 → 新分區; 回傳該月 rollup"""
+    fresh = {row['id'] for row in _lines(spool_path)}
+    target = directory / _partition_name(month)
+    rollup = {'total': 0, 'actions': {}, 'days': {}}
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{target.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        raw, gz = _open_gzip(tmp)
+        with raw, gz:
+            sources = [spool_path] if not target.exists() else [target, spool_path]
+            for source in sources:
+                for row in _lines(source):
+                    if source == target and row['id'] in fresh:
+                        continue
+                    if source == spool_path:
+                        if row['id'] not in fresh:           # 來源內重複的 id 只留第一筆
+                            continue
+                        fresh.discard(row['id'])
+                    gz.write((json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+                    rollup['total'] += 1
+                    _add(rollup['actions'], row['action'])
+                    _add(rollup['days'].setdefault(row['timestamp'][8:10], {}), row['action'])
+        os.chmod(tmp, file_mode(target))
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    rollup['days'] = dict(sorted(rollup['days'].items()))
+    return rollup
+
+
+def build(docs, directory=None, before=None):
+    """把 docs 中 timestamp < before 的日誌依月份寫入分區 (與既有分區依 id 合併) 並更新 rollup
+
+    回傳 {'months': {月份: 該月總筆數}, 'archived': 本次寫入筆數, 'skipped': 缺 timestamp 或未過期}
+    """
+    directory = Path(directory) if directory else ROOT / ARCHIVE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    before = before or audit_cutoff()
+    spool = _Spool(directory)
+    archived = skipped = 0
+    try:
+        for doc in docs:
+            row = normalize(doc)
+            if row is None or datetime.fromisoformat(row['timestamp']) >= before:
+                skipped += 1
+                continue
+            spool.write(row['timestamp'][:7], row)
+            archived += 1
+        spool.close()
+
+        rollup = load_rollup(directory)
+        for month, (path, _, _) in sorted(spool.files.items()):
+            rollup['months'][month] = _merge(directory, month, path)
+        rollup['months'] = dict(sorted(rollup['months'].items()))
+        rollup['before'] = max(rollup.get('before') or '', before.isoformat())
+        write_atomic(directory / ROLLUP_FILE,
+                     json.dumps(rollup, ensure_ascii=False, indent=1).encode('utf-8'))
+    finally:
+        spool.cleanup()
+    return {'months': {m: rollup['months'][m]['total'] for m in spool.files},
+            'archived': archived, 'skipped': skipped}
+
+
+def load_rollup(directory=None):
+    path = (Path(directory) if directory else ROOT / ARCHIVE_DIR) / ROLLUP_FILE
+    if not path.exists():
+        return {'before': None, 'months': {}}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+# ===== 清理 =====
+
+def prune(client, directory=None, before=None, batch_size=MAX_BATCH, confirm=False):
+    """刪除來源中早於 before 且已封存的文件; confirm=False 時只統計
+
+    來源依時間遞增讀出, 每次只載入當月分區的 id 集合。
+    回傳 {'scanned', 'archived' (可刪 / 已刪), 'unarchived' (分區內沒有, 保留), 'commits'}
+    """
+    archive = AuditArchive(directory)
+    before = before or audit_cutoff()
+    summary = {'scanned': 0, 'archived': 0, 'unarchived': 0, 'commits': 0}
+    month, ids, writes = None, set(), []
+
+    def flush():
+        if writes and confirm:
+            client.commit(writes)
+            summary['commits'] += 1
+        writes.clear()
+
+    for doc in iter_firestore(client, before):
+        summary['scanned'] += 1
+        row = normalize(doc)
+        if row['timestamp'][:7] != month:
+            month = row['timestamp'][:7]
+            ids = archive.ids(month)
+        if row['id'] not in ids:
+            summary['unarchived'] += 1
+            continue
+        summary['archived'] += 1
+        writes.append(client.delete_write(COLLECTION, row['id']))
+        if len(writes) >= batch_size:
+            flush()
+    flush()
+
+    if confirm and summary['archived']:
+        client.commit([client.create_write(COLLECTION, auto_id(), {
+            'action': PRUNE_ACTION,
+            'targetId': COLLECTION,
+            'details': {'before': before.isoformat(), 'deleted': summary['archived'],
+                        'kept': summary['unarchived']},
+            'performedBy': 'tools.auditarchive',
+            'userEmail': None,
+            'deviceId': 'audit_archive',
+        }, server_time=('timestamp',))])
+    return summary
+
+
+# ===== 查詢 =====
+
+def _day_start(day):
+    return datetime.combine(date.fromisoformat(day.replace('/', '-')), dtime(), TIMEZONE)
+
+
+def _months(first, last):
+    y, m = first.year, first.month
+    while (y, m) <= (last.year, last.month):
+        yield f'{y:04d}-{m:02d}'
+        y, m = (y, m + 1) if m < 12 else (y + 1, 1)
+
+
+def _matches_user(row, needle):
+    details = row.get('details') if isinstance(row.get('details'), dict) else {}
+    haystack = ' '.join(str(v or '') for v in (row.get('userEmail'), row.get('performedBy'),
+                                               details.get('booker'), row.get('deviceId')))
+    return needle in haystack.lower()
+
+
+class AuditArchive:
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else ROOT / ARCHIVE_DIR
+        self._rollup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    @property
+    def rollup(self):
+        if self._rollup is None:
+            self._rollup = load_rollup(self.directory)
+        return self._rollup
+
+    def months(self):
+        return sorted(p.name[len('audit-'):-len('.jsonl.gz')] for p in self.directory.glob(PARTITION_GLOB))
+
+    def rows(self, month):
+        """'YYYY-MM' 分區的所有列 (寫入順序); 沒有該月分區則不產生任何列"""
+        path = self.directory / _partition_name(month)
+        if path.exists():
+            yield from _lines(path)
+
+    def ids(self, month):
+        return {row['id'] for row in self.rows(month)}
+
+    def query(self, start, end, action=None, user=None):
+        """timestamp 落在 start 當日 0 時 ~ end 當日結束 (台北時間) 的日誌, 依時間遞減"""
+        lo, hi = _day_start(start).date(), _day_start(end).date()
+        needle = (user or '').strip().lower()
+        results = []
+        for month in reversed(list(_months(lo, hi))):
+            hits = []
+            for row in self.rows(month):
+                if action and row['action'] != action:
+                    continue
+                if not lo.isoformat() <= row['timestamp'][:10] <= hi.isoformat():
+                    continue
+                if needle and not _matches_user(row, needle):
+                    continue
+                hits.append(row)
+            hits.sort(key=lambda r: (datetime.fromisoformat(r['timestamp']), r['id']), reverse=True)
+            results.extend(hits)
+        return results
+
+    def month(self, year, month, action=None, user=None):
+        last = date(year + month // 12, month % 12 + 1, 1).toordinal() - 1
+        return self.query(f'{year:04d}-{month:02d}-01', date.fromordinal(last).isoformat(), action, user)
+
+    def counts(self, start, end):
+        """[start, end] 日期範圍內各 action 的筆數, 只讀 rollup 不解壓分區"""
+        lo, hi = date.fromisoformat(start.replace('/', '-')), date.fromisoformat(end.replace('/', '-'))
+        counts = {}
+        for month in _months(lo, hi):
+            for day, actions in self.rollup['months'].get(month, {}).get('days', {}).items():
+                if lo.isoformat() <= f'{month}-{day}' <= hi.isoformat():
+                    for name, n in actions.items():
+                        _add(counts, name, n)
+        return dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='稽核日誌冷封存 (壓縮月分區、各動作統計、保留期限清理)')
+    parser.add_argument('--dir', help=f'封存目錄 (預設 {ARCHIVE_DIR}/)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    cutoff = audit_cutoff().date().isoformat()
+
+    def firestore_args(p):
+        p.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+        p.add_argument('--token', help='OAuth access token (正式環境以管理員身分讀寫; emulator 不需要)')
+        p.add_argument('--before', type=_day_start,
+                       help=f'只處理早於此日期的日誌 (預設 {cutoff}, 保留 1 學年)')
+
+    p_build = sub.add_parser('build', help='由 Firestore (或匯出檔) 建立 / 合併月分區')
+    p_build.add_argument('sources', nargs='*', help='匯出檔 (.json / .jsonl); 省略則讀 Firestore')
+    firestore_args(p_build)
+    p_prune = sub.add_parser('prune', help='刪除已封存且超過保留期限的 audit_logs')
+    firestore_args(p_prune)
+    p_prune.add_argument('--confirm', action='store_true', help='實際刪除 (預設只列出數量)')
+    p_query = sub.add_parser('query', help='查詢 YYYY-MM 或 起 迄 日期')
+    p_query.add_argument('range', nargs='+')
+    p_query.add_argument('--action')
+    p_query.add_argument('--user')
+    p_query.add_argument('--json', action='store_true')
+    sub.add_parser('stats', help='列出各月分區與各動作筆數')
+    args = parser.parse_args(argv)
+
+    if args.command in ('build', 'prune'):
+        client = None
+        if args.command == 'prune' or not args.sources:
+            if not args.project:
+                parser.error('需要 --project (或 GCLOUD_PROJECT)')
+            client = Firestore(args.project, token=args.token)
+        t0 = time.perf_counter()
+        try:
+            if args.command == 'build':
+                docs = (doc for s in args.sources for doc in iter_export(s)) if args.sources \
+                    else iter_firestore(client, args.before or audit_cutoff())
+                summary = build(docs, args.dir, args.before)
+            else:
+                summary = prune(client, args.dir, args.before, confirm=args.confirm)
+        finally:
+            if client:
+                client.close()
+        elapsed = time.perf_counter() - t0
+        if args.command == 'build':
+            for month, rows in summary['months'].items():
+                print(f'✓ {month}: {rows} 筆')
+            print(f"· 封存 {summary['archived']} 筆, 略過 {summary['skipped']} 筆 ({elapsed:.2f} s)")
+            return 0
+        print(f"· 早於保留期限 {summary['scanned']} 筆: 已封存 {summary['archived']} 筆, "
+              f"未封存 {summary['unarchived']} 筆 (保留不刪)")
+        if args.confirm:
+            print(f"✓ 已刪除 {summary['archived']} 筆 ({summary['commits']} 個 commit, {elapsed:.2f} s)")
+        else:
+            print('· 未刪除任何文件; 確認封存無誤後加 --confirm')
+        return 0
+
+    with AuditArchive(args.dir) as archive:
+        if args.command == 'stats':
+            for month, info in archive.rollup['months'].items():
+                top = '、'.join(f'{a} {n}' for a, n in sorted(info['actions'].items(), key=lambda kv: -kv[1])[:4])
+                size = (archive.directory / _partition_name(month)).stat().st_size
+                print(f"{month}: {info['total']} 筆, {size // 1024 + 1} KB  ({top})")
+            if archive.rollup['before']:
+                print(f"· 已封存至 {archive.rollup['before'][:10]} 之前; 之後的日誌仍在 Firestore")
+            return 0
+        t0 = time.perf_counter()
+        if len(args.range) == 1:
+            year, month = (int(p) for p in args.range[0].replace('/', '-').split('-')[:2])
+            rows = archive.month(year, month, args.action, args.user)
+        else:
+            rows = archive.query(args.range[0], args.range[1], args.action, args.user)
+        elapsed = (time.perf_counter() - t0) * 1000
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        for row in rows:
+            who = row.get('userEmail') or row.get('performedBy') or 'System'
+            print(f"{row['timestamp'][:19].replace('T', ' ')}  {row['action']}  {who}  "
+                  f"{json.dumps(row.get('details') or {}, ensure_ascii=False)[:80]}")
+        print(f'· {len(rows)} 筆, {elapsed:.2f} ms (0 次 Firestore 讀取)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
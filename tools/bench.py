@@ -0,0 +1,237 @@
+"""
+codemod 工具鏈效能基準 (benchmark suite)
+
+app.js 已 6.6k 行 / 256 KB 且每版持續成長, 多校建置前需要知道補丁腳本
+隨檔案放大的實際成本。本模組以目前的 app.js / index.html / styles.css 為樣本,
+產生 1× / 10× / 100× 大小的合成樹 (錨點密度與原檔相同), 逐一計時:
+
+    add_history_batch.update_html / update_css / update_js
+    update_files.py / add_mobile_button.py 的 __main__ 本體
+
+每個量測點分成:
+  cold — 無補丁帳本, 必須完整掃描 (每次重跑前還原 target 並刪除帳本)
+  warm — 帳本已記錄, 走 stat 快速路徑
+
+合成樹含一份 tools/、components/ 與腳本的複本, 在子行程中執行 (tools.ROOT 指向合成樹),
+不會動到 repo 本身的檔案。結果寫成 JSON, 與基準比較後列出退步項目。
+
+用法:
+    python -m tools.bench                           # 跑 1×/10×/100× 並與 bench-baseline.json 比較
+    python -m tools.bench --scales 1 10 --repeat 5
+    python -m tools.bench --update-baseline         # 以本次結果作為新基準
+    python -m tools.bench --check                   # 有退步時 exit 1 (CI 用)
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools import ROOT
+from tools.jsindex import JsIndex
+from tools.ledger import LEDGER_FILE
+
+SCALES = (1, 10, 100)
+TARGETS = ('app.js', 'index.html', 'styles.css')
+SCRIPTS = ('add_history_batch.py', 'add_mobile_button.py', 'update_files.py', 'update_styles.py')
+# 名稱 → (模組, 函式); 函式為 None 代表以 __main__ 執行整支腳本
+ENTRY_POINTS = {
+    'add_history_batch.update_html': ('add_history_batch', 'update_html'),
+    'add_history_batch.update_css': ('add_history_batch', 'update_css'),
+    'add_history_batch.update_js': ('add_history_batch', 'update_js'),
+    'update_files': ('update_files', None),
+    'add_mobile_button': ('add_mobile_button', None),
+}
+DEFAULT_BASELINE = 'bench-baseline.json'
+TOLERANCE = 0.25            # 比基準慢 25% 以上才算退步
+NOISE_FLOOR = 0.005         # 且至少慢 5 ms (避免毫秒級量測的雜訊)
+
+
+def scale_js(source, factor):
+    """在原檔前面加上 factor-1 份複本; 複本中的頂層宣告改名, 讓以名稱定位的 edit 仍指向原檔宣告"""
+    if factor <= 1:
+        return source
+    idx = JsIndex.build(source)
+    names = [(s.start + source[s.start:s.end].index(s.name, len(s.kind)), s.name)
+             for s in idx.declarations()]
+    copies = []
+    for i in range(1, factor):
+        out = []
+        cursor = 0
+        for pos, name in names:
+            out.append(source[cursor:pos])
+            out.append(f'{name}__b{i}')
+            cursor = pos + len(name)
+        out.append(source[cursor:])
+        copies.append(''.join(out))
+    return '\n'.join(copies) + '\n' + source
+
+
+def scale_css(source, factor):
+    """CSS 複本放在前面: upsert 以最後一條同名規則為準, 仍會落在原檔的規則上"""
+    return '\n'.join([source.lstrip('\ufeff')] * (factor - 1) + [source]) if factor > 1 else source
+
+
+def scale_html(source, factor):
+    """把 <body> 內容複製 factor-1 份插在 </body> 之前"""
+    if factor <= 1:
+        return source
+    start = source.index('>', source.index('<body')) + 1
+    end = source.rindex('</body>')
+    return source[:end] + source[start:end] * (factor - 1) + source[end:]
+
+
+SCALERS = {'app.js': scale_js, 'index.html': scale_html, 'styles.css': scale_css}
+
+
+def build_tree(dest, factor, root=ROOT):
+    """建立合成樹: tools/、components/ 與腳本複本 + 放大後的 targets; 回傳各 target 大小 (bytes)"""
+    dest = Path(dest)
+    shutil.copytree(root / 'tools', dest / 'tools', ignore=shutil.ignore_patterns('__pycache__'))
+    shutil.copytree(root / 'components', dest / 'components')
+    for name in SCRIPTS:
+        shutil.copy2(root / name, dest / name)
+    sizes = {}
+    for name in TARGETS:
+        with open(root / name, 'r', encoding='utf-8', newline='') as f:
+            text = SCALERS[name](f.read(), factor)
+        data = text.encode('utf-8')
+        (dest / name).write_bytes(data)
+        sizes[name] = len(data)
+    return sizes
+
+
+def _call(module, func):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if func is None:
+            runpy.run_module(module, run_name='__main__')
+        else:
+            getattr(importlib.import_module(module), func)()
+
+
+def _child(repeat):
+    """在合成樹中執行 (cwd = 合成樹): 回傳 {entry: {'cold': [...], 'warm': [...]}}"""
+    root = Path.cwd()
+    pristine = {name: (root / name).read_bytes() for name in TARGETS}
+    ledger = root / LEDGER_FILE
+    timings = {}
+    # 先 import 一次, 避免第一個量測點算進模組載入時間
+    for module, _ in ENTRY_POINTS.values():
+        importlib.import_module(module)
+    for entry, (module, func) in ENTRY_POINTS.items():
+        cold = []
+        warm = []
+        for _ in range(repeat):
+            for name, data in pristine.items():
+                (root / name).write_bytes(data)
+            if ledger.exists():
+                ledger.unlink()
+            t0 = time.perf_counter()
+            _call(module, func)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            _call(module, func)
+            warm.append(time.perf_counter() - t0)
+        timings[entry] = {'cold': cold, 'warm': warm}
+    return timings
+
+
+def measure(factor, repeat):
+    """建立 factor 倍的合成樹並在子行程中計時, 回傳 {'sizes': ..., 'entries': {entry: {cold, warm}}}"""
+    with tempfile.TemporaryDirectory(prefix=f'bench-{factor}x-') as tmp:
+        sizes = build_tree(tmp, factor)
+        proc = subprocess.run([sys.executable, '-m', 'tools.bench', '--child', '--repeat', str(repeat)],
+                              cwd=tmp, capture_output=True, text=True, check=True,
+                              env={**os.environ, 'PYTHONPATH': tmp, 'PYTHONDONTWRITEBYTECODE': '1'})
+        timings = json.loads(proc.stdout)
+    entries = {entry: {phase: statistics.median(values) for phase, values in t.items()}
+               for entry, t in timings.items()}
+    return {'sizes': sizes, 'entries': entries}
+
+
+def compare(current, baseline, tolerance=TOLERANCE, noise_floor=NOISE_FLOOR):
+    """回傳退步清單 [(scale, entry, phase, 基準秒數, 本次秒數)]"""
+    regressions = []
+    for scale, result in current['results'].items():
+        base = baseline.get('results', {}).get(scale)
+        if not base:
+            continue
+        for entry, phases in result['entries'].items():
+            for phase, seconds in phases.items():
+                before = base['entries'].get(entry, {}).get(phase)
+                if before is None:
+                    continue
+                if seconds > before * (1 + tolerance) and seconds - before > noise_floor:
+                    regressions.append((scale, entry, phase, before, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='codemod 工具鏈效能基準')
+    parser.add_argument('--scales', nargs='*', type=int, default=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=3, help='每個量測點重複次數 (取中位數)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基準 JSON 路徑 (相對 repo 根目錄)')
+    parser.add_argument('--output', help='本次結果 JSON 輸出路徑')
+    parser.add_argument('--update-baseline', action='store_true', help='以本次結果覆寫基準')
+    parser.add_argument('--check', action='store_true', help='有退步時 exit 1')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        json.dump(_child(args.repeat), sys.stdout)
+        return 0
+
+    current = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    for factor in args.scales:
+        result = measure(factor, args.repeat)
+        current['results'][f'{factor}x'] = result
+        size = sum(result['sizes'].values()) // 1024
+        print(f"{factor}× ({size} KB)")
+        for entry, phases in result['entries'].items():
+            print(f"  {entry:<32} cold {phases['cold'] * 1000:9.1f} ms   warm {phases['warm'] * 1000:9.1f} ms")
+
+    baseline_path = ROOT / args.baseline
+    regressions = []
+    if baseline_path.exists():
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare(current, json.load(f))
+        for scale, entry, phase, before, after in regressions:
+            print(f"✗ {scale} {entry} {phase}: {before * 1000:.1f} ms → {after * 1000:.1f} ms "
+                  f"(+{(after / before - 1) * 100:.0f}%)")
+        if not regressions:
+            print(f"✓ 與 {args.baseline} 相比沒有退步")
+    else:
+        print(f"· 尚無基準 {args.baseline} (以 --update-baseline 建立)")
+
+    payload = json.dumps(current, ensure_ascii=False, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    if args.update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        print(f"✓ 基準已寫入 {args.baseline}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+預約串流匯出 (streaming range exporter)
+
+executeExport 以單一 orderBy('date', 'desc').get() 讀回整個區間, 再在瀏覽器記憶體裡組出整份 CSV 字串;
+沒選區間時更是整個 bookings 集合 → 學年底匯出大校資料時分頁直接卡住。
+
+本模組改在 Python 端匯出:
+  - 以游標分頁 (Firestore.stream_query, date desc + __name__) 逐頁讀取, 每列讀到就寫出, 記憶體只放一頁
+  - CSV 欄位、轉義、BOM 與 executeExport 相同 (Excel 可直接開, tools/analytics 可直接讀);
+    另可輸出 NDJSON, 每行一筆與封存 JSON bookings 相同欄位的物件
+  - bookingSeries 系列以 tools/series.expand 展開成區間內的虛擬預約 (id = '<系列 id>@<dayOrdinal>'),
+    依同樣的 (date, id) desc 順序與 bookings 串流合併; 系列展開後的日期遠少於 bookings, 整批排序放在記憶體
+  - 每寫完一頁在 <輸出檔>.cursor.json 記下最後一筆的 (date, id) 與檔案長度;
+    中斷後加 --resume 會截掉最後一次記錄之後寫了一半的內容, 從游標接著讀, 結果與一次跑完相同
+
+用法:
+    python -m tools.bulkexport -o 113學年.csv --start 2024-08-01 --end 2025-07-31 --project <專案>
+    python -m tools.bulkexport -o all.ndjson --project <專案> --token "$(gcloud auth print-access-token)"
+    python -m tools.bulkexport -o 113學年.csv --start 2024-08-01 --end 2025-07-31 --project <專案> --resume
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools.analytics import CSV_HEADERS, DEFAULT_ROOM, TIMEZONE, UNKNOWN_BOOKER, app_constants
+from tools.conflicts import date_ordinal
+from tools.firestore import Firestore
+from tools.patching import write_atomic
+from tools.series import COLLECTION as SERIES, expand
+
+COLLECTION = 'bookings'
+PAGE_SIZE = 500
+STATE_SUFFIX = '.cursor.json'
+UNKNOWN_ROOM = '未知場地'
+UNKNOWN_TIME = '未知時間'
+NO_REASON = '無'
+UNKNOWN_DEVICE = 'Unknown'
+STATUS = '有效'     # 資料庫只存有效的預約, 刪除的在 audit log
+BOM = '\ufeff'
+
+
+def normalize_day(value):
+    """'2025-09-01' / '2025/09/01' → Firestore 的 '2025/09/01'"""
+    return value.replace('-', '/') if value else None
+
+
+def csv_escape(value):
+    """executeExport 的 escape(): 空值 → '', 含逗號 / 換行 / 雙引號才加引號"""
+    if not value:
+        return ''
+    value = str(value).replace('"', '""')
+    return f'"{value}"' if ',' in value or '\n' in value or '"' in value else value
+
+
+def _created(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def locale_time(created):
+    """toLocaleString('zh-TW', {hour12: false}) 的台北時間格式: 2025/3/5 09:03:22 (午夜寫 00, 不用部分瀏覽器的 24)"""
+    if created is None:
+        return UNKNOWN_TIME
+    t = created.astimezone(TIMEZONE)
+    return f'{t.year}/{t.month}/{t.day} {t:%H:%M:%S}'
+
+
+def iso_time(created):
+    """Date.toISOString(): 毫秒 + Z"""
+    if created is None:
+        return None
+    return created.astimezone(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def room_name(doc):
+    room = doc.get('room')
+    return room if room and room != UNKNOWN_ROOM else DEFAULT_ROOM
+
+
+def csv_row(doc, period_names):
+    periods = ' & '.join(period_names.get(p, p) for p in doc.get('periods') or ())
+    return ','.join([
+        csv_escape(doc.get('id')),
+        csv_escape(doc.get('date')),
+        csv_escape(room_name(doc)),
+        csv_escape(periods),
+        csv_escape(doc.get('booker') or UNKNOWN_BOOKER),
+        csv_escape(doc.get('reason') or NO_REASON),
+        csv_escape(locale_time(_created(doc.get('createdAt')))),
+        csv_escape(doc.get('deviceId') or UNKNOWN_DEVICE),
+        STATUS,
+    ])
+
+
+def ndjson_row(doc):
+    """封存 JSON 的 bookings 元素"""
+    return json.dumps({
+        'id': doc.get('id'),
+        'date': doc.get('date') or '',
+        'room': room_name(doc),
+        'periods': doc.get('periods') or [],
+        'booker': doc.get('booker') or UNKNOWN_BOOKER,
+        'reason': doc.get('reason') or '',
+        'createdAt': iso_time(_created(doc.get('createdAt'))),
+        'deviceId': doc.get('deviceId') or None,
+    }, ensure_ascii=False)
+
+
+def export_format(path):
+    return 'ndjson' if str(path).lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def state_path(output):
+    return Path(f'{output}{STATE_SUFFIX}')
+
+
+def _filters(start, end):
+    if start and end:
+        return [('date', '>=', start), ('date', '<=', end)]
+    return []
+
+
+def _order(doc):
+    return doc.get('date') or '', doc['id']
+
+
+def series_rows(client, start=None, end=None, after=None):
+    """[start, end] 內的系列日期 (虛擬預約), 依 (date, id) desc 排序; after = 續傳游標, 只留排在它之後的"""
+    filters = [('endOrdinal', '>=', date_ordinal(start))] if start else []
+    docs = [doc for series in client.stream_query(SERIES, filters) for doc in expand(series, start, end)]
+    if after is not None:
+        docs = [doc for doc in docs if _order(doc) < tuple(after)]
+    return sorted(docs, key=_order, reverse=True)
+
+
+def _checkpoint(f, output, state):
+    f.flush()
+    os.fsync(f.fileno())
+    state['bytes'] = f.tell()
+    write_atomic(state_path(output), (json.dumps(state, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+def export(client, output, start=None, end=None, fmt=None, page_size=PAGE_SIZE, resume=False, period_names=None):
+    """把 [start, end] (皆空 = 全部) 的預約 (含系列展開的日期) 依 date desc 串流寫入 output; 回傳 {'rows', 'resumed'}
+
+    resume=True 且有上次的游標檔時接著寫; 區間或格式與上次不同會拒絕續傳 (ValueError)。
+    """
+    output = Path(output)
+    start, end = normalize_day(start), normalize_day(end)
+    fmt = fmt or export_format(output)
+    if period_names is None:
+        period_names = {pid: name for name, pid in app_constants()[1].items()}
+    query = {'start': start, 'end': end, 'format': fmt}
+
+    previous = None
+    if resume and state_path(output).exists() and output.exists():
+        previous = json.loads(state_path(output).read_text(encoding='utf-8'))
+        if previous['query'] != query:
+            raise ValueError(f'{state_path(output)} 記錄的是 {previous["query"]}, 與這次的區間 / 格式不同')
+
+    state = previous or {'query': query, 'cursor': None, 'rows': 0, 'bytes': 0}
+    resumed = state['rows']
+    with open(output, 'r+b' if previous else 'wb') as f:
+        if previous:
+            f.truncate(previous['bytes'])       # 丟掉上次最後一個檢查點之後寫了一半的列
+            f.seek(previous['bytes'])
+        else:
+            if fmt == 'csv':
+                f.write((BOM + ','.join(CSV_HEADERS)).encode('utf-8'))
+            _checkpoint(f, output, state)
+        bookings = client.stream_query(COLLECTION, _filters(start, end), [('date', 'desc')], page_size=page_size,
+                                       start_after=state['cursor'])
+        docs = heapq.merge(bookings, series_rows(client, start, end, state['cursor']), key=_order, reverse=True)
+        for doc in docs:
+            if fmt == 'csv':
+                f.write(('\n' + csv_row(doc, period_names)).encode('utf-8'))     # 與 rows.join('\n') 相同, 檔尾無換行
+            else:
+                f.write((ndjson_row(doc) + '\n').encode('utf-8'))
+            state['rows'] += 1
+            state['cursor'] = [doc.get('date'), doc['id']]
+            if state['rows'] % page_size == 0:
+                _checkpoint(f, output, state)
+    state_path(output).unlink(missing_ok=True)
+    return {'rows': state['rows'], 'resumed': resumed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='以游標分頁串流匯出預約 (CSV / NDJSON, 可續傳)')
+    parser.add_argument('-o', '--output', required=True, help='輸出檔 (.csv 或 .ndjson / .jsonl)')
+    parser.add_argument('--start', help='起日 YYYY-MM-DD (與 --end 一起給; 都不給 = 全部歷史)')
+    parser.add_argument('--end', help='迄日 YYYY-MM-DD')
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='預設依副檔名')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='每頁文件數 (也是檢查點間隔)')
+    parser.add_argument('--resume', action='store_true', help='從上次中斷的游標接著匯出')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+    parser.add_argument('--token', help='OAuth access token (正式環境以管理員身分讀取; emulator 不需要)')
+    args = parser.parse_args(argv)
+    if not args.project:
+        parser.error('需要 --project (或 GCLOUD_PROJECT)')
+    if bool(args.start) != bool(args.end):
+        parser.error('--start 與 --end 需一起指定')
+    if args.start and normalize_day(args.start) > normalize_day(args.end):
+        parser.error('起日不可晚於迄日')
+
+    client = Firestore(args.project, token=args.token)
+    t0 = time.perf_counter()
+    try:
+        summary = export(client, args.output, args.start, args.end, args.format, args.page_size, args.resume)
+    except ValueError as e:
+        print(f'✗ {e}')
+        return 1
+    except KeyboardInterrupt:
+        print(f'✗ 已中斷; 以 --resume 從 {state_path(args.output)} 的游標接著匯出')
+        return 130
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - t0
+    if summary['resumed']:
+        print(f"· 接續上次的 {summary['resumed']} 筆")
+    print(f"✓ {args.output}: {summary['rows']} 筆 ({elapsed:.2f} s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+學期固定預約批次匯入 (bulk recurring importer)
+
+每學期初要建立數百筆固定的每週預約 (社團課、考場...), 以往只能在批次 UI
+一個日期一個日期點。本模組讀取規則 CSV:
+
+    場地名稱,星期,預約節次,開始日期,結束日期,預約者姓名,預約理由/用途,間隔週數
+    禮堂,三,第五節、第六節,2025-09-03,2026-01-14,王老師,社團,1
+
+每條規則與 app.js 送出多日期預約相同, 寫成一份 bookingSeries 系列文件 (room / periods / periodMask /
+booker / reason / deviceId / startOrdinal / endOrdinal / dayBits / batchId / createdAt = 伺服器時間,
+格式見 tools/series.py); 只有一個日期、或跨度達 MAX_SPAN_DAYS (366 天) 的規則才逐日寫成 bookings 文件
+(date / room / periods / booker / reason / deviceId / batchId / createdAt, 以及查詢用的 dayOrdinal /
+weekKey / monthKey, 見 tools/datekeys.py)。寫入前逐日做與送出表單相同的檢查:
+
+  - 固定不開放時段 (roomSettings/{場地}.unavailableSlots)
+  - 場地公告鎖定 (roomAnnouncements.lockBookings)
+  - 與既有預約 (含 bookingSeries 系列展開的日期)、與 CSV 內其他規則的節次衝突 (tools/conflicts.py 衝突索引)
+
+全部通過才寫入: 每 500 份文件一個 atomic commit, 以數條連線平行送出。
+文件 id 由內容決定 (系列 = tools/series.series_id, 與 series fold 折疊同一批逐日文件得到的 id 相同;
+逐日文件 = imp_ + 雜湊), 中途失敗後重跑會略過已寫入的系列與文件, 不會重複建立; 已寫入的系列整份略過,
+其中已取消的日期也不會被補回。同一條規則共用 batchId, 後端 LINE 通知只推一則。
+
+用法:
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.bulkimport rules.csv --project demo-test
+    python -m tools.bulkimport rules.csv --project <專案> --token "$(gcloud auth print-access-token)"
+    python -m tools.bulkimport rules.csv --project <專案> --dry-run     # 只展開與檢查, 不寫入
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from tools import ROOT
+from tools.analytics import app_constants
+from tools.conflicts import ConflictIndex, date_ordinal
+from tools.datekeys import date_keys
+from tools.firestore import CONNECTIONS, MAX_BATCH, Firestore, FirestoreError, parallel
+from tools.series import COLLECTION as SERIES, FIELDS as SERIES_FIELDS, MAX_SPAN_DAYS, day_bits, series_id
+from tools.series import expand as expand_series
+
+RULE_HEADERS = ['場地名稱', '星期', '預約節次', '開始日期', '結束日期', '預約者姓名', '預約理由/用途', '間隔週數']
+DEVICE_ID = 'bulk_import'
+DAY_IDS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')     # date.weekday() 順序; 與 app.js slotId 前綴相同
+_WEEKDAYS = {**{c: i for i, c in enumerate('一二三四五六日')}, '天': 6,
+             **{d: i for i, d in enumerate(DAY_IDS)}, **{str(i + 1): i for i in range(7)}}
+_PERIOD_SEP = re.compile(r'[、;；,，]')
+
+
+class RuleError(ValueError):
+    """規則 CSV 有誤 (訊息含所有錯誤列)"""
+
+
+@dataclass(frozen=True)
+class Rule:
+    line: int
+    room: str
+    weekday: int                # 0 = 星期一
+    periods: tuple              # 節次 id, 依 PERIODS 順序
+    start: date
+    end: date
+    booker: str
+    reason: str
+    interval: int = 1
+
+    @property
+    def batch_id(self):
+        key = f'{self.room}|{self.weekday}|{",".join(self.periods)}|{self.start}|{self.end}|{self.booker}|{self.reason}'
+        return 'imp_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _parse_date(value):
+    return date.fromisoformat(value.strip().replace('/', '-'))
+
+
+def _parse_rule(line, row, rooms, period_ids, period_names):
+    room = row['場地名稱'].strip()
+    if room not in rooms:
+        raise ValueError(f'未知場地 {room}')
+    day = re.sub(r'^(星期|週|周|禮拜)', '', row['星期'].strip()).lower()[:3]
+    if day not in _WEEKDAYS:
+        raise ValueError(f'無法辨識星期 {row["星期"]}')
+    periods = set()
+    for token in filter(None, (t.strip() for t in _PERIOD_SEP.split(row['預約節次']))):
+        pid = period_names.get(token, token)
+        if pid not in period_ids:
+            raise ValueError(f'未知節次 {token}')
+        periods.add(pid)
+    if not periods:
+        raise ValueError('未指定節次')
+    start, end = _parse_date(row['開始日期']), _parse_date(row['結束日期'])
+    if end < start:
+        raise ValueError('結束日期早於開始日期')
+    booker = row['預約者姓名'].strip()
+    reason = (row.get('預約理由/用途') or '').strip()
+    # 與 firestore.rules isValidBooking 相同的長度限制
+    if not 1 <= len(booker) <= 50:
+        raise ValueError('預約者姓名需為 1–50 字')
+    if len(reason) > 200:
+        raise ValueError('預約理由超過 200 字')
+    interval = int((row.get('間隔週數') or '1').strip() or 1)
+    if interval < 1:
+        raise ValueError('間隔週數需 ≥ 1')
+    return Rule(line, room, _WEEKDAYS[day], tuple(p for p in period_ids if p in periods),
+                start, end, booker, reason, interval)
+
+
+def read_rules(path, root=ROOT):
+    """讀取規則 CSV; 任何一列有誤就列出全部錯誤後 raise RuleError"""
+    rooms, period_names = app_constants(root)
+    period_ids = list(period_names.values())
+    rules = []
+    errors = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        missing = [h for h in RULE_HEADERS[:-1] if h not in (reader.fieldnames or ())]
+        if missing:
+            raise RuleError(f'缺少欄位: {", ".join(missing)}')
+        for line, row in enumerate(reader, start=2):
+            if not any((v or '').strip() for v in row.values()):
+                continue
+            try:
+                rules.append(_parse_rule(line, row, rooms, period_ids, period_names))
+            except ValueError as e:
+                errors.append(f'第 {line} 列: {e}')
+    if errors:
+        raise RuleError('\n'.join(errors))
+    return rules
+
+
+def expand(rule):
+    """規則 → 逐日的預約 (含 id; createdAt 由寫入時的伺服器時間填入)
+
+    寫成系列的規則, 每一天的 id 與 seriesId 同系列展開後的虛擬預約 ('<系列 id>@<dayOrdinal>'),
+    重跑時 load_state 展開既有系列就能認出已寫入的日期
+    """
+    first = rule.start + timedelta(days=(rule.weekday - rule.start.weekday()) % 7)
+    days = []
+    day = first
+    while day <= rule.end:
+        days.append(day)
+        day += timedelta(weeks=rule.interval)
+    base = {'room': rule.room, 'periods': list(rule.periods), 'booker': rule.booker, 'reason': rule.reason,
+            'deviceId': DEVICE_ID, 'batchId': rule.batch_id}
+    sid = series_id(rule.batch_id, base) if 1 < len(days) and (days[-1] - days[0]).days < MAX_SPAN_DAYS else None
+    docs = []
+    for day in days:
+        date_str = day.strftime('%Y/%m/%d')
+        keys = date_keys(day)
+        if sid:
+            ids = {'id': f"{sid}@{keys['dayOrdinal']}", 'seriesId': sid}
+        else:
+            key = f'{rule.room}|{date_str}|{",".join(rule.periods)}|{rule.booker}|{rule.reason}'
+            ids = {'id': 'imp_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}
+        docs.append({**ids, 'date': date_str, **base, **keys, 'line': rule.line})
+    return docs
+
+
+def plan(rules):
+    """展開全部規則; 同一文件 (同場地、日期、節次、預約者、用途) 只保留一份"""
+    docs = {}
+    for rule in rules:
+        for doc in expand(rule):
+            docs.setdefault(doc['id'], doc)
+    return list(docs.values())
+
+
+def load_state(client, docs, connections=CONNECTIONS):
+    """讀取各場地在匯入日期範圍內的既有預約 (含 bookingSeries 展開的日期)、不開放時段、公告
+    → {room: (bookings, slots, announcements)}"""
+    spans = {}
+    for doc in docs:
+        lo, hi = spans.get(doc['room'], (doc['date'], doc['date']))
+        spans[doc['room']] = (min(lo, doc['date']), max(hi, doc['date']))
+
+    def job(room, lo, hi):
+        def fetch(conn):
+            bookings = conn.run_query('bookings', [('room', '==', room), ('date', '>=', lo), ('date', '<=', hi)])
+            for series in conn.run_query(SERIES, [('room', '==', room), ('endOrdinal', '>=', date_ordinal(lo))]):
+                bookings.extend(expand_series(series, lo, hi))
+            settings = conn.get('roomSettings', room) or {}
+            announcements = conn.run_query('roomAnnouncements', [('room', '==', room)])
+            return bookings, settings.get('unavailableSlots') or [], announcements
+        return fetch
+
+    rooms = list(spans)
+    results = parallel(client, [job(room, *spans[room]) for room in rooms], connections)
+    return dict(zip(rooms, results))
+
+
+def check(docs, state, period_ids, period_labels):
+    """回傳 (待寫入的逐日預約, 已存在而略過的日期數, 衝突訊息清單)
+
+    既有預約中出現本次要寫的系列 (同 seriesId) 時, 整個系列視為已寫入
+    """
+    planned = {doc['id'] for doc in docs} | {doc['seriesId'] for doc in docs if doc.get('seriesId')}
+    existing = []
+    already = set()
+    for bookings, _, _ in state.values():
+        for b in bookings:
+            if b['id'] in planned or b.get('seriesId') in planned:
+                already.update(filter(None, (b['id'], b.get('seriesId'))))
+            else:
+                existing.append(b)
+    skipped = 0
+    index = ConflictIndex.from_docs(existing, period_ids)
+    ours = ConflictIndex(period_ids)
+    owner = {}
+    problems = []
+    pending = []
+    for doc in sorted(docs, key=lambda d: (d['date'], d['room'], d['line'])):
+        if doc['id'] in already or doc.get('seriesId') in already:
+            skipped += 1
+            continue
+        room, date_str, periods = doc['room'], doc['date'], doc['periods']
+        where = f"第 {doc['line']} 列 {date_str} {room}"
+        _, slots, announcements = state.get(room, ((), (), ()))
+        day_id = DAY_IDS[date.fromisoformat(date_str.replace('/', '-')).weekday()]
+        blocked = [p for p in periods if f'{day_id}_{p}' in slots]
+        if blocked:
+            problems.append(f"{where} {period_labels[blocked[0]]} 為固定禁排時段")
+            continue
+        lock = next((a for a in announcements if a.get('lockBookings') is True
+                     and (a.get('startDate') or '') <= date_str <= (a.get('endDate') or '')), None)
+        if lock:
+            problems.append(f"{where} 已被公告鎖定: {lock.get('message') or ''}")
+            continue
+        hit = index.conflicts(room, [date_str], periods)
+        if hit:
+            pid = hit[0][1][0]
+            booker = next((b.get('booker') for b in existing
+                           if b.get('room') == room and b.get('date') == date_str and pid in (b.get('periods') or ())), '')
+            problems.append(f"{where} {period_labels[pid]} 已被 {booker} 預約")
+            continue
+        hit = ours.conflicts(room, [date_str], periods)
+        if hit:
+            pid = hit[0][1][0]
+            problems.append(f"{where} {period_labels[pid]} 與第 {owner[(room, date_ordinal(date_str), pid)]} 列重疊")
+            continue
+        ours.add(room, date_str, periods)
+        for pid in periods:
+            owner[(room, date_ordinal(date_str), pid)] = doc['line']
+        pending.append(doc)
+    return pending, skipped, problems
+
+
+def documents(docs, period_ids):
+    """待寫入的逐日預約 → [(集合, 文件 id, 資料, 日期數)]; 同一 seriesId 的日期合成一份系列文件
+    (欄位與 dayBits / periodMask 的算法同 tools/series.fold_plan)"""
+    out = []
+    series = {}
+    for doc in docs:
+        if doc.get('seriesId'):
+            series.setdefault(doc['seriesId'], []).append(doc)
+        else:
+            out.append(('bookings', doc['id'], {k: v for k, v in doc.items() if k not in ('id', 'line')}, 1))
+    for sid, members in series.items():
+        head = members[0]
+        ordinals = sorted(m['dayOrdinal'] for m in members)
+        data = {k: head[k] for k in SERIES_FIELDS}
+        data['periodMask'] = sum(1 << period_ids.index(p) for p in set(head['periods']) if p in period_ids)
+        data.update({'startOrdinal': ordinals[0], 'endOrdinal': ordinals[-1],
+                     'dayBits': day_bits(ordinals, ordinals[0]), 'batchId': head['batchId']})
+        out.append((SERIES, sid, data, len(members)))
+    return out
+
+
+def write(client, docs, period_ids, batch_size=MAX_BATCH, connections=CONNECTIONS):
+    """每 batch_size 份文件一個 commit, 平行送出; 回傳 (成功的日期數, 成功的系列數, [錯誤訊息])"""
+    writes = documents(docs, period_ids)
+    batches = [writes[i:i + batch_size] for i in range(0, len(writes), batch_size)]
+
+    def job(batch):
+        def commit(conn):
+            days = sum(n for *_, n in batch)
+            series = sum(1 for collection, *_ in batch if collection == SERIES)
+            try:
+                conn.commit([conn.create_write(collection, doc_id, data, server_time=('createdAt',))
+                             for collection, doc_id, data, _ in batch])
+            except (FirestoreError, OSError) as e:
+                return days, series, e
+            return days, series, None
+        return commit
+
+    results = parallel(client, [job(b) for b in batches], connections)
+    written = sum(n for n, _, err in results if err is None)
+    series = sum(n for _, n, err in results if err is None)
+    errors = [f'{n} 筆 commit 失敗: {err}' for n, _, err in results if err is not None]
+    return written, series, errors
+
+
+def import_rules(client, rules, dry_run=False, batch_size=MAX_BATCH, connections=CONNECTIONS, root=ROOT):
+    """展開 → 檢查 → 寫入; 回傳 {'planned', 'skipped', 'written', 'series', 'conflicts', 'errors'} (series = 寫入的系列數)"""
+    _, period_names = app_constants(root)
+    period_ids = list(period_names.values())
+    period_labels = {pid: name for name, pid in period_names.items()}
+    docs = plan(rules)
+    state = load_state(client, docs, connections)
+    pending, skipped, problems = check(docs, state, period_ids, period_labels)
+    summary = {'planned': len(docs), 'skipped': skipped, 'written': 0, 'series': 0, 'conflicts': problems,
+               'errors': []}
+    if not problems and not dry_run and pending:
+        summary['written'], summary['series'], summary['errors'] = write(client, pending, period_ids, batch_size,
+                                                                         connections)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='學期固定預約批次匯入')
+    parser.add_argument('rules', help='規則 CSV')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+    parser.add_argument('--token', help='OAuth access token (正式環境以管理員身分寫入; emulator 不需要)')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS, help='平行連線數')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH, help=f'每個 commit 的文件數 (≤ {MAX_BATCH})')
+    parser.add_argument('--dry-run', action='store_true', help='只展開與檢查, 不寫入')
+    args = parser.parse_args(argv)
+    if not args.project:
+        parser.error('需要 --project (或 GCLOUD_PROJECT)')
+
+    try:
+        rules = read_rules(args.rules)
+    except RuleError as e:
+        print(f'✗ {e}')
+        return 1
+    client = Firestore(args.project, token=args.token)
+    t0 = time.perf_counter()
+    try:
+        summary = import_rules(client, rules, args.dry_run, min(args.batch_size, MAX_BATCH), args.connections)
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - t0
+
+    print(f"· {len(rules)} 條規則 → {summary['planned']} 筆預約 (已存在略過 {summary['skipped']} 筆)")
+    for msg in summary['conflicts']:
+        print(f'✗ {msg}')
+    for msg in summary['errors']:
+        print(f'✗ {msg}')
+    if summary['conflicts']:
+        print(f"✗ {len(summary['conflicts'])} 筆衝突, 未寫入任何預約")
+        return 1
+    if args.dry_run:
+        print(f"✓ 檢查通過, 可寫入 {summary['planned'] - summary['skipped']} 筆 (dry run)")
+        return 0
+    print(f"✓ 已寫入 {summary['written']} 筆 (其中 {summary['series']} 個系列; {elapsed:.2f} s)")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+app.js 依相依關係拆分 (dependency-aware code splitting)
+
+app.js 是單一全域 script, 瀏覽器要整份解析完才畫得出週曆; 但其中大半是儀表板、
+進階分析、統計圖表、匯出、設定、Web Push、搜尋 — 畫週曆時完全用不到。
+教室舊電腦光解析就要好幾百毫秒。
+
+本模組以 JsIndex 切出頂層宣告, 逐一分類每個對頂層函式的引用:
+
+  value   — 同步使用回傳值 (x = f()、f() + 1、arr.map(f)、new F()…)
+  call    — 敘述層級呼叫 (f(); / await f()), 回傳值不用或以 Promise 方式等待
+  handler — 只被當事件處理器交出去: addEventListener / setTimeout / .then 的參數、
+            el.onclick = f、字串裡的 onclick="f(this)"
+
+關鍵區塊 (critical) = 所有非函式宣告與頂層敘述 (載入時即執行) + CRITICAL_ROOTS +
+CRITICAL_SECTIONS, 再沿 value / call 邊取遞移閉包; 事件處理器裡回傳值會被同步使用的
+函式、呼叫 preventDefault / stopPropagation 的函式也留在關鍵區塊 (等 chunk 下載完才
+preventDefault 就太遲了)。其餘函式依所在的 `// =====` 區段分到 CHUNKS 的延遲區塊,
+原位置換成同名 stub:
+
+    function openStatsModal() { return callLazy('stats', 'openStatsModal', this, arguments); }
+
+stub 第一次被呼叫時載入該 chunk (與它以 value 邊相依的其他 chunk) 再轉呼叫真正的函式;
+chunk 內的 function 宣告會覆蓋全域同名 stub, 之後直接呼叫實作。index.html 既有的
+onclick="toggleBatchDate(this)" 不用改。window load 後閒置時預先載入全部 chunk。
+
+用法:
+    python -m tools.codesplit                     # 分析: 各區塊大小與 chunk 相依
+    python -m tools.codesplit --explain NAME      # NAME 為何在關鍵區塊 (引用路徑)
+    python -m tools.codesplit --write             # 部署用: 改寫 app.js、輸出 app.<chunk>.<hash>.js、
+                                                  # index.html 加 prefetch (在 tools.fingerprint 之前執行)
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+
+from tools import ROOT
+from tools.jsindex import JsIndex, brackets, tokens
+from tools.patching import Edit, Patch, apply_patches, read_text, report, write_atomic
+
+SOURCE = 'app.js'
+HASH_LENGTH = 10
+LOADER_MARKER = 'const LAZY_CHUNKS = '
+
+# 畫出週曆、送出預約一定要有的函式 (其餘由引用關係帶進來)
+CRITICAL_ROOTS = ('renderCalendar', 'loadBookingsFromFirebase', 'submitBooking')
+CRITICAL_SECTIONS = ('工具函數',)
+# 區段標題關鍵字 → chunk 名稱; 沒對到的區段歸入 DEFAULT_CHUNK
+CHUNKS = (
+    ('analytics', ('Analytics', '學期報告')),
+    ('dashboard', ('儀表板', '我的預約', '成就徽章')),
+    ('export', ('匯出', '學制學期')),
+    ('stats', ('統計功能',)),
+    ('search', ('進階搜尋', '智慧預約建議')),
+    ('history', ('歷史記錄', '批次預約', '批次取消')),
+    ('notify', ('Web Push', '通知偏好', '告警訂閱', '預約通知訂閱', 'LINE')),
+    ('admin', ('稽核日誌', '異動履歷', '維護公告', '意見回饋')),
+)
+DEFAULT_CHUNK = 'misc'
+SHARED_CHUNK = 'shared'
+
+# 回傳值不會被使用的「交出 callback」呼叫; .then / .catch / .finally 會把 Promise 攤平, 交 stub 也安全
+HANDLER_CALLS = {'addEventListener', 'setTimeout', 'setInterval', 'requestAnimationFrame',
+                 'requestIdleCallback', 'then', 'catch', 'finally'}
+# addEventListener 註冊這些事件等同啟動流程, 不算延後執行
+STARTUP_EVENTS = {"'DOMContentLoaded'", '"DOMContentLoaded"', "'load'", '"load"'}
+STATEMENT_PRECEDERS = {';', '{', '}', 'await', 'else', 'void'}
+# 這些 token 出現在函式內 → 事件必須同步處理, 不能等 chunk 下載
+SYNC_EVENT_WORDS = {'preventDefault', 'stopPropagation', 'stopImmediatePropagation'}
+_HANDLER_IN_STRING = re.compile(r'(?<![\w$.])([A-Za-z_$][\w$]*)\s*\(')
+
+LOADER = '''// ===== 延遲載入區塊 (tools/codesplit.py 產生, 勿手動修改) =====
+const LAZY_CHUNKS = {table};
+const lazyScriptLoads = {{}};
+
+function loadLazyScript(name) {{
+    if (!lazyScriptLoads[name]) {{
+        lazyScriptLoads[name] = new Promise((resolve, reject) => {{
+            const script = document.createElement('script');
+            script.src = LAZY_CHUNKS[name].src;
+            script.onload = resolve;
+            script.onerror = () => {{
+                delete lazyScriptLoads[name];
+                reject(new Error(`無法載入 ${{script.src}}`));
+            }};
+            document.head.appendChild(script);
+        }});
+    }}
+    return lazyScriptLoads[name];
+}}
+
+function callLazy(chunk, name, self, args) {{
+    const stub = window[name];
+    return Promise.all([chunk, ...LAZY_CHUNKS[chunk].deps].map(loadLazyScript)).then(() => {{
+        if (window[name] === stub) throw new Error(`${{LAZY_CHUNKS[chunk].src}} 沒有定義 ${{name}}`);
+        return window[name].apply(self, args);
+    }}, (error) => {{
+        if (typeof showToast === 'function') showToast('功能載入失敗，請檢查網路後重新整理', 'error');
+        throw error;
+    }});
+}}
+
+window.addEventListener('load', () => {{
+    const idle = window.requestIdleCallback || ((cb) => setTimeout(cb, 2000));
+    idle(() => Object.keys(LAZY_CHUNKS).forEach(loadLazyScript));
+}});
+
+'''
+STUB = "function {name}() {{ return callLazy('{chunk}', '{name}', this, arguments); }}"
+
+
+class SplitError(Exception):
+    """app.js 已拆分過, 或關鍵函式不存在"""
+
+
+@dataclass
+class Analysis:
+    index: JsIndex
+    functions: dict                         # 名稱 → Symbol (只含可拆的 function 宣告)
+    refs: dict                              # Symbol → {名稱: value | call | handler}
+    critical: dict                          # 名稱 → 帶進關鍵區塊的原因 (上一層名稱或說明)
+    chunks: dict = field(default_factory=dict)      # chunk → [Symbol] (原始順序)
+    deps: dict = field(default_factory=dict)        # chunk → 遞移相依的其他 chunk
+
+    def chunk_of(self, name):
+        return next((c for c, syms in self.chunks.items() if any(s.name == name for s in syms)), None)
+
+    def explain(self, name):
+        """NAME 被帶進關鍵區塊的引用路徑"""
+        path = [name]
+        while name in self.critical and self.critical[name] in self.critical and len(path) < 50:
+            name = self.critical[name]
+            path.append(name)
+        if name in self.critical:
+            path.append(self.critical[name])
+        return path
+
+
+def _classify(toks, i, match, parent):
+    """toks[i] 是頂層函式名稱的一次出現 → value | call | handler | None (不是引用)"""
+    prev = toks[i - 1].text if i else None
+    nxt = toks[i + 1].text if i + 1 < len(toks) else None
+    if prev in ('.', 'function'):
+        return None
+    if nxt == ':' and prev in ('{', ','):
+        return None                                         # 物件 key
+    if prev == 'typeof':
+        return 'handler'
+    if nxt == '(':
+        close = match.get(i + 1)
+        after = toks[close + 1] if close is not None and close + 1 < len(toks) else None
+        chained = after is not None and after.text in ('.', '[', '(', '?', '`')
+        if prev == ':' and i >= 3 and (toks[i - 2].text == 'default' or toks[i - 3].text == 'case'):
+            prev = ';'
+        if prev == ')' and match.get(i - 1) is not None and toks[match[i - 1] - 1].text in ('if', 'while', 'for'):
+            prev = ';'
+        if prev == '=>' and parent[i] is not None and _callee(toks, parent[i]) in HANDLER_CALLS \
+                and after is not None and after.text in (')', ','):
+            prev = ';'                                      # addEventListener('click', () => f())
+        if prev in STATEMENT_PRECEDERS and not chained:
+            return 'call'
+        return 'value'
+    if prev in ('(', ',') and nxt in (')', ',') and parent[i] is not None \
+            and _callee(toks, parent[i]) in HANDLER_CALLS:
+        return 'handler'
+    if prev == '=' and i >= 3 and toks[i - 2].text.startswith('on') and toks[i - 3].text == '.':
+        return 'handler'                                    # el.onclick = f
+    return 'value'
+
+
+def _callee(toks, open_index):
+    if toks[open_index].text != '(' or open_index == 0:
+        return None
+    return toks[open_index - 1].text
+
+
+def _deferred_ranges(toks, match):
+    """HANDLER_CALLS 的參數區間 (DOMContentLoaded / load 除外): 其中的呼叫延後到事件發生才執行"""
+    ranges = []
+    for i, t in enumerate(toks):
+        if t.text == '(' and i and toks[i - 1].text in HANDLER_CALLS and i in match:
+            if toks[i - 1].text == 'addEventListener' and i + 1 < len(toks) and toks[i + 1].text in STARTUP_EVENTS:
+                continue
+            ranges.append((i, match[i]))
+    return ranges
+
+
+def analyze(source):
+    index = JsIndex.build(source)
+    toks = tokens(source)
+    match, parent = brackets(toks)
+    starts = [t.start for t in toks]
+    duplicated = set(index.duplicates())
+    functions = {s.name: s for s in index.declarations()
+                 if s.kind in ('function', 'async function') and s.name not in duplicated}
+    deferred = _deferred_ranges(toks, match)
+
+    refs = {}
+    sync_event = set()
+    for sym in index.symbols:
+        lo, hi = bisect.bisect_left(starts, sym.start), bisect.bisect_left(starts, sym.end)
+        found = {}
+        for i in range(lo, hi):
+            t = toks[i]
+            if t.kind in ('string', 'template'):
+                for name in _HANDLER_IN_STRING.findall(t.text):
+                    if name in functions:
+                        found.setdefault(name, 'handler')
+                continue
+            if t.kind != 'word':
+                continue
+            if t.text in SYNC_EVENT_WORDS and sym.name in functions:
+                sync_event.add(sym.name)
+            if t.text not in functions or t.start == _name_offset(source, sym):
+                continue
+            kind = _classify(toks, i, match, parent)
+            if kind == 'call' and any(a < i < b for a, b in deferred):
+                kind = 'handler'                            # 事件發生時才呼叫, 可以先交 stub
+            if kind and _RANK[kind] > _RANK.get(found.get(t.text), -1):
+                found[t.text] = kind
+        refs[sym] = found
+
+    sections = _sections(source)
+    critical = {}
+    queue = []
+
+    def promote(name, reason):
+        if name not in critical:
+            critical[name] = reason
+            queue.append(name)
+
+    for sym in index.symbols:
+        if sym.name not in functions:
+            key = sym.name or f'第 {sym.line} 行的頂層敘述'
+            critical[key] = '載入時執行'
+            queue.append(key)
+    for name in CRITICAL_ROOTS:
+        if name not in functions:
+            raise SplitError(f'找不到關鍵函式 {name}')
+        promote(name, 'CRITICAL_ROOTS')
+    for name, sym in functions.items():
+        if _section_title(sections, sym) and any(k in _section_title(sections, sym) for k in CRITICAL_SECTIONS):
+            promote(name, 'CRITICAL_SECTIONS')
+        if name in sync_event:
+            promote(name, '事件需同步處理 (preventDefault / stopPropagation)')
+
+    by_key = {(s.name or f'第 {s.line} 行的頂層敘述'): s for s in index.symbols if s.name not in duplicated}
+    by_key.update({name: syms[-1] for name, syms in index.duplicates().items()})
+    while queue:
+        key = queue.pop()
+        syms = index.find_all(key) if key in duplicated else [by_key[key]]
+        for sym in syms:
+            for name, kind in refs[sym].items():
+                if kind in ('value', 'call'):
+                    promote(name, key)
+
+    analysis = Analysis(index, functions, refs, critical)
+    owner = {name: _chunk_for(_section_title(sections, sym)) for name, sym in functions.items() if name not in critical}
+    # 被其他 chunk 同步使用的函式 (連同它同步呼叫的函式) 移到 SHARED_CHUNK,
+    # 否則打開統計也得先載入搜尋、歷史…整串互相引用的 chunk
+    moved = True
+    while moved:
+        moved = False
+        for name, chunk in owner.items():
+            for callee, kind in refs[functions[name]].items():
+                if kind != 'handler' and callee in owner and owner[callee] not in (chunk, SHARED_CHUNK):
+                    owner[callee] = SHARED_CHUNK
+                    moved = True
+    for name, sym in functions.items():
+        if name in owner:
+            analysis.chunks.setdefault(owner[name], []).append(sym)
+    for chunk, syms in analysis.chunks.items():
+        needs = {owner[n] for s in syms for n, k in refs[s].items() if k != 'handler' and n in owner} - {chunk}
+        analysis.deps[chunk] = sorted(needs)
+    return analysis
+
+
+_RANK = {'handler': 0, 'call': 1, 'value': 2}
+
+
+def _name_offset(source, sym):
+    m = re.compile(r'function\s*\*?\s*([\w$]+)').search(source, sym.start)
+    return m.start(1) if m else -1
+
+
+def _sections(source):
+    """`// ===== 標題 =====` 與上下 `// ====…` 框起來的標題 → [(offset, 標題)]"""
+    found = []
+    for m in re.finditer(r'^// =====(.*)$', source, re.MULTILINE):
+        title = m.group(1).strip(' =')
+        if not title:
+            boxed = re.compile(r'// (.+)').match(source, m.end() + 1)
+            if boxed is None or boxed.group(1).startswith('='):
+                continue
+            title = boxed.group(1).strip()
+        found.append((m.start(), title))
+    return found
+
+
+def _section_title(sections, sym):
+    title = ''
+    for start, text in sections:
+        if start > sym.start:
+            break
+        title = text
+    return title
+
+
+def _chunk_for(title):
+    for chunk, keywords in CHUNKS:
+        if any(k in title for k in keywords):
+            return chunk
+    return DEFAULT_CHUNK
+
+
+def chunk_name(chunk, data):
+    return f'app.{chunk}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.js'
+
+
+def split(source, eol='\n'):
+    """回傳 (關鍵區塊原始碼, {chunk 檔名: bytes}, Analysis); 延遲函式原位置換成 stub"""
+    if LOADER_MARKER in source:
+        raise SplitError(f'{SOURCE} 已拆分過 (含 {LOADER_MARKER.strip()})')
+    analysis = analyze(source)
+    files = {}
+    table = {}
+    stubs = []
+    for chunk, syms in analysis.chunks.items():
+        header = f'// {SOURCE} 延遲區塊 {chunk} (tools/codesplit.py 產生)'
+        body = (eol * 2).join(analysis.index.text(s, with_doc=True) for s in syms)
+        data = (header + eol + eol + body + eol).encode('utf-8')
+        name = chunk_name(chunk, data)
+        files[name] = data
+        table[chunk] = {'src': name, 'deps': analysis.deps[chunk]}
+        stubs.extend((s, STUB.format(name=s.name, chunk=chunk)) for s in syms)
+
+    out = []
+    cursor = 0
+    for sym, stub in sorted(stubs, key=lambda x: x[0].start):
+        out.append(source[cursor:sym.doc_start])
+        out.append(stub)
+        cursor = sym.end
+    out.append(source[cursor:])
+    rows = ',\n'.join(f'    {json.dumps(c)}: {json.dumps(t, ensure_ascii=False)}' for c, t in table.items())
+    loader = LOADER.format(table='{\n' + rows + '\n}').replace('\n', eol)
+    critical = ''.join(out)
+    # 放在檔頭說明之後、第一個敘述之前 (stub 被呼叫前 LAZY_CHUNKS 必須已初始化)
+    head = re.match(r'\s*/\*\*.*?\*/\s*', critical, re.DOTALL)
+    at = head.end() if head else 0
+    return critical[:at] + loader + critical[at:], files, analysis
+
+
+def html_patch(files):
+    """index.html 在 app.js 之前加上各 chunk 的 prefetch (閒置時下載不解析, tools.fingerprint 會納入預快取)"""
+    anchor = f'    <script src="{SOURCE}"></script>'
+    links = ''.join(f'    <link rel="prefetch" href="{name}" as="script">\n' for name in sorted(files))
+    return Patch('codesplit/prefetch', 'index.html', (Edit(anchor, links + anchor),), label='index.html 延遲區塊 prefetch')
+
+
+def write(root=ROOT, dry_run=False):
+    source, eol = read_text(root / SOURCE)
+    critical, files, analysis = split(source, eol)
+    if not dry_run:
+        for name, data in files.items():
+            write_atomic(root / name, data)
+    results = apply_patches([html_patch(files)], root=root, dry_run=dry_run)
+    if not dry_run and all(r.status == 'applied' for r in results):
+        write_atomic(root / SOURCE, critical.encode('utf-8'))
+    return critical, files, analysis, results
+
+
+def summary(source, analysis):
+    total = len(source.encode('utf-8'))
+    lazy = {c: sum(len(analysis.index.text(s, with_doc=True).encode('utf-8')) for s in syms)
+            for c, syms in analysis.chunks.items()}
+    critical = total - sum(lazy.values())
+    lines = [f'關鍵區塊 {critical / 1024:.1f} KB / {total / 1024:.1f} KB ({critical / total:.0%}), '
+             f'{sum(1 for n in analysis.critical if n in analysis.functions)} 個函式']
+    for chunk, size in sorted(lazy.items(), key=lambda x: -x[1]):
+        deps = ', '.join(analysis.deps[chunk]) or '-'
+        lines.append(f'  {chunk:<10} {size / 1024:6.1f} KB  {len(analysis.chunks[chunk]):3d} 個函式  相依: {deps}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把 app.js 拆成關鍵區塊與延遲載入的功能 chunk')
+    parser.add_argument('--write', action='store_true', help='改寫 app.js 並輸出 chunk 檔 (部署用)')
+    parser.add_argument('--dry-run', action='store_true', help='與 --write 併用: 只計算不寫檔')
+    parser.add_argument('--explain', metavar='NAME', help='列出 NAME 被帶進關鍵區塊的引用路徑')
+    args = parser.parse_args(argv)
+
+    source, _ = read_text(ROOT / SOURCE)
+    if args.explain:
+        analysis = analyze(source)
+        if args.explain in analysis.critical:
+            print(' ← '.join(analysis.explain(args.explain)))
+        else:
+            print(f'{args.explain} 在延遲區塊 {analysis.chunk_of(args.explain) or "(不存在)"}')
+        return 0
+    if not args.write:
+        print(summary(source, analyze(source)))
+        return 0
+    try:
+        _, files, analysis, results = write(dry_run=args.dry_run)
+    except SplitError as e:
+        print(f'✗ {e}')
+        return 1
+    print(summary(source, analysis))
+    for name in sorted(files):
+        print(f'  → {name}')
+    report(results)
+    return 0 if all(r.status == 'applied' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
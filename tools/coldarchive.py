@@ -0,0 +1,396 @@
+"""
+過期預約的欄式冷封存 (columnar cold archive)
+
+DATA_RETENTION.md 規定預約保留 3 個完整學年, 每學年以 executeExport(archive = true)
+匯出封存檔; 但歷史記錄彈窗查舊資料時仍逐月對 Firestore 下 `date >= YYYY/MM/01`
+查詢, 每看一次去年的資料都是計費讀取。
+
+本模組把封存檔 (CSV / 封存 JSON / Firestore 匯出; bookingSeries 系列展開成各日期, 見 tools/analytics.iter_json)
+中超過保留期限的預約, 依月份轉成 archive/bookings-YYYY-MM.bkca, 每個檔案:
+
+    'BKCA' | u32 header 長度 | header JSON | (8 byte 對齊) 各欄位區段
+
+數值欄 (小端序、未壓縮, 可直接 mmap 後以 memoryview 讀取, 依日期排序):
+    date     int32   date.toordinal()
+    room     uint8   場地字典索引
+    periods  uint16  節次 bitmask (bit 順序見 header.periods, 即 app.js PERIODS 順序)
+    booker   uint32  預約者字典索引
+    reason   uint32  用途字典索引
+    created  int64   建立時間 epoch 毫秒; -1 = 未知
+字串區段 (zlib 壓縮的 JSON 陣列, 用到時才解壓):
+    rooms / bookers / reasons 字典、ids (文件 id)
+
+查詢以 bisect 在 date 欄定位, 只展開命中的列:
+
+    with ColdArchive() as archive:
+        archive.month(2022, 3)                              # 與歷史記錄彈窗同格式, 日期遞減
+        archive.query('2022/03/01', '2022/06/30', room='禮堂')
+
+封存檔含預約者姓名與用途 (個資), archive/ 不進版控、不隨網站部署。
+
+用法:
+    python -m tools.coldarchive build 學期封存_*.json            # 預設封存 3 學年以前的資料
+    python -m tools.coldarchive build export.csv --before 2023-08-01
+    python -m tools.coldarchive query 2022-03 [--room 禮堂]
+    python -m tools.coldarchive stats
+"""
+import argparse
+import bisect
+import json
+import mmap
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import date, datetime
+from pathlib import Path
+
+from tools import ROOT
+from tools.analytics import DEFAULT_ROOM, TIMEZONE, UNKNOWN_BOOKER, app_constants, iter_docs, parse_created
+from tools.patching import write_atomic
+
+ARCHIVE_DIR = 'archive'
+MAGIC = b'BKCA'
+VERSION = 1
+RETENTION_YEARS = 3
+PARTITION_GLOB = 'bookings-*.bkca'
+# 欄位名稱 → array typecode
+NUMERIC_COLUMNS = {'date': 'i', 'room': 'B', 'periods': 'H', 'booker': 'I', 'reason': 'I', 'created': 'q'}
+STRING_SECTIONS = ('rooms', 'bookers', 'reasons', 'ids')
+_LITTLE = sys.byteorder == 'little'
+
+
+class ArchiveFormatError(Exception):
+    """封存檔格式不符 (magic / 版本 / 區段長度)"""
+
+
+def retention_cutoff(today=None, years=RETENTION_YEARS):
+    """保留 years 個完整學年 (學年自 8/1 起, 預設 3): 早於回傳日期者為過期資料"""
+    today = today or date.today()
+    school_year = today.year if today.month >= 8 else today.year - 1
+    return date(school_year - years, 8, 1)
+
+
+def _ordinal(day):
+    y, m, d = (int(p) for p in day.replace('-', '/').split('/'))
+    return date(y, m, d).toordinal()
+
+
+def _fs_date(ordinal):
+    return date.fromordinal(ordinal).strftime('%Y/%m/%d')
+
+
+def normalize(doc, period_names):
+    """封存來源的文件 → 統一格式 (CSV 的節次名稱轉回 id, createdAt 轉 epoch 毫秒)"""
+    created = parse_created(doc.get('createdAt'))
+    return {
+        'id': doc.get('id', ''),
+        'date': (doc.get('date') or '').replace('-', '/'),
+        'room': doc.get('room') or DEFAULT_ROOM,
+        'periods': [period_names.get(p, p) for p in doc.get('periods') or ()],
+        'booker': doc.get('booker') or UNKNOWN_BOOKER,
+        'reason': doc.get('reason') or '',
+        'created': round(created.timestamp() * 1000) if created else -1,
+    }
+
+
+# ===== 寫入 =====
+
+def _dictionary(values):
+    table = {}
+    codes = array('I', (table.setdefault(v, len(table)) for v in values))
+    return list(table), codes
+
+
+def encode_partition(docs, period_ids):
+    """docs (normalize 後) → 單一月份分區的 bytes"""
+    docs = sorted(docs, key=lambda d: (d['date'], d['room'], d['id']))
+    bit = {pid: i for i, pid in enumerate(period_ids)}
+    extra = [p for d in docs for p in d['periods'] if p not in bit]
+    for pid in dict.fromkeys(extra):
+        bit[pid] = len(bit)
+        period_ids = list(period_ids) + [pid]
+    if len(bit) > 16:
+        raise ArchiveFormatError(f'節次種類 {len(bit)} 超過 uint16 bitmask')
+
+    rooms, room_codes = _dictionary(d['room'] for d in docs)
+    bookers, booker_codes = _dictionary(d['booker'] for d in docs)
+    reasons, reason_codes = _dictionary(d['reason'] for d in docs)
+    columns = {
+        'date': array('i', (_ordinal(d['date']) for d in docs)),
+        'room': array('B', room_codes),
+        'periods': array('H', (sum(1 << bit[p] for p in set(d['periods'])) for d in docs)),
+        'booker': booker_codes,
+        'reason': reason_codes,
+        'created': array('q', (d['created'] for d in docs)),
+    }
+    strings = {'rooms': rooms, 'bookers': bookers, 'reasons': reasons, 'ids': [d['id'] for d in docs]}
+
+    blobs = []
+    for name, typecode in NUMERIC_COLUMNS.items():
+        col = columns[name]
+        if not _LITTLE:
+            col = array(typecode, col)
+            col.byteswap()
+        blobs.append((name, 'raw', typecode, col.tobytes()))
+    for name in STRING_SECTIONS:
+        data = json.dumps(strings[name], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        blobs.append((name, 'zlib', None, zlib.compress(data, 9)))
+
+    # header 內的 offset 以資料區起點 (header 後 8 byte 對齊) 為 0
+    sections = {}
+    offset = 0
+    for name, codec, typecode, blob in blobs:
+        sections[name] = {'offset': offset, 'length': len(blob), 'codec': codec, 'type': typecode}
+        offset += len(blob) + (-len(blob) % 8)
+    header = json.dumps({'version': VERSION, 'rows': len(docs), 'periods': list(period_ids),
+                         'sections': sections}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    head = MAGIC + struct.pack('<I', len(header)) + header
+    out = [head, b'\0' * (-len(head) % 8)]
+    for _, _, _, blob in blobs:
+        out.append(blob)
+        out.append(b'\0' * (-len(blob) % 8))
+    return b''.join(out)
+
+
+# ===== 讀取 =====
+
+class Partition:
+    """單一月份分區; 數值欄直接對 mmap 建 memoryview, 字串區段用到時才解壓"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:4] != MAGIC:
+            raise ArchiveFormatError(f'{self.path.name}: magic 不符')
+        (header_len,) = struct.unpack_from('<I', self._map, 4)
+        header = json.loads(self._map[8:8 + header_len].decode('utf-8'))
+        if header['version'] != VERSION:
+            raise ArchiveFormatError(f"{self.path.name}: 不支援的版本 {header['version']}")
+        self.rows = header['rows']
+        self.period_ids = header['periods']
+        self._base = 8 + header_len + (-(8 + header_len) % 8)
+        self._sections = header['sections']
+        self._strings = {}
+        self._masks = {}
+        self._views = []
+        self.columns = {name: self._numeric(name) for name in NUMERIC_COLUMNS}
+
+    def _raw(self, name):
+        sec = self._sections[name]
+        start = self._base + sec['offset']
+        if start + sec['length'] > len(self._map):
+            raise ArchiveFormatError(f'{self.path.name}: 區段 {name} 超出檔案長度')
+        return start, sec
+
+    def _numeric(self, name):
+        start, sec = self._raw(name)
+        view = memoryview(self._map)[start:start + sec['length']]
+        if _LITTLE:
+            self._views.append(view)
+            return view.cast(sec['type'])
+        col = array(sec['type'], view.tobytes())
+        view.release()
+        col.byteswap()
+        return col
+
+    def strings(self, name):
+        if name not in self._strings:
+            start, sec = self._raw(name)
+            self._strings[name] = json.loads(zlib.decompress(self._map[start:start + sec['length']]).decode('utf-8'))
+        return self._strings[name]
+
+    def span(self, lo, hi):
+        """date ordinal 介於 [lo, hi] 的列範圍 (二分搜尋)"""
+        dates = self.columns['date']
+        return bisect.bisect_left(dates, lo), bisect.bisect_right(dates, hi)
+
+    def _periods(self, mask):
+        found = self._masks.get(mask)
+        if found is None:
+            found = self._masks[mask] = [pid for b, pid in enumerate(self.period_ids) if mask >> b & 1]
+        return list(found)
+
+    def records(self, indices=None):
+        """指定列 (預設全部) → normalize 格式的 dict 清單 (created 為 epoch 毫秒)"""
+        c = self.columns
+        ids, rooms = self.strings('ids'), self.strings('rooms')
+        bookers, reasons = self.strings('bookers'), self.strings('reasons')
+        dates = {}
+        out = []
+        for i in range(self.rows) if indices is None else indices:
+            ordinal = c['date'][i]
+            day = dates.get(ordinal) or dates.setdefault(ordinal, _fs_date(ordinal))
+            out.append({
+                'id': ids[i],
+                'date': day,
+                'room': rooms[c['room'][i]],
+                'periods': self._periods(c['periods'][i]),
+                'booker': bookers[c['booker'][i]],
+                'reason': reasons[c['reason'][i]],
+                'created': c['created'][i],
+            })
+        return out
+
+    def bookings(self, indices):
+        """指定列 → Firestore 文件格式 (createdAt 為 ISO 字串), 供歷史記錄顯示"""
+        out = self.records(indices)
+        for doc in out:
+            created = doc.pop('created')
+            doc['createdAt'] = datetime.fromtimestamp(created / 1000, TIMEZONE).isoformat() if created >= 0 else None
+        return out
+
+    def close(self):
+        # cast 出來的 memoryview 都要先釋放, mmap 才能關閉
+        for col in self.columns.values():
+            if isinstance(col, memoryview):
+                col.release()
+        for view in self._views:
+            view.release()
+        self._map.close()
+        self._file.close()
+
+
+
+class ColdArchive:
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else ROOT / ARCHIVE_DIR
+        self._open = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def months(self):
+        return sorted(p.stem[len('bookings-'):] for p in self.directory.glob(PARTITION_GLOB))
+
+    def partition(self, month):
+        """'YYYY-MM' → Partition (開過的會快取); 沒有該月分區回傳 None"""
+        if month not in self._open:
+            path = self.directory / f'bookings-{month}.bkca'
+            self._open[month] = Partition(path) if path.exists() else None
+        return self._open[month]
+
+    def query(self, start, end, room=None, include_cancelled=False):
+        """date 介於 [start, end] (YYYY/MM/DD 或 YYYY-MM-DD) 的預約, 依日期遞減 (同 loadHistoryData 的 orderBy)"""
+        lo, hi = _ordinal(start), _ordinal(end)
+        first, last = date.fromordinal(lo), date.fromordinal(hi)
+        results = []
+        y, m = last.year, last.month
+        while (y, m) >= (first.year, first.month):
+            part = self.partition(f'{y:04d}-{m:02d}')
+            if part is not None:
+                begin, stop = part.span(lo, hi)
+                room_code = None
+                if room is not None:
+                    rooms = part.strings('rooms')
+                    room_code = rooms.index(room) if room in rooms else -1
+                rooms_col = part.columns['room']
+                masks = part.columns['periods']
+                results.extend(part.bookings([
+                    i for i in range(stop - 1, begin - 1, -1)
+                    if (room_code is None or rooms_col[i] == room_code) and (include_cancelled or masks[i])
+                ]))
+            y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+        return results
+
+    def month(self, year, month, room=None):
+        """歷史記錄彈窗的月查詢 (`date >= YYYY/MM/01` 且 `date <= YYYY/MM/31`)"""
+        return self.query(f'{year:04d}/{month:02d}/01', _month_end(year, month), room=room)
+
+    def close(self):
+        for part in self._open.values():
+            if part is not None:
+                part.close()
+        self._open.clear()
+
+
+def _month_end(year, month):
+    nxt = date(year + month // 12, month % 12 + 1, 1)
+    return _fs_date(nxt.toordinal() - 1)
+
+
+def build(sources, directory=None, before=None):
+    """把 sources 中 date < before 的預約依月份寫入分區 (與既有分區合併, 同 id 以新資料為準)
+
+    回傳 {月份: 列數}
+    """
+    directory = Path(directory) if directory else ROOT / ARCHIVE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    before = (before or retention_cutoff()).strftime('%Y/%m/%d')
+    _, period_names = app_constants()
+    period_ids = list(period_names.values())
+
+    by_month = {}
+    for source in sources:
+        for doc in iter_docs(source):
+            doc = normalize(doc, period_names)
+            if doc['date'] and doc['date'] < before:
+                by_month.setdefault(doc['date'][:7].replace('/', '-'), {})[doc['id']] = doc
+
+    written = {}
+    with ColdArchive(directory) as archive:
+        for month, docs in sorted(by_month.items()):
+            existing = archive.partition(month)
+            merged = {}
+            if existing is not None:
+                merged = {doc['id']: doc for doc in existing.records()}
+            merged.update(docs)
+            data = encode_partition(merged.values(), existing.period_ids if existing else period_ids)
+            written[month] = (len(merged), data)
+    for month, (rows, data) in written.items():
+        write_atomic(directory / f'bookings-{month}.bkca', data)
+    return {month: rows for month, (rows, _) in written.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='過期預約冷封存 (欄式、依月分區)')
+    parser.add_argument('--dir', help=f'封存目錄 (預設 {ARCHIVE_DIR}/)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help='由封存檔建立 / 合併月分區')
+    p_build.add_argument('sources', nargs='+')
+    p_build.add_argument('--before', type=date.fromisoformat,
+                         help=f'只封存早於此日期的資料 (預設 {retention_cutoff().isoformat()}, 保留 3 學年)')
+    p_query = sub.add_parser('query', help='查詢 YYYY-MM 或 起 迄 日期')
+    p_query.add_argument('range', nargs='+')
+    p_query.add_argument('--room')
+    p_query.add_argument('--json', action='store_true')
+    sub.add_parser('stats', help='列出各月分區')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        for month, rows in build(args.sources, args.dir, args.before).items():
+            print(f"✓ {month}: {rows} 筆")
+        return 0
+
+    with ColdArchive(args.dir) as archive:
+        if args.command == 'stats':
+            for month in archive.months():
+                part = archive.partition(month)
+                print(f"{month}: {part.rows} 筆, {part.path.stat().st_size // 1024 + 1} KB")
+            return 0
+        t0 = time.perf_counter()
+        if len(args.range) == 1:
+            year, month = (int(p) for p in args.range[0].replace('/', '-').split('-')[:2])
+            rows = archive.month(year, month, room=args.room)
+        else:
+            rows = archive.query(args.range[0], args.range[1], room=args.room)
+        elapsed = (time.perf_counter() - t0) * 1000
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        _, period_names = app_constants()
+        names = {pid: name for name, pid in period_names.items()}
+        for b in rows:
+            print(f"{b['date']}  {b['room']}  {'、'.join(names.get(p, p) for p in b['periods'])}  "
+                  f"{b['booker']}  {b['reason'] or '-'}")
+        print(f"· {len(rows)} 筆, {elapsed:.2f} ms (0 次 Firestore 讀取)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
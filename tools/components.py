@@ -0,0 +1,395 @@
+"""
+元件編譯器 (component compiler)
+
+add_history_batch.py 以前把整個功能寫成三大段 Python 字串 (彈窗 HTML、CSS、JS),
+再以 `'    <!-- Firebase SDK -->'`、`'// ===== 初始化 ====='` 當錨點拼進去;
+改一行 CSS 也得重跑所有 codemod、重掃每個 target。
+
+現在每個功能是 components/<名稱>/ 下的一組片段檔, 由 component.toml 宣告插入點:
+
+    id = "add_history_batch"            # 片段的 Patch id 前綴
+    label = "歷史記錄與批次預約"
+
+    [[fragment]]
+    id = "history-modal"
+    file = "history-modal.html"
+    target = "index.html"
+    before = '''
+        <!-- Firebase SDK -->'''          # 或 after / replace / symbol (+ where); CSS 片段不需錨點
+    unless = "history-modal-overlay"
+    label = "新增歷史記錄彈窗"
+
+建置時每個片段的「插入點 + 內容」算一個 hash, 與 .component-state.json 比對,
+只有變動的片段會產生 patch, 只有這些 patch 的 target 會被讀寫:
+  - 第一次套用 — 以錨點插入 (沒寫 unless 時以片段全文當冪等保護)
+  - 內容變動 — 以上次輸出的全文當錨點原地換成新內容;
+    CSS 只 upsert 有變的規則, 從片段移除的規則一併刪除
+  - 片段被移除 — 把上次輸出的內容移除 (replace 片段還原成錨點)
+同一次建置的 patch 為一個交易 (見 tools/transaction.py), 缺任何錨點就一個檔案都不寫。
+
+用法:
+    python -m tools.components                    # 增量建置 (只重建內容有變的片段)
+    python -m tools.components history_batch      # 只處理指定元件
+    python -m tools.components --full             # 忽略狀態, 全部以錨點重新套用
+    python -m tools.components --dry-run
+    python -m tools.components --watch            # 開發用: 片段存檔即重建 (Linux 用 inotify, 其他平台輪詢)
+"""
+import argparse
+import ctypes
+import hashlib
+import json
+import os
+import select
+import sys
+import time
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+
+from tools import ROOT
+from tools.cssindex import CssIndex
+from tools.patching import Edit, Patch, PatchError, css_upserts, report, write_atomic
+from tools.transaction import apply_transaction
+
+COMPONENTS_DIR = 'components'
+MANIFEST = 'component.toml'
+STATE_FILE = '.component-state.json'
+ANCHOR_KEYS = ('before', 'after', 'replace', 'symbol')
+
+# inotify(7) 事件: 編輯器多半寫暫存檔再 rename, 所以 MOVED_TO / CREATE 也要收
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+DEBOUNCE = 0.05
+POLL_INTERVAL = 0.2
+
+
+class ComponentError(PatchError):
+    """component.toml 宣告有誤"""
+
+
+@dataclass(frozen=True)
+class Fragment:
+    key: str                    # <元件 id>/<片段 id>, 同時是 Patch id
+    target: str
+    text: str
+    mode: str                   # before | after | replace | symbol | append | css
+    anchor: str | None = None   # symbol 模式為宣告名稱
+    where: str = 'replace'
+    unless: str | None = None
+    label: str = ''
+
+    @property
+    def placement(self):
+        return {'target': self.target, 'mode': self.mode, 'anchor': self.anchor, 'where': self.where}
+
+    @property
+    def digest(self):
+        data = json.dumps([self.placement, self.text], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def patch(self):
+        """第一次套用: 以宣告的錨點插入"""
+        if self.mode == 'css':
+            return Patch(self.key, self.target, css_upserts(self.text), label=self.label)
+        edit = {
+            'before': lambda: Edit(self.anchor, self.text + self.anchor),
+            'after': lambda: Edit(self.anchor, self.anchor + self.text),
+            'replace': lambda: Edit(self.anchor, self.text),
+            'symbol': lambda: Edit(None, self.text, symbol=self.anchor, where=self.where),
+            'append': lambda: Edit(None, self.text),
+        }[self.mode]()
+        return Patch(self.key, self.target, (edit,), unless=self.unless or self.text, label=self.label)
+
+
+@dataclass(frozen=True)
+class Component:
+    id: str
+    label: str
+    path: Path
+    fragments: tuple
+
+    def patches(self, target=None):
+        """以錨點套用的 Patch 清單 (codemod 腳本的 PATCHES 用)"""
+        return [f.patch() for f in self.fragments if target is None or f.target == target]
+
+
+def _fragment(component_id, base, entry):
+    try:
+        frag_id, file, target = entry['id'], entry['file'], entry['target']
+    except KeyError as e:
+        raise ComponentError(f'{base / MANIFEST}: fragment 缺少 {e.args[0]}') from None
+    anchors = [k for k in ANCHOR_KEYS if k in entry]
+    if len(anchors) > 1:
+        raise ComponentError(f'{component_id}/{frag_id}: {" / ".join(anchors)} 只能擇一')
+    if anchors:
+        mode = anchors[0]
+    else:
+        mode = 'css' if target.endswith('.css') else 'append'
+    where = entry.get('where', 'replace')
+    if mode == 'symbol' and where not in ('replace', 'before', 'after', 'end'):
+        raise ComponentError(f'{component_id}/{frag_id}: 未知的 where={where!r}')
+    with open(base / file, 'rb') as f:
+        text = f.read().decode('utf-8')
+    return Fragment(f'{component_id}/{frag_id}', target, text, mode,
+                    entry.get(mode) if anchors else None, where, entry.get('unless'), entry.get('label', ''))
+
+
+def load_component(name, root=ROOT):
+    """讀取 components/<name>/component.toml"""
+    base = Path(root) / COMPONENTS_DIR / name
+    with open(base / MANIFEST, 'rb') as f:
+        manifest = tomllib.load(f)
+    component_id = manifest.get('id', name)
+    fragments = tuple(_fragment(component_id, base, e) for e in manifest.get('fragment', ()))
+    keys = [f.key for f in fragments]
+    if len(set(keys)) != len(keys):
+        raise ComponentError(f'{component_id}: 片段 id 重複')
+    return Component(component_id, manifest.get('label', ''), base, fragments)
+
+
+def discover(root=ROOT):
+    base = Path(root) / COMPONENTS_DIR
+    if not base.is_dir():
+        return []
+    return sorted(p.name for p in base.iterdir() if (p / MANIFEST).is_file())
+
+
+def _css_rules(text):
+    css = CssIndex.build(text)
+    return {(r.selector, r.context): css.text(r, with_doc=True) for r in css.rules}
+
+
+def update_patch(fragment, prev):
+    """上次輸出 prev (狀態檔紀錄) → 目前片段; 插入點不變時原地換成新內容"""
+    old = prev['text']
+    if fragment.mode == 'css':
+        before, after = _css_rules(old), _css_rules(fragment.text)
+        edits = [Edit(None, text, rule=sel, context=ctx, where='upsert')
+                 for (sel, ctx), text in after.items() if before.get((sel, ctx)) != text]
+        edits += [Edit(None, '', rule=sel, context=ctx, where='delete') for sel, ctx in before if (sel, ctx) not in after]
+        return Patch(fragment.key, fragment.target, tuple(edits), label=fragment.label)
+    if fragment.mode == 'symbol' and fragment.where == 'replace':
+        return fragment.patch()
+    anchor = fragment.anchor or ''
+    edit = {
+        'before': lambda: Edit(old + anchor, fragment.text + anchor),
+        'after': lambda: Edit(anchor + old, anchor + fragment.text),
+    }.get(fragment.mode, lambda: Edit(old, fragment.text))()
+    return Patch(fragment.key, fragment.target, (edit,), label=fragment.label)
+
+
+def removal_patch(key, prev):
+    """片段已從 manifest 移除 (或換了插入點): 拿掉上次輸出的內容"""
+    old, mode, anchor = prev['text'], prev['mode'], prev.get('anchor') or ''
+    if mode == 'css':
+        edits = tuple(Edit(None, '', rule=sel, context=ctx, where='delete') for sel, ctx in _css_rules(old))
+    elif mode == 'symbol' and prev.get('where') == 'replace':
+        raise ComponentError(f'{key}: 取代整個宣告的片段無法自動移除, 請手動還原')
+    else:
+        edit = {
+            'before': lambda: Edit(old + anchor, anchor),
+            'after': lambda: Edit(anchor + old, anchor),
+            'replace': lambda: Edit(old, anchor),
+        }.get(mode, lambda: Edit(old, ''))()
+        edits = (edit,)
+    return Patch(key, prev['target'], edits, label=f'移除 {key}')
+
+
+class Compiler:
+    """增量建置: 比對片段 hash 與狀態檔, 只為有變動的片段產生 patch"""
+
+    def __init__(self, root=ROOT, state_path=None):
+        self.root = Path(root)
+        self.state_path = Path(state_path) if state_path else self.root / STATE_FILE
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {'fragments': {}}
+
+    def load(self, names=None):
+        return [load_component(n, self.root) for n in (names or discover(self.root))]
+
+    def plan(self, components, full=False):
+        """回傳 (patches, 目前片段 {key: Fragment}); full=True 時全部以錨點重新套用"""
+        known = self.state['fragments']
+        current = {f.key: f for c in components for f in c.fragments}
+        patches = []
+        prefixes = tuple(f'{c.id}/' for c in components)
+        for key, prev in known.items():
+            # 只處理這次有載入的元件; 片段不見或換了插入點 → 先移除舊輸出
+            moved = key in current and current[key].placement != prev['placement']
+            if key.startswith(prefixes) and (key not in current or moved) and prev['text'] is not None:
+                patches.append(removal_patch(key, {**prev['placement'], 'text': prev['text']}))
+        for key, fragment in current.items():
+            prev = known.get(key)
+            if full or prev is None or prev['placement'] != fragment.placement:
+                patches.append(fragment.patch())
+            elif prev['digest'] == fragment.digest:
+                continue
+            elif prev['text'] is None:
+                patches.append(fragment.patch())
+            else:
+                patches.append(update_patch(fragment, {**prev['placement'], 'text': prev['text']}))
+        return patches, current
+
+    def build(self, names=None, full=False, dry_run=False):
+        components = self.load(names)
+        patches, current = self.plan(components, full)
+        if not patches:
+            return []
+        results = apply_transaction(patches, root=self.root, dry_run=dry_run, workers=1)
+        if dry_run or any(r.status in ('missing', 'aborted') for r in results):
+            return results
+        fragments = self.state['fragments']
+        prefixes = tuple(f'{c.id}/' for c in components)
+        for key in [k for k in fragments if k.startswith(prefixes) and k not in current]:
+            del fragments[key]
+        texts = {}
+        for r in results:
+            fragment = current.get(r.patch.id)
+            if fragment is None:
+                continue
+            text = fragment.text
+            if r.status == 'skipped' and fragment.mode != 'css':
+                # 因 unless 略過: 樹裡是別的版本 → 不記錄輸出, 之後改片段仍走錨點插入
+                if fragment.target not in texts:
+                    texts[fragment.target] = (self.root / fragment.target).read_bytes().decode('utf-8').replace('\r\n', '\n')
+                if text not in texts[fragment.target]:
+                    text = None
+            fragments[fragment.key] = {'digest': fragment.digest, 'placement': fragment.placement, 'text': text}
+        write_atomic(self.state_path, json.dumps(self.state, ensure_ascii=False, indent=1).encode('utf-8'))
+        return results
+
+
+class Inotify:
+    """以 ctypes 呼叫 inotify(7); 只監看目錄本身 (不遞迴)"""
+
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失敗')
+        for d in dirs:
+            if libc.inotify_add_watch(self.fd, os.fsencode(d), WATCH_MASK) < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f'inotify_add_watch 失敗: {d}')
+
+    def wait(self, timeout=None):
+        """有事件回傳 True (並清空佇列), 逾時回傳 False"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Poller:
+    """沒有 inotify 的平台: 輪詢目錄下檔案的 (mtime, size)"""
+
+    def __init__(self, dirs):
+        self.dirs = list(dirs)
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        seen = {}
+        for d in self.dirs:
+            for entry in os.scandir(d):
+                st = entry.stat()
+                seen[entry.path] = (st.st_mtime_ns, st.st_size)
+        return seen
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL if timeout is None else min(POLL_INTERVAL, timeout))
+            snapshot = self._scan()
+            if snapshot != self.snapshot:
+                self.snapshot = snapshot
+                return True
+        return False
+
+    def close(self):
+        pass
+
+
+def _watcher(dirs):
+    if sys.platform.startswith('linux'):
+        try:
+            return Inotify(dirs)
+        except OSError as e:
+            print(f'inotify 無法使用 ({e}), 改用輪詢')
+    return Poller(dirs)
+
+
+def _build_and_report(compiler, names, full=False, dry_run=False):
+    started = time.perf_counter()
+    try:
+        results = compiler.build(names, full=full, dry_run=dry_run)
+    except (ComponentError, PatchError, OSError, tomllib.TOMLDecodeError) as e:
+        print(f'✗ {e}')
+        return False
+    report(results)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f'{len(results)} 個片段, {elapsed:.1f} ms' if results else f'沒有變動的片段 ({elapsed:.1f} ms)')
+    failed = any(r.status in ('missing', 'aborted') for r in results)
+    if failed:
+        print('✗ 有片段找不到錨點, 全部檔案均未修改')
+    return not failed
+
+
+def watch(compiler, names=None):
+    """片段或 manifest 存檔後重建; Ctrl-C 結束"""
+    base = compiler.root / COMPONENTS_DIR
+
+    def dirs():
+        return [base] + [base / n for n in (names or discover(compiler.root))]
+
+    watched = dirs()
+    watcher = _watcher(watched)
+    print(f'監看 {base} ({type(watcher).__name__}), Ctrl-C 結束')
+    try:
+        while True:
+            watcher.wait()
+            while watcher.wait(DEBOUNCE):   # 一次存多個檔只建置一次
+                pass
+            _build_and_report(compiler, names)
+            if dirs() != watched:          # 新增 / 刪除元件目錄 → 重新註冊監看
+                watcher.close()
+                watched = dirs()
+                watcher = _watcher(watched)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='以片段 hash 增量建置 components/ 下的元件')
+    parser.add_argument('components', nargs='*', help='元件目錄名稱 (預設全部)')
+    parser.add_argument('--full', action='store_true', help='忽略狀態檔, 全部以錨點重新套用')
+    parser.add_argument('--dry-run', action='store_true', help='只計算不寫檔')
+    parser.add_argument('--watch', action='store_true', help='監看片段檔, 存檔即重建')
+    args = parser.parse_args(argv)
+    compiler = Compiler()
+    ok = _build_and_report(compiler, args.components or None, full=args.full, dry_run=args.dry_run)
+    if args.watch:
+        watch(compiler, args.components or None)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
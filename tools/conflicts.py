@@ -0,0 +1,121 @@
+"""
+節次 bitmask 衝突索引 (conflict index)
+
+批次 / 每週重複預約送出時, app.js 原本對每個日期各下一次 Firestore 查詢,
+再對每筆結果逐一 periods.includes(); 一學期 20 週的重複預約就是 20 次往返。
+
+衝突索引把預約壓成 (場地, 日期序數) → 節次 bitmask (bit i = app.js PERIODS[i]),
+檢查一個日期只要一次 dict 查詢加一次 AND。app.js 的 buildConflictIndex /
+findConflicts 是同一套結構 (日期序數同為自 1970/01/01 起的天數)。
+
+本模組是參考實作, 也可以直接對匯出檔驗證一筆重複預約:
+
+    index = ConflictIndex.from_docs(docs)
+    index.conflicts('禮堂', weekly_dates(date(2025, 9, 1), 20), ['period1', 'period2'])
+
+用法:
+    python -m tools.conflicts export.json --room 禮堂 --start 2025-09-01 --weeks 20 --periods period1 period2
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+from tools import ROOT
+from tools.analytics import app_constants, iter_docs
+from tools.coldarchive import normalize
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+
+def date_ordinal(value):
+    """'YYYY/MM/DD' / 'YYYY-MM-DD' / date → 自 1970/01/01 起的天數 (與 app.js dateOrdinal 相同)"""
+    if isinstance(value, str):
+        y, m, d = value.replace('-', '/').split('/')
+        value = date(int(y), int(m), int(d))
+    return value.toordinal() - EPOCH
+
+
+def weekly_dates(start, weeks):
+    """start 起每週同一天, 共 weeks 個 'YYYY/MM/DD'"""
+    return [(start + timedelta(weeks=i)).strftime('%Y/%m/%d') for i in range(weeks)]
+
+
+class ConflictIndex:
+    """(room, 日期序數) → 已佔用節次的 bitmask; 已取消 (periods 為空) 的預約不佔位"""
+
+    def __init__(self, period_ids):
+        self.period_ids = list(period_ids)
+        self.bits = {pid: 1 << i for i, pid in enumerate(self.period_ids)}
+        self.masks = {}
+
+    @classmethod
+    def from_docs(cls, docs, period_ids=None):
+        if period_ids is None:
+            period_ids = list(app_constants()[1].values())
+        index = cls(period_ids)
+        for doc in docs:
+            index.add(doc['room'], doc['date'], doc.get('periods') or ())
+        return index
+
+    def mask(self, periods):
+        """節次 id → bitmask; 未知節次忽略 (與 app.js periodMask 相同)"""
+        bits = self.bits
+        m = 0
+        for pid in periods:
+            m |= bits.get(pid, 0)
+        return m
+
+    def names(self, mask):
+        return [pid for pid in self.period_ids if mask & self.bits[pid]]
+
+    def add(self, room, day, periods):
+        m = self.mask(periods)
+        if m:
+            key = (room, date_ordinal(day))
+            self.masks[key] = self.masks.get(key, 0) | m
+
+    def booked(self, room, day):
+        return self.masks.get((room, date_ordinal(day)), 0)
+
+    def conflicts(self, room, days, periods):
+        """依 days 順序回傳 [(day, [重疊節次 id])]"""
+        wanted = self.mask(periods)
+        masks = self.masks
+        out = []
+        for day in days:
+            overlap = masks.get((room, date_ordinal(day)), 0) & wanted
+            if overlap:
+                out.append((day, self.names(overlap)))
+        return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='以衝突索引驗證批次 / 重複預約')
+    parser.add_argument('sources', nargs='+', help='匯出檔 (CSV / 封存 JSON / Firestore 匯出)')
+    parser.add_argument('--room', required=True)
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help='第一個日期 (YYYY-MM-DD)')
+    parser.add_argument('--weeks', type=int, default=1, help='每週重複次數')
+    parser.add_argument('--periods', nargs='+', required=True, help='節次 id (period1, lunch, ...)')
+    args = parser.parse_args(argv)
+
+    _, period_names = app_constants(ROOT)
+    docs = [normalize(doc, period_names) for path in args.sources for doc in iter_docs(path)]
+    t0 = time.perf_counter()
+    index = ConflictIndex.from_docs(docs, list(period_names.values()))
+    t1 = time.perf_counter()
+    days = weekly_dates(args.start, args.weeks)
+    found = index.conflicts(args.room, days, args.periods)
+    t2 = time.perf_counter()
+
+    print(f"· {len(docs)} 筆預約 → {len(index.masks)} 個 (場地, 日期) "
+          f"建立 {(t1 - t0) * 1000:.1f} ms, 檢查 {len(days)} 個日期 {(t2 - t1) * 1000:.2f} ms")
+    for day, periods in found:
+        print(f"✗ {day} {args.room}: {', '.join(periods)} 已被預約")
+    if not found:
+        print(f"✓ {args.room} {len(days)} 個日期皆無衝突")
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
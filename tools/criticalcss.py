@@ -0,0 +1,453 @@
+"""
+首屏關鍵 CSS 內聯 (critical-CSS extraction & inlining)
+
+index.html 的 <link rel="stylesheet"> 會擋住第一次繪製: 就算 cssprune 壓縮過,
+教室電腦仍要先下載整份樣式表才畫得出頂部導航、查詢控制區與週曆,
+而第一屏實際用到的只是其中一小部分。
+
+本模組在部署時:
+  1. 以 html.parser 建出 index.html 的初始 DOM; 首屏不可見的元素 (class 含 hidden、
+     各種 *-overlay 彈窗) 只保留元素本身 (讓「隱藏」的樣式照樣內聯), 不展開其內容
+  2. 依 app.js renderSkeleton 的 getElementById / createElement / className / innerHTML
+     把骨架屏補進 #calendarGrid (月曆在 .hidden 裡, 不會補)
+  3. 以 CssIndex 逐條比對規則: selector 有任一段命中初始 DOM 就內聯 (只留命中的那幾段);
+     :hover / :focus 等互動狀態在首屏不成立, :not() / :nth-child() 等結構條件一律視為成立 (寧可多留);
+     @media print 略過, @keyframes 只留內聯規則有用到的
+  4. 關鍵 CSS 以 <style id="critical-css"> 插在樣式表之前, 樣式表改為
+     media="print" onload 非同步載入, 另附 <noscript> 後備
+
+非同步載入的仍是完整樣式表 (不是扣掉關鍵規則的剩餘部分): 內聯規則在前、完整樣式表在後,
+載入後的串接順序與原本相同, 不會因拆檔改變同權重規則的先後。
+
+重跑只更新 <style id="critical-css"> 的內容, 內容相同則不寫檔。
+
+用法:
+    python -m tools.criticalcss              # 在 cssprune --rewrite 之後、fingerprint 之前執行 (部署用)
+    python -m tools.criticalcss --dry-run    # 只列出內聯大小
+    python -m tools.criticalcss --output critical.css
+"""
+import argparse
+import gzip
+import re
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+from tools import ROOT
+from tools.cssindex import CssIndex
+from tools.cssprune import keyframes_used, minify, serialize
+from tools.fingerprint import is_local
+from tools.jsindex import JsIndex
+from tools.patching import Edit, Patch, apply_patches, read_text, report, write_atomic
+
+STYLE_ID = 'critical-css'
+SKELETON_FUNCTION = 'renderSkeleton'
+BUDGET = 14 * 1024          # gzip 後; 約第一個 TCP 往返 (initcwnd 10 × MSS) 送得完的量
+# 首屏不可見: 元素本身留著 (隱藏樣式要內聯), 內容不展開
+_COLLAPSED_CLASS = re.compile(r'^(?:hidden|[\w-]*overlay)$')
+# 使用者互動後才成立的狀態
+STATE_PSEUDO = frozenset({'hover', 'focus', 'active', 'focus-within', 'focus-visible', 'visited', 'target'})
+VOID_TAGS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                       'source', 'track', 'wbr'})
+SKIPPED_AT_RULES = ('@import', '@charset', '@namespace', '@page')
+
+_LINK = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_HREF = re.compile(r'\bhref="([^"]+)"', re.IGNORECASE)
+_STYLESHEET = re.compile(r'\brel="stylesheet"', re.IGNORECASE)
+_NOSCRIPT = re.compile(r'<noscript\b.*?</noscript>', re.IGNORECASE | re.DOTALL)
+_SKELETON_STEP = re.compile(r"getElementById\('([^']+)'\)|createElement\('(\w+)'\)"
+                            r"|\.className\s*=\s*'([^']*)'|\.innerHTML\s*=\s*`([^`]*)`")
+_ATTR = re.compile(r'''^\s*([\w-]+)\s*(?:([~|^$*]?=)\s*(?:"([^"]*)"|'([^']*)'|([^\s\]]+)))?\s*([is])?\s*$''')
+
+
+# ===== 初始 DOM =====
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'classes', 'parent', 'children', 'collapsed')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.classes = frozenset(self.attrs.get('class', '').split())
+        self.parent = parent
+        self.children = []
+        self.collapsed = any(_COLLAPSED_CLASS.match(c) for c in self.classes)
+        if parent is not None:
+            parent.children.append(self)
+
+
+class _TreeBuilder(HTMLParser):
+    """HTML → Node 樹; collapsed 元素的後代不建節點 (只追蹤巢狀深度)"""
+
+    def __init__(self, root):
+        super().__init__(convert_charrefs=True)
+        self.stack = [(None, root)]
+
+    def handle_starttag(self, tag, attrs):
+        parent = self.stack[-1][1]
+        node = None
+        if parent is not None and not parent.collapsed:
+            node = Node(tag, {k: v or '' for k, v in attrs}, parent)
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, node))
+
+    def handle_startendtag(self, tag, attrs):
+        parent = self.stack[-1][1]
+        if parent is not None and not parent.collapsed:
+            Node(tag, {k: v or '' for k, v in attrs}, parent)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                return
+
+
+def parse_html(html, root=None):
+    """回傳根節點 (#document 或傳入的 root, html 片段接在其下)"""
+    root = root or Node('#document')
+    builder = _TreeBuilder(root)
+    builder.feed(html)
+    builder.close()
+    return root
+
+
+def _walk(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def add_skeleton(root, function_source):
+    """依 renderSkeleton 的原始碼把骨架屏元素補進對應的 grid (grid 不在初始 DOM 中的分支略過)"""
+    by_id = {n.attrs['id']: n for n in _walk(root) if n.attrs.get('id')}
+    parent = node = None
+    for m in _SKELETON_STEP.finditer(function_source):
+        grid_id, tag, class_name, inner = m.groups()
+        if grid_id is not None:
+            parent = by_id.get(grid_id)
+            node = None
+        elif tag is not None:
+            node = Node(tag, parent=parent) if parent is not None and not parent.collapsed else None
+        elif node is not None and class_name is not None:
+            node.attrs['class'] = class_name
+            node.classes = frozenset(class_name.split())
+        elif node is not None and inner is not None:
+            parse_html(inner, node)
+    return root
+
+
+class Document:
+    """初始 DOM + 依 id / class / tag 的索引, 供 selector 比對"""
+
+    def __init__(self, root):
+        self.root = root
+        self.nodes = [n for n in _walk(root) if n.tag != '#document']
+        self.by_id, self.by_class, self.by_tag = {}, {}, {}
+        for node in self.nodes:
+            if node.attrs.get('id'):
+                self.by_id.setdefault(node.attrs['id'], []).append(node)
+            for c in node.classes:
+                self.by_class.setdefault(c, []).append(node)
+            self.by_tag.setdefault(node.tag, []).append(node)
+
+    @classmethod
+    def from_files(cls, root=ROOT):
+        html, _ = read_text(Path(root) / 'index.html')
+        tree = parse_html(html)
+        app = Path(root) / 'app.js'
+        if app.exists():
+            idx = JsIndex.from_file(app)
+            decl = idx.find(SKELETON_FUNCTION)
+            if decl is not None:
+                add_skeleton(tree, idx.text(decl))
+        return cls(tree)
+
+    def matches(self, selector):
+        """單一 selector (不含頂層逗號) 是否命中任一節點"""
+        compounds, combinators = _complex(selector)
+        last = compounds[-1]
+        if last is None:
+            return False
+        if last['ids']:
+            candidates = self.by_id.get(last['ids'][0], ())
+        elif last['classes']:
+            candidates = self.by_class.get(last['classes'][0], ())
+        elif last['tag']:
+            candidates = self.by_tag.get(last['tag'], ())
+        else:
+            candidates = self.nodes
+        return any(_match_complex(node, compounds, combinators, len(compounds) - 1) for node in candidates)
+
+
+# ===== selector 比對 =====
+
+def _closing(text, i):
+    """text[i] 為 ( 或 [, 回傳對應右括號之後的位置 (略過引號內容)"""
+    depth = 0
+    quote = None
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == '\\':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(text)
+
+
+def split_top(text, sep=','):
+    """依不在括號 / 引號內的 sep 切開"""
+    parts = []
+    start = i = 0
+    while i < len(text):
+        if text[i] in '([':
+            i = _closing(text, i)
+            continue
+        if text[i] == sep:
+            parts.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    parts.append(text[start:].strip())
+    return [p for p in parts if p]
+
+
+def _name(text, i):
+    j = i
+    while j < len(text) and (text[j].isalnum() or text[j] in '-_' or ord(text[j]) > 127 or text[j] == '\\'):
+        j += 2 if text[j] == '\\' else 1
+    return text[i:j].replace('\\', ''), j
+
+
+def _compound(text):
+    """'div.a#b[x="1"]:hover' → {'tag', 'ids', 'classes', 'attrs'}; 含互動狀態回傳 None"""
+    out = {'tag': None, 'ids': [], 'classes': [], 'attrs': []}
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '*':
+            i += 1
+        elif c == '#':
+            name, i = _name(text, i + 1)
+            out['ids'].append(name)
+        elif c == '.':
+            name, i = _name(text, i + 1)
+            out['classes'].append(name)
+        elif c == '[':
+            end = _closing(text, i)
+            out['attrs'].append(text[i + 1:end - 1])
+            i = end
+        elif c == ':':
+            element = text.startswith('::', i)
+            name, i = _name(text, i + (2 if element else 1))
+            if i < len(text) and text[i] == '(':
+                i = _closing(text, i)
+            name = name.lower()
+            if not element and name in STATE_PSEUDO:
+                return None
+            if name == 'root':
+                out['tag'] = out['tag'] or 'html'
+        elif c.isalpha():
+            name, i = _name(text, i)
+            out['tag'] = name.lower()
+        else:
+            i += 1                  # 無法辨識的字元 (namespace 等): 寧可多留, 略過
+    return out
+
+
+def _complex(selector):
+    """'a > b c' → ([compound...], [None, '>', ' ']); combinators[i] 為 compounds[i] 與前一個的關係"""
+    compounds, combinators = [], []
+    pending = None
+    start = i = 0
+    text = selector.strip()
+
+    def flush(end):
+        nonlocal pending
+        part = text[start:end].strip()
+        if part:
+            combinators.append(pending if compounds else None)
+            compounds.append(_compound(part))
+            pending = ' '
+    while i < len(text):
+        c = text[i]
+        if c in '([':
+            i = _closing(text, i)
+            continue
+        if c in ' >+~':
+            flush(i)
+            if c != ' ':
+                pending = c
+            start = i + 1
+        i += 1
+    flush(len(text))
+    return compounds, combinators
+
+
+def _match_attr(node, spec):
+    m = _ATTR.match(spec)
+    if not m:
+        return True
+    name, op, *values, flag = m.groups()
+    if name not in node.attrs:
+        return False
+    if not op:
+        return True
+    actual, expected = node.attrs[name], next((v for v in values if v is not None), '')
+    if flag == 'i':
+        actual, expected = actual.lower(), expected.lower()
+    return {
+        '=': actual == expected,
+        '~=': expected in actual.split(),
+        '|=': actual == expected or actual.startswith(expected + '-'),
+        '^=': actual.startswith(expected),
+        '$=': actual.endswith(expected),
+        '*=': expected in actual,
+    }[op]
+
+
+def _match_compound(node, compound):
+    if compound is None:
+        return False
+    if compound['tag'] and compound['tag'] != node.tag:
+        return False
+    if any(node.attrs.get('id') != i for i in compound['ids']):
+        return False
+    if not all(c in node.classes for c in compound['classes']):
+        return False
+    return all(_match_attr(node, a) for a in compound['attrs'])
+
+
+def _match_complex(node, compounds, combinators, i):
+    if not _match_compound(node, compounds[i]):
+        return False
+    if i == 0:
+        return True
+    combinator = combinators[i]
+    parent = node.parent
+    if combinator in ('>', ' '):
+        while parent is not None and parent.tag != '#document':
+            if _match_complex(parent, compounds, combinators, i - 1):
+                return True
+            if combinator == '>':
+                return False
+            parent = parent.parent
+        return False
+    siblings = parent.children if parent is not None else []
+    before = siblings[:siblings.index(node)]
+    if combinator == '+':
+        before = before[-1:]
+    return any(_match_complex(s, compounds, combinators, i - 1) for s in before)
+
+
+# ===== 關鍵規則 =====
+
+def critical_css(source, document):
+    """回傳 (關鍵 CSS, {'rules', 'inlined', 'bytes', 'gzip'})"""
+    idx = CssIndex.build(source)
+    kept = []
+    for rule in idx.rules:
+        if any('print' in prelude for prelude in rule.context):
+            continue
+        if rule.selector.startswith('@'):
+            if not rule.selector.startswith(SKIPPED_AT_RULES):
+                kept.append((rule, None))
+            continue
+        alive = [part for part in split_top(rule.selector) if document.matches(part)]
+        if alive:
+            kept.append((rule, ','.join(alive)))
+    body_text = ' '.join(minify(idx.body(r)) for r, sel in kept if sel is not None)
+    kept = [(r, sel) for r, sel in kept if sel is not None or keyframes_used(r, body_text)]
+    css = serialize(idx, kept).strip()
+    inlined = sum(1 for _, sel in kept if sel is not None)
+    data = css.encode('utf-8')
+    return css, {'rules': len(idx.rules), 'inlined': inlined, 'bytes': len(data),
+                 'gzip': len(gzip.compress(data, 9, mtime=0))}
+
+
+# ===== index.html 改寫 =====
+
+def stylesheet_links(html):
+    """<noscript> 以外, 以 <link rel="stylesheet"> 載入的本地樣式表: [(標籤, 網址)]"""
+    visible = _NOSCRIPT.sub(lambda m: ' ' * len(m.group()), html)
+    links = []
+    for m in _LINK.finditer(visible):
+        href = _HREF.search(m.group())
+        if href and _STYLESHEET.search(m.group()) and is_local(href.group(1)):
+            links.append((html[m.start():m.end()], href.group(1)))
+    return links
+
+
+def _indent(html, tag):
+    start = html.index(tag)
+    return html[html.rfind('\n', 0, start) + 1:start]
+
+
+def html_patches(html, css):
+    """第一次: 樣式表前插入 <style id="critical-css">, 樣式表改非同步; 之後只更新 <style> 內容"""
+    style = f'<style id="{STYLE_ID}">{css}</style>'
+    if f'id="{STYLE_ID}"' in html:
+        return [Patch('criticalcss/style', 'index.html', (Edit(f'<style id="{STYLE_ID}">', style, until=('</style>',)),),
+                      unless=style, label='index.html 關鍵 CSS')]
+    edits = []
+    for n, (tag, href) in enumerate(stylesheet_links(html)):
+        if 'media=' in tag:
+            continue
+        indent = _indent(html, tag)
+        deferred = tag[:-1].rstrip(' /') + ''' media="print" onload="this.media='all'">'''
+        new = f'{deferred}\n{indent}<noscript><link rel="stylesheet" href="{href}"></noscript>'
+        edits.append(Edit(tag, (f'{style}\n{indent}' if n == 0 else '') + new, count=1))
+    if not edits:
+        return []
+    return [Patch('criticalcss/index', 'index.html', tuple(edits), label='index.html 關鍵 CSS 內聯、樣式表非同步載入')]
+
+
+def build(root=ROOT, dry_run=False):
+    """計算關鍵 CSS 並改寫 index.html; 回傳 (關鍵 CSS, {網址: 統計}, patch 結果)"""
+    root = Path(root)
+    html, _ = read_text(root / 'index.html')
+    document = Document.from_files(root)
+    parts, stats = [], {}
+    for _, href in stylesheet_links(html):
+        path = root / href
+        if not path.exists():
+            continue
+        css, stats[href] = critical_css(read_text(path)[0], document)
+        parts.append(css)
+    css = ''.join(parts)
+    results = apply_patches(html_patches(html, css), root=root, dry_run=dry_run) if css else []
+    return css, stats, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='內聯首屏關鍵 CSS, 樣式表改為非同步載入')
+    parser.add_argument('--dry-run', action='store_true', help='只計算, 不改寫 index.html')
+    parser.add_argument('--output', help='另存關鍵 CSS')
+    args = parser.parse_args(argv)
+
+    css, stats, results = build(dry_run=args.dry_run)
+    for href, s in stats.items():
+        print(f"  {href}: 內聯 {s['inlined']}/{s['rules']} 條規則, {s['bytes'] / 1024:.1f} KB "
+              f"(gzip {s['gzip'] / 1024:.1f} KB)")
+    size = len(gzip.compress(css.encode('utf-8'), 9, mtime=0))
+    if size > BUDGET:
+        print(f'✗ 關鍵 CSS gzip 後 {size / 1024:.1f} KB 超過 {BUDGET // 1024} KB (首屏需要多一次往返)')
+    if args.output:
+        write_atomic(Path(args.output), (css + '\n').encode('utf-8'))
+    report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+CSS 規則索引 (rule-level CSS index)
+
+update_styles.py 以前用 find(".control-row {") + 「.room-select:focus { 之後第一個 }」
+定位區塊, 遇到 @media 就錯位; add_history_batch.update_css() 直接 append,
+每跑一次 styles.css 就多一份歷史記錄 / 批次預約樣式。
+
+本模組一次掃描 CSS (跳過註解與字串), 把 (at-rule 脈絡, selector) 對應到 byte 區段:
+
+    idx = CssIndex.build(css)
+    idx.find('.history-item', context=('@media (max-width: 768px)',))
+    idx.duplicates()
+
+upsert / delete 由 tools/patching.py 的 Edit(rule=...) 執行, 重跑結果不變。
+
+用法:
+    python -m tools.cssindex styles.css             # 列出重複規則
+    python -m tools.cssindex styles.css --dedupe    # 刪除「內容完全相同」的較早副本
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+
+from tools import ROOT
+
+# 內含一般規則、需要展開成脈絡的 at-rule; 其他 (@keyframes、@font-face…) 視為不透明的單一規則
+NESTING_AT_RULES = ('@media', '@supports', '@container', '@layer', '@document')
+
+_TOKEN = re.compile(r'/\*.*?\*/|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[{};]', re.DOTALL)
+_SPACE = re.compile(r'\s+')
+
+
+class CssSyntaxError(Exception):
+    """大括號不成對"""
+
+
+def normalize_selector(text):
+    """壓縮空白、統一逗號格式, 讓 `.a,\n.b` 與 `.a, .b` 視為同一 selector"""
+    text = _SPACE.sub(' ', text).strip()
+    return ', '.join(part.strip() for part in text.split(','))
+
+
+def normalize_body(text):
+    return _SPACE.sub(' ', text).strip()
+
+
+@dataclass(frozen=True)
+class Rule:
+    selector: str           # 正規化後的 selector (at-rule 則為其 prelude, 例如 '@keyframes shake')
+    context: tuple          # 外層 at-rule prelude, 例如 ('@media (max-width: 768px)',)
+    start: int              # selector 起點
+    end: int                # 結尾 } (或 ;) 之後
+    doc_start: int          # 緊鄰上方註解的起點; 沒有則等於 start
+    body_start: int         # { 之後
+    body_end: int           # 結尾 } 的位置
+
+
+@dataclass(frozen=True)
+class Block:
+    context: tuple          # 含自身在內的完整脈絡
+    start: int
+    end: int                # 結尾 } 之後
+
+
+class CssIndex:
+    def __init__(self, source, rules, blocks):
+        self.source = source
+        self.rules = rules
+        self.blocks = blocks
+        self._by_key = {}
+        for rule in rules:
+            self._by_key.setdefault((rule.context, rule.selector), []).append(rule)
+
+    @classmethod
+    def build(cls, source):
+        return cls(source, *_scan(source))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.build(f.read())
+
+    def find(self, selector, context=()):
+        """最後一條同 selector 同脈絡的規則 (cascade 中實際較晚生效者)"""
+        found = self._by_key.get((tuple(context), normalize_selector(selector)))
+        return found[-1] if found else None
+
+    def find_all(self, selector, context=()):
+        return list(self._by_key.get((tuple(context), normalize_selector(selector)), ()))
+
+    def last_block(self, context):
+        found = [b for b in self.blocks if b.context == tuple(context)]
+        return found[-1] if found else None
+
+    def body(self, rule):
+        return self.source[rule.body_start:rule.body_end]
+
+    def text(self, rule, with_doc=False):
+        return self.source[rule.doc_start if with_doc else rule.start:rule.end]
+
+    def duplicates(self):
+        return {key: rules for key, rules in self._by_key.items() if len(rules) > 1}
+
+    def redundant(self):
+        """內容與較晚的同 selector 同脈絡規則完全相同 → 刪掉也不影響 cascade"""
+        found = []
+        for rules in self.duplicates().values():
+            later = set()
+            for rule in reversed(rules):
+                body = normalize_body(self.body(rule))
+                if body in later:
+                    found.append(rule)
+                later.add(body)
+        return sorted(found, key=lambda r: r.start)
+
+
+def _scan(src):
+    """單次掃描, 回傳 (rules, blocks)"""
+    rules = []
+    blocks = []
+    stack = []              # ('ctx', prelude, start) | ('rule', selector, start, doc, body_start) | ('opaque', ...)
+    seg_start = 1 if src.startswith('\ufeff') else 0   # 目前 prelude 的起點 (上一個 { } ; 之後); 跳過 BOM
+    doc_start = None
+    pos = 0
+
+    def context():
+        return tuple(item[1] for item in stack if item[0] == 'ctx')
+
+    def in_opaque():
+        return any(item[0] in ('rule', 'opaque') for item in stack)
+
+    for m in _TOKEN.finditer(src):
+        tok = m.group()
+        if tok.startswith('/*'):
+            if not in_opaque() and not src[seg_start:m.start()].strip():
+                if doc_start is None:
+                    doc_start = m.start()
+                seg_start = m.end()
+            continue
+        if tok[0] in '"\'':
+            continue
+        pos = m.end()
+        if tok == '{':
+            prelude_raw = src[seg_start:m.start()]
+            start = seg_start + (len(prelude_raw) - len(prelude_raw.lstrip()))
+            prelude = normalize_selector(prelude_raw)
+            if in_opaque():
+                stack.append(('inner', prelude, start))
+            elif prelude.startswith(NESTING_AT_RULES):
+                stack.append(('ctx', prelude, start))
+            elif prelude.startswith('@'):
+                stack.append(('opaque', prelude, start, doc_start, pos))
+            else:
+                stack.append(('rule', prelude, start, doc_start, pos))
+            doc_start = None
+        elif tok == '}':
+            if not stack:
+                raise CssSyntaxError(f'多餘的 }} (offset {m.start()})')
+            item = stack.pop()
+            if item[0] == 'ctx':
+                blocks.append(Block(context() + (item[1],), item[2], pos))
+            elif item[0] in ('rule', 'opaque'):
+                _, selector, start, doc, body_start = item
+                rules.append(Rule(selector, context(), start, pos, doc if doc is not None else start,
+                                  body_start, m.start()))
+            doc_start = None
+        elif tok == ';' and not in_opaque():
+            # @import / @charset 之類無區塊的 at-rule
+            raw = src[seg_start:m.start()]
+            start = seg_start + (len(raw) - len(raw.lstrip()))
+            rules.append(Rule(normalize_selector(raw), context(), start, pos,
+                              doc_start if doc_start is not None else start, pos, pos))
+            doc_start = None
+        seg_start = pos
+    if stack:
+        raise CssSyntaxError(f'結尾仍有未關閉的 {stack[-1][1]!r}')
+    rules.sort(key=lambda r: r.start)
+    return rules, blocks
+
+
+def dedupe(source):
+    """刪除內容完全相同的較早副本 (連同其上方註解), 回傳 (新內容, 刪除數)"""
+    idx = CssIndex.build(source)
+    out = []
+    cursor = 0
+    removed = idx.redundant()
+    for rule in removed:
+        start = rule.doc_start
+        # 連同該行縮排與規則後的換行一起刪, 避免留下一排空白
+        while start > cursor and source[start - 1] in ' \t':
+            start -= 1
+        out.append(source[cursor:start])
+        cursor = rule.end
+        while cursor < len(source) and source[cursor] in ' \t\r':
+            cursor += 1
+        if source.startswith('\n', cursor):
+            cursor += 1
+        # 前面已是空行時, 再吃掉一個空行
+        blank = re.match(r'[ \t]*\r?\n', source[cursor:cursor + 64])
+        if blank and (not out[-1] or re.search(r'\n[ \t\r]*\n$', out[-1])):
+            cursor += blank.end()
+    out.append(source[cursor:])
+    return ''.join(out), len(removed)
+
+
+def main(argv=None):
+    from tools.patching import encode, read_text, write_atomic
+
+    parser = argparse.ArgumentParser(description='列出 / 清除重複的 CSS 規則')
+    parser.add_argument('files', nargs='*', default=['styles.css'])
+    parser.add_argument('--dedupe', action='store_true', help='刪除內容完全相同的較早副本')
+    args = parser.parse_args(argv)
+
+    for name in args.files:
+        path = ROOT / name
+        text, _eol = read_text(path)
+        idx = CssIndex.build(text)
+        dups = idx.duplicates()
+        print(f"{name}: {len(idx.rules)} 條規則, {len(dups)} 組重複, {len(idx.redundant())} 條可安全刪除")
+        for (ctx, selector), rules in sorted(dups.items(), key=lambda kv: kv[1][0].start):
+            where = ' '.join(ctx) + ' ' if ctx else ''
+            print(f"  {where}{selector} × {len(rules)}")
+        if args.dedupe:
+            new_text, removed = dedupe(text)
+            if removed:
+                write_atomic(path, encode(new_text))
+            print(f"✓ {name} 刪除 {removed} 條重複規則")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+未使用 selector 清除 + 壓縮 (unused-selector elimination)
+
+styles.v2.50.0.css 有 236 KB, 其中不少樣式屬於早已被 codemod 換掉的舊 UI。
+本模組收集 index.html、app.js、components/ 片段與 codemod 腳本
+(add_mobile_button.py…) 中實際出現的 class / id, 刪掉不可能命中的規則後輸出壓縮版,
+並附上被刪規則的報告。
+
+判斷原則是「寧可多留」:
+  - 來源檔中任何形似識別字的 token 都視為可能用到的 class / id
+  - `heat-${level}`、'status-' + x 這類動態組字, 以 heat- / status- 為前綴全數保留
+  - :not() / :is() / [attr] 等括號內的 class 不列入必要條件
+
+用法:
+    python -m tools.cssprune                                # 輸出 styles.v2.50.0.min.css 與報告
+    python -m tools.cssprune styles.css --report prune.json
+    python -m tools.cssprune --rewrite                      # 並把 index.html / sw.js 改指向壓縮版 (部署用)
+"""
+import argparse
+import json
+import re
+import sys
+
+from tools import ROOT
+from tools.cssindex import CssIndex
+from tools.patching import Edit, Patch, apply_patches, read_text, report, write_atomic
+
+DEFAULT_STYLESHEET = 'styles.v2.50.0.css'
+# class / id 可能出現的來源 (codemod 腳本與 components/ 片段注入的 HTML/JS 也要算進去)
+SOURCES = ('index.html', 'app.js', 'components', 'add_mobile_button.py', 'update_files.py')
+
+_WORD = re.compile(r'[A-Za-z_][\w-]*')
+# `heat-${level}` / 'status-' + x → 前綴 heat- / status-
+_DYNAMIC_PREFIX = re.compile(r'''([A-Za-z_][\w-]*-)(?:\$\{|['"`]\s*\+)''')
+_PARENS = re.compile(r'\([^()]*\)|\[[^\]]*\]')
+_REQUIRED = re.compile(r'([.#])((?:[\w-]|\\.)+)')
+_STRING_OR_COMMENT = re.compile(r'/\*.*?\*/|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'', re.DOTALL)
+
+
+def collect_usage(sources=SOURCES, root=ROOT):
+    """回傳 (可能用到的 token 集合, 動態前綴 tuple)"""
+    tokens = set()
+    prefixes = set()
+    for name in sources:
+        path = root / name
+        if not path.exists():
+            continue
+        # 目錄 (components/) 取其下所有片段檔
+        for file in sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]:
+            text, _ = read_text(file)
+            tokens.update(_WORD.findall(text))
+            prefixes.update(_DYNAMIC_PREFIX.findall(text))
+    return tokens, tuple(sorted(prefixes))
+
+
+def _strip_parens(selector):
+    prev = None
+    while prev != selector:
+        prev, selector = selector, _PARENS.sub('', selector)
+    return selector
+
+
+def part_may_match(part, tokens, prefixes):
+    """selector 中每個 class / id 都可能存在時, 這段 selector 才可能命中"""
+    for _, name in _REQUIRED.findall(_strip_parens(part)):
+        name = name.replace('\\', '')
+        if name not in tokens and not name.startswith(prefixes):
+            return False
+    return True
+
+
+def minify(text, declarations=True):
+    """移除註解、壓縮空白; declarations=True 時也去掉 `prop: value` 冒號後的空白"""
+    out = []
+    cursor = 0
+    for m in _STRING_OR_COMMENT.finditer(text):
+        out.append(_squeeze(text[cursor:m.start()], declarations))
+        if not m.group().startswith('/*'):
+            out.append(m.group())
+        cursor = m.end()
+    out.append(_squeeze(text[cursor:], declarations))
+    result = ''.join(out).strip().replace(';}', '}')
+    return result.rstrip(';') if declarations else result
+
+
+def _squeeze(chunk, declarations):
+    chunk = re.sub(r'\s+', ' ', chunk)
+    chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+    chunk = re.sub(r'\s*!\s*important', '!important', chunk)
+    if declarations:
+        chunk = re.sub(r'\s*:\s*', ':', chunk)
+    return chunk
+
+
+def keyframes_used(rule, body_text, tokens=()):
+    """@keyframes 的名稱有出現在保留的宣告 (或來源檔) 中; 其他 at-rule 一律視為用到"""
+    if not rule.selector.startswith('@keyframes'):
+        return True
+    name = rule.selector.split(None, 1)[-1]
+    return name in body_text or name in tokens
+
+
+def serialize(idx, kept):
+    """[(規則, selector)] → 壓縮後 CSS; selector 為 None 表示 at-rule 原樣輸出, 依序重建 @media 等脈絡"""
+    out = []
+    open_ctx = ()
+    for rule, selector in kept:
+        # 脈絡切換: 關掉不再共用的 @media, 打開新的
+        common = 0
+        while common < min(len(open_ctx), len(rule.context)) and open_ctx[common] == rule.context[common]:
+            common += 1
+        out.append('}' * (len(open_ctx) - common))
+        out.extend(minify(prelude, declarations=False) + '{' for prelude in rule.context[common:])
+        open_ctx = rule.context
+        if selector is None:
+            out.append(minify(idx.text(rule)))
+        else:
+            out.append(minify(selector, declarations=False) + '{' + minify(idx.body(rule)) + '}')
+    out.append('}' * len(open_ctx))
+    return ''.join(out) + '\n'
+
+
+def prune(source, tokens, prefixes):
+    """回傳 (壓縮後 CSS, 報告 dict)"""
+    idx = CssIndex.build(source)
+    kept = []
+    dropped = []
+    trimmed = []
+    for rule in idx.rules:
+        if rule.selector.startswith('@'):
+            kept.append((rule, None))
+            continue
+        parts = [p.strip() for p in rule.selector.split(',')]
+        alive = [p for p in parts if part_may_match(p, tokens, prefixes)]
+        if not alive:
+            dropped.append({'context': list(rule.context), 'selector': rule.selector,
+                            'bytes': len(idx.text(rule, with_doc=True).encode('utf-8'))})
+            continue
+        if len(alive) < len(parts):
+            trimmed.append({'context': list(rule.context), 'removed': [p for p in parts if p not in alive]})
+        kept.append((rule, ','.join(alive)))
+
+    body_text = ' '.join(minify(idx.body(r)) for r, sel in kept if sel is not None)
+    unused = [r for r, sel in kept if sel is None and not keyframes_used(r, body_text, tokens)]
+    for rule in unused:
+        dropped.append({'context': list(rule.context), 'selector': rule.selector,
+                        'bytes': len(idx.text(rule).encode('utf-8'))})
+    css = serialize(idx, [(r, sel) for r, sel in kept if r not in unused])
+    stats = {
+        'rules_before': len(idx.rules),
+        'rules_dropped': len(dropped),
+        'bytes_before': len(source.encode('utf-8')),
+        'bytes_after': len(css.encode('utf-8')),
+    }
+    return css, {'stats': stats, 'dropped': dropped, 'trimmed_selectors': trimmed}
+
+
+def unreferenced_stylesheets(root=ROOT):
+    """根目錄中沒有被 index.html / sw.js 引用的 styles*.css (舊版殘留)"""
+    referenced = ''
+    for name in ('index.html', 'sw.js'):
+        referenced += read_text(root / name)[0]
+    return sorted(p.name for p in root.glob('styles*.css')
+                  if p.name not in referenced and not p.name.endswith('.min.css'))
+
+
+def min_name(name):
+    return name[:-len('.css')] + '.min.css'
+
+
+def reference_patches(name, new_name):
+    return [
+        Patch(f'cssprune/{name}/index', 'index.html', (Edit(f'href="{name}"', f'href="{new_name}"'),),
+              unless=f'href="{new_name}"'),
+        Patch(f'cssprune/{name}/sw', 'sw.js', (Edit(f"'./{name}'", f"'./{new_name}'"),), unless=f"'./{new_name}'"),
+    ]
+
+
+def rewrite_references(name, root=ROOT):
+    """index.html / sw.js 改指向 name 的 .min.css; 已改過的重跑為 skipped"""
+    return apply_patches(reference_patches(name, min_name(name)), root=root)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='刪除未使用的 CSS 規則並壓縮')
+    parser.add_argument('stylesheets', nargs='*', default=[DEFAULT_STYLESHEET])
+    parser.add_argument('--report', help='被刪規則報告 (JSON) 輸出路徑')
+    parser.add_argument('--rewrite', action='store_true', help='index.html / sw.js 改指向 .min.css')
+    args = parser.parse_args(argv)
+
+    tokens, prefixes = collect_usage()
+    reports = {}
+    for name in args.stylesheets:
+        source, _ = read_text(ROOT / name)
+        css, result = prune(source, tokens, prefixes)
+        write_atomic(ROOT / min_name(name), css.encode('utf-8'))
+        reports[name] = result
+        s = result['stats']
+        print(f"✓ {name} → {min_name(name)}: 刪除 {s['rules_dropped']}/{s['rules_before']} 條規則, "
+              f"{s['bytes_before'] // 1024} KB → {s['bytes_after'] // 1024} KB")
+        if args.rewrite:
+            report(rewrite_references(name))
+    for name in unreferenced_stylesheets():
+        print(f"· {name} 未被 index.html / sw.js 引用 (可不必部署)")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
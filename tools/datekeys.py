@@ -0,0 +1,190 @@
+"""
+預約日期查詢鍵回填 (date-ordinal / weekKey / monthKey migration)
+
+bookings 的 date 是 'YYYY/MM/DD' 字串: 週曆、月曆、智慧建議與歷史記錄全靠字串範圍查詢
+(歷史記錄還以 'YYYY/MM/31' 充當月底), 週 / 月檢視無法以等值查詢取得。
+
+每筆預約加上三個由 date 推得的欄位 (與 app.js bookingDateKeys、Cloud Function syncBookingDateKeys 相同):
+  dayOrdinal — 自 1970/01/01 起的天數 (同 tools/conflicts.date_ordinal)
+  weekKey    — 所在週週一 'YYYY/MM/DD' (= 週曆的 queryStart)
+  monthKey   — 'YYYY/MM'
+
+app.js 的週 / 月載入改成 room + weekKey / monthKey 等值查詢, 其他區間改用 dayOrdinal 整數範圍;
+新預約由前端寫入時一併帶上, 舊版前端建立的或改了 date 的預約由 syncBookingDateKeys 補正。
+
+本工具回填既有文件: 以游標逐頁讀取 bookings, 只對缺欄位或與 date 不符的文件送 update
+(只寫這三個欄位, 不動其他欄位), 每 500 筆一個 commit、數條連線平行送出; 重跑只會補上剩下的差異。
+
+GitHub Pages 每次 push 都會部署 app.js, 不能靠部署順序保證已回填: 整批掃完且沒有寫入失敗時才寫入
+migrations/dateKeys (complete = true), app.js 讀到這份標記才改用查詢鍵, 在那之前 (或查詢鍵的查詢失敗,
+例如索引 / 規則還沒部署) 照舊以 date 字串範圍查詢。標記寫入前 functions 必須已部署:
+回填掃過之後才由舊版前端建立的預約靠 syncBookingDateKeys 補上查詢鍵。
+部署前置: firebase deploy --only firestore,functions → 本工具回填 (寫入標記); 部署流程以 --status 回報是否完成。
+
+用法:
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.datekeys --project demo-test
+    python -m tools.datekeys --project <專案> --token "$(gcloud auth print-access-token)"
+    python -m tools.datekeys --project <專案> --dry-run     # 只統計需要回填的筆數
+    python -m tools.datekeys --status                       # 回填標記是否已寫入 (未完成 exit 1; 專案預設取自 config.js)
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from tools.conflicts import date_ordinal
+from tools.firestore import CONNECTIONS, MAX_BATCH, Firestore, FirestoreError, parallel
+
+COLLECTION = 'bookings'
+FIELDS = ('dayOrdinal', 'weekKey', 'monthKey')
+MARKER = ('migrations', 'dateKeys')     # app.js dateKeysReady() 讀取的回填完成標記
+PAGE_SIZE = 1000
+
+_DATE = re.compile(r'^(\d{4})[/-](\d{1,2})[/-](\d{1,2})$')
+
+
+def parse_day(value):
+    """'YYYY/MM/DD' / 'YYYY-MM-DD' → date; 格式不符回傳 None"""
+    m = _DATE.match(value or '') if isinstance(value, str) else None
+    if not m:
+        return None
+    try:
+        return date(*map(int, m.groups()))
+    except ValueError:
+        return None
+
+
+def date_keys(day):
+    """date → {'dayOrdinal', 'weekKey', 'monthKey'}"""
+    monday = day - timedelta(days=day.weekday())
+    return {'dayOrdinal': date_ordinal(day), 'weekKey': monday.strftime('%Y/%m/%d'), 'monthKey': day.strftime('%Y/%m')}
+
+
+def pending(doc):
+    """需要寫入的鍵 (已一致回傳 {}); date 無法解析回傳 None"""
+    day = parse_day(doc.get('date'))
+    if day is None:
+        return None
+    keys = date_keys(day)
+    if all(doc.get(k) == v and type(doc.get(k)) is type(v) for k, v in keys.items()):
+        return {}
+    return keys
+
+
+def _commit_job(updates):
+    def commit(conn):
+        try:
+            conn.commit([conn.update_write(COLLECTION, doc_id, keys) for doc_id, keys in updates])
+        except (FirestoreError, OSError) as e:
+            return len(updates), e
+        return len(updates), None
+    return commit
+
+
+def migrate(client, batch_size=MAX_BATCH, connections=CONNECTIONS, dry_run=False, page_size=PAGE_SIZE):
+    """回填全部預約; 回傳 {'scanned', 'current', 'invalid', 'updated', 'errors': [...], 'marked'}
+
+    每累積 connections 個 batch 就平行送出一輪, 記憶體只放這一輪的更新。
+    整批沒有寫入失敗時寫入 MARKER (marked = True); dry run 不寫。
+    """
+    summary = {'scanned': 0, 'current': 0, 'invalid': 0, 'updated': 0, 'errors': [], 'marked': False}
+    round_size = batch_size * max(1, connections)
+    updates = []
+
+    def flush():
+        if dry_run:
+            summary['updated'] += len(updates)
+        else:
+            batches = [updates[i:i + batch_size] for i in range(0, len(updates), batch_size)]
+            for count, error in parallel(client, [_commit_job(b) for b in batches], connections):
+                if error:
+                    summary['errors'].append(f'{count} 筆寫入失敗: {error}')
+                else:
+                    summary['updated'] += count
+        updates.clear()
+
+    for doc in client.stream_query(COLLECTION, page_size=page_size):
+        summary['scanned'] += 1
+        keys = pending(doc)
+        if keys is None:
+            summary['invalid'] += 1
+        elif not keys:
+            summary['current'] += 1
+        else:
+            updates.append((doc['id'], keys))
+            if len(updates) >= round_size:
+                flush()
+    if updates:
+        flush()
+    if not dry_run and not summary['errors']:
+        marker = {'complete': True, 'scanned': summary['scanned'], 'invalid': summary['invalid'],
+                  'completedAt': datetime.now(timezone.utc)}
+        client.commit([client.set_write(*MARKER, marker)])
+        summary['marked'] = True
+    return summary
+
+
+def backfill_complete(client):
+    """MARKER 是否已寫入 (與 app.js dateKeysReady 相同判斷)"""
+    marker = client.get(*MARKER)
+    return bool(marker) and marker.get('complete') is True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回填預約的 dayOrdinal / weekKey / monthKey')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+    parser.add_argument('--token', help='OAuth access token (正式環境以管理員身分寫入; emulator 不需要)')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS, help='平行連線數')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH, help=f'每個 commit 的文件數 (≤ {MAX_BATCH})')
+    parser.add_argument('--dry-run', action='store_true', help='只統計, 不寫入')
+    parser.add_argument('--status', action='store_true', help='只檢查回填標記 (可公開讀取, 不需 token)')
+    args = parser.parse_args(argv)
+    if args.status and not args.project:
+        from tools.freeslots import config_project     # freeslots → series → 本模組, 延後匯入避免循環
+
+        args.project = config_project()
+    if not args.project:
+        parser.error('需要 --project (或 GCLOUD_PROJECT)')
+
+    client = Firestore(args.project, token=args.token)
+    if args.status:
+        try:
+            done = backfill_complete(client)
+        except (FirestoreError, OSError) as e:
+            print(f'✗ 無法讀取 {"/".join(MARKER)} (firestore.rules 可能尚未部署): {e}')
+            return 1
+        finally:
+            client.close()
+        if done:
+            print('✓ 日期查詢鍵已回填, 前端使用 weekKey / monthKey / dayOrdinal 查詢')
+            return 0
+        print('✗ 日期查詢鍵尚未回填完成 (沒有 migrations/dateKeys 標記), 前端照舊以 date 範圍查詢; '
+              '請先部署 firestore / functions 後執行 python -m tools.datekeys')
+        return 1
+    t0 = time.perf_counter()
+    try:
+        summary = migrate(client, min(args.batch_size, MAX_BATCH), args.connections, args.dry_run)
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - t0
+
+    print(f"· 掃描 {summary['scanned']} 筆, 已一致 {summary['current']} 筆")
+    if summary['invalid']:
+        print(f"✗ {summary['invalid']} 筆 date 格式不符, 未回填")
+    for msg in summary['errors']:
+        print(f'✗ {msg}')
+    if args.dry_run:
+        print(f"✓ 需要回填 {summary['updated']} 筆 (dry run)")
+        return 0
+    print(f"✓ 已回填 {summary['updated']} 筆 ({elapsed:.2f} s)")
+    if summary['errors']:
+        print('  重跑即可補上失敗的部分 (只會寫入仍不一致的文件); 全部成功後才會寫入完成標記')
+    else:
+        print(f'✓ 已寫入 {"/".join(MARKER)}: 前端改用日期查詢鍵')
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
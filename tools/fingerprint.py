@@ -0,0 +1,186 @@
+"""
+內容指紋資產管線 (content-fingerprinted assets)
+
+以前每次發版都要手動改 sw.js 的 CACHE_NAME, 而 activate 會把舊快取整個刪掉 →
+就算只改了一行 app.js, 所有使用者也得重新下載 CSS、JS、字型設定全部資源。
+
+本模組在部署時:
+  1. 找出 index.html 以 <script src> / <link rel="stylesheet"> 載入的本地 JS / CSS
+  2. 依內容 SHA-256 另存為 app.<hash>.js、styles.v2.50.0.min.<hash>.css
+  3. 以補丁引擎把 index.html 的標籤改指向指紋檔名
+  4. 依 index.html 實際引用的資源重建 sw.js 的 ASSETS_TO_CACHE (未引用的 styles.css 不再預快取,
+     <link rel="prefetch"> 的 app.js 延遲區塊一併預快取),
+     CACHE_NAME 附上整份清單的雜湊 → 只有資源內容真的變了才會換新快取
+
+指紋檔名的內容永不改變, sw.js install 時會直接沿用舊快取中的同名回應,
+所以使用者只會下載 bytes 真的有變的檔案。
+
+sw.js、manifest.json、favicon.png 需要固定網址, 不加指紋。
+
+用法:
+    python -m tools.fingerprint              # 在 cssprune --rewrite 與產生 config.js 之後執行 (部署用)
+    python -m tools.fingerprint --dry-run    # 只列出對應表
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+from tools import ROOT
+from tools.jsindex import JsIndex
+from tools.patching import Edit, Patch, apply_patches, read_text, report, write_atomic
+
+HASH_LENGTH = 10
+MANIFEST_FILE = 'asset-manifest.json'
+# 需要固定網址的資源 (SW 本身、PWA manifest 與其圖示)
+STABLE_ASSETS = ('sw.js', 'manifest.json', 'favicon.png')
+
+_SCRIPT = re.compile(r'<script\b[^>]*?\bsrc="([^"]+)"', re.IGNORECASE)
+_LINK = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_HREF = re.compile(r'\bhref="([^"]+)"', re.IGNORECASE)
+_STYLESHEET = re.compile(r'\brel="stylesheet"', re.IGNORECASE)
+_PREFETCH = re.compile(r'\brel="prefetch"', re.IGNORECASE)
+# 已加過指紋的檔名: name.<hash>.ext
+_FINGERPRINTED = re.compile(r'\.[0-9a-f]{%d}(\.(?:js|css))$' % HASH_LENGTH)
+_STRING = re.compile(r"'([^'\\]*)'")
+
+
+def is_local(url):
+    return not re.match(r'[a-z][a-z0-9+.-]*:|//|#', url, re.IGNORECASE)
+
+
+def referenced_assets(html):
+    """index.html 以 <script src> / <link rel="stylesheet"> 載入的本地資源 (依出現順序, 不重複)"""
+    found = [(m.start(), m.group(1)) for m in _SCRIPT.finditer(html)]
+    for m in _LINK.finditer(html):
+        href = _HREF.search(m.group())
+        if href and _STYLESHEET.search(m.group()):
+            found.append((m.start(), href.group(1)))
+    urls = []
+    for _, url in sorted(found):
+        if is_local(url) and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def prefetched_assets(html):
+    """<link rel="prefetch"> 預先下載的本地資源 (tools/codesplit.py 的延遲區塊, 檔名已含指紋)"""
+    urls = []
+    for m in _LINK.finditer(html):
+        href = _HREF.search(m.group())
+        if href and _PREFETCH.search(m.group()) and is_local(href.group(1)) and href.group(1) not in urls:
+            urls.append(href.group(1))
+    return urls
+
+
+def referenced_urls(html):
+    """index.html 中所有本地 src / href (含 manifest、icon)"""
+    return {m.group(2) for m in re.finditer(r'\b(src|href)="([^"]+)"', html) if is_local(m.group(2))}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def source_name(url):
+    """app.<hash>.js → app.js (重跑時找回原始檔)"""
+    return _FINGERPRINTED.sub(r'\1', url)
+
+
+def fingerprinted_name(url, data):
+    path = Path(source_name(url))
+    return str(path.with_name(f'{path.stem}.{content_hash(data)}{path.suffix}'))
+
+
+def build_mapping(html, root=ROOT):
+    """回傳 {index.html 中目前的網址: 指紋網址}; 原始檔不存在的資源略過"""
+    mapping = {}
+    for url in referenced_assets(html):
+        if source_name(url) in STABLE_ASSETS:
+            continue
+        path = root / source_name(url)
+        if not path.exists():
+            continue
+        mapping[url] = fingerprinted_name(url, path.read_bytes())
+    return mapping
+
+
+def precache_list(current, html_urls, mapping, extra=()):
+    """依 index.html 實際引用重建預快取清單: 外部網址保留, 未引用的本地檔移除, 新引用 (含 extra) 補在後面"""
+    renamed = {source_name(old): new for old, new in mapping.items()}
+    out = []
+    for entry in current:
+        if not is_local(entry):
+            out.append(entry)
+            continue
+        name = entry[2:] if entry.startswith('./') else entry
+        name = renamed.get(source_name(name), name)
+        if name in ('', 'index.html') or name in html_urls:
+            out.append(f'./{name}')
+    for name in [*mapping.values(), *extra]:
+        if f'./{name}' not in out:
+            # 新資源排在外部網址之前
+            externals = [i for i, e in enumerate(out) if not is_local(e)]
+            out.insert(externals[0] if externals else len(out), f'./{name}')
+    return out
+
+
+def sw_patches(sw_source, assets):
+    """以頂層宣告名稱定位, 取代 sw.js 的 CACHE_NAME 與 ASSETS_TO_CACHE"""
+    idx = JsIndex.build(sw_source)
+    cache_decl = idx.text(idx.find('CACHE_NAME'))
+    base = re.sub(r'-[0-9a-f]{%d}$' % HASH_LENGTH, '', _STRING.search(cache_decl).group(1))
+    digest = content_hash('\n'.join(assets).encode('utf-8'))
+    lines = ''.join(f"    '{a}',\n" for a in assets)
+    return [Patch('fingerprint/sw', 'sw.js', (
+        Edit(None, f"const CACHE_NAME = '{base}-{digest}';", symbol='CACHE_NAME'),
+        Edit(None, f'const ASSETS_TO_CACHE = [\n{lines}];', symbol='ASSETS_TO_CACHE'),
+    ), label='sw.js 預快取清單')]
+
+
+def html_patches(mapping):
+    return [Patch(f'fingerprint/{source_name(old)}', 'index.html', (Edit(f'"{old}"', f'"{new}"'),),
+                  label=f'index.html → {new}')
+            for old, new in mapping.items() if old != new]
+
+
+def current_assets(sw_source):
+    idx = JsIndex.build(sw_source)
+    return _STRING.findall(idx.text(idx.find('ASSETS_TO_CACHE')))
+
+
+def fingerprint(root=ROOT, dry_run=False):
+    """產生指紋檔、改寫 index.html 與 sw.js; 回傳 ({原始檔名: 指紋檔名}, patch 結果)"""
+    html, _ = read_text(root / 'index.html')
+    sw_source, _ = read_text(root / 'sw.js')
+    mapping = build_mapping(html, root)
+    if not dry_run:
+        for old, new in mapping.items():
+            write_atomic(root / new, (root / source_name(old)).read_bytes())
+
+    html_urls = {mapping.get(u, u) for u in referenced_urls(html)}
+    assets = precache_list(current_assets(sw_source), html_urls, mapping, prefetched_assets(html))
+    results = apply_patches(html_patches(mapping) + sw_patches(sw_source, assets), root=root, dry_run=dry_run)
+    manifest = {source_name(old): new for old, new in mapping.items()}
+    if not dry_run:
+        write_atomic(root / MANIFEST_FILE,
+                     (json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+    return manifest, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='為 JS / CSS 加上內容指紋並重建 sw.js 預快取清單')
+    parser.add_argument('--dry-run', action='store_true', help='只列出對應表, 不寫檔')
+    args = parser.parse_args(argv)
+
+    manifest, results = fingerprint(dry_run=args.dry_run)
+    for name, new in manifest.items():
+        print(f"  {name} → {new}")
+    report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
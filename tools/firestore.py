@@ -0,0 +1,277 @@
+"""
+Firestore REST client (僅標準函式庫)
+
+維運工具 (批次匯入、封存、遷移) 不跑在瀏覽器裡, 沒有 firebase SDK 可用;
+這裡以 http.client 直接呼叫 Firestore REST API, 每個 Firestore 物件持有一條
+keep-alive 連線, 需要平行時以 clone() 多開幾條, 交給 parallel() 分派。
+
+連線目標:
+  設定 FIRESTORE_EMULATOR_HOST (例如 127.0.0.1:8080) → 本機 emulator, 以 owner 身分略過 rules
+  否則 → firestore.googleapis.com; 帶 OAuth token (gcloud auth print-access-token) 以該身分存取,
+        不帶則與未登入的瀏覽器相同, 受 firestore.rules 限制 (預約、場地設定可公開讀取)
+
+用法:
+    db = Firestore('demo-project')
+    docs = db.run_query('bookings', [('room', '==', '禮堂'), ('date', '>=', '2025/09/01')])
+    for doc in db.stream_query('audit_logs', order_by=[('timestamp', 'asc')]): ...   # 游標分頁, 固定記憶體
+    db.commit([db.create_write('bookings', 'abc', {'date': '2025/09/01'}, server_time=('createdAt',))])
+"""
+import asyncio
+import http.client
+import json
+import os
+import secrets
+import string
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+EMULATOR_ENV = 'FIRESTORE_EMULATOR_HOST'
+PRODUCTION_HOST = 'firestore.googleapis.com'
+MAX_BATCH = 500             # 單次 commit 的寫入上限
+CONNECTIONS = 4
+OPERATORS = {
+    '==': 'EQUAL', '!=': 'NOT_EQUAL', '<': 'LESS_THAN', '<=': 'LESS_THAN_OR_EQUAL',
+    '>': 'GREATER_THAN', '>=': 'GREATER_THAN_OR_EQUAL', 'in': 'IN', 'array-contains': 'ARRAY_CONTAINS',
+}
+_ID_CHARS = string.ascii_letters + string.digits
+
+
+class FirestoreError(Exception):
+    """REST API 回傳錯誤"""
+
+    def __init__(self, status, message):
+        super().__init__(f'{status} {message}')
+        self.status = status
+
+
+def auto_id():
+    """與 SDK collection.doc() 相同格式的 20 字元隨機 id"""
+    return ''.join(secrets.choice(_ID_CHARS) for _ in range(20))
+
+
+def encode_value(value):
+    """Python 值 → Firestore REST 型別值"""
+    if value is None:
+        return {'nullValue': None}
+    if isinstance(value, bool):
+        return {'booleanValue': value}
+    if isinstance(value, int):
+        return {'integerValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, str):
+        return {'stringValue': value}
+    if isinstance(value, datetime):
+        return {'timestampValue': value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [encode_value(v) for v in value]}}
+    if isinstance(value, dict):
+        return {'mapValue': {'fields': encode_fields(value)}}
+    raise TypeError(f'無法寫入 Firestore 的型別: {type(value).__name__}')
+
+
+def encode_fields(data):
+    return {k: encode_value(v) for k, v in data.items()}
+
+
+def decode_value(value):
+    """Firestore REST 型別值 → Python 值"""
+    if 'arrayValue' in value:
+        return [decode_value(v) for v in value['arrayValue'].get('values', [])]
+    if 'mapValue' in value:
+        return {k: decode_value(v) for k, v in value['mapValue'].get('fields', {}).items()}
+    for key in ('stringValue', 'timestampValue', 'booleanValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'integerValue' in value:
+        return int(value['integerValue'])
+    return None
+
+
+def decode_document(doc):
+    """REST 文件 → {'id': ..., 欄位...}"""
+    data = {k: decode_value(v) for k, v in doc.get('fields', {}).items()}
+    data['id'] = doc['name'].rsplit('/', 1)[-1]
+    return data
+
+
+class Firestore:
+    """單一 keep-alive HTTP 連線的 Firestore REST client (非執行緒安全, 一條連線一個使用者)"""
+
+    def __init__(self, project, host=None, token=None):
+        self.project = project
+        self.token = token
+        self.emulator = host is not None or EMULATOR_ENV in os.environ
+        self.host = host or os.environ.get(EMULATOR_ENV) or PRODUCTION_HOST
+        self.database = f'projects/{project}/databases/(default)'
+        self._conn = None
+
+    def clone(self):
+        """同一目標的另一條連線"""
+        return Firestore(self.project, self.host if self.emulator else None, self.token)
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            cls = http.client.HTTPConnection if self.emulator else http.client.HTTPSConnection
+            self._conn = cls(self.host, timeout=60)
+        return self._conn
+
+    def _request(self, method, path, body=None):
+        """回傳解析後的 JSON; 404 回傳 None。keep-alive 連線被對方關閉時重連一次"""
+        headers = {}
+        if self.token or self.emulator:
+            headers['Authorization'] = f'Bearer {self.token or "owner"}'
+        payload = None
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in (0, 1):
+            conn = self._connect()
+            try:
+                conn.request(method, f'/v1/{path}', payload, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+        if resp.status == 404:
+            return None
+        if resp.status >= 400:
+            try:
+                message = json.loads(data)['error']['message']
+            except (ValueError, KeyError, TypeError):
+                message = data.decode('utf-8', 'replace')[:200]
+            raise FirestoreError(resp.status, message)
+        return json.loads(data) if data else {}
+
+    def document_name(self, collection, doc_id):
+        return f'{self.database}/documents/{collection}/{doc_id}'
+
+    def get(self, collection, doc_id):
+        """單一文件; 不存在回傳 None"""
+        doc = self._request('GET', quote(self.document_name(collection, doc_id), safe='/()'))
+        return decode_document(doc) if doc else None
+
+    def list_documents(self, collection, page_size=300):
+        """整個 collection 的文件 (依 pageToken 分頁)"""
+        docs = []
+        token = ''
+        while True:
+            path = f'{self.database}/documents/{quote(collection)}?pageSize={page_size}'
+            page = self._request('GET', path + (f'&pageToken={quote(token)}' if token else '')) or {}
+            docs.extend(decode_document(d) for d in page.get('documents', ()))
+            token = page.get('nextPageToken')
+            if not token:
+                return docs
+
+    def _structured_query(self, collection, filters, order_by, limit):
+        query = {'from': [{'collectionId': collection}]}
+        clauses = [{'fieldFilter': {'field': {'fieldPath': field}, 'op': OPERATORS[op], 'value': encode_value(value)}}
+                   for field, op, value in filters]
+        if len(clauses) == 1:
+            query['where'] = clauses[0]
+        elif clauses:
+            query['where'] = {'compositeFilter': {'op': 'AND', 'filters': clauses}}
+        if order_by:
+            query['orderBy'] = [{'field': {'fieldPath': field}, 'direction': 'DESCENDING' if d == 'desc' else 'ASCENDING'}
+                                for field, d in order_by]
+        if limit is not None:
+            query['limit'] = limit
+        return query
+
+    def _run(self, query):
+        rows = self._request('POST', f'{self.database}/documents:runQuery', {'structuredQuery': query})
+        return [row['document'] for row in rows or () if 'document' in row]
+
+    def run_query(self, collection, filters=(), order_by=(), limit=None):
+        """filters: [(欄位, 運算子, 值)], 運算子同 SDK ('==', '>=', 'in', ...); order_by: [(欄位, 'asc'|'desc')]"""
+        return [decode_document(d) for d in self._run(self._structured_query(collection, filters, order_by, limit))]
+
+    def stream_query(self, collection, filters=(), order_by=(), page_size=300, start_after=None):
+        """同 run_query, 但以游標 (startAt before=false) 逐頁讀取並逐筆 yield, 記憶體只放一頁
+
+        排序最後自動補上 __name__, 游標取自上一頁最後一筆文件的原始排序值, 同一時間戳的文件不會漏讀或重讀。
+        start_after: 中斷後續傳用, 依 order_by 順序的排序值 + 文件 id (例如 ('2025/03/01', 'abc'))
+        """
+        order_by = list(order_by)
+        if not any(field == '__name__' for field, _ in order_by):
+            order_by.append(('__name__', order_by[-1][1] if order_by else 'asc'))
+        query = self._structured_query(collection, filters, order_by, page_size)
+        if start_after is not None:
+            values = [{'referenceValue': self.document_name(collection, v)} if field == '__name__' else encode_value(v)
+                      for (field, _), v in zip(order_by, start_after)]
+            query['startAt'] = {'values': values, 'before': False}
+        while True:
+            page = self._run(query)
+            for doc in page:
+                yield decode_document(doc)
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            values = [{'referenceValue': last['name']} if field == '__name__'
+                      else last.get('fields', {}).get(field, {'nullValue': None}) for field, _ in order_by]
+            query['startAt'] = {'values': values, 'before': False}
+
+    def create_write(self, collection, doc_id, data, server_time=()):
+        """新增文件的 write (文件已存在則整個 commit 失敗); server_time 欄位寫入伺服器時間"""
+        write = {
+            'update': {'name': self.document_name(collection, doc_id), 'fields': encode_fields(data)},
+            'currentDocument': {'exists': False},
+        }
+        if server_time:
+            write['updateTransforms'] = [{'fieldPath': f, 'setToServerValue': 'REQUEST_TIME'} for f in server_time]
+        return write
+
+    def update_write(self, collection, doc_id, data):
+        """只改 data 中的欄位 (updateMask), 文件不存在則整個 commit 失敗; 等同 SDK 的 doc.update()"""
+        return {
+            'update': {'name': self.document_name(collection, doc_id), 'fields': encode_fields(data)},
+            'updateMask': {'fieldPaths': list(data)},
+            'currentDocument': {'exists': True},
+        }
+
+    def set_write(self, collection, doc_id, data):
+        """整份覆寫 (文件不存在則建立), 等同 SDK 的 doc.set()"""
+        return {'update': {'name': self.document_name(collection, doc_id), 'fields': encode_fields(data)}}
+
+    def delete_write(self, collection, doc_id, must_exist=False):
+        """刪除文件; must_exist=True 時文件已不存在則整個 commit 失敗"""
+        write = {'delete': self.document_name(collection, doc_id)}
+        if must_exist:
+            write['currentDocument'] = {'exists': True}
+        return write
+
+    def commit(self, writes):
+        """單一 atomic commit (最多 MAX_BATCH 筆), 等同 SDK 的 batch.commit()"""
+        if len(writes) > MAX_BATCH:
+            raise FirestoreError(400, f'單次 commit 最多 {MAX_BATCH} 筆, 收到 {len(writes)} 筆')
+        return self._request('POST', f'{self.database}/documents:commit', {'writes': writes})
+
+
+async def _pool(client, jobs, connections):
+    clients = [client] + [client.clone() for _ in range(max(1, min(connections, len(jobs))) - 1)]
+    results = [None] * len(jobs)
+    pending = iter(enumerate(jobs))
+
+    async def worker(conn):
+        for i, job in pending:
+            results[i] = await asyncio.to_thread(job, conn)
+
+    try:
+        await asyncio.gather(*(worker(c) for c in clients))
+    finally:
+        for c in clients[1:]:
+            c.close()
+    return results
+
+
+def parallel(client, jobs, connections=CONNECTIONS):
+    """以 connections 條連線平行執行 jobs (每個 job 為 fn(client)); 依 jobs 順序回傳結果"""
+    return asyncio.run(_pool(client, list(jobs), connections))
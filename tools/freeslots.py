@@ -0,0 +1,177 @@
+"""
+學期空堂索引 (free-slot index)
+
+findSmartAlternatives 每次遇到時段已被借, 就對 Firestore 查「前後 7 天所有場地」
+的預約加上整個 roomSettings, 再在前端跑策略 A/B/C; 開學搶借期間這個查詢一直在打。
+
+本模組把一個學期的資料編成靜態檔 free-slots.json (隨網站部署):
+
+    {
+      "version": "3f2a...",             # 預約與場地設定內容的雜湊, 內容不變則檔案不變
+      "lastChange": "2025-09-03T...",   # 學期內最後一筆預約的建立時間
+      "start": "2025/08/01", "days": 184,
+      "periods": ["morning", "period1", ...],          # bit 順序 = app.js PERIODS
+      "rooms": {"禮堂": {"free": "<base64>", "busy": "<base64>"}, ...}
+    }
+
+free 為每日一個 uint16 (小端序) 空堂 bitmask = 全部節次 − 已借 − 固定不開放 (unavailableSlots);
+busy 為每日一個 uint8, 當天已借節次數 (策略 B 的「越空越優先」)。
+
+前端查詢變成 Uint16Array 索引 + AND, 不必連線; 真正送出預約時仍由送出流程即時檢查衝突。
+
+用法:
+    python -m tools.freeslots                            # 讀 Firestore (專案取自 config.js), 寫 free-slots.json
+    python -m tools.freeslots --project <專案> --today 2025-09-01
+    python -m tools.freeslots --source 學期封存.json --settings roomSettings.json   # 離線
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import sys
+from array import array
+from datetime import date
+
+from tools import ROOT
+from tools.analytics import DEFAULT_ROOM, app_constants, iter_docs, parse_created
+from tools.conflicts import date_ordinal
+from tools.firestore import Firestore
+from tools.series import COLLECTION as SERIES, expand
+
+ARTIFACT = 'free-slots.json'
+DAY_IDS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')     # date.weekday() 順序
+
+
+def semester_range(today):
+    """與 app.js getSemesterRange() 相同: 8/1–1/31 上學期 (含 1 月), 2/1–7/31 下學期"""
+    if today.month >= 8:
+        return date(today.year, 8, 1), date(today.year + 1, 1, 31)
+    if today.month == 1:
+        return date(today.year - 1, 8, 1), date(today.year, 1, 31)
+    return date(today.year, 2, 1), date(today.year, 7, 31)
+
+
+def _b64(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def compile_slots(bookings, settings, start, end, rooms, period_ids):
+    """bookings: 預約文件; settings: {場地: unavailableSlots}; 回傳 free-slots.json 內容"""
+    bit = {pid: 1 << i for i, pid in enumerate(period_ids)}
+    full = (1 << len(period_ids)) - 1
+    base = date_ordinal(start)
+    days = (end - start).days + 1
+    blocked = {}
+    for room in rooms:
+        slots = set(settings.get(room) or ())
+        blocked[room] = [sum(bit[p] for p in period_ids if f'{day}_{p}' in slots) for day in DAY_IDS]
+    booked = {room: array('H', bytes(2 * days)) for room in rooms}
+    busy = {room: array('B', bytes(days)) for room in rooms}
+    lo, hi = start.strftime('%Y/%m/%d'), end.strftime('%Y/%m/%d')
+    digest = hashlib.sha1()
+    last = None
+    for b in sorted(bookings, key=lambda b: (b['date'], b.get('room') or DEFAULT_ROOM, b.get('id', ''))):
+        day_str = b['date'].replace('-', '/')
+        room = b.get('room') or DEFAULT_ROOM
+        if not lo <= day_str <= hi or room not in booked:
+            continue
+        periods = b.get('periods') or ()
+        i = date_ordinal(day_str) - base
+        for p in periods:
+            booked[room][i] |= bit.get(p, 0)
+        busy[room][i] = min(255, busy[room][i] + len(periods))
+        digest.update(f"{b.get('id', '')}|{day_str}|{room}|{','.join(periods)}\n".encode('utf-8'))
+        created = parse_created(b.get('createdAt'))
+        if created and (last is None or created > last):
+            last = created
+    digest.update(json.dumps({r: sorted(settings.get(r) or ()) for r in rooms}, ensure_ascii=False).encode('utf-8'))
+
+    out_rooms = {}
+    weekday = start.weekday()
+    for room in rooms:
+        free = array('H', ((full & ~(booked[room][i] | blocked[room][(weekday + i) % 7])) for i in range(days)))
+        out_rooms[room] = {'free': _b64(free), 'busy': _b64(busy[room])}
+    return {
+        'version': digest.hexdigest()[:12],
+        'lastChange': last.isoformat() if last else None,
+        'start': lo,
+        'days': days,
+        'periods': list(period_ids),
+        'rooms': out_rooms,
+    }
+
+
+def decode_room(artifact, room):
+    """(free, busy) 兩個 array, 供測試與除錯"""
+    free = array('H', base64.b64decode(artifact['rooms'][room]['free']))
+    busy = array('B', base64.b64decode(artifact['rooms'][room]['busy']))
+    if sys.byteorder == 'big':
+        free.byteswap()
+    return free, busy
+
+
+def config_project(root=ROOT):
+    """從 config.js (部署時由 FIREBASE_CONFIG 產生) 讀出 projectId"""
+    try:
+        text = (root / 'config.js').read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    m = re.search(r'''projectId["']?\s*:\s*["']([^"']+)["']''', text)
+    return m.group(1) if m else None
+
+
+def fetch(client, start, end):
+    """學期內的預約 (單欄位範圍查詢, 不需複合索引; 含 bookingSeries 展開的日期) 與全部場地設定"""
+    bookings = client.run_query('bookings', [('date', '>=', start.strftime('%Y/%m/%d')),
+                                             ('date', '<=', end.strftime('%Y/%m/%d'))])
+    for series in client.run_query(SERIES, [('endOrdinal', '>=', date_ordinal(start))]):
+        bookings.extend(expand(series, start, end))
+    settings = {doc['id']: doc.get('unavailableSlots') or [] for doc in client.list_documents('roomSettings')}
+    return bookings, settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='產生學期空堂索引 free-slots.json')
+    parser.add_argument('--project', help='Firebase 專案 id (預設取自 config.js)')
+    parser.add_argument('--token', help='OAuth access token (選用; 預約與場地設定可公開讀取)')
+    parser.add_argument('--source', nargs='*', help='改讀匯出檔 (CSV / 封存 JSON / Firestore 匯出), 不連線')
+    parser.add_argument('--settings', help='搭配 --source: {場地: unavailableSlots} JSON')
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today(), help='決定學期 (YYYY-MM-DD)')
+    parser.add_argument('-o', '--output', default=str(ROOT / ARTIFACT))
+    args = parser.parse_args(argv)
+
+    rooms, period_names = app_constants(ROOT)
+    start, end = semester_range(args.today)
+    if args.source:
+        # CSV 匯出的節次是名稱, 轉回 id
+        bookings = [{**doc, 'periods': [period_names.get(p, p) for p in doc.get('periods') or ()]}
+                    for path in args.source for doc in iter_docs(path)]
+        settings = {}
+        if args.settings:
+            with open(args.settings, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+    else:
+        project = args.project or config_project()
+        if not project:
+            parser.error('需要 --project (或含 projectId 的 config.js)')
+        client = Firestore(project, token=args.token)
+        try:
+            bookings, settings = fetch(client, start, end)
+        finally:
+            client.close()
+
+    artifact = compile_slots(bookings, settings, start, end, rooms, list(period_names.values()))
+    payload = json.dumps(artifact, ensure_ascii=False, separators=(',', ':')) + '\n'
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(payload)
+    print(f"✓ {args.output}: {artifact['start']} 起 {artifact['days']} 天 × {len(rooms)} 個場地, "
+          f"{len(payload.encode('utf-8')) / 1024:.1f} KB, version {artifact['version']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
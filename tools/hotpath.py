@@ -0,0 +1,359 @@
+"""
+熱路徑靜態分析 (hot-path analyzer): 找出 app.js 與補丁腳本 JS 中的平方級樣式
+
+add_history_batch 注入的歷史記錄渲染在 snapshot.forEach 裡做
+`historyList.innerHTML += ...`, 每加一列就把整個清單重新序列化 + 解析一次;
+同一段程式對每個節次 PERIODS.find、對每個日曆格 batchSelectedDates.includes。
+教室的低階平板上, 這類 O(n²) 是「點了沒反應」的主因, 而且在桌機上測不出來。
+
+本模組以 tools/jsindex 的 tokenizer 掃描:
+
+  innerhtml-concat-in-loop   迴圈內 el.innerHTML += / outerHTML +=
+  lookup-in-loop             迴圈內 .find / .findIndex / .includes / .indexOf / .lastIndexOf
+                             (接收者是陣列字面值、字串、字串方法結果者略過)
+  listener-rebind-in-render  render* / update* / show* ... 函式內 querySelectorAll(...) 後
+                             逐一 addEventListener / on* = (每次重繪都重綁, 應改用事件委派)
+
+「迴圈」= for / while / do 的本體, 以及 forEach / map / filter / reduce / some / every /
+find / sort ... 的 callback; 迴圈內再包一層 addEventListener / setTimeout 等 callback 的
+程式只在事件發生時執行, 不算。
+
+掃描範圍: app.js、components/**/*.js、根目錄補丁腳本 (*.py) 中看起來是 JS 的字串常數。
+
+預算閘門: hotpath-budget.json 記錄每個 (檔案, 函式, 規則) 目前允許的數量;
+--check 時任何一項超過就失敗 (CI 與部署前執行), 修掉後以 --update-budget 下修。
+以函式為單位而非行號, 無關的增刪行不會讓閘門誤判。
+
+用法:
+    python -m tools.hotpath                     # 列出所有發現
+    python -m tools.hotpath --rule lookup-in-loop
+    python -m tools.hotpath --check             # 超過預算時 exit 1
+    python -m tools.hotpath --update-budget     # 以目前結果作為新預算
+"""
+import argparse
+import ast
+import bisect
+import json
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from tools import ROOT
+from tools.jsindex import JsIndex, JsSyntaxError, brackets, tokens
+from tools.patching import write_atomic
+
+BUDGET_FILE = 'hotpath-budget.json'
+RULES = ('innerhtml-concat-in-loop', 'lookup-in-loop', 'listener-rebind-in-render')
+ITERATION_METHODS = {'forEach', 'map', 'filter', 'reduce', 'reduceRight', 'some', 'every',
+                     'find', 'findIndex', 'flatMap', 'sort'}
+LOOKUP_METHODS = {'find', 'findIndex', 'includes', 'indexOf', 'lastIndexOf'}
+LOOP_KEYWORDS = {'for', 'while'}
+# callback 只在事件 / 計時器觸發時執行, 不屬於外層迴圈的每次迭代
+DEFERRED_CALLS = {'addEventListener', 'setTimeout', 'setInterval', 'requestAnimationFrame',
+                  'requestIdleCallback', 'then', 'catch', 'finally', 'onSnapshot'}
+# 回傳字串的方法: 其結果的 .includes / .indexOf 是字串搜尋
+STRING_METHODS = {'toLowerCase', 'toUpperCase', 'trim', 'join', 'toString', 'substring', 'replace',
+                  'padStart', 'padEnd', 'toISOString', 'toLocaleString', 'toLocaleDateString', 'getAttribute'}
+RENDER_NAME = re.compile(r'^(render|update|refresh|show|build|display|populate|draw)[A-Z_]')
+_JS_HINT = re.compile(r'\bfunction\b|=>|\bdocument\.|\b(?:const|let)\s')
+
+
+@dataclass(frozen=True)
+class Finding:
+    rule: str
+    path: str
+    line: int
+    function: str
+    loop: str           # 所在迴圈的描述 (listener-rebind-in-render 為 querySelectorAll 的選擇器)
+    code: str
+
+    @property
+    def key(self):
+        return f'{self.path}::{self.function}'
+
+
+def _receiver(toks, dot):
+    """toks[dot] 為 '.', 回傳其前方成員鏈的文字 (例如 snapshot.docs)"""
+    i = dot - 1
+    parts = []
+    while i >= 0:
+        t = toks[i]
+        if t.kind == 'word':
+            parts.append(t.text)
+            if i >= 1 and toks[i - 1].text in ('.', '?.'):
+                parts.append('.')
+                i -= 2
+                continue
+        elif t.text in (')', ']'):
+            parts.append('()' if t.text == ')' else '[]')
+        break
+    return ''.join(reversed(parts)) or '…'
+
+
+class _Scan:
+    def __init__(self, source):
+        self.source = source
+        self.toks = tokens(source)
+        self.match, self.parent = brackets(self.toks)
+        self.loops = {}         # 迴圈區域開括號 index → 描述
+        self.deferred = set()   # DEFERRED_CALLS 的參數 '(' index
+        self.statement = {}     # 無大括號的 for / while 本體: token index → 描述
+        self._regions()
+
+    def _regions(self):
+        toks, match = self.toks, self.match
+        for i, t in enumerate(toks):
+            if t.text != '(' or i == 0 or i not in match:
+                continue
+            prev = toks[i - 1]
+            if prev.text in DEFERRED_CALLS:
+                self.deferred.add(i)
+            elif prev.text in ITERATION_METHODS and i >= 2 and toks[i - 2].text in ('.', '?.'):
+                self.loops[i] = f'{_receiver(toks, i - 2)}.{prev.text}'
+            elif prev.text in LOOP_KEYWORDS and prev.kind == 'word':
+                close = match[i]
+                header = ' '.join(self.source[toks[i].start + 1:toks[close].start].split())
+                label = f"{prev.text} ({header if len(header) <= 40 else header[:39] + '…'})"
+                if toks[i - 2].text == '}' if i >= 2 else False:
+                    opener = match.get(i - 2)
+                    if opener is not None and opener >= 1 and toks[opener - 1].text == 'do':
+                        continue                                # do { } while (...) 的條件
+                body = close + 1
+                if body < len(toks) and toks[body].text == '{':
+                    self.loops[body] = label
+                else:
+                    j = body
+                    while j < len(toks) and not (toks[j].text == ';' and self.parent[j] == self.parent[body]):
+                        self.statement[j] = label
+                        j += 1
+        for i, t in enumerate(toks):
+            if t.text == 'do' and t.kind == 'word' and i + 1 < len(toks) and toks[i + 1].text == '{':
+                self.loops[i + 1] = 'do { }'
+
+    def loop_of(self, i):
+        """toks[i] 所在的最內層迴圈描述; 不在迴圈內 (或中間隔了事件 callback) 回傳 None"""
+        if i in self.statement:
+            return self.statement[i]
+        p = self.parent[i]
+        while p is not None:
+            if p in self.deferred:
+                return None
+            if p in self.loops:
+                return self.loops[p]
+            if p in self.statement:
+                return self.statement[p]
+            p = self.parent[p]
+        return None
+
+    def _literal_receiver(self, dot):
+        prev = self.toks[dot - 1]
+        if prev.kind in ('string', 'template'):
+            return True
+        if prev.text == ']':
+            opener = self.match.get(dot - 1)
+            before = self.toks[opener - 1] if opener else None
+            return before is None or (before.kind == 'punct' and before.text not in (')', ']'))
+        if prev.text == ')':
+            opener = self.match.get(dot - 1)
+            return opener is not None and opener >= 1 and self.toks[opener - 1].text in STRING_METHODS
+        return False
+
+    def _compound_add(self, i):
+        """toks[i:i + 2] 為緊鄰的 + = (tokenizer 把 += 切成兩個 punct)"""
+        toks = self.toks
+        return i + 1 < len(toks) and toks[i].text == '+' and toks[i + 1].text == '=' \
+            and toks[i + 1].start == toks[i].start + 1
+
+    def _string_search(self, open_index):
+        """唯一參數是字串字面值 (x.includes(',')): 多半是字串搜尋而非集合查找"""
+        toks = self.toks
+        close = self.match.get(open_index)
+        return close == open_index + 2 and toks[open_index + 1].kind == 'string'
+
+    def findings(self):
+        """→ [(rule, token index, loop 描述)]"""
+        toks = self.toks
+        out = []
+        for i, t in enumerate(toks):
+            if t.kind != 'word' or i == 0 or toks[i - 1].text not in ('.', '?.'):
+                continue
+            nxt = toks[i + 1].text if i + 1 < len(toks) else None
+            if t.text in ('innerHTML', 'outerHTML') and self._compound_add(i + 1):
+                loop = self.loop_of(i)
+                if loop:
+                    out.append(('innerhtml-concat-in-loop', i, loop))
+            elif t.text in LOOKUP_METHODS and nxt == '(' and not self._literal_receiver(i - 1) \
+                    and not self._string_search(i + 1):
+                loop = self.loop_of(i)
+                if loop:
+                    out.append(('lookup-in-loop', i, loop))
+            elif t.text == 'querySelectorAll' and nxt == '(':
+                selector = self._rebinds(i)
+                if selector is not None:
+                    out.append(('listener-rebind-in-render', i, selector))
+        return out
+
+    def _binds(self, open_index):
+        close = self.match.get(open_index, open_index)
+        toks = self.toks
+        for j in range(open_index, close):
+            if toks[j].text == 'addEventListener' or (
+                    toks[j].text.startswith('on') and toks[j - 1].text == '.' and toks[j + 1].text == '='
+                    and toks[j + 2].text != '='):
+                return True
+        return False
+
+    def _rebinds(self, i):
+        """querySelectorAll(...) 的結果被逐一綁事件 → 回傳選擇器文字, 否則 None"""
+        toks, match = self.toks, self.match
+        close = match.get(i + 1)
+        if close is None:
+            return None
+        selector = self.source[toks[i + 1].start + 1:toks[close].start].strip()
+        # document.querySelectorAll('.x').forEach(el => el.addEventListener(...))
+        if close + 3 < len(toks) and toks[close + 1].text == '.' and toks[close + 2].text == 'forEach' \
+                and toks[close + 3].text == '(':
+            return selector if self._binds(close + 3) else None
+        # const els = ...querySelectorAll(...); els.forEach(...) / for (const el of els) { ... }
+        j = i - 1
+        while j > 0 and (toks[j].text in ('.', '?.') or toks[j].kind == 'word') and toks[j].text not in ('const', 'let', 'var'):
+            j -= 1
+        if toks[j].text != '=' or j == 0 or toks[j - 1].kind != 'word':
+            return None
+        name = toks[j - 1].text
+        scope = self.parent[i]
+        end = match.get(scope, len(toks)) if scope is not None else len(toks)
+        for k in range(close + 1, end):
+            if toks[k].text != name or toks[k - 1].text in ('.', '?.'):
+                continue
+            if k + 3 < len(toks) and toks[k + 1].text == '.' and toks[k + 2].text == 'forEach' \
+                    and toks[k + 3].text == '(' and self._binds(k + 3):
+                return selector
+            if toks[k - 1].text == 'of' and toks[k + 1].text == ')':
+                body = k + 2
+                if body < len(toks) and toks[body].text == '{' and self._binds(body):
+                    return selector
+        return None
+
+
+def _line_starts(text):
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def scan_source(source, path, line_offset=0, default_function='<module>'):
+    """單一段 JS → [Finding]; 片段不完整 (例如補丁錨點) 時函式名稱以 default_function 代替"""
+    try:
+        scan = _Scan(source)
+    except JsSyntaxError:
+        return []
+    try:
+        index = JsIndex.build(source)
+    except JsSyntaxError:
+        index = None
+    starts = _line_starts(source)
+    out = []
+    for rule, i, loop in scan.findings():
+        offset = scan.toks[i].start
+        sym = index.at(offset) if index else None
+        function = (sym.name if sym and sym.name else None) or default_function
+        if rule == 'listener-rebind-in-render' and not RENDER_NAME.match(function):
+            continue
+        row = bisect.bisect_right(starts, offset) - 1
+        code = source[starts[row]:starts[row + 1] if row + 1 < len(starts) else len(source)].strip()
+        out.append(Finding(rule, path, row + 1 + line_offset, function, loop, code[:100]))
+    return out
+
+
+def embedded_js(path):
+    """Python 補丁腳本中看起來是 JS 的模組層字串常數 → [(名稱, 字串, 起始行號 - 1)]"""
+    tree = ast.parse(Path(path).read_text(encoding='utf-8'))
+    out = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) \
+                and isinstance(node.value.value, str) and _JS_HINT.search(node.value.value):
+            name = next((t.id for t in node.targets if isinstance(t, ast.Name)), '<const>')
+            out.append((name, node.value.value, node.value.lineno - 1))
+    return out
+
+
+def sources(root=ROOT):
+    """(相對路徑, JS 原始碼, 行號位移, 預設函式名稱)"""
+    root = Path(root)
+    yield 'app.js', (root / 'app.js').read_bytes().decode('utf-8').replace('\r\n', '\n'), 0, '<module>'
+    for path in sorted((root / 'components').rglob('*.js')):
+        yield path.relative_to(root).as_posix(), path.read_text(encoding='utf-8'), 0, '<fragment>'
+    for path in sorted(root.glob('*.py')):
+        for name, text, offset in embedded_js(path):
+            yield path.name, text, offset, name
+
+
+def scan(root=ROOT):
+    return [f for path, text, offset, name in sources(root) for f in scan_source(text, path, offset, name)]
+
+
+def counts(findings):
+    """→ {'檔案::函式': {規則: 數量}} (鍵已排序, 可直接寫成預算)"""
+    table = Counter((f.key, f.rule) for f in findings)
+    out = {}
+    for (key, rule), n in sorted(table.items()):
+        out.setdefault(key, {})[rule] = n
+    return out
+
+
+def load_budget(root=ROOT):
+    path = Path(root) / BUDGET_FILE
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+
+
+def compare(current, budget):
+    """→ (超過預算 [(key, rule, 目前, 預算)], 可下修 [(key, rule, 目前, 預算)])"""
+    over, under = [], []
+    for key in sorted(set(current) | set(budget)):
+        for rule in RULES:
+            have, allowed = current.get(key, {}).get(rule, 0), budget.get(key, {}).get(rule, 0)
+            if have > allowed:
+                over.append((key, rule, have, allowed))
+            elif have < allowed:
+                under.append((key, rule, have, allowed))
+    return over, under
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='熱路徑平方級樣式靜態分析與預算閘門')
+    parser.add_argument('--rule', choices=RULES, help='只列出此規則')
+    parser.add_argument('--check', action='store_true', help=f'超過 {BUDGET_FILE} 的預算時 exit 1')
+    parser.add_argument('--update-budget', action='store_true', help='以目前結果覆寫預算')
+    args = parser.parse_args(argv)
+
+    findings = scan()
+    current = counts(findings)
+    if args.update_budget:
+        write_atomic(ROOT / BUDGET_FILE, (json.dumps(current, ensure_ascii=False, indent=2) + '\n').encode('utf-8'))
+        print(f'✓ {BUDGET_FILE}: {len(findings)} 項, {len(current)} 個函式')
+        return 0
+    if args.check:
+        over, under = compare(current, load_budget())
+        for key, rule, have, allowed in over:
+            print(f'✗ {key} {rule}: {have} > 預算 {allowed}')
+            for f in findings:
+                if f.key == key and f.rule == rule:
+                    print(f'    {f.path}:{f.line}  [{f.loop}]  {f.code}')
+        for key, rule, have, allowed in under:
+            print(f'· {key} {rule}: {have} < 預算 {allowed} (可執行 --update-budget 下修)')
+        if over:
+            return 1
+        print(f'✓ 熱路徑預算內 ({len(findings)} 項)')
+        return 0
+
+    shown = [f for f in findings if args.rule in (None, f.rule)]
+    for f in shown:
+        print(f'{f.path}:{f.line}  {f.rule}  {f.function}  [{f.loop}]  {f.code}')
+    totals = Counter(f.rule for f in shown)
+    print('· ' + ', '.join(f'{rule} {totals[rule]}' for rule in RULES if args.rule in (None, rule)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
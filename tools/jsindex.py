@@ -0,0 +1,329 @@
+"""
+app.js 頂層符號索引 (top-level symbol index)
+
+update_files.py 以前逐字比對整個 `function switchView(mode) { ... }`,
+多一個空白就印出 "Could not find target string"。本模組一次線性掃描 JS 原始碼
+(正確跳過字串、template literal、註解、regex literal), 建出頂層宣告的 offset 表:
+
+    idx = JsIndex.build(source)
+    idx.find('switchView')      # 依名稱 → Symbol (最後一個宣告, 即實際生效者)
+    idx.at(offset)              # 依 offset 二分搜尋 → 所在的頂層敘述
+    idx.duplicates()            # 同名重複宣告 (後者會默默覆蓋前者)
+
+用法:
+    python -m tools.jsindex app.js            # 列出頂層宣告統計與重複宣告
+    python -m tools.jsindex app.js --check    # 有重複宣告時 exit 1 (建置檢查用)
+"""
+import argparse
+import bisect
+import re
+import sys
+from dataclasses import dataclass
+
+from tools import ROOT
+
+DECL_KINDS = ('function', 'const', 'let', 'var', 'class')
+BLOCK_KEYWORDS = ('if', 'for', 'while', 'try', 'switch', 'do')
+BLOCK_CONTINUATIONS = ('else', 'catch', 'finally', 'while')
+# 這些 token 之後的 / 是 regex literal 開頭, 而不是除號
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                  'void', 'throw', 'instanceof', 'yield', 'await'}
+
+_TOKEN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>=>|\.\.\.|[^\sA-Za-z_$\d])
+''', re.VERBOSE | re.DOTALL)
+
+
+class JsSyntaxError(Exception):
+    """掃描到未結束的字串 / 註解 / template literal"""
+
+
+@dataclass(frozen=True)
+class Symbol:
+    name: str | None        # 頂層運算式 (例如 document.addEventListener(...)) 為 None
+    kind: str               # function | async function | const | let | var | class | statement
+    start: int              # 宣告關鍵字 (或 async) 的 offset
+    end: int                # 結尾 } 或 ; 之後的 offset
+    doc_start: int          # 緊鄰的 /** JSDoc */ 起點; 沒有則等於 start
+    line: int               # 1-based 行號
+
+
+def _skip_template(src, i):
+    """i 指向 ` 之後; 回傳 (結束位置, 是否遇到 ${)"""
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if c == '\\':
+            i += 2
+        elif c == '`':
+            return i + 1, False
+        elif c == '$' and src.startswith('${', i):
+            return i + 2, True
+        else:
+            i += 1
+    raise JsSyntaxError('template literal 未結束')
+
+
+def _skip_regex(src, i):
+    """i 指向開頭 / 之後; 回傳 regex literal (含 flags) 結束位置"""
+    n = len(src)
+    in_class = False
+    while i < n:
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            raise JsSyntaxError('regex literal 未結束')
+        if in_class:
+            in_class = c != ']'
+        elif c == '[':
+            in_class = True
+        elif c == '/':
+            i += 1
+            while i < n and (src[i].isalnum() or src[i] == '_'):
+                i += 1
+            return i
+        i += 1
+    raise JsSyntaxError('regex literal 未結束')
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str               # word | number | punct | string | template | regex
+    text: str               # template 為 ` 與 ${ 之間的字面部分
+    start: int
+
+
+def tokens(src):
+    """切出有意義的 token (略過空白與註解); template literal 的字面部分為一個 template token, ${} 內照常切"""
+    out = []
+    stack = []
+    prev = None
+    pos = 0
+    n = len(src)
+
+    def template(start):
+        end, opened = _skip_template(src, start)
+        out.append(Token('template', src[start:end - 2 if opened else end - 1], start))
+        if opened:
+            stack.append('${')
+        return end
+
+    while pos < n:
+        m = _TOKEN.match(src, pos)
+        if m is None:
+            raise JsSyntaxError(f'無法解析 offset {pos}')
+        kind = m.lastgroup
+        tok = m.group()
+        start = pos
+        pos = m.end()
+        if kind in ('space', 'line_comment', 'block_comment'):
+            continue
+        if kind == 'punct':
+            if tok == '`':
+                pos = template(pos)
+                prev = '`'
+                continue
+            if tok == '/' and (prev is None or prev in REGEX_PRECEDERS or prev in REGEX_KEYWORDS):
+                pos = _skip_regex(src, pos)
+                out.append(Token('regex', src[start:pos], start))
+                prev = 'regex'
+                continue
+            if tok in '{([':
+                stack.append(tok)
+            elif tok in '})]' and stack and stack.pop() == '${':
+                pos = template(pos)
+                prev = '`'
+                continue
+        out.append(Token(kind, tok, start))
+        prev = tok
+    return out
+
+
+def brackets(toks):
+    """回傳 (match, parent): 括號配對 index, 與每個 token 所在最內層開括號的 index"""
+    match = {}
+    parent = [None] * len(toks)
+    stack = []
+    for i, t in enumerate(toks):
+        parent[i] = stack[-1] if stack else None
+        if t.kind != 'punct':
+            continue
+        if t.text in '([{':
+            stack.append(i)
+        elif t.text in ')]}' and stack:
+            j = stack.pop()
+            match[i], match[j] = j, i
+    return match, parent
+
+
+class JsIndex:
+    def __init__(self, source, symbols):
+        self.source = source
+        self.symbols = symbols                      # 依 start 排序
+        self._starts = [s.start for s in symbols]
+        self._by_name = {}
+        for sym in symbols:
+            if sym.name:
+                self._by_name.setdefault(sym.name, []).append(sym)
+
+    @classmethod
+    def build(cls, source):
+        return cls(source, _scan(source))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.build(f.read())
+
+    def find(self, name, kind=None):
+        """回傳同名宣告中最後一個 (JS 執行時實際生效的那個); 找不到回傳 None"""
+        found = [s for s in self._by_name.get(name, ()) if kind is None or s.kind == kind]
+        return found[-1] if found else None
+
+    def find_all(self, name):
+        return list(self._by_name.get(name, ()))
+
+    def at(self, offset):
+        """offset 所在的頂層敘述 (O(log n)); 不在任何敘述內回傳 None"""
+        i = bisect.bisect_right(self._starts, offset) - 1
+        if i >= 0 and offset < self.symbols[i].end:
+            return self.symbols[i]
+        return None
+
+    def declarations(self):
+        return [s for s in self.symbols if s.name]
+
+    def duplicates(self):
+        return {name: syms for name, syms in self._by_name.items() if len(syms) > 1}
+
+    def text(self, sym, with_doc=False):
+        return self.source[sym.doc_start if with_doc else sym.start:sym.end]
+
+
+def _scan(src):
+    """單次線性掃描, 回傳頂層敘述清單"""
+    symbols = []
+    line_starts = [0] + [m.end() for m in re.finditer('\n', src)]
+    stack = []              # '{' '(' '[' 或 '${' (template 內的運算式)
+    prev = None             # 上一個有意義的 token, 用來判斷 / 是否為 regex
+    current = None          # 進行中的頂層敘述: [name, kind, start, doc_start, state]
+    doc_start = None
+    pos = 0
+    n = len(src)
+
+    def close(end):
+        nonlocal current
+        name, kind, start, doc, _ = current
+        line = bisect.bisect_right(line_starts, start)
+        symbols.append(Symbol(name, kind, start, end, doc if doc is not None else start, line))
+        current = None
+
+    while pos < n:
+        m = _TOKEN.match(src, pos)
+        if m is None:
+            raise JsSyntaxError(f'無法解析 offset {pos}')
+        kind = m.lastgroup
+        tok = m.group()
+        start = pos
+        pos = m.end()
+
+        if kind == 'space':
+            continue
+        if kind in ('line_comment', 'block_comment'):
+            if not stack and current is None and doc_start is None and tok.startswith('/**'):
+                doc_start = start
+            continue
+
+        # 頂層新敘述開始
+        if not stack and current is None:
+            if kind == 'word' and tok == 'async' and re.match(r'\s+function\b', src[pos:pos + 20]):
+                current = [None, 'async function', start, doc_start, 'header']
+            elif kind == 'word' and tok in DECL_KINDS:
+                current = [None, tok, start, doc_start, 'header']
+            elif kind == 'word' and tok in BLOCK_KEYWORDS:
+                current = [None, 'statement', start, doc_start, 'block']
+            elif not (kind == 'punct' and tok == ';'):
+                current = [None, 'statement', start, doc_start, 'expr']
+            doc_start = None
+        elif current is not None and current[0] is None and current[4] == 'header' and not stack:
+            # 宣告名稱: function 後 (可能有 * generator)、const/let/var/class 後的第一個識別字
+            if kind == 'word' and tok not in ('function', 'async'):
+                current[0] = tok
+                current[4] = 'named'
+            elif tok in ('{', '['):
+                current[4] = 'named'        # 解構宣告, 不記名稱
+
+        if kind == 'punct':
+            if tok == '`':
+                pos, opened = _skip_template(src, pos)
+                if opened:
+                    stack.append('${')
+                prev = '`'
+                continue
+            if tok == '/' and (prev is None or prev in REGEX_PRECEDERS or prev in REGEX_KEYWORDS):
+                pos = _skip_regex(src, pos)
+                prev = 'regex'
+                continue
+            if tok in '{([':
+                stack.append(tok)
+            elif tok in '})]':
+                if not stack:
+                    raise JsSyntaxError(f'多餘的 {tok!r} (offset {start})')
+                top = stack.pop()
+                if top == '${':
+                    pos, opened = _skip_template(src, pos)
+                    if opened:
+                        stack.append('${')
+                    prev = '`'
+                    continue
+                if tok == '}' and not stack and current is not None:
+                    ckind, state = current[1], current[4]
+                    if ckind in ('function', 'async function', 'class') or state == 'block':
+                        nxt = _TOKEN.match(src, pos)
+                        while nxt and nxt.lastgroup in ('space', 'line_comment', 'block_comment'):
+                            nxt = _TOKEN.match(src, nxt.end())
+                        if not (state == 'block' and nxt and nxt.group() in BLOCK_CONTINUATIONS):
+                            close(pos)
+            elif tok == ';' and not stack and current is not None:
+                close(pos)
+        prev = tok
+
+    if stack:
+        raise JsSyntaxError(f'結尾仍有未關閉的 {stack[-1]!r}')
+    if current is not None:
+        close(n)
+    return symbols
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='列出 JS 頂層宣告與重複宣告')
+    parser.add_argument('files', nargs='*', default=['app.js'])
+    parser.add_argument('--check', action='store_true', help='有重複宣告時 exit 1')
+    args = parser.parse_args(argv)
+
+    found_duplicates = False
+    for name in args.files:
+        idx = JsIndex.from_file(ROOT / name)
+        counts = {}
+        for sym in idx.declarations():
+            counts[sym.kind] = counts.get(sym.kind, 0) + 1
+        summary = ', '.join(f'{k} {v}' for k, v in sorted(counts.items()))
+        print(f"{name}: {len(idx.declarations())} 個頂層宣告 ({summary})")
+        for dup, syms in sorted(idx.duplicates().items()):
+            found_duplicates = True
+            lines = ', '.join(str(s.line) for s in syms)
+            print(f"  ✗ {dup} 重複宣告於第 {lines} 行 (第 {syms[-1].line} 行的宣告生效)")
+    return 1 if args.check and found_duplicates else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
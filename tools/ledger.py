@@ -0,0 +1,136 @@
+"""
+補丁帳本 (patch ledger): 以 SHA-256 記錄每個 patch 的套用狀態
+
+舊做法是各腳本自己探測 `'history-modal-overlay' not in content` 之類的字串,
+每次探測都要掃全檔, 而且 update_css() 之類沒有保護的 edit 重跑就會重複套用。
+
+帳本 (.patch-ledger.json) 記錄:
+  targets[檔案] = {sha256, size, mtime_ns, applied: [patch id], missing: [patch id]}
+  patches[id]   = {target, before, after}   # 套用當下 target 的前後雜湊
+
+重跑時先比對 stat (size + mtime_ns), 相符就直接採用帳本中的雜湊 → 完全不開檔;
+stat 不符才重新計算雜湊, 雜湊仍相符則照樣略過掃描。
+
+用法:
+    python -m tools.ledger status     # 逐一列出 patch 狀態, 並指出「部分套用」的腳本
+"""
+import argparse
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools import ROOT
+from tools.patching import DEFAULT_MODULES, collect, write_atomic
+
+LEDGER_FILE = '.patch-ledger.json'
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class Ledger:
+    def __init__(self, root=ROOT, path=None):
+        self.root = Path(root)
+        self.path = Path(path) if path else self.root / LEDGER_FILE
+        data = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        self.targets = data.get('targets', {})
+        self.patches = data.get('patches', {})
+
+    def current_hash(self, target):
+        """stat 與帳本相符 → 直接回傳記錄的雜湊 (不開檔); 否則重新計算。檔案不存在回傳 None"""
+        path = self.root / target
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        rec = self.targets.get(target)
+        if rec and rec['size'] == st.st_size and rec['mtime_ns'] == st.st_mtime_ns:
+            return rec['sha256']
+        with open(path, 'rb') as f:
+            return sha256_bytes(f.read())
+
+    def known(self, target):
+        """target 內容與帳本相符時回傳 (已套用 ids, 缺錨點 ids); 內容已漂移或未記錄回傳 None"""
+        rec = self.targets.get(target)
+        if rec is None or self.current_hash(target) != rec['sha256']:
+            return None
+        return set(rec['applied']), set(rec['missing'])
+
+    def record(self, target, before, after, results):
+        """記錄一次套用: before / after 為 target 寫入前後的完整 bytes"""
+        before_hash = sha256_bytes(before)
+        after_hash = sha256_bytes(after) if after is not before else before_hash
+        rec = self.targets.get(target)
+        # 寫入前內容與帳本一致 → 沿用先前已套用清單; 否則 (手動改過) 只信任本次結果
+        applied = set(rec['applied']) if rec and rec['sha256'] == before_hash else set()
+        missing = set()
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        for r in results:
+            if r.status == 'missing':
+                missing.add(r.patch.id)
+                continue
+            applied.add(r.patch.id)
+            if r.status == 'applied':
+                self.patches[r.patch.id] = {'target': target, 'before': before_hash, 'after': after_hash, 'at': now}
+        st = (self.root / target).stat()
+        self.targets[target] = {
+            'sha256': after_hash,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'applied': sorted(applied),
+            'missing': sorted(missing - applied),
+        }
+
+    def status(self, patch):
+        """applied | missing | pending | reverted | drifted | unknown"""
+        rec = self.targets.get(patch.target)
+        current = self.current_hash(patch.target)
+        if rec and current == rec['sha256']:
+            if patch.id in rec['applied']:
+                return 'applied'
+            if patch.id in rec['missing']:
+                return 'missing'
+            return 'pending'
+        entry = self.patches.get(patch.id)
+        if entry and current == entry['before']:
+            return 'reverted'   # target 回到套用前的內容
+        return 'drifted' if rec else 'unknown'
+
+    def save(self):
+        data = {'version': 1, 'targets': self.targets, 'patches': self.patches}
+        write_atomic(self.path, (json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+
+
+def partial_modules(statuses):
+    """依 patch id 前綴 (腳本名) 分組, 找出有些 patch 已套用、有些沒有的腳本"""
+    groups = {}
+    for patch_id, state in statuses.items():
+        groups.setdefault(patch_id.split('/')[0], set()).add(state)
+    return sorted(m for m, states in groups.items()
+                  if 'applied' in states and states & {'missing', 'pending', 'reverted'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查詢補丁帳本')
+    parser.add_argument('command', choices=['status'])
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES))
+    args = parser.parse_args(argv)
+
+    ledger = Ledger()
+    statuses = {}
+    for patch in collect(args.modules):
+        statuses[patch.id] = ledger.status(patch)
+        print(f"{statuses[patch.id]:<9} [{patch.target}] {patch.id}")
+    partial = partial_modules(statuses)
+    for module in partial:
+        print(f"✗ {module} 只套用了一部分")
+    return 1 if partial else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
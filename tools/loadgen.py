@@ -0,0 +1,426 @@
+"""
+預約流程負載產生器 (asyncio, 對本機 Firestore + Functions emulator)
+
+開學第一週數百位老師同時預約時, 預約流程會怎樣沒人知道:
+loadBookingsFromFirebase 查詢 → submitBooking 的衝突查詢與 batch.commit
+→ bookings 寫入觸發 notifyOnBookingCreate / trackBookingChanges / journalBookingChanges
+(批次 / 重複預約寫成一份 bookingSeries 系列, 只觸發 notifyOnSeriesCreate)。
+本模組以 asyncio 模擬 N 位老師的操作腳本, 每位老師一條 keep-alive 連線 (同一個瀏覽器分頁),
+依 app.js 的實際請求順序重播:
+
+    load_week       開啟頁面: (room, weekKey) 等值查詢 + 同場地的系列 + roomSettings/{場地}
+    prefetch        2.5 秒後背景預載其他場地同一週 (每間間隔 200 ms)
+    switch_week     切換上 / 下週
+    conflict_check  送出前 (room, date in [...]) 與同場地系列的衝突查詢
+    book            單日預約 commit; batch_book 為批次 / 每週重複 (一份系列文件)
+    delete          取消自己剛建立的預約
+    audit_log       logSystemAction 寫入 audit_logs
+
+場地依熱門程度 (ROOMS 順序, Zipf 權重) 挑選、日期集中在 --weeks 週內,
+刻意製造同格搶訂。報表列出:
+  - 各操作吞吐量與 p50 / p95 / p99 延遲、錯誤數
+  - 衝突: 送出前查到已被預約 (rejected) 與兩人都通過檢查後重複入帳 (double booked)
+  - 觸發器: 輪詢 editTrail (trackBookingChanges 的輸出) 對照每筆寫入的 commit 時間,
+    得到觸發延遲分布、最大積壓量與負載結束後清空積壓所需時間
+
+只對 emulator 執行 (FIRESTORE_EMULATOR_HOST), 不會對正式專案送出任何請求。
+--project 需與 Functions emulator 的專案相同, 觸發器才會執行。
+
+用法:
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.loadgen --project demo-test
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python -m tools.loadgen --project demo-test --sessions 300 --ramp 30
+    ... --no-triggers                   # 沒開 Functions emulator 時略過觸發器量測
+    ... --json loadgen-300.json         # 報表另存 JSON, 方便比較不同規模
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+
+from tools.analytics import app_constants
+from tools.conflicts import ConflictIndex, date_ordinal
+from tools.datekeys import date_keys, parse_day
+from tools.firestore import Firestore, FirestoreError, auto_id
+from tools.series import COLLECTION as SERIES, day_bits, expand
+
+OPERATIONS = ('load_week', 'room_settings', 'prefetch', 'switch_week', 'conflict_check',
+              'book', 'batch_book', 'delete', 'audit_log')
+TRIGGER_COLLECTION = 'editTrail'
+PREFETCH_DELAY = 2.5        # triggerRoomPrefetch 的 setTimeout
+PREFETCH_GAP = 0.2          # 預載每間場地之間的間隔
+TRIGGER_LOOKBACK = 5.0
+IN_LIMIT = 30               # Firestore 'in' 查詢上限 (submitBooking 每 30 個日期一次)
+_FRACTION = re.compile(r'(\.\d{6})\d+')
+
+
+@dataclass
+class LoadConfig:
+    sessions: int = 50
+    ramp: float = 10.0              # 所有 session 在幾秒內陸續開始
+    think: float = 1.0              # 操作間平均思考時間 (指數分布), 秒
+    start: date = None              # 第一週的週一; 預設下週一
+    weeks: int = 2                  # 預約集中的週數 (越少越搶)
+    week_switches: int = 2
+    prefetch_rooms: int = 3
+    book_probability: float = 0.7
+    batch_probability: float = 0.25
+    batch_weeks: int = 4            # 每週重複預約的週數
+    delete_probability: float = 0.2
+    triggers: bool = True
+    poll_interval: float = 0.5
+    drain_timeout: float = 60.0
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.start is None:
+            today = date.today()
+            self.start = today + timedelta(days=7 - today.weekday())
+
+
+@dataclass
+class Recorder:
+    """各操作延遲樣本 (秒)、錯誤與事件計數、每筆寫入的 commit 時間 (epoch 秒)"""
+    samples: dict = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+    events: Counter = field(default_factory=Counter)
+    writes: dict = field(default_factory=dict)          # (bookingId, changeType) → commit 時間
+    trigger_lag: list = field(default_factory=list)
+    backlog: list = field(default_factory=list)         # [(距開始秒數, 尚未看到觸發輸出的寫入數)]
+
+    async def call(self, op, fn, *args):
+        """在執行緒中呼叫 Firestore client 方法並計時; 失敗計入 errors 後回傳 None"""
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except (FirestoreError, OSError) as e:
+            self.errors[op] += 1
+            self.events[f'error: {type(e).__name__} {getattr(e, "status", "")}'.strip()] += 1
+            return None
+        finally:
+            self.samples[op].append(time.perf_counter() - t0)
+
+
+def percentile(values, q):
+    """nearest-rank 百分位數; values 為空回傳 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def _epoch(timestamp):
+    """REST timestampValue (奈秒精度、Z 結尾) → epoch 秒"""
+    return datetime.fromisoformat(_FRACTION.sub(r'\1', timestamp).replace('Z', '+00:00')).timestamp()
+
+
+def _fs_date(day):
+    return day.strftime('%Y/%m/%d')
+
+
+def _week_filters(room, monday):
+    return [('room', '==', room), ('weekKey', '==', _fs_date(monday))]
+
+
+def _room_series(client, room, start, end):
+    """app.js loadSeriesBookings: 同場地 endOrdinal >= 起日的系列, 展開成 [start, end] 內的預約"""
+    found = client.run_query(SERIES, [('room', '==', room), ('endOrdinal', '>=', date_ordinal(start))])
+    return [doc for series in found for doc in expand(series, start, end)]
+
+
+def _load_week(client, room, monday):
+    # 同一條 keep-alive 連線, 兩個查詢依序送出
+    return client.run_query('bookings', _week_filters(room, monday)) + _room_series(client, room, monday,
+                                                                                  monday + timedelta(days=6))
+
+
+class Session:
+    """一位老師的操作腳本; rng 由 seed + 編號決定, 同樣設定重跑的腳本相同"""
+
+    def __init__(self, number, client, rec, config, rooms, period_ids):
+        self.number = number
+        self.client = client
+        self.rec = rec
+        self.config = config
+        self.rooms = rooms
+        self.period_ids = period_ids
+        self.rng = random.Random(config.seed * 100003 + number)
+        self.device_id = f'loadgen_{number:04d}'
+        self.created = []
+
+    async def think(self):
+        await asyncio.sleep(self.rng.expovariate(1 / self.config.think) if self.config.think > 0 else 0)
+
+    async def load_week(self, op, room, monday):
+        return await self.rec.call(op, _load_week, self.client, room, monday)
+
+    async def prefetch(self, room, monday):
+        # 與思考時間同比例縮放, --think 0 時不等待
+        await asyncio.sleep(PREFETCH_DELAY * self.config.think)
+        others = [r for r in self.rooms if r != room]
+        for other in self.rng.sample(others, min(self.config.prefetch_rooms, len(others))):
+            await self.load_week('prefetch', other, monday)
+            await asyncio.sleep(PREFETCH_GAP * self.config.think)
+
+    async def audit(self, action, details, target):
+        data = {'action': action, 'targetId': target, 'details': details, 'performedBy': 'Guest',
+                'userEmail': None, 'deviceId': self.device_id, 'userAgent': 'tools.loadgen', 'ip': '127.0.0.1'}
+        await self.rec.call('audit_log', self.client.commit,
+                            [self.client.create_write('audit_logs', auto_id(), data, server_time=('timestamp',))])
+
+    async def book(self, room, monday):
+        cfg = self.config
+        day = monday + timedelta(days=self.rng.randrange(5))
+        weeks = cfg.batch_weeks if self.rng.random() < cfg.batch_probability else 1
+        dates = [_fs_date(day + timedelta(weeks=w)) for w in range(weeks)]
+        first = self.rng.randrange(len(self.period_ids) - 1)
+        periods = self.period_ids[first:first + self.rng.choice((1, 2))]
+
+        existing = await self.rec.call('conflict_check', _room_series, self.client, room, dates[0], dates[-1])
+        if existing is None:
+            return
+        for i in range(0, len(dates), IN_LIMIT):
+            found = await self.rec.call('conflict_check', self.client.run_query, 'bookings',
+                                        [('room', '==', room), ('date', 'in', dates[i:i + IN_LIMIT])])
+            if found is None:
+                return
+            existing.extend(found)
+        if ConflictIndex.from_docs(existing, self.period_ids).conflicts(room, dates, periods):
+            self.rec.events['rejected (conflict check)'] += 1
+            return
+
+        data = {'room': room, 'periods': periods, 'booker': f'壓測教師{self.number:03d}', 'reason': 'loadgen',
+                'deviceId': self.device_id}
+        if len(dates) > 1:
+            # 批次 / 重複預約: 一份系列文件, 沒有逐筆的 editTrail 觸發可量測
+            series_id = auto_id()
+            ordinals = [date_ordinal(d) for d in dates]
+            data.update({'periodMask': sum(1 << self.period_ids.index(p) for p in periods),
+                         'startOrdinal': ordinals[0], 'endOrdinal': ordinals[-1],
+                         'dayBits': day_bits(ordinals, ordinals[0])})
+            writes = [self.client.create_write(SERIES, series_id, data, server_time=('createdAt',))]
+            if await self.rec.call('batch_book', self.client.commit, writes) is None:
+                return
+            ids = [f'{series_id}@{o}' for o in ordinals]
+        else:
+            ids = [auto_id()]
+            data.update({'date': dates[0], **date_keys(parse_day(dates[0]))})
+            writes = [self.client.create_write('bookings', ids[0], data, server_time=('createdAt',))]
+            if await self.rec.call('book', self.client.commit, writes) is None:
+                return
+            self.rec.writes[(ids[0], 'created')] = time.time()
+            self.created.extend(ids)
+        await self.audit('CREATE_BOOKING', {'room': room, 'dates': dates, 'periods': periods,
+                                            'count': len(dates), 'createdIds': ids}, ','.join(ids))
+        await self.load_week('load_week', room, monday)               # loadBookingsFromFirebase(true)
+
+    async def delete(self):
+        doc_id = self.created.pop(self.rng.randrange(len(self.created)))
+        if await self.rec.call('delete', self.client.commit, [self.client.delete_write('bookings', doc_id)]) is None:
+            return
+        self.rec.writes[(doc_id, 'deleted')] = time.time()
+        await self.audit('DELETE_BOOKING', {'reason': 'loadgen'}, doc_id)
+
+    async def run(self):
+        cfg = self.config
+        await asyncio.sleep(self.rng.uniform(0, cfg.ramp))
+        weights = [1 / (i + 1) for i in range(len(self.rooms))]
+        room = self.rng.choices(self.rooms, weights)[0]
+        week = self.rng.randrange(cfg.weeks)
+        monday = cfg.start + timedelta(weeks=week)
+        try:
+            await self.load_week('load_week', room, monday)
+            await self.rec.call('room_settings', self.client.get, 'roomSettings', room)
+            background = asyncio.create_task(self.prefetch(room, monday))
+            for _ in range(cfg.week_switches):
+                await self.think()
+                week = max(0, min(cfg.weeks - 1, week + self.rng.choice((-1, 1))))
+                monday = cfg.start + timedelta(weeks=week)
+                await self.load_week('switch_week', room, monday)
+            if self.rng.random() < cfg.book_probability:
+                await self.think()
+                await self.book(room, monday)
+            if self.created and self.rng.random() < cfg.delete_probability:
+                await self.think()
+                await self.delete()
+            await background
+        finally:
+            self.client.close()
+
+
+async def watch_triggers(client, rec, done, config, started):
+    """輪詢 editTrail, 以 (bookingId, changeType) 對照寫入時間; 負載結束後等積壓清空或逾時"""
+    seen = set()                    # 已讀過的 editTrail 文件 id (回看範圍會重複讀到)
+    outputs = {}                    # (bookingId, changeType) → 觸發器寫入時間; commit 回應前就可能先查到
+    matched = set()
+    newest = started
+    deadline = None
+    while True:
+        # 伺服器時間戳與可見順序不一定一致 (較早的時間戳可能較晚才查得到), 每次回看 TRIGGER_LOOKBACK 秒
+        since = datetime.fromtimestamp(max(started, newest - TRIGGER_LOOKBACK)).astimezone()
+        entries = await asyncio.to_thread(lambda: list(client.stream_query(
+            TRIGGER_COLLECTION, [('changedAt', '>=', since)], [('changedAt', 'asc')])))
+        for entry in entries:
+            if entry['id'] in seen or not entry.get('changedAt'):
+                continue
+            seen.add(entry['id'])
+            changed = _epoch(entry['changedAt'])
+            outputs.setdefault((entry.get('bookingId'), entry.get('changeType')), changed)
+            newest = max(newest, changed)
+        for key, changed in outputs.items():
+            if key not in matched and key in rec.writes:
+                matched.add(key)
+                rec.trigger_lag.append(max(0.0, changed - rec.writes[key]))
+        pending = len(rec.writes) - len(matched)
+        rec.backlog.append((time.time() - started, pending))
+        if done.is_set():
+            if deadline is None:
+                deadline = time.monotonic() + config.drain_timeout
+            if pending == 0 or time.monotonic() > deadline:
+                rec.events['trigger outputs missing after drain'] = pending
+                return
+        await asyncio.sleep(config.poll_interval)
+
+
+def count_double_bookings(client, config, rooms, period_ids):
+    """測試週範圍內同一 (場地, 日期, 節次) 被超過一筆預約佔用的格數"""
+    last = config.start + timedelta(weeks=config.weeks + config.batch_weeks, days=-1)
+    cells = Counter()
+    for room in rooms:
+        docs = client.run_query('bookings', [('room', '==', room), ('date', '>=', _fs_date(config.start)),
+                                             ('date', '<=', _fs_date(last))])
+        for doc in docs + _room_series(client, room, config.start, last):
+            for pid in doc.get('periods') or ():
+                if pid in period_ids:
+                    cells[(room, doc['date'], pid)] += 1
+    return sum(1 for n in cells.values() if n > 1)
+
+
+async def _run(client, config, rooms, period_ids):
+    rec = Recorder()
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.sessions + 8))
+    started = time.time()
+    done = asyncio.Event()
+    watcher = None
+    if config.triggers:
+        watcher = asyncio.create_task(watch_triggers(client.clone(), rec, done, config, started))
+    t0 = time.perf_counter()
+    sessions = [Session(n, client.clone(), rec, config, rooms, period_ids) for n in range(config.sessions)]
+    await asyncio.gather(*(s.run() for s in sessions))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    drain_started = time.perf_counter()
+    if watcher:
+        await watcher
+    drain = time.perf_counter() - drain_started
+    double = await asyncio.to_thread(count_double_bookings, client, config, rooms, period_ids)
+    return rec, elapsed, drain, double
+
+
+def run(client, config=None, rooms=None, period_ids=None):
+    """執行一次負載, 回傳報表 dict (延遲單位 ms)"""
+    config = config or LoadConfig()
+    if rooms is None or period_ids is None:
+        all_rooms, periods = app_constants()
+        rooms = rooms or all_rooms
+        period_ids = period_ids or list(periods.values())
+    rec, elapsed, drain, double = asyncio.run(_run(client, config, rooms, period_ids))
+
+    operations = {}
+    for op in OPERATIONS:
+        values = rec.samples.get(op, [])
+        if values:
+            operations[op] = {
+                'count': len(values), 'per_second': round(len(values) / elapsed, 2),
+                **{f'p{q}': round(percentile(values, q) * 1000, 1) for q in (50, 95, 99)},
+                'errors': rec.errors.get(op, 0),
+            }
+    total = sum(o['count'] for o in operations.values())
+    triggers = None
+    if config.triggers:
+        triggers = {
+            'writes': len(rec.writes),
+            'observed': len(rec.trigger_lag),
+            **{f'lag_p{q}': round(percentile(rec.trigger_lag, q) * 1000, 1) if rec.trigger_lag else None
+               for q in (50, 95, 99)},
+            'max_backlog': max((n for _, n in rec.backlog), default=0),
+            'drain_seconds': round(drain, 2),
+        }
+    return {
+        'config': {k: (v.isoformat() if isinstance(v, date) else v) for k, v in asdict(config).items()},
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput': round(total / elapsed, 2) if elapsed else 0.0,
+        'operations': operations,
+        'conflicts': {'rejected': rec.events.get('rejected (conflict check)', 0), 'double_booked': double},
+        'events': dict(rec.events),
+        'triggers': triggers,
+    }
+
+
+def format_report(report):
+    lines = [f"{'操作':<16}{'次數':>7}{'次/秒':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'錯誤':>6}   (ms)"]
+    for op, o in report['operations'].items():
+        lines.append(f"{op:<16}{o['count']:>7}{o['per_second']:>9}{o['p50']:>9}{o['p95']:>9}{o['p99']:>9}{o['errors']:>6}")
+    cfg = report['config']
+    lines.append(f"· {cfg['sessions']} 位老師, {report['elapsed_seconds']} s, 共 {report['throughput']} 次請求/秒")
+    c = report['conflicts']
+    lines.append(f"· 衝突: 送出前被擋 {c['rejected']} 次, 通過檢查仍重複入帳 {c['double_booked']} 格")
+    t = report['triggers']
+    if t:
+        lines.append(f"· 觸發器: {t['observed']}/{t['writes']} 筆寫入看到 {TRIGGER_COLLECTION}, "
+                     f"延遲 p50 {t['lag_p50']} / p95 {t['lag_p95']} / p99 {t['lag_p99']} ms, "
+                     f"最大積壓 {t['max_backlog']}, 負載結束後 {t['drain_seconds']} s 清空")
+    for name, n in report['events'].items():
+        if name.startswith('error') or (name.startswith('trigger') and n):
+            lines.append(f'✗ {name}: {n}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(description='預約流程負載產生器 (只對 emulator)')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id (同 Functions emulator)')
+    parser.add_argument('--sessions', type=int, default=defaults.sessions, help='同時模擬的老師數')
+    parser.add_argument('--ramp', type=float, default=defaults.ramp, help='所有 session 陸續開始的秒數')
+    parser.add_argument('--think', type=float, default=defaults.think, help='操作間平均思考秒數')
+    parser.add_argument('--start', type=date.fromisoformat, help=f'第一週週一 (預設 {defaults.start.isoformat()})')
+    parser.add_argument('--weeks', type=int, default=defaults.weeks, help='預約集中的週數')
+    parser.add_argument('--batch-probability', type=float, default=defaults.batch_probability)
+    parser.add_argument('--delete-probability', type=float, default=defaults.delete_probability)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--no-triggers', action='store_true', help='不量測觸發器 (未啟動 Functions emulator)')
+    parser.add_argument('--drain-timeout', type=float, default=defaults.drain_timeout)
+    parser.add_argument('--json', help='報表另存為 JSON')
+    args = parser.parse_args(argv)
+    if not args.project:
+        parser.error('需要 --project (或 GCLOUD_PROJECT)')
+    if 'FIRESTORE_EMULATOR_HOST' not in os.environ:
+        parser.error('只能對 emulator 執行: 請設定 FIRESTORE_EMULATOR_HOST')
+
+    config = LoadConfig(sessions=args.sessions, ramp=args.ramp, think=args.think, start=args.start,
+                        weeks=args.weeks, batch_probability=args.batch_probability,
+                        delete_probability=args.delete_probability, seed=args.seed,
+                        triggers=not args.no_triggers, drain_timeout=args.drain_timeout)
+    client = Firestore(args.project)
+    try:
+        report = run(client, config)
+    finally:
+        client.close()
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if any(o['errors'] for o in report['operations'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
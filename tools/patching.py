@@ -0,0 +1,381 @@
+"""
+單次掃描多重補丁引擎 (multi-patch engine)
+
+舊做法: 每支 codemod 各自 open → `old in content` → `content.replace` → write,
+每個 edit 都掃全檔兩次, 成本隨「檔案數 × edit 數 × 檔案大小」放大。
+
+新做法: 腳本只宣告 PATCHES, 由 apply_patches() 統一處理:
+  1. 每個 target 只讀一次
+  2. 所有錨點 + 冪等保護字串編成單一 regex, 一次掃描取得全部出現位置
+  3. 依位置由前往後拼接輸出
+  4. 每個 target 只寫一次 (同目錄 temp file + os.replace, 原子替換)
+
+語意: 錨點一律比對「原始內容」, 某個 edit 的輸出不會成為另一個 edit 的錨點。
+
+用法:
+    python -m tools.patching                     # 套用所有 codemod 腳本的 PATCHES
+    python -m tools.patching add_history_batch   # 只套用指定腳本
+    python -m tools.patching --no-atomic         # 不以腳本為交易單位 (見 tools/transaction.py)
+
+套用結果記錄在補丁帳本 (見 tools/ledger.py), 重跑時已確認的 patch 不再掃描。
+"""
+import argparse
+import importlib
+import os
+import re
+import stat
+import tempfile
+from dataclasses import dataclass
+
+from tools import ROOT
+from tools.cssindex import CssIndex
+from tools.jsindex import JsIndex
+
+# 依 README 中的歷史執行順序
+DEFAULT_MODULES = ('update_files', 'add_mobile_button', 'update_styles', 'add_history_batch')
+
+
+class PatchError(Exception):
+    """補丁宣告有誤 (例如兩個 edit 改到同一段文字)"""
+
+
+@dataclass(frozen=True)
+class Edit:
+    """單一替換: 把 old (並延伸到 until 依序找到的結束標記) 換成 new。
+
+    old=None 代表附加到檔尾; count=-1 與 str.replace 相同, 取代所有出現位置。
+    JS target 可改用 symbol 以頂層宣告名稱定位 (見 tools/jsindex.py), where 為:
+      replace — 取代整個宣告 (保留上方 JSDoc)
+      before / after — 插在宣告之前 / 之後
+      end — 插在函式本體結尾的 } 之前
+    CSS target 可改用 rule 以 selector + at-rule 脈絡定位 (見 tools/cssindex.py), where 為:
+      upsert — 已存在就原地取代, 否則插入對應 @media 區塊 (沒有就附加到檔尾)
+      delete — 刪除該規則; 不存在視為已完成
+    """
+    old: str | None
+    new: str
+    until: tuple = ()
+    count: int = -1
+    symbol: str | None = None
+    where: str = 'replace'
+    rule: str | None = None
+    context: tuple = ()
+
+
+@dataclass(frozen=True)
+class Patch:
+    """針對同一 target 的一組 edit; 任一錨點找不到則整組不套用。"""
+    id: str
+    target: str                 # 相對 repo 根目錄的路徑
+    edits: tuple
+    unless: str | None = None   # target 已含此字串 → 視為已套用, 略過
+    label: str = ''
+
+
+@dataclass
+class PatchResult:
+    patch: Patch
+    status: str                 # applied | skipped | missing | aborted (交易中同組有 patch 缺錨點)
+    detail: str = ''
+
+
+def decode(data):
+    """bytes → (內容, 主要換行符)
+
+    內容保持原樣不做換行轉換: styles.css 等檔案 CRLF / LF 混用,
+    整檔轉換會讓沒動到的行也出現在 diff 裡。錨點比對時 \\n 同時接受 \\r\\n (見 scan),
+    插入的新內容則改用檔案的主要換行符。
+    """
+    crlf = data.count(b'\r\n')
+    eol = '\r\n' if crlf and crlf * 2 >= data.count(b'\n') else '\n'
+    return data.decode('utf-8'), eol
+
+
+def encode(text):
+    return text.encode('utf-8')
+
+
+def with_eol(text, eol):
+    return text.replace('\n', eol) if eol != '\n' else text
+
+
+def needle_pattern(needle):
+    """字面比對, 但 \\n 也接受 \\r\\n"""
+    return re.escape(needle).replace('\\\n', '\\r?\\n')
+
+
+def read_text(path):
+    """讀取文字檔, 回傳 (內容, 換行符)"""
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+def file_mode(path):
+    """替換 path 時暫存檔該用的權限: 既有檔案沿用原權限, 新檔同 open() 建立 (0o666 扣掉 umask)
+
+    mkstemp 建立的暫存檔是 0600, os.replace 後 target 也會變成 0600;
+    部署產物 (GitHub Pages) 必須所有人可讀, 所以 rename 前要先改回來。
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def write_atomic(path, data):
+    """寫入同目錄暫存檔後 os.replace, 中途失敗不會留下半寫的 target; 權限見 file_mode()"""
+    path = os.fspath(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def scan(text, needles):
+    """單次掃描, 回傳 {needle: [(起點, 終點), ...]}
+
+    用 lookahead 讓比對為零寬度, 重疊的出現位置也不會漏掉;
+    同一位置若有多個 needle 互為前綴, 由最長者一併記錄。
+    """
+    needles = sorted(set(needles), key=len, reverse=True)
+    hits = {n: [] for n in needles}
+    if not needles:
+        return hits
+    prefixes = {n: [m for m in needles if m != n and n.startswith(m)] for n in needles}
+    alternatives = '|'.join(f'(?P<n{i}>{needle_pattern(n)})' for i, n in enumerate(needles))
+    for m in re.finditer(f'(?=(?:{alternatives}))', text):
+        needle = needles[int(m.lastgroup[1:])]
+        start = m.start()
+        hits[needle].append((start, m.end(m.lastgroup)))
+        for p in prefixes[needle]:
+            # 前綴的長度 = 前綴字元數 + 其中被 \r\n 取代的 \n 數
+            end = start + len(p) + text.count('\r', start, start + len(p) + p.count('\n'))
+            hits[p].append((start, end))
+    return hits
+
+
+def _needles(patch):
+    found = [e.old for e in patch.edits if e.old is not None]
+    if patch.unless:
+        found.append(patch.unless)
+    return found
+
+
+def _symbol_span(index, edit):
+    sym = index.find(edit.symbol)
+    if sym is None:
+        return None
+    if edit.where == 'replace':
+        return sym.start, sym.end
+    if edit.where == 'before':
+        return sym.doc_start, sym.doc_start
+    if edit.where == 'after':
+        return sym.end, sym.end
+    if edit.where == 'end':
+        return sym.end - 1, sym.end - 1
+    raise PatchError(f'未知的 where={edit.where!r}')
+
+
+def _rule_span(css, edit):
+    """回傳 (start, end, new); delete 且規則不存在時回傳 None"""
+    rule = css.find(edit.rule, edit.context)
+    if edit.where == 'delete':
+        return (rule.doc_start, rule.end, '') if rule else None
+    if edit.where != 'upsert':
+        raise PatchError(f'未知的 where={edit.where!r}')
+    if rule:
+        # new 自帶註解時連同原本上方的註解一起取代
+        start = rule.doc_start if edit.new.lstrip().startswith('/*') else rule.start
+        return start, rule.end, edit.new.strip()
+    block = css.last_block(edit.context) if edit.context else None
+    if block:
+        pos = block.end - 1
+        return pos, pos, '\n' + edit.new.rstrip() + '\n'
+    text = edit.new.strip()
+    for prelude in reversed(edit.context):
+        text = prelude + ' {\n' + text + '\n}'
+    end = len(css.source)
+    return end, end, '\n\n' + text + '\n'
+
+
+def css_upserts(css_text):
+    """把一段 CSS 拆成逐條規則的 upsert edit (含 @media 內的規則, 上方註解隨規則插入)"""
+    css = CssIndex.build(css_text)
+    return tuple(Edit(None, css.text(r, with_doc=True), rule=r.selector, context=r.context, where='upsert')
+                 for r in css.rules)
+
+
+def _resolve(text, patch, hits, index=None, css=None):
+    """把 patch 的 edit 轉成 (start, end, new) 區段; 錨點缺漏回傳 (None, 說明)"""
+    spans = []
+    for edit in patch.edits:
+        if edit.rule:
+            span = _rule_span(css, edit)
+            if span is not None:
+                spans.append(span)
+            continue
+        if edit.symbol:
+            span = _symbol_span(index, edit)
+            if span is None:
+                return None, f'找不到頂層宣告 {edit.symbol!r}'
+            spans.append((*span, edit.new))
+            continue
+        if edit.old is None:
+            spans.append((len(text), len(text), edit.new))
+            continue
+        taken = []
+        last_end = -1
+        for pos, end in hits[edit.old]:
+            if pos < last_end:
+                continue  # 與 str.replace 相同: 同一錨點不重疊取代
+            for marker in edit.until:
+                found = re.compile(needle_pattern(marker)).search(text, end)
+                if found is None:
+                    return None, f'找不到結束標記 {marker!r}'
+                end = found.end()
+            taken.append((pos, end, edit.new))
+            last_end = end
+            if len(taken) == edit.count:
+                break
+        if not taken:
+            return None, f'找不到錨點 {edit.old.strip()[:40]!r}'
+        spans.extend(taken)
+    return spans, ''
+
+
+def patch_text(text, patches, eol='\n'):
+    """對單一 target 的內容套用多個 patch, 回傳 (新內容, [PatchResult]); 新增內容改用 eol 換行"""
+    hits = scan(text, [n for p in patches for n in _needles(p)])
+    needs_index = any(e.symbol for p in patches for e in p.edits)
+    index = JsIndex.build(text) if needs_index else None
+    needs_css = any(e.rule for p in patches for e in p.edits)
+    css = CssIndex.build(text) if needs_css else None
+    results = []
+    spans = []
+    for patch in patches:
+        if patch.unless and hits[patch.unless]:
+            results.append(PatchResult(patch, 'skipped', '已套用'))
+            continue
+        resolved, detail = _resolve(text, patch, hits, index, css)
+        if resolved is None:
+            results.append(PatchResult(patch, 'missing', detail))
+            continue
+        base = len(spans)  # 同位置插入時維持宣告順序
+        spans.extend((start, end, base + i, new, patch.id) for i, (start, end, new) in enumerate(resolved))
+        results.append(PatchResult(patch, 'applied'))
+
+    spans.sort()
+    out = []
+    cursor = 0
+    prev_id = None
+    for start, end, _seq, new, patch_id in spans:
+        if start < cursor:
+            raise PatchError(f'{patch_id} 與 {prev_id} 改到同一段文字 (offset {start})')
+        out.append(text[cursor:start])
+        out.append(with_eol(new, eol))
+        cursor = end
+        prev_id = patch_id
+    out.append(text[cursor:])
+    return ''.join(out), results
+
+
+def group_by_target(patches):
+    grouped = {}
+    for patch in patches:
+        grouped.setdefault(patch.target, []).append(patch)
+    return grouped
+
+
+def apply_patches(patches, root=ROOT, dry_run=False, ledger=None):
+    """套用 patches: 每個 target 讀一次、掃描一次、寫一次 (有變更才寫)
+
+    有 ledger 時, 帳本確認已套用 / 缺錨點的 patch 直接略過;
+    整個 target 都已確認時連檔案都不開。
+    """
+    results = []
+    for target, group in group_by_target(patches).items():
+        known = ledger.known(target) if ledger else None
+        if known:
+            applied, missing = known
+            results.extend(PatchResult(p, 'skipped', '帳本') for p in group if p.id in applied)
+            results.extend(PatchResult(p, 'missing', '帳本') for p in group if p.id in missing)
+            group = [p for p in group if p.id not in applied and p.id not in missing]
+            if not group:
+                continue
+        path = os.path.join(root, target)
+        with open(path, 'rb') as f:
+            data = f.read()
+        text, eol = decode(data)
+        new_text, target_results = patch_text(text, group, eol)
+        out = encode(new_text) if new_text != text else data
+        if not dry_run:
+            if out is not data:
+                write_atomic(path, out)
+            if ledger:
+                ledger.record(target, data, out, target_results)
+        results.extend(target_results)
+    if ledger and not dry_run:
+        ledger.save()
+    return results
+
+
+def run(patches, dry_run=False, atomic=False):
+    """codemod 腳本的共用進入點: 帶帳本套用並輸出結果
+
+    atomic=True 時每支腳本的 patches 各是一個交易 (見 tools/transaction.py): 全部套用或全部不寫;
+    不論是否 atomic, 所有腳本的 patches 都在同一次讀取 / 掃描 / 寫入中完成。
+    """
+    from tools.ledger import Ledger
+    from tools.transaction import apply_transaction
+
+    if atomic:
+        results = apply_transaction(patches, dry_run=dry_run, ledger=Ledger(), unit=script_of)
+    else:
+        results = apply_patches(patches, dry_run=dry_run, ledger=Ledger())
+    report(results)
+    return results
+
+
+def report(results):
+    """沿用舊腳本的 ✓ / ✗ 輸出風格"""
+    marks = {'applied': '✓', 'skipped': '·', 'missing': '✗', 'aborted': '↺'}
+    for r in results:
+        name = r.patch.label or r.patch.id
+        suffix = f' ({r.detail})' if r.detail else ''
+        print(f"{marks[r.status]} [{r.patch.target}] {name}{suffix}")
+
+
+def script_of(patch):
+    """patch id 的前綴 = 所屬 codemod 腳本名 (見 tools.ledger.partial_modules)"""
+    return patch.id.split('/')[0]
+
+
+def collect(module_names):
+    """匯入 codemod 腳本並收集其 PATCHES (腳本在 import 時不得有副作用)"""
+    patches = []
+    for name in module_names:
+        patches.extend(importlib.import_module(name).PATCHES)
+    return patches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='一次套用所有 codemod 補丁')
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES))
+    parser.add_argument('--dry-run', action='store_true', help='只計算不寫檔')
+    parser.add_argument('--no-atomic', action='store_true', help='逐 patch 套用, 不以腳本為交易單位')
+    args = parser.parse_args(argv)
+    # 所有腳本一起套用, 每個 target 只讀寫一次; atomic 時缺任何錨點的腳本整支不寫, 其他腳本照常套用
+    results = run(collect(args.modules), dry_run=args.dry_run, atomic=not args.no_atomic)
+    return 1 if any(r.status in ('missing', 'aborted') for r in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
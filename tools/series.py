@@ -0,0 +1,253 @@
+"""
+重複 / 批次預約系列 (booking series) 折疊與展開
+
+送出多個日期的預約 (批次選日、每週重複) 原本是每個日期一份 bookings 文件, 以 batchId 串起來:
+20 個日期 = 20 次寫入、20 次 notifyOnBookingCreate / trackBookingChanges / journalBookingChanges /
+syncBookingDateKeys 觸發, 外加 20 個 trigger 搶 notificationLocks 的交易。
+
+改成 bookingSeries 集合的一份系列文件:
+
+    {room, periods, periodMask, booker, reason, deviceId, createdAt,
+     startOrdinal, endOrdinal,          # 第一天 / 最後一天的 dayOrdinal
+     dayBits,                           # 日期 bitmap 的 hex: bit i (位元組 i >> 3 的第 i & 7 位) = startOrdinal + i 當天
+     batchId?, foldedFrom?,             # 由本工具折疊的系列: 原 batchId 與 {dayOrdinal: 原文件 id}
+     rejectedDayBits?}                  # trackSeriesChanges 清回更新時多出的日期: {dayBits: 被拒的值, at}
+
+讀取時展開成虛擬預約 (id = '<系列 id>@<dayOrdinal>', 帶 seriesId), 與一般預約一起顯示、檢查衝突;
+取消其中一天 = 清掉該天的 bit, 改單天的節次則把那一天拆回一般預約。寫入與 trigger 都是每個系列 O(1)。
+
+本工具:
+  fold   — 把既有 bookings 依 batchId (且場地 / 節次 / 預約者 / 理由 / 裝置相同) 折成系列;
+           每組一個 atomic commit (建立系列 + 刪除原文件), 系列 id 由內容決定, 重跑不會重複。
+           折疊出的系列帶 foldedFrom, notifyOnSeriesCreate 不會再推一次通知; 原文件的刪除由
+           notifyOnBookingDelete / trackBookingChanges 以 foldedFrom 認出, 不推取消通知也不記 editTrail
+  unfold — 反向: 系列展開回一般預約 (沿用 foldedFrom 記下的原 id, 一律帶 batchId) 並刪除系列;
+           同時寫入 notificationLocks/{batchId} (kind = series_unfold): 展開出的文件不會觸發批次通知,
+           trackBookingChanges 不記 created; 系列的刪除由 trackSeriesChanges 以「第一天的預約已存在」認出
+
+用法:
+    python -m tools.series fold --project <專案> --token "$(gcloud auth print-access-token)"
+    python -m tools.series fold --project <專案> --dry-run        # 只列出可折疊的組數與筆數
+    python -m tools.series unfold --project <專案> [--id ser_xxx ...]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone
+
+from tools.analytics import app_constants, parse_created
+from tools.conflicts import EPOCH, date_ordinal
+from tools.datekeys import date_keys, parse_day
+from tools.firestore import CONNECTIONS, MAX_BATCH, Firestore, FirestoreError, parallel
+
+COLLECTION = 'bookingSeries'
+BOOKINGS = 'bookings'
+LOCKS = 'notificationLocks'
+MAX_SPAN_DAYS = 366         # 同 app.js SERIES_MAX_DAYS; dayBits 最多 92 個 hex 字元
+FIELDS = ('room', 'periods', 'booker', 'reason', 'deviceId')
+
+
+def day_bits(ordinals, start):
+    """dayOrdinal 集合 → dayBits hex (bit i = start + i)"""
+    bits = bytearray((max(ordinals) - start) // 8 + 1)
+    for ordinal in ordinals:
+        i = ordinal - start
+        bits[i >> 3] |= 1 << (i & 7)
+    return bits.hex()
+
+
+def series_ordinals(series):
+    """系列 → 有效日期的 dayOrdinal (遞增)"""
+    start = series['startOrdinal']
+    return [start + i * 8 + j for i, byte in enumerate(bytes.fromhex(series.get('dayBits') or ''))
+            for j in range(8) if byte >> j & 1]
+
+
+def ordinal_day(ordinal):
+    return date.fromordinal(ordinal + EPOCH)
+
+
+def expand(series, start=None, end=None):
+    """系列 (含 id) → [start, end] (日期或 'YYYY/MM/DD', None = 不限) 內的虛擬預約; 欄位同 bookings 文件"""
+    lo = date_ordinal(start) if start else None
+    hi = date_ordinal(end) if end else None
+    base = {k: series[k] for k in (*FIELDS, 'createdAt') if series.get(k) is not None}
+    base['batchId'] = series.get('batchId') or series['id']
+    docs = []
+    for ordinal in series_ordinals(series):
+        if (lo is not None and ordinal < lo) or (hi is not None and ordinal > hi):
+            continue
+        day = ordinal_day(ordinal)
+        docs.append({**base, 'id': f"{series['id']}@{ordinal}", 'seriesId': series['id'],
+                     'date': day.strftime('%Y/%m/%d'), **date_keys(day)})
+    return docs
+
+
+def series_id(batch_id, doc):
+    key = '|'.join([batch_id, doc.get('room') or '', ','.join(sorted(doc['periods'])), doc.get('booker') or '',
+                    doc.get('reason') or '', doc.get('deviceId') or ''])
+    return 'ser_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _created(value):
+    created = parse_created(value) if value is not None and not isinstance(value, datetime) else value
+    return created.astimezone(timezone.utc) if created else None
+
+
+def fold_plan(docs, period_ids):
+    """bookings 文件 → (系列 [(系列 id, 系列資料, 原文件 id)], 略過原因 [...])
+
+    同一 batchId 內欄位相同的有效預約 (2 筆以上) 才折疊; 已取消 (periods 為空) 的保留為一般文件。
+    """
+    groups = defaultdict(list)
+    for doc in docs:
+        if doc.get('batchId') and doc.get('periods') and parse_day(doc.get('date')):
+            groups[series_id(doc['batchId'], doc)].append(doc)
+
+    plan, skipped = [], []
+    for sid, members in sorted(groups.items()):
+        if len(members) < 2:
+            continue
+        batch_id = members[0]['batchId']
+        by_day = {date_ordinal(parse_day(m['date'])): m for m in members}
+        if len(by_day) != len(members):
+            skipped.append(f'{batch_id}: 同一天有重複的文件')
+            continue
+        first, last = min(by_day), max(by_day)
+        if last - first >= MAX_SPAN_DAYS:
+            skipped.append(f'{batch_id}: 跨 {last - first + 1} 天, 超過 {MAX_SPAN_DAYS} 天上限')
+            continue
+        created = sorted(c for c in (_created(m.get('createdAt')) for m in members) if c)
+        head = members[0]
+        data = {k: head[k] for k in FIELDS if head.get(k) is not None}
+        data['periods'] = list(head['periods'])
+        data['periodMask'] = sum(1 << period_ids.index(p) for p in set(head['periods']) if p in period_ids)
+        if created:
+            data['createdAt'] = created[0]        # 系列的建立時間 = 最早的一筆
+        data.update({'startOrdinal': first, 'endOrdinal': last, 'dayBits': day_bits(by_day, first),
+                     'batchId': batch_id, 'foldedFrom': {str(o): m['id'] for o, m in sorted(by_day.items())}})
+        plan.append((sid, data, [m['id'] for _, m in sorted(by_day.items())]))
+    return plan, skipped
+
+
+def unfold_plan(series):
+    """系列 (含 id) → 展開後的一般預約 [(文件 id, 資料)]; 原 id 取自 foldedFrom, 沒有則 '<系列 id>_<dayOrdinal>'"""
+    origin = series.get('foldedFrom') or {}
+    occurrences = expand(series)
+    created = _created(series.get('createdAt'))
+    docs = []
+    for occurrence in occurrences:
+        ordinal = occurrence['dayOrdinal']
+        data = {k: v for k, v in occurrence.items() if k not in ('id', 'seriesId', 'createdAt')}
+        if created:
+            data['createdAt'] = created
+        docs.append((origin.get(str(ordinal)) or f"{series['id']}_{ordinal}", data))
+    return docs
+
+
+def _commit_job(label, count, build):
+    def commit(conn):
+        try:
+            conn.commit(build(conn))
+        except (FirestoreError, OSError) as e:
+            return label, count, e
+        return label, count, None
+    return commit
+
+
+def _run(client, jobs, connections, summary):
+    for label, count, error in parallel(client, jobs, connections):
+        if error:
+            summary['errors'].append(f'{label}: {error}')
+        else:
+            summary['series'] += 1
+            summary['bookings'] += count
+
+
+def fold(client, period_ids, connections=CONNECTIONS, dry_run=False):
+    """折疊全部可折疊的 batchId 組; 回傳 {'series', 'bookings', 'skipped', 'errors'}"""
+    docs = [doc for doc in client.stream_query(BOOKINGS, page_size=1000) if doc.get('batchId')]
+    plan, skipped = fold_plan(docs, period_ids)
+    summary = {'series': 0, 'bookings': 0, 'skipped': skipped, 'errors': []}
+    if dry_run:
+        summary['series'] = len(plan)
+        summary['bookings'] = sum(len(ids) for _, _, ids in plan)
+        return summary
+
+    def build(sid, data, ids):
+        # 原文件須仍存在 (exists 前置條件), 折疊途中被刪除的組整個 commit 失敗, 不會把它復活在系列裡
+        return lambda conn: ([conn.create_write(COLLECTION, sid, data)]
+                             + [conn.delete_write(BOOKINGS, doc_id, must_exist=True) for doc_id in ids])
+    jobs = [_commit_job(data['batchId'], len(ids), build(sid, data, ids)) for sid, data, ids in plan]
+    _run(client, jobs, connections, summary)
+    return summary
+
+
+def unfold(client, ids=None, connections=CONNECTIONS, dry_run=False):
+    """展開系列 (ids 為 None = 全部) 回一般預約; 回傳 {'series', 'bookings', 'skipped', 'errors'}"""
+    if ids:
+        series = [s for s in (client.get(COLLECTION, sid) for sid in ids) if s]
+    else:
+        series = client.list_documents(COLLECTION)
+    summary = {'series': 0, 'bookings': 0, 'skipped': [], 'errors': []}
+    jobs = []
+    for s in series:
+        docs = unfold_plan(s)
+        if len(docs) + 2 > MAX_BATCH:
+            summary['skipped'].append(f"{s['id']}: {len(docs)} 個日期超過單次 commit 上限")
+            continue
+        if dry_run:
+            summary['series'] += 1
+            summary['bookings'] += len(docs)
+            continue
+
+        def build(conn, s=s, docs=docs):
+            lock = {'acquiredAt': datetime.now(timezone.utc), 'kind': 'series_unfold'}
+            writes = [conn.create_write(BOOKINGS, doc_id, data) for doc_id, data in docs]
+            writes.append(conn.set_write(LOCKS, s.get('batchId') or s['id'], lock))
+            return writes + [conn.delete_write(COLLECTION, s['id'], must_exist=True)]
+        jobs.append(_commit_job(s['id'], len(docs), build))
+    _run(client, jobs, connections, summary)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='重複 / 批次預約系列: 折疊 (fold) 或展開 (unfold)')
+    parser.add_argument('command', choices=('fold', 'unfold'))
+    parser.add_argument('--id', action='append', dest='ids', help='unfold 只展開指定系列 (可重複)')
+    parser.add_argument('--project', default=os.environ.get('GCLOUD_PROJECT'), help='Firebase 專案 id')
+    parser.add_argument('--token', help='OAuth access token (正式環境以管理員身分寫入; emulator 不需要)')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS, help='平行連線數')
+    parser.add_argument('--dry-run', action='store_true', help='只統計, 不寫入')
+    args = parser.parse_args(argv)
+    if not args.project:
+        parser.error('需要 --project (或 GCLOUD_PROJECT)')
+
+    client = Firestore(args.project, token=args.token)
+    t0 = time.perf_counter()
+    try:
+        if args.command == 'fold':
+            summary = fold(client, list(app_constants()[1].values()), args.connections, args.dry_run)
+        else:
+            summary = unfold(client, args.ids, args.connections, args.dry_run)
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - t0
+
+    for msg in summary['skipped']:
+        print(f'· 略過 {msg}')
+    for msg in summary['errors']:
+        print(f'✗ {msg}')
+    verb = '折疊' if args.command == 'fold' else '展開'
+    suffix = ' (dry run)' if args.dry_run else f' ({elapsed:.2f} s)'
+    print(f"✓ {verb} {summary['series']} 個系列, {summary['bookings']} 筆預約{suffix}")
+    if summary['errors']:
+        print('  重跑即可補上失敗的部分 (已完成的組不會重複處理)')
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
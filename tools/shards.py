@@ -0,0 +1,149 @@
+"""
+靜態週分片 (per-room weekly snapshot shards)
+
+每次冷開啟, loadBookingsFromFirebase 都要對 Firestore 查一次 `room == X && date in [本週]`;
+記憶體快取 bookingsCache (key = `${room}:${queryStart}:${queryEnd}`, 3 分鐘) 只對第二次以後有用。
+早上 7:50 幾百位老師同時打開網頁, 就是幾百次完整查詢。
+
+本模組把每個場地、每一週的預約匯出成一個小 JSON, 隨網站部署 (經 sw.js 快取):
+
+    shards/<場地雜湊>-<週一 YYYYMMDD>-<週日 YYYYMMDD>.json
+    {"key": "禮堂:2025/09/01:2025/09/07", "watermark": 1756690000000, "bookings": [...]}
+
+key 與 bookingsCache 相同 (前端確認相符才使用); 場地雜湊為場地名稱 UTF-16 的 FNV-1a 32 bit
+(與 app.js shardUrl 相同)。watermark 為讀取 Firestore 前的時間 (再往前留一點餘裕),
+前端只查 bookingChanges (functions/index.js journalBookingChanges 寫入的變更日誌) 中
+changedAt > watermark 的項目補上分片之後的異動。
+
+用法:
+    python -m tools.shards                          # 讀 Firestore (專案取自 config.js), 本週前 1 週到後 8 週
+    python -m tools.shards --project <專案> --weeks-ahead 4
+    python -m tools.shards --source 學期封存.json    # 離線 (測試用)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from tools import ROOT
+from tools.analytics import DEFAULT_ROOM, app_constants, iter_docs, parse_created
+from tools.firestore import Firestore
+from tools.freeslots import config_project
+
+SHARD_DIR = 'shards'
+WEEKS_BEHIND = 1
+WEEKS_AHEAD = 8
+WATERMARK_MARGIN = 120          # 秒; 與 Firestore 伺服器時鐘的誤差餘裕 (重複套用變更無害)
+
+
+def room_hash(room):
+    """場地名稱 UTF-16 code unit 的 FNV-1a 32 bit (與 app.js shardUrl 相同)"""
+    h = 0x811c9dc5
+    units = room.encode('utf-16-le')
+    for i in range(0, len(units), 2):
+        h ^= units[i] | units[i + 1] << 8
+        h = (h * 0x01000193) & 0xffffffff
+    return f'{h:08x}'
+
+
+def shard_name(room, start, end):
+    """start / end 為 'YYYY/MM/DD'"""
+    return f"{SHARD_DIR}/{room_hash(room)}-{start.replace('/', '')}-{end.replace('/', '')}.json"
+
+
+def week_starts(today, behind=WEEKS_BEHIND, ahead=WEEKS_AHEAD):
+    monday = today - timedelta(days=today.weekday())
+    return [monday + timedelta(weeks=i) for i in range(-behind, ahead + 1)]
+
+
+def _booking(doc):
+    """與 loadBookingsFromFirebase 放進 bookings 陣列的格式相同; createdAt 轉為 epoch 毫秒"""
+    out = {k: v for k, v in doc.items() if k != 'createdAt'}
+    out['room'] = doc.get('room') or DEFAULT_ROOM
+    created = parse_created(doc.get('createdAt'))
+    if created:
+        out['createdAt'] = round(created.timestamp() * 1000)
+    return out
+
+
+def build_shards(bookings, rooms, weeks, watermark):
+    """回傳 {相對路徑: 分片內容}; 沒有預約的週也輸出 (空分片同樣省下一次查詢)"""
+    spans = [(w.strftime('%Y/%m/%d'), (w + timedelta(days=6)).strftime('%Y/%m/%d')) for w in weeks]
+    grouped = {(room, span): [] for room in rooms for span in spans}
+    for doc in bookings:
+        room = doc.get('room') or DEFAULT_ROOM
+        day = (doc.get('date') or '').replace('-', '/')
+        for span in spans:
+            if span[0] <= day <= span[1]:
+                if (room, span) in grouped:
+                    grouped[(room, span)].append(_booking({**doc, 'date': day}))
+                break
+    return {
+        shard_name(room, start, end): {
+            'key': f'{room}:{start}:{end}',
+            'watermark': watermark,
+            'bookings': sorted(docs, key=lambda b: (b['date'], b.get('id', ''))),
+        }
+        for (room, (start, end)), docs in grouped.items()
+    }
+
+
+def write_shards(shards, root=ROOT):
+    """寫入分片並刪除不在本次範圍內的舊分片; 回傳總 bytes"""
+    directory = root / SHARD_DIR
+    directory.mkdir(exist_ok=True)
+    keep = set()
+    total = 0
+    for name, shard in shards.items():
+        data = (json.dumps(shard, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        (root / name).write_bytes(data)
+        keep.add((root / name).name)
+        total += len(data)
+    for path in directory.glob('*.json'):
+        if path.name not in keep:
+            os.unlink(path)
+    return total
+
+
+def fetch(client, weeks):
+    lo = weeks[0].strftime('%Y/%m/%d')
+    hi = (weeks[-1] + timedelta(days=6)).strftime('%Y/%m/%d')
+    return client.run_query('bookings', [('date', '>=', lo), ('date', '<=', hi)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='匯出每場地每週的預約分片 shards/*.json')
+    parser.add_argument('--project', help='Firebase 專案 id (預設取自 config.js)')
+    parser.add_argument('--token', help='OAuth access token (選用; 預約可公開讀取)')
+    parser.add_argument('--source', nargs='*', help='改讀匯出檔 (CSV / 封存 JSON / Firestore 匯出), 不連線')
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--weeks-behind', type=int, default=WEEKS_BEHIND)
+    parser.add_argument('--weeks-ahead', type=int, default=WEEKS_AHEAD)
+    args = parser.parse_args(argv)
+
+    rooms, period_names = app_constants(ROOT)
+    weeks = week_starts(args.today, args.weeks_behind, args.weeks_ahead)
+    watermark = round((time.time() - WATERMARK_MARGIN) * 1000)
+    if args.source:
+        bookings = [{**doc, 'periods': [period_names.get(p, p) for p in doc.get('periods') or ()]}
+                    for path in args.source for doc in iter_docs(path)]
+    else:
+        project = args.project or config_project()
+        if not project:
+            parser.error('需要 --project (或含 projectId 的 config.js)')
+        client = Firestore(project, token=args.token)
+        try:
+            bookings = fetch(client, weeks)
+        finally:
+            client.close()
+
+    shards = build_shards(bookings, rooms, weeks, watermark)
+    total = write_shards(shards)
+    print(f"✓ {len(shards)} 個分片 ({len(rooms)} 個場地 × {len(weeks)} 週), {total / 1024:.1f} KB → {SHARD_DIR}/")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+交易式多檔補丁 (transactional patch sets)
+
+add_history_batch.py 依序改 index.html → styles.css → app.js, 中間任一步印出
+"✗ 找不到..." 就留下半套用的樹: HTML 已有歷史記錄按鈕, app.js 卻沒有對應的處理函式。
+
+apply_transaction() 把一個腳本的 PATCHES 視為單一單位:
+  1. 讀取階段: 每個 target 讀進記憶體 (並記下 stat)
+  2. 計算階段: 各 target 分給 worker process, 對記憶體副本平行套用 patch_text
+  3. 任一 patch 缺錨點或計算失敗 → 全部放棄, 一個檔案都不寫
+  4. 提交階段: 先全部寫成同目錄暫存檔, 確認讀取後沒有被別人改過, 再逐一 os.replace;
+     途中失敗則把已替換的檔案還原成原始 bytes
+
+多支腳本一起套用時傳 unit=script_of: 每個 target 仍只讀寫一次, 步驟 3 只放棄缺錨點的那支腳本。
+
+用法:
+    results = apply_transaction(PATCHES, ledger=Ledger())
+    results = apply_transaction(collect(DEFAULT_MODULES), ledger=Ledger(), unit=script_of)
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from tools import ROOT
+from tools.patching import PatchError, PatchResult, decode, encode, file_mode, group_by_target, patch_text, write_atomic
+
+
+class TransactionError(PatchError):
+    """提交途中失敗 (已還原) 或 target 在計算期間被修改"""
+
+
+def _compute(target, data, patches):
+    """worker: 對記憶體中的 bytes 套用 patches, 回傳 (target, 新 bytes, [PatchResult])"""
+    text, eol = decode(data)
+    new_text, results = patch_text(text, patches, eol)
+    return target, encode(new_text) if new_text != text else data, results
+
+
+def _stage(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, file_mode(path))
+    return tmp
+
+
+def _commit(changes, root):
+    """changes: {target: (原始 bytes, 新 bytes, 讀取時的 stat)}; 全部替換或全部還原"""
+    staged = {}
+    replaced = []
+    try:
+        for target, (_, after, _) in changes.items():
+            staged[target] = _stage(os.path.join(root, target), after)
+        for target, (_, _, st) in changes.items():
+            now = os.stat(os.path.join(root, target))
+            if (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise TransactionError(f'{target} 在套用期間被修改')
+        for target in changes:
+            os.replace(staged[target], os.path.join(root, target))
+            del staged[target]
+            replaced.append(target)
+    except BaseException as e:
+        for target in replaced:
+            write_atomic(os.path.join(root, target), changes[target][0])
+        for tmp in staged.values():
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        if isinstance(e, TransactionError):
+            raise
+        raise TransactionError(f'提交失敗, 已還原 {len(replaced)} 個檔案: {e}') from e
+
+
+def apply_transaction(patches, root=ROOT, dry_run=False, ledger=None, workers=None, unit=None):
+    """全部 patch 都能套用才寫檔; 否則已成功計算的 patch 標為 aborted, 樹維持原狀
+
+    unit(patch) 回傳交易單位 (例如 tools.patching.script_of), 預設整組 patches 是同一個單位。
+    分單位時每個 target 仍只讀、算、寫一次; 只有含缺錨點 patch 的單位被放棄, 其餘單位照常寫入。
+    """
+    unit = unit or (lambda patch: None)
+    results = []
+    jobs = []
+    for target, group in group_by_target(patches).items():
+        known = ledger.known(target) if ledger else None
+        if known:
+            applied, missing = known
+            results.extend(PatchResult(p, 'skipped', '帳本') for p in group if p.id in applied)
+            results.extend(PatchResult(p, 'missing', '帳本') for p in group if p.id in missing)
+            group = [p for p in group if p.id not in applied and p.id not in missing]
+            if not group:
+                continue
+        path = os.path.join(root, target)
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            jobs.append((target, f.read(), group, st))
+
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_compute, target, data, group) for target, data, group, _ in jobs]
+            computed = [f.result() for f in futures]
+    else:
+        computed = [_compute(target, data, group) for target, data, group, _ in jobs]
+
+    for _, _, target_results in computed:
+        results.extend(target_results)
+    failed = {unit(r.patch) for r in results if r.status == 'missing'}
+    if failed:
+        results = [PatchResult(r.patch, 'aborted', '同組 patch 缺錨點')
+                   if r.status == 'applied' and unit(r.patch) in failed else r for r in results]
+        for i, (target, data, group, _) in enumerate(jobs):
+            if not any(unit(p) in failed for p in group):
+                continue
+            # 錨點一律比對原始內容, 拿掉被放棄的單位後其餘 patch 的結果不變; 只有失敗時才重算這些 target
+            keep = [p for p in group if unit(p) not in failed]
+            computed[i] = _compute(target, data, keep) if keep else (target, data, [])
+
+    changes = {target: (data, after, st)
+               for (target, data, _, st), (_, after, _) in zip(jobs, computed) if after != data}
+    if not dry_run:
+        if changes:
+            _commit(changes, root)
+        recorded = [(target, data, after, target_results)
+                    for (target, data, _, _), (_, after, target_results) in zip(jobs, computed) if target_results]
+        if ledger and recorded:
+            for target, data, after, target_results in recorded:
+                ledger.record(target, data, after, target_results)
+            ledger.save()
+    return results
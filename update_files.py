@@ -1,30 +1,10 @@
-import os
+"""
+週/月視圖切換改用 .hidden class 控制 (避免 CSS !important 覆蓋 inline style)
+"""
+from tools.patching import Edit, Patch, run
 
 # Update app.js
-app_js_path = r"h:\schedule\app.js"
-try:
-    with open(app_js_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    
-    old_switch_view = """function switchView(mode) {
-    viewMode = mode;
-
-    // 更新按鈕狀態
-    document.getElementById('btnViewWeek').classList.toggle('active', mode === 'week');
-    document.getElementById('btnViewMonth').classList.toggle('active', mode === 'month');
-
-    // 顯示/隱藏對應視圖
-    document.getElementById('calendarGrid').style.display = mode === 'week' ? 'grid' : 'none';
-    document.getElementById('monthCalendar').style.display = mode === 'month' ? 'block' : 'none';
-
-    if (mode === 'week') {
-        loadBookingsFromFirebase();
-    } else {
-        loadMonthBookings();
-    }
-}"""
-
-    new_switch_view = """function switchView(mode) {
+NEW_SWITCH_VIEW = """function switchView(mode) {
     viewMode = mode;
 
     // 更新按鈕狀態
@@ -54,33 +34,21 @@ try:
     }
 }"""
 
-    if old_switch_view in content:
-        new_content = content.replace(old_switch_view, new_switch_view)
-        with open(app_js_path, "w", encoding="utf-8") as f:
-            f.write(new_content)
-        print("Successfully updated app.js")
-    else:
-        print("Could not find target string in app.js")
-
-except Exception as e:
-    print(f"Error updating app.js: {e}")
-
 # Update index.html
-index_html_path = r"h:\schedule\index.html"
-try:
-    with open(index_html_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    
-    old_html = 'class="month-calendar" id="monthCalendar" style="display: none;"'
-    new_html = 'class="month-calendar hidden" id="monthCalendar"'
-    
-    if old_html in content:
-        new_content = content.replace(old_html, new_html)
-        with open(index_html_path, "w", encoding="utf-8") as f:
-            f.write(new_content)
-        print("Successfully updated index.html")
-    else:
-        print("Could not find target string in index.html")
-
-except Exception as e:
-    print(f"Error updating index.html: {e}")
+OLD_MONTH_CALENDAR = 'class="month-calendar" id="monthCalendar" style="display: none;"'
+NEW_MONTH_CALENDAR = 'class="month-calendar hidden" id="monthCalendar"'
+
+PATCHES = [
+    # 以函式名稱定位, 不再逐字比對舊的函式本體
+    Patch('update_files/switch-view', 'app.js',
+          (Edit(None, NEW_SWITCH_VIEW, symbol='switchView'),),
+          unless="monthCalendar.classList.remove('hidden')",
+          label='switchView 改用 hidden class'),
+    Patch('update_files/month-calendar-hidden', 'index.html',
+          (Edit(OLD_MONTH_CALENDAR, NEW_MONTH_CALENDAR),),
+          unless=NEW_MONTH_CALENDAR,
+          label='月曆容器改用 hidden class'),
+]
+
+if __name__ == '__main__':
+    run(PATCHES)
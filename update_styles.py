@@ -1,8 +1,9 @@
-import os
-
-file_path = 'h:\\schedule\\styles.css'
+"""
+重寫控制面板 (.control-panel ~ .room-select:focus) 樣式規則
+"""
+from tools.patching import Patch, css_upserts, run
 
-new_styles = """
+NEW_STYLES = """
 .control-panel {
     background: white;
     padding: 1.5rem;
@@ -114,41 +115,14 @@ new_styles = """
 }
 """
 
-try:
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+# 逐條規則 upsert: 已存在就原地取代 (含 @media 內), 不存在才附加; 重跑不會改變 styles.css
+PATCHES = [
+    Patch('update_styles/control-panel', 'styles.css',
+          css_upserts(NEW_STYLES),
+          label='控制面板樣式區塊'),
+]
 
-    # Define the start and end markers of the block to replace
-    # We use a unique string from the start and end of the block
-    start_marker = ".control-row {"
-    end_marker = ".room-select:focus {"
-    
-    start_idx = content.find(start_marker)
-    if start_idx == -1:
-        print("Start marker not found")
-        exit(1)
-        
-    # Find the end of the block starting at end_marker
-    end_idx_start = content.find(end_marker, start_idx)
-    if end_idx_start == -1:
-        print("End marker not found")
+if __name__ == '__main__':
+    results = run(PATCHES)
+    if any(r.status == 'missing' for r in results):
         exit(1)
-        
-    # Find the closing brace of the end marker block
-    end_idx = content.find("}", end_idx_start)
-    if end_idx == -1:
-        print("Closing brace not found")
-        exit(1)
-        
-    end_idx += 1 # Include the closing brace
-
-    # Perform replacement
-    new_content = content[:start_idx] + new_styles + content[end_idx:]
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(new_content)
-        
-    print("Successfully updated styles.css")
-
-except Exception as e:
-    print(f"Error: {e}")